@@ -26,6 +26,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # Lookups trigram (búsqueda de asistentes); inactivo en SQLite
+    'django.contrib.postgres',
     
     # Apps de terceros
     'rest_framework',
@@ -38,6 +40,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ConsultasSQLMiddleware',  # Primero: cuenta también las consultas de autenticación
+    'core.middleware.PerfiladoMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS debe ir antes de CommonMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -67,6 +71,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backyard_bar.wsgi.application'
+ASGI_APPLICATION = 'backyard_bar.asgi.application'
+
+# Modo de servicio: 'wsgi' (gunicorn sync) o 'asgi' (gunicorn + workers uvicorn y vistas async)
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
 
 import dj_database_url
 
@@ -78,6 +86,18 @@ DATABASES = {
     )
 }
 
+# Réplica de solo lectura (opcional): catálogo, dashboard, lista de invitados y Mis Entradas leen de
+# ella (ver core.replicas). Escrituras, select_for_update y transacciones siguen en la primaria.
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default='')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=600)
+    # En los tests la réplica es la misma base que la primaria
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['core.replicas.RouterReplica']
+# Tras reservar o pagar, el cliente lee de la primaria durante este tiempo (lee sus propias escrituras
+# aunque la réplica venga atrasada)
+REPLICA_LECTURA_PROPIA_SEGUNDOS = config('REPLICA_LECTURA_PROPIA_SEGUNDOS', default=30, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -157,11 +177,23 @@ CSRF_TRUSTED_ORIGINS = config(
     cast=lambda v: [s.strip() for s in v.split(',')]
 )
 
+# El TLS termina en el proxy (nginx/Coolify), que reenvía X-Forwarded-Proto: las URLs absolutas
+# que arma Django (p. ej. el `next` de la paginación) salen con https y no como contenido mixto.
+# Solo detrás del proxy: con el backend expuesto directo (docker-compose.yml publica :8000)
+# cualquier cliente podría mandar el encabezado y hacer pasar una conexión http por https.
+DETRAS_DE_PROXY = config('DETRAS_DE_PROXY', default=False, cast=bool)
+if DETRAS_DE_PROXY:
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
 # ========================================
 # MERCADO PAGO - Credenciales
 # ========================================
 MP_ACCESS_TOKEN = config('MP_ACCESS_TOKEN', default='')
 MP_PUBLIC_KEY = config('MP_PUBLIC_KEY', default='')
+# Host de la API (se puede apuntar a un stand-in local para pruebas/benchmarks)
+MP_API_URL = config('MP_API_URL', default='https://api.mercadopago.com')
+# Timeout de las llamadas salientes a Mercado Pago (cliente async)
+MP_HTTP_TIMEOUT_SEGUNDOS = config('MP_HTTP_TIMEOUT_SEGUNDOS', default=10, cast=float)
 
 # URL base para los webhooks de Mercado Pago
 BASE_URL = config('BASE_URL', default='http://localhost:8000')
@@ -174,6 +206,119 @@ FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:5173')
 # ========================================
 # Tiempo en minutos que una reserva se mantiene activa antes de expirar
 TIEMPO_EXPIRACION_RESERVA_MINUTOS = 15
+
+# ========================================
+# STREAM DE STOCK EN TIEMPO REAL (SSE)
+# ========================================
+# Cada cuánto se relee el stock de un evento con suscriptores (máx. 1 push por intervalo)
+STOCK_STREAM_INTERVALO_SEGUNDOS = config('STOCK_STREAM_INTERVALO_SEGUNDOS', default=0.5, cast=float)
+# Heartbeat para que proxies y navegadores no corten conexiones inactivas
+STOCK_STREAM_HEARTBEAT_SEGUNDOS = config('STOCK_STREAM_HEARTBEAT_SEGUNDOS', default=15, cast=int)
+
+# ========================================
+# MÉTRICAS (series temporales de ventas e ingresos)
+# ========================================
+# Retención de los buckets por minuto (horas) y por hora (días); los diarios no se purgan
+METRICAS_RETENCION_MINUTOS_HORAS = config('METRICAS_RETENCION_MINUTOS_HORAS', default=48, cast=int)
+METRICAS_RETENCION_HORAS_DIAS = config('METRICAS_RETENCION_HORAS_DIAS', default=90, cast=int)
+# Máximo de buckets por respuesta del endpoint de series
+METRICAS_MAX_PUNTOS = config('METRICAS_MAX_PUNTOS', default=1500, cast=int)
+
+# ========================================
+# PORTERÍA OFFLINE
+# ========================================
+# Solapamiento de las descargas delta del manifiesto: tiene que superar la transacción más larga que
+# escribe entradas (su fecha_modificacion se fija antes del commit)
+MANIFIESTO_MARGEN_SEGUNDOS = config('MANIFIESTO_MARGEN_SEGUNDOS', default=120, cast=int)
+# Máximo de escaneos por sincronización de check-in por lotes
+CHECKIN_LOTE_MAX_ESCANEOS = config('CHECKIN_LOTE_MAX_ESCANEOS', default=1000, cast=int)
+# Búsqueda de asistentes por cédula / nombre / email: máximo de entradas por respuesta
+BUSQUEDA_ASISTENTES_LIMITE = config('BUSQUEDA_ASISTENTES_LIMITE', default=50, cast=int)
+# Filas leídas por vuelta del cursor al exportar la lista de invitados
+EXPORTACION_CHUNK_FILAS = config('EXPORTACION_CHUNK_FILAS', default=2000, cast=int)
+# Exportaciones en segundo plano: directorio privado (no servido como media), si se
+# ejecutan en un hilo del worker web ('hilo') o solo con procesar_exportaciones ('comando'),
+# y minutos sin progreso tras los cuales un trabajo EN_PROCESO se reintenta
+EXPORTACIONES_DIR = config('EXPORTACIONES_DIR', default=str(BASE_DIR / 'exportaciones'))
+EXPORTACION_EJECUCION = config('EXPORTACION_EJECUCION', default='hilo')
+EXPORTACION_TIMEOUT_MINUTOS = config('EXPORTACION_TIMEOUT_MINUTOS', default=10, cast=int)
+
+# ========================================
+# CORTESÍAS (emisión masiva del staff)
+# ========================================
+# Máximo de invitados por emisión desde la API (el comando no tiene límite)
+CORTESIAS_MAX_INVITADOS = config('CORTESIAS_MAX_INVITADOS', default=10000, cast=int)
+# Procesos para dibujar los QR (0 = uno por CPU)
+CORTESIAS_PROCESOS_QR = config('CORTESIAS_PROCESOS_QR', default=0, cast=int)
+
+# ========================================
+# REEMBOLSOS (cancelación de eventos)
+# ========================================
+# 'hilo': el reembolso masivo corre en un hilo del worker que canceló el evento;
+# 'comando': solo con `manage.py cancelar_evento --reanudar`
+REEMBOLSOS_EJECUCION = config('REEMBOLSOS_EJECUCION', default='hilo')
+# Órdenes por tanda (una transacción por tanda)
+REEMBOLSOS_TANDA = config('REEMBOLSOS_TANDA', default=200, cast=int)
+# Pedidos a Mercado Pago en vuelo y tope por segundo (0 = sin tope)
+REEMBOLSOS_CONCURRENCIA = config('REEMBOLSOS_CONCURRENCIA', default=8, cast=int)
+REEMBOLSOS_POR_SEGUNDO = config('REEMBOLSOS_POR_SEGUNDO', default=10, cast=float)
+# Tandas fallidas (429/5xx/red) antes de marcar un reembolso como ERROR
+REEMBOLSOS_MAX_INTENTOS = config('REEMBOLSOS_MAX_INTENTOS', default=5, cast=int)
+# Minutos sin progreso tras los cuales un reembolso EN_PROCESO se retoma
+REEMBOLSOS_TIMEOUT_MINUTOS = config('REEMBOLSOS_TIMEOUT_MINUTOS', default=10, cast=int)
+# Conexiones SMTP reutilizadas para los avisos a los clientes
+REEMBOLSOS_CONEXIONES_SMTP = config('REEMBOLSOS_CONEXIONES_SMTP', default=2, cast=int)
+
+# ========================================
+# CONCILIACIÓN DE PAGOS (Mercado Pago)
+# ========================================
+# Pagos por página de la búsqueda de MP (la API admite hasta 1000)
+CONCILIACION_PAGINA = config('CONCILIACION_PAGINA', default=200, cast=int)
+# Sin cursor guardado (primera ejecución) se revisan las últimas N horas
+CONCILIACION_VENTANA_INICIAL_HORAS = config('CONCILIACION_VENTANA_INICIAL_HORAS', default=24, cast=int)
+# Cada ejecución vuelve a leer estos minutos antes del cursor: la búsqueda de MP
+# puede indexar un pago con unos segundos de atraso (releerlo no cambia nada)
+CONCILIACION_SOLAPAMIENTO_MINUTOS = config('CONCILIACION_SOLAPAMIENTO_MINUTOS', default=5, cast=int)
+
+# ========================================
+# VERIFICACIÓN DE STOCK
+# ========================================
+# Los movimientos más nuevos que esto se verifican pero no se suman al punto de
+# control (debe superar la transacción más larga que toca stock)
+STOCK_MARGEN_SEGUNDOS = config('STOCK_MARGEN_SEGUNDOS', default=300, cast=int)
+
+# ========================================
+# MÉTRICAS PROMETHEUS (/api/metrics/)
+# ========================================
+# Token Bearer del scraper; vacío = endpoint solo disponible con DEBUG.
+# Con varios workers, gunicorn.conf.py define PROMETHEUS_MULTIPROC_DIR.
+METRICAS_TOKEN = config('METRICAS_TOKEN', default='')
+
+# Consultas más lentas que esto se registran en el log con su origen (0 = no registrar)
+SQL_CONSULTA_LENTA_MS = config('SQL_CONSULTA_LENTA_MS', default=200, cast=int)
+
+# ========================================
+# PERFILADO POR MUESTREO (ver core/perfilado.py)
+# ========================================
+# Con PERFILADO_ACTIVO se perfila una fracción de los requests a estas rutas (nombres de URL);
+# el staff puede perfilar cualquier request con la cabecera X-Perfilar: 1 aunque esté apagado.
+PERFILADO_ACTIVO = config('PERFILADO_ACTIVO', default=False, cast=bool)
+PERFILADO_RUTAS = config('PERFILADO_RUTAS', default='comprar-entrada,validar-qr', cast=lambda v: {s.strip() for s in v.split(',') if s.strip()})
+PERFILADO_FRACCION = config('PERFILADO_FRACCION', default=0.01, cast=float)
+PERFILADO_INTERVALO_MS = config('PERFILADO_INTERVALO_MS', default=5, cast=float)
+PERFILES_DIR = config('PERFILES_DIR', default=str(BASE_DIR / 'perfiles'))
+# Capturas que se conservan (las más viejas se borran)
+PERFILADO_MAX_CAPTURAS = config('PERFILADO_MAX_CAPTURAS', default=200, cast=int)
+
+# ========================================
+# TRAZAS POR ORDEN (ver core/trazas.py)
+# ========================================
+# Tramos reserva → pago → emisión → email de cada orden, en archivos JSON por día.
+# El directorio debe ser compartido por el backend y los workers.
+TRAZAS_ACTIVAS = config('TRAZAS_ACTIVAS', default=True, cast=bool)
+TRAZAS_DIR = config('TRAZAS_DIR', default=str(BASE_DIR / 'trazas'))
+TRAZAS_RETENCION_DIAS = config('TRAZAS_RETENCION_DIAS', default=7, cast=int)
+
 # ========================================
 # CONFIGURACIÓN DE CORREO ELECTRÓNICO (EMAIL)
 # ========================================
@@ -0,0 +1,132 @@
+"""
+Conteo de consultas SQL por bloque de código.
+
+ContadorConsultas se instala con connection.execute_wrapper() y acumula la
+cantidad y el tiempo de las consultas; las que superan SQL_CONSULTA_LENTA_MS
+se registran en el log con la línea del proyecto que las originó.
+
+presupuesto_consultas() es el ayudante para pruebas: falla (con la lista de
+SQL) si un bloque supera las consultas declaradas, así una consulta por fila
+nueva no pasa desapercibida. PRESUPUESTOS declara el máximo de cada endpoint
+principal y presupuesto_endpoint() lo aplica; core/tests.py los verifica con
+pocos y con muchos datos.
+"""
+
+import logging
+import os
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Frames que no cuentan como origen de una consulta (este módulo y el middleware)
+_EXCLUIDOS = {os.path.abspath(__file__), os.path.join(os.path.dirname(os.path.abspath(__file__)), 'middleware.py')}
+
+
+# Consultas máximas por endpoint, autenticación incluida. validar-qr: el UPDATE
+# condicional y el SELECT de la entrada, un UPDATE del resumen y un upsert de la
+# métrica; dentro de la transacción de un TestCase suma además el SAVEPOINT y su
+# RELEASE (en producción son BEGIN/COMMIT y no pasan por el cursor)
+PRESUPUESTOS = {
+    'GET /api/eventos/': 3,
+    'GET /api/eventos/<id>/': 2,
+    'GET /api/mis-entradas/': 3,
+    'GET /api/staff/stats/': 2,
+    'POST /api/staff/validar-qr/': 7,
+}
+# Con réplica, Mis Entradas consulta además en la primaria si el cliente compró hace poco (ver core.replicas)
+PRESUPUESTO_REPLICA = {'GET /api/mis-entradas/': 1}
+
+
+class PresupuestoConsultasExcedido(AssertionError):
+    """Un bloque hizo más consultas que las declaradas en su presupuesto."""
+
+
+def origen_consulta():
+    """'archivo.py:línea en función' del frame del proyecto más interno, o None."""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith('<'):
+            continue
+        archivo = os.path.abspath(frame.filename)
+        if archivo.startswith(base) and 'site-packages' not in archivo and archivo not in _EXCLUIDOS:
+            return f"{os.path.relpath(archivo, base)}:{frame.lineno} en {frame.name}"
+    return None
+
+
+class ContadorConsultas:
+    """
+    Wrapper de ejecución (ver connection.execute_wrapper) que cuenta las
+    consultas y su duración. Con guardar_sql=True conserva el SQL de cada una;
+    `contexto` (p. ej. "GET /api/eventos/") acompaña al log de las lentas.
+    """
+
+    def __init__(self, guardar_sql=False, contexto=None):
+        self.cantidad = 0
+        self.segundos = 0.0
+        self.guardar_sql = guardar_sql
+        self.contexto = contexto
+        self.sql = []
+        self.lenta_segundos = settings.SQL_CONSULTA_LENTA_MS / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.cantidad += 1
+            self.segundos += duracion
+            if self.guardar_sql:
+                self.sql.append(sql)
+            if self.lenta_segundos and duracion >= self.lenta_segundos:
+                origen = ' '.join(filter(None, [origen_consulta(), self.contexto and f"({self.contexto})"]))
+                logger.warning(f"Consulta lenta ({duracion * 1000:.0f} ms) desde {origen or 'desconocido'}: {sql[:500]}")
+
+
+@contextmanager
+def contar_consultas(guardar_sql=False, contexto=None):
+    """Cuenta las consultas del bloque en todas las bases configuradas (en este hilo)."""
+    contador = ContadorConsultas(guardar_sql=guardar_sql, contexto=contexto)
+    with ExitStack() as pila:
+        for alias in connections:
+            pila.enter_context(connections[alias].execute_wrapper(contador))
+        yield contador
+
+
+@contextmanager
+def presupuesto_consultas(maximo, descripcion='El bloque'):
+    """
+    Falla con PresupuestoConsultasExcedido si el bloque hace más de `maximo`
+    consultas:
+
+        with presupuesto_consultas(4, 'GET /api/mis-entradas/'):
+            client.get('/api/mis-entradas/')
+    """
+    with contar_consultas(guardar_sql=True) as contador:
+        yield contador
+    if contador.cantidad > maximo:
+        detalle = '\n'.join(f"  {i}. {sql[:300]}" for i, sql in enumerate(contador.sql, 1))
+        raise PresupuestoConsultasExcedido(
+            f"{descripcion} hizo {contador.cantidad} consultas (presupuesto: {maximo}):\n{detalle}"
+        )
+
+
+def presupuesto_endpoint(endpoint):
+    """
+    presupuesto_consultas() con el máximo declarado en PRESUPUESTOS para
+    `endpoint` (más el extra de la réplica si está configurada):
+
+        with presupuesto_endpoint('GET /api/mis-entradas/'):
+            client.get('/api/mis-entradas/')
+    """
+    from .replicas import replica_configurada
+
+    maximo = PRESUPUESTOS[endpoint]
+    if replica_configurada():
+        maximo += PRESUPUESTO_REPLICA.get(endpoint, 0)
+    return presupuesto_consultas(maximo, endpoint)
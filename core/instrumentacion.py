@@ -0,0 +1,147 @@
+"""
+Métricas Prometheus del circuito de venta y portería (GET /api/metrics/).
+
+Con varios workers de gunicorn cada proceso escribe sus valores en
+PROMETHEUS_MULTIPROC_DIR (lo define gunicorn.conf.py) y el endpoint suma los
+de todos; sin esa variable (runserver, comandos) se usa el registro del
+proceso. Este módulo no importa Django al cargarse: qr_png lo usa dentro del
+pool de procesos de las cortesías.
+
+Se consultan con rate()/histogram_quantile(), p. ej. escaneos por segundo:
+    sum(rate(backyard_escaneos_total[1m]))
+"""
+
+import os
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Buckets para esperas cortas (locks, QR) y para llamadas externas
+BUCKETS_CORTOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+BUCKETS_EXTERNOS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30)
+
+
+# ===================================
+# MÉTRICAS
+# ===================================
+
+RESERVA_SEGUNDOS = Histogram(
+    'backyard_reserva_segundos',
+    'Duración de la reserva completa (stock + preferencia de Mercado Pago)',
+    ['resultado'], buckets=BUCKETS_EXTERNOS,
+)
+RESERVA_ESPERA_LOCK_SEGUNDOS = Histogram(
+    'backyard_reserva_espera_lock_segundos',
+    'Espera del SELECT FOR UPDATE de los lotes al reservar',
+    buckets=BUCKETS_CORTOS,
+)
+MP_SOLICITUD_SEGUNDOS = Histogram(
+    'backyard_mp_solicitud_segundos',
+    'Llamadas a la API de Mercado Pago por operación y resultado',
+    ['operacion', 'resultado'], buckets=BUCKETS_EXTERNOS,
+)
+QR_SEGUNDOS = Histogram(
+    'backyard_qr_segundos',
+    'Dibujo de un código QR',
+    buckets=BUCKETS_CORTOS,
+)
+EMAIL_SEGUNDOS = Histogram(
+    'backyard_email_segundos',
+    'Envío de emails (una sesión SMTP) por tipo y resultado',
+    ['tipo', 'resultado'], buckets=BUCKETS_EXTERNOS,
+)
+WEBHOOK_SEGUNDOS = Histogram(
+    'backyard_webhook_segundos',
+    'Procesamiento del webhook de Mercado Pago por estado del pago',
+    ['estado_pago'], buckets=BUCKETS_EXTERNOS,
+)
+ESCANEOS_TOTAL = Counter(
+    'backyard_escaneos',
+    'Escaneos de entradas en la puerta por origen y resultado',
+    ['origen', 'resultado'],
+)
+HTTP_CONSULTAS_SQL = Histogram(
+    'backyard_http_consultas_sql',
+    'Consultas SQL por request, por nombre de ruta',
+    ['vista'], buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 200, 500),
+)
+HTTP_SQL_SEGUNDOS = Histogram(
+    'backyard_http_sql_segundos',
+    'Tiempo total en base de datos por request, por nombre de ruta',
+    ['vista'], buckets=BUCKETS_CORTOS,
+)
+
+
+def resultado_http(codigo):
+    """'ok' para 2xx y la clase del código para el resto (4xx, 5xx)."""
+    return 'ok' if 200 <= codigo < 300 else f"{codigo // 100}xx"
+
+
+class medir:
+    """
+    Observa la duración del bloque en un histograma:
+
+        with medir(MP_SOLICITUD_SEGUNDOS, operacion='pago') as medicion:
+            ...
+            medicion.etiquetas['resultado'] = 'ok'
+
+    Las etiquetas que falten al salir valen 'error' (p. ej. por una excepción).
+    """
+
+    def __init__(self, histograma, **etiquetas):
+        self.histograma = histograma
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duracion = time.perf_counter() - self.inicio
+        etiquetas = {nombre: self.etiquetas.get(nombre, 'error') for nombre in self.histograma._labelnames}
+        (self.histograma.labels(**etiquetas) if etiquetas else self.histograma).observe(duracion)
+        return False
+
+
+# ===================================
+# ATRASO DE EXPIRACIÓN (calculado al consultar)
+# ===================================
+
+class ColectorReservasVencidas:
+    """
+    Reservas PENDIENTES con la expiración ya pasada: las que limpiar_reservas
+    todavía no liberó. Se consulta en la base al pedir las métricas, así que
+    refleja al worker aunque corra en otro contenedor.
+    """
+
+    def collect(self):
+        from django.db.models import Count, Min
+        from django.utils import timezone
+        from .models import Orden
+
+        ahora = timezone.now()
+        vencidas = Orden.objects.filter(estado='PENDIENTE', fecha_expiracion__lt=ahora).aggregate(
+            cantidad=Count('id'), mas_vieja=Min('fecha_expiracion')
+        )
+        atraso = (ahora - vencidas['mas_vieja']).total_seconds() if vencidas['mas_vieja'] else 0
+        yield GaugeMetricFamily(
+            'backyard_reservas_vencidas', 'Reservas vencidas que todavía retienen stock', value=vencidas['cantidad']
+        )
+        yield GaugeMetricFamily(
+            'backyard_expiracion_atraso_segundos',
+            'Segundos desde que venció la reserva pendiente más vieja sin liberar', value=atraso
+        )
+
+
+def exportar_metricas():
+    """Texto en formato Prometheus con las métricas de todos los workers."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    vencidas = CollectorRegistry()
+    vencidas.register(ColectorReservasVencidas())
+    return generate_latest(registro) + generate_latest(vencidas)
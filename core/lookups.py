@@ -0,0 +1,32 @@
+"""
+Lookups propios del ORM para Backyard Bar.
+Se registran al iniciar la app (CoreConfig.ready).
+"""
+
+from django.db.models import CharField, Lookup
+
+
+@CharField.register_lookup
+class PrefijoSinMayusculas(Lookup):
+    """
+    campo__iprefijo='per' -> empieza con 'per' sin distinguir mayúsculas.
+
+    A diferencia de __istartswith (UPPER(campo) LIKE UPPER(...)), en PostgreSQL
+    genera `campo ILIKE 'per%'`, que usa los índices GIN trigram sobre la columna.
+    """
+    lookup_name = 'iprefijo'
+    # El valor llega como texto plano también cuando el lado izquierdo es una expresión
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', [f"{connection.ops.prep_for_like_query(value)}%"]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"UPPER({lhs}) LIKE UPPER({rhs}) ESCAPE '\\'", lhs_params + rhs_params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ILIKE {rhs}", lhs_params + rhs_params
@@ -0,0 +1,81 @@
+"""
+Comando de administración para comparar la serialización de la respuesta de
+reserva: OrdenSerializer (anidado) contra OrdenCheckoutSerializer (mínimo).
+
+Trabaja sobre datos temporales dentro de una transacción que se revierte.
+"""
+
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Cliente, Evento, Lote, Orden
+from core.serializers import OrdenSerializer, OrdenCheckoutSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _medir(serializer_class, orden, iteraciones):
+    with CaptureQueriesContext(connection) as consultas:
+        serializer_class(orden).data
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        serializer_class(orden).data
+    duracion = time.perf_counter() - inicio
+    return {
+        'consultas': len(consultas.captured_queries),
+        'us_por_respuesta': round(duracion / iteraciones * 1_000_000, 1),
+        'bytes': len(json.dumps(serializer_class(orden).data, default=str)),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark de OrdenSerializer vs OrdenCheckoutSerializer sobre una orden recién reservada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=2000)
+        parser.add_argument('--json', action='store_true', help='Imprime solo el resultado en JSON')
+
+    def handle(self, *args, **options):
+        resultados = {}
+        try:
+            with transaction.atomic():
+                evento = Evento.objects.create(
+                    titulo='Benchmark', fecha_inicio=timezone.now() + timedelta(days=1), ubicacion='-'
+                )
+                lote = Lote.objects.create(evento=evento, nombre='General', precio=Decimal('500'), cantidad_total=100)
+                cliente = Cliente.objects.create(
+                    cedula='bench-0001', nombre='Bench', apellido='Mark', fecha_nacimiento='1990-01-01',
+                    email='bench@backyardbar.local', telefono='-'
+                )
+                # Misma forma que la orden que devuelve procesar_reserva_entrada
+                orden = Orden.objects.create(
+                    cliente=cliente, evento=evento, lote=lote, cantidad_entradas=2,
+                    monto_subtotal=Decimal('1000'), monto_total=Decimal('1000'),
+                    fecha_expiracion=timezone.now() + timedelta(minutes=15), mp_preference_id='bench-pref'
+                )
+                orden.mp_init_point = 'https://www.mercadopago.com.uy/checkout/v1/redirect?pref_id=bench-pref'
+
+                for serializer_class in (OrdenSerializer, OrdenCheckoutSerializer):
+                    resultados[serializer_class.__name__] = _medir(serializer_class, orden, options['iteraciones'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+
+        for nombre, r in resultados.items():
+            self.stdout.write(
+                f"{nombre:26} {r['us_por_respuesta']:>9} µs/respuesta   "
+                f"{r['consultas']} consultas   {r['bytes']} bytes"
+            )
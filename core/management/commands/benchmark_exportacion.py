@@ -0,0 +1,163 @@
+"""
+Comando de administración para medir la exportación de la lista de invitados.
+
+Para cada tamaño crea N entradas temporales (transacción revertida al final),
+consume la exportación en streaming y reporta filas/seg y el pico de RSS del
+proceso durante la exportación (por encima del RSS previo). Con --legacy mide
+también el armado del CSV completo en memoria (implementación anterior).
+"""
+
+import csv
+import gc
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from core.models import Cliente, Evento, Lote, Orden, Entrada
+from core.services_exportacion import exportar_lista_invitados
+
+LOTE_CREACION = 5000
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _rss_actual():
+    """RSS del proceso en bytes (Linux: /proc/self/statm)."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class _MedidorRSS:
+    """Muestrea el RSS en un hilo aparte y guarda el pico."""
+
+    def __init__(self, intervalo=0.005):
+        self.intervalo = intervalo
+        self.pico = 0
+        self._detener = threading.Event()
+
+    def _muestrear(self):
+        while not self._detener.is_set():
+            self.pico = max(self.pico, _rss_actual())
+            time.sleep(self.intervalo)
+
+    def __enter__(self):
+        gc.collect()
+        self.base = _rss_actual()
+        self.pico = self.base
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+        self.pico = max(self.pico, _rss_actual())
+
+    @property
+    def pico_mb(self):
+        return round((self.pico - self.base) / 1024 / 1024, 1)
+
+
+def _exportar_legacy(evento):
+    """Implementación anterior: queryset cacheado y CSV completo en un HttpResponse."""
+    response = HttpResponse(content_type='text/csv')
+    writer = csv.writer(response)
+    for e in Entrada.objects.filter(lote__evento=evento).select_related('cliente', 'lote'):
+        writer.writerow([
+            e.codigo_corto or str(e.id)[:8].upper(), e.cliente.nombre, e.cliente.apellido, e.cliente.cedula,
+            e.cliente.email, e.lote.nombre, e.lote.precio, 'Ingresó' if e.usada else 'Pendiente',
+            e.fecha_uso.strftime('%Y-%m-%d %H:%M') if e.fecha_uso else '-'
+        ])
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    help = 'Mide filas/seg y pico de RSS de la exportación en streaming de la lista de invitados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entradas', default='100,10000,100000', help='Tamaños separados por coma')
+        parser.add_argument('--formato', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--legacy', action='store_true', help='Mide también la exportación anterior (en memoria)')
+        parser.add_argument('--json', action='store_true', help='Imprime solo el resultado en JSON')
+
+    def _crear_datos(self, cantidad):
+        evento = Evento.objects.create(
+            titulo='Benchmark', fecha_inicio=timezone.now() + timedelta(hours=1), ubicacion='-'
+        )
+        lote = Lote.objects.create(evento=evento, nombre='General', precio=Decimal('500'), cantidad_total=cantidad)
+        cliente = Cliente.objects.create(
+            cedula='bench-0001', nombre='Bench', apellido='Mark', fecha_nacimiento='1990-01-01',
+            email='bench@backyardbar.local', telefono='-'
+        )
+        orden = Orden.objects.create(
+            cliente=cliente, evento=evento, lote=lote, cantidad_entradas=cantidad,
+            monto_subtotal=Decimal('0'), monto_total=Decimal('0'), estado='APROBADO'
+        )
+        creadas = 0
+        while creadas < cantidad:
+            n = min(LOTE_CREACION, cantidad - creadas)
+            Entrada.objects.bulk_create([Entrada(orden=orden, cliente=cliente, lote=lote) for _ in range(n)])
+            creadas += n
+        return evento
+
+    def _medir(self, cantidad, options):
+        resultado = {'entradas': cantidad}
+        try:
+            with transaction.atomic():
+                evento = self._crear_datos(cantidad)
+
+                with _MedidorRSS() as rss:
+                    inicio = time.perf_counter()
+                    total_bytes = sum(len(b) for b in exportar_lista_invitados(
+                        evento.id, formato=options['formato'], gzip=options['gzip']
+                    ))
+                    duracion = time.perf_counter() - inicio
+                resultado.update({
+                    'filas_por_segundo': round(cantidad / duracion),
+                    'pico_rss_mb': rss.pico_mb,
+                    'megabytes': round(total_bytes / 1024 / 1024, 2),
+                })
+
+                if options['legacy']:
+                    with _MedidorRSS() as rss:
+                        inicio = time.perf_counter()
+                        _exportar_legacy(evento)
+                        duracion = time.perf_counter() - inicio
+                    resultado['legacy'] = {
+                        'filas_por_segundo': round(cantidad / duracion),
+                        'pico_rss_mb': rss.pico_mb,
+                    }
+                raise _Rollback()
+        except _Rollback:
+            pass
+        return resultado
+
+    def handle(self, *args, **options):
+        resultados = [self._medir(int(n), options) for n in options['entradas'].split(',')]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'formato': options['formato'], 'gzip': options['gzip'], 'resultados': resultados
+            }, indent=2))
+            return
+
+        self.stdout.write(f"Formato: {options['formato']}{' + gzip' if options['gzip'] else ''}")
+        for r in resultados:
+            linea = (
+                f"  {r['entradas']:>9} entradas   {r['filas_por_segundo']:>8} filas/s   "
+                f"pico RSS +{r['pico_rss_mb']:>6} MB   {r['megabytes']:>8} MB generados"
+            )
+            if 'legacy' in r:
+                linea += f"   | legacy {r['legacy']['filas_por_segundo']:>7} filas/s  pico RSS +{r['legacy']['pico_rss_mb']} MB"
+            self.stdout.write(linea)
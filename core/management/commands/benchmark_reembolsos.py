@@ -0,0 +1,146 @@
+"""
+Comando de administración para medir el reembolso masivo contra el stand-in
+local de Mercado Pago.
+
+Crea un evento con N órdenes APROBADAS (transacción revertida al final), lo
+cancela y procesa los reembolsos con latencia y tope de tasa simulados en MP y
+emails en memoria. Reporta reembolsos/seg y verifica que MP recibió
+exactamente un reembolso por orden.
+"""
+
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.models import Cliente, Evento, Lote, Orden, Entrada, crear_entradas
+from core.mp_local import ServidorMPLocal
+from core.services_estadisticas import ajustar_resumen_ventas
+from core.services_reembolsos import cancelar_evento, procesar_cancelacion
+
+LOTE_CREACION = 2000
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide reembolsos/seg de la cancelación de un evento contra el stand-in local de Mercado Pago.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ordenes', type=int, default=1000)
+        parser.add_argument('--latencia-mp', type=float, default=0.1, help='Latencia simulada de MP en segundos')
+        parser.add_argument('--limite-mp', type=int, default=0, help='Reembolsos/seg que acepta MP (0 = sin límite)')
+        parser.add_argument('--rechazados', type=int, default=0, help='Pagos cuyo reembolso MP rechaza')
+        parser.add_argument('--concurrencia', type=int, help='Por defecto REEMBOLSOS_CONCURRENCIA')
+        parser.add_argument('--por-segundo', type=float, help='Por defecto REEMBOLSOS_POR_SEGUNDO (0 = sin tope)')
+        parser.add_argument('--json', action='store_true', help='Imprime solo el resultado en JSON')
+
+    def _crear_datos(self, cantidad, mp):
+        evento = Evento.objects.create(
+            titulo='Benchmark', fecha_inicio=timezone.now() + timedelta(days=7), ubicacion='-'
+        )
+        lote = Lote.objects.create(
+            evento=evento, nombre='General', precio=Decimal('500'), cantidad_total=cantidad * 2,
+            cantidad_vendida=cantidad * 2
+        )
+        for inicio in range(0, cantidad, LOTE_CREACION):
+            n = min(LOTE_CREACION, cantidad - inicio)
+            clientes = Cliente.objects.bulk_create([
+                Cliente(
+                    cedula=f"bench-{inicio + i}", nombre='Bench', apellido='Mark', fecha_nacimiento='1990-01-01',
+                    email=f"bench-{inicio + i}@backyardbar.local", telefono='-'
+                )
+                for i in range(n)
+            ])
+            ordenes = Orden.objects.bulk_create([
+                Orden(
+                    cliente=cliente, evento=evento, lote=lote, cantidad_entradas=2,
+                    monto_subtotal=Decimal('1000'), monto_comision=Decimal('100'), monto_total=Decimal('1100'),
+                    estado='APROBADO', mp_payment_id=f"bench-{inicio + i}", fecha_aprobacion=timezone.now()
+                )
+                for i, cliente in enumerate(clientes)
+            ])
+            entradas = [Entrada(orden=o, cliente=o.cliente, lote=lote) for o in ordenes for _ in range(2)]
+            crear_entradas(entradas)
+            for orden in ordenes:
+                mp.pagos[orden.mp_payment_id] = {
+                    'id': orden.mp_payment_id, 'status': 'approved', 'transaction_amount': 1100,
+                    'external_reference': str(orden.id),
+                }
+        ajustar_resumen_ventas(
+            lote.id, vendidas=cantidad * 2, recaudado=Decimal('1100') * cantidad, comision=Decimal('100') * cantidad
+        )
+        mp.reembolsos_rechazados.update(f"bench-{i}" for i in range(min(self.rechazados, cantidad)))
+        return evento, lote
+
+    def handle(self, *args, **options):
+        cantidad = options['ordenes']
+        self.rechazados = options['rechazados']
+
+        with ServidorMPLocal(latencia=options['latencia_mp'], max_por_segundo=options['limite_mp']) as mp, \
+                override_settings(MP_API_URL=mp.url, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            mail.outbox = []
+            try:
+                with transaction.atomic():
+                    evento, lote = self._crear_datos(cantidad, mp)
+                    cancelacion, _ = cancelar_evento(evento.id, motivo='Benchmark', en_segundo_plano=False)
+
+                    inicio = time.perf_counter()
+                    cancelacion = procesar_cancelacion(
+                        cancelacion.id, concurrencia=options['concurrencia'], por_segundo=options['por_segundo']
+                    )
+                    duracion = time.perf_counter() - inicio
+
+                    lote.refresh_from_db()
+                    pagos_reembolsados = [r['payment_id'] for r in mp.reembolsos.values()]
+                    resultado = {
+                        'ordenes': cantidad,
+                        'reembolsadas': cancelacion.reembolsadas,
+                        'errores': cancelacion.errores,
+                        'estado': cancelacion.estado,
+                        'duracion_s': round(duracion, 2),
+                        'reembolsos_por_segundo': round(cancelacion.reembolsadas / duracion, 1),
+                        'reembolsos_en_mp': len(pagos_reembolsados),
+                        'duplicados_en_mp': len(pagos_reembolsados) - len(set(pagos_reembolsados)),
+                        'emails': len(mail.outbox),
+                        'entradas_anuladas': Entrada.objects.filter(lote=lote, anulada=True).count(),
+                        'stock_vendido_final': lote.cantidad_vendida,
+                    }
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+        resultado.update({
+            'latencia_mp_s': options['latencia_mp'],
+            'limite_mp': options['limite_mp'],
+        })
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, indent=2))
+            return
+
+        self.stdout.write(
+            f"{resultado['ordenes']} órdenes | latencia MP {options['latencia_mp']}s | "
+            f"límite MP {options['limite_mp'] or 'sin límite'}/s"
+        )
+        self.stdout.write(
+            f"  {resultado['reembolsos_por_segundo']} reembolsos/s ({resultado['duracion_s']}s)   "
+            f"reembolsadas {resultado['reembolsadas']}   errores {resultado['errores']}   emails {resultado['emails']}"
+        )
+        ok = (
+            resultado['duplicados_en_mp'] == 0
+            and resultado['reembolsos_en_mp'] == resultado['reembolsadas']
+            and resultado['entradas_anuladas'] == resultado['reembolsadas'] * 2
+        )
+        estilo = self.style.SUCCESS if ok else self.style.ERROR
+        self.stdout.write(estilo(
+            f"  MP recibió {resultado['reembolsos_en_mp']} reembolsos ({resultado['duplicados_en_mp']} duplicados), "
+            f"{resultado['entradas_anuladas']} entradas anuladas, stock vendido final {resultado['stock_vendido_final']}"
+        ))
@@ -0,0 +1,135 @@
+"""
+Comando de administración para comparar el modo WSGI (gunicorn sync) contra el
+modo ASGI (gunicorn + uvicorn con vistas async) con latencia simulada de Mercado Pago.
+
+Levanta un stand-in local de MP, arranca cada modo como subproceso y dispara
+requests concurrentes contra el webhook (que consulta el pago en MP).
+"""
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.mp_local import ServidorMPLocal
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar_puerto(puerto, timeout=20):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(('127.0.0.1', puerto), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores ya ordenados)."""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+async def _disparar(url, total, concurrencia):
+    latencias = []
+    errores = 0
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=concurrencia)) as cliente:
+        async def uno(i):
+            nonlocal errores
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    r = await cliente.post(f"{url}?topic=payment&id=bench-{i}")
+                    if r.status_code != 200:
+                        errores += 1
+                except httpx.HTTPError:
+                    errores += 1
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(uno(i) for i in range(total)))
+        duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'requests': total,
+        'errores': errores,
+        'duracion_s': round(duracion, 3),
+        'requests_por_segundo': round(total / duracion, 2),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compara req/s y latencia p99 entre SERVER_MODE=wsgi y asgi con latencia simulada de Mercado Pago.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latencia-mp', type=float, default=0.5, help='Latencia simulada de MP en segundos')
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--concurrencia', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=3)
+        parser.add_argument('--modos', default='wsgi,asgi')
+        parser.add_argument('--json', action='store_true', help='Imprime solo el resultado en JSON')
+
+    def handle(self, *args, **options):
+        resultados = {}
+
+        with ServidorMPLocal(latencia=options['latencia_mp']) as mp:
+            for modo in options['modos'].split(','):
+                puerto = _puerto_libre()
+                env = dict(
+                    os.environ,
+                    SERVER_MODE=modo,
+                    MP_API_URL=mp.url,
+                    GUNICORN_BIND=f"127.0.0.1:{puerto}",
+                    WEB_CONCURRENCY=str(options['workers']),
+                )
+                proceso = subprocess.Popen(
+                    [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--log-level', 'warning'],
+                    cwd=settings.BASE_DIR, env=env,
+                )
+                try:
+                    if not _esperar_puerto(puerto):
+                        self.stderr.write(self.style.ERROR(f'El servidor {modo} no arrancó.'))
+                        continue
+                    url = f"http://127.0.0.1:{puerto}/api/pagos/webhook/"
+                    resultados[modo] = asyncio.run(_disparar(url, options['requests'], options['concurrencia']))
+                finally:
+                    proceso.terminate()
+                    proceso.wait(timeout=30)
+
+        salida = {
+            'latencia_mp_s': options['latencia_mp'],
+            'concurrencia': options['concurrencia'],
+            'workers': options['workers'],
+            'modos': resultados,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(salida, indent=2))
+            return
+
+        self.stdout.write(f"Latencia MP simulada: {options['latencia_mp']}s | concurrencia: {options['concurrencia']} | workers: {options['workers']}")
+        for modo, r in resultados.items():
+            self.stdout.write(
+                f"  {modo:5} {r['requests_por_segundo']:>8} req/s   p50 {r['p50_ms']:>8} ms   "
+                f"p99 {r['p99_ms']:>8} ms   errores {r['errores']}"
+            )
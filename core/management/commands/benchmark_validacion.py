@@ -0,0 +1,97 @@
+"""
+Comando de administración para medir el throughput de la validación en puerta.
+
+Crea N entradas temporales (transacción revertida al final), las escanea a
+través de ValidarEntradaView y vuelve a escanearlas para medir la detección
+de doble ingreso. Reporta escaneos/seg y consultas por escaneo.
+"""
+
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Cliente, Evento, Lote, Orden, Entrada
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide escaneos/seg y consultas por escaneo del endpoint de validación de QR.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entradas', type=int, default=500)
+        parser.add_argument('--json', action='store_true', help='Imprime solo el resultado en JSON')
+
+    def _escanear(self, api, codigos):
+        validas = alertas = 0
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            for codigo in codigos:
+                r = api.post('/api/staff/validar-qr/', {'codigo_qr': codigo}, format='json')
+                if r.data.get('es_valida'):
+                    validas += 1
+                else:
+                    alertas += 1
+            duracion = time.perf_counter() - inicio
+        return {
+            'escaneos': len(codigos),
+            'validas': validas,
+            'alertas_doble_ingreso': alertas,
+            'escaneos_por_segundo': round(len(codigos) / duracion, 1),
+            'consultas_por_escaneo': round(len(consultas.captured_queries) / len(codigos), 2),
+        }
+
+    def handle(self, *args, **options):
+        resultados = {}
+        if 'testserver' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+
+        try:
+            with transaction.atomic():
+                evento = Evento.objects.create(
+                    titulo='Benchmark', fecha_inicio=timezone.now() + timedelta(hours=1), ubicacion='-'
+                )
+                lote = Lote.objects.create(evento=evento, nombre='General', precio=Decimal('500'), cantidad_total=options['entradas'])
+                cliente = Cliente.objects.create(
+                    cedula='bench-0001', nombre='Bench', apellido='Mark', fecha_nacimiento='1990-01-01',
+                    email='bench@backyardbar.local', telefono='-'
+                )
+                orden = Orden.objects.create(
+                    cliente=cliente, evento=evento, lote=lote, cantidad_entradas=options['entradas'],
+                    monto_subtotal=Decimal('0'), monto_total=Decimal('0'), estado='APROBADO'
+                )
+                entradas = Entrada.objects.bulk_create(
+                    [Entrada(orden=orden, cliente=cliente, lote=lote) for _ in range(options['entradas'])]
+                )
+                portero = User.objects.create_user(username='bench-portero', is_staff=True)
+
+                api = APIClient()
+                api.force_authenticate(portero)
+                codigos = [str(e.id) for e in entradas]
+
+                resultados['primer_escaneo'] = self._escanear(api, codigos)
+                resultados['reescaneo'] = self._escanear(api, codigos)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+
+        for fase, r in resultados.items():
+            self.stdout.write(
+                f"{fase:15} {r['escaneos_por_segundo']:>8} escaneos/s   {r['consultas_por_escaneo']} consultas/escaneo   "
+                f"válidas {r['validas']}   alertas {r['alertas_doble_ingreso']}"
+            )
@@ -0,0 +1,419 @@
+"""
+Comando de administración que simula una venta flash contra el stack completo.
+
+Levanta el servidor (gunicorn en el SERVER_MODE elegido) con un stand-in
+local de Mercado Pago y, sobre un evento nuevo:
+
+1. crea N clientes sintéticos y los loguea (POST /api/auth/login/),
+2. dispara una reserva por cliente con la concurrencia elegida,
+3. aprueba o rechaza pagos por webhook mientras el resto de las reservas
+   expira (limpiar_reservas en paralelo),
+4. valida en puerta todas las entradas emitidas y reescanea una muestra.
+
+Reporta throughput y percentiles de latencia por fase, y verifica las
+invariantes (sin sobreventa, stock conservado contra órdenes y libro,
+entradas emitidas e ingresos únicos). El resultado en JSON (--salida) sirve
+para comparar entre versiones; termina con error si alguna invariante falla.
+
+Los emails de entradas van al EMAIL_HOST configurado (mailpit en desarrollo).
+Los datos creados se borran al final, salvo con --conservar.
+"""
+
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+import httpx
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from core.management.commands.benchmark_servidor import _esperar_puerto, _puerto_libre, percentil
+from core.models import Cliente, Evento, Lote, Orden, Entrada, MovimientoStock
+from core.mp_local import ServidorMPLocal
+from core.services_stock import stock_real
+
+CLAVE = 'carga-Backyard-2024'
+
+
+async def _ejecutar(pedidos, concurrencia):
+    """
+    Corre `pedidos` (funciones async sin argumentos que retornan la respuesta)
+    de a `concurrencia` a la vez. Retorna (métricas, respuestas en orden).
+    """
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias = []
+    codigos = Counter()
+
+    async def uno(pedido):
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                respuesta = await pedido()
+                codigos[str(respuesta.status_code)] += 1
+            except httpx.HTTPError as e:
+                respuesta = None
+                codigos[e.__class__.__name__] += 1
+            latencias.append(time.perf_counter() - inicio)
+            return respuesta
+
+    inicio = time.perf_counter()
+    respuestas = await asyncio.gather(*(uno(pedido) for pedido in pedidos))
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'requests': len(pedidos),
+        'duracion_s': round(duracion, 3),
+        'requests_por_segundo': round(len(pedidos) / duracion, 1) if duracion else 0.0,
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+        'p90_ms': round(percentil(latencias, 90) * 1000, 1),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 1),
+        'max_ms': round(latencias[-1] * 1000, 1) if latencias else 0.0,
+        'respuestas': dict(sorted(codigos.items())),
+    }, respuestas
+
+
+def _cliente_http(url, concurrencia):
+    return httpx.AsyncClient(
+        base_url=url, timeout=120, limits=httpx.Limits(max_connections=concurrencia)
+    )
+
+
+def _json(respuesta):
+    try:
+        return respuesta.json() if respuesta is not None else {}
+    except ValueError:
+        return {}
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga de una venta flash (login, reservas, pagos, expiraciones, puerta) con invariantes de stock.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=200, help='Compradores sintéticos (una reserva cada uno)')
+        parser.add_argument('--stock', type=int, default=300, help='Entradas del evento, repartidas entre los lotes')
+        parser.add_argument('--lotes', type=int, default=1)
+        parser.add_argument('--max-entradas', type=int, default=4, help='Cada reserva pide entre 1 y este número')
+        parser.add_argument('--concurrencia', type=int, default=50)
+        parser.add_argument('--aprobadas', type=float, default=0.7, help='Fracción de reservas con pago aprobado')
+        parser.add_argument('--rechazadas', type=float, default=0.1, help='Fracción con pago rechazado (el resto expira)')
+        parser.add_argument('--reescaneos', type=float, default=0.1, help='Fracción de entradas que se vuelven a escanear')
+        parser.add_argument('--latencia-mp', type=float, default=0.2, help='Latencia simulada de MP en segundos')
+        parser.add_argument('--modo', default='wsgi', choices=['wsgi', 'asgi'])
+        parser.add_argument('--workers', type=int, default=3)
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla de cantidades y reparto de pagos')
+        parser.add_argument('--salida', help='Además guarda el resultado JSON en este archivo')
+        parser.add_argument('--conservar', action='store_true', help='No borra el evento, las órdenes ni los clientes')
+        parser.add_argument('--json', action='store_true', help='Imprime solo el resultado en JSON')
+
+    # ===================================
+    # DATOS
+    # ===================================
+
+    def _crear_datos(self, options):
+        sufijo = uuid.uuid4().hex[:8]
+        evento = Evento.objects.create(
+            titulo=f'Venta flash {sufijo}', fecha_inicio=timezone.now() + timedelta(days=7), ubicacion='-'
+        )
+        lotes = max(options['lotes'], 1)
+        for numero in range(lotes):
+            # El resto de la división va al primer lote
+            cantidad = options['stock'] // lotes + (options['stock'] % lotes if numero == 0 else 0)
+            Lote.objects.create(
+                evento=evento, nombre=f'Lote {numero + 1}', precio=Decimal('500'), orden=numero + 1,
+                cantidad_total=cantidad
+            )
+
+        # Un solo hash para todos: el costo de PBKDF2 queda en el login del servidor, no acá
+        clave = make_password(CLAVE)
+        clientes = Cliente.objects.bulk_create([
+            Cliente(
+                cedula=f'carga-{sufijo}-{i}', nombre='Carga', apellido=str(i), telefono='-',
+                email=f'carga-{sufijo}-{i}@backyardbar.local', password=clave
+            )
+            for i in range(options['clientes'])
+        ], batch_size=1000)
+        portero = User.objects.create_user(
+            username=f'carga-{sufijo}@backyardbar.local', email=f'carga-{sufijo}@backyardbar.local',
+            password=CLAVE, is_staff=True
+        )
+        # El JWT solo lleva user_id y la autenticación prueba primero con el staff:
+        # un cliente con el mismo id que un usuario staff no podría comprar
+        ids_staff = set(
+            User.objects.filter(is_staff=True, id__in=[c.id for c in clientes]).values_list('id', flat=True)
+        )
+        compradores = [c for c in clientes if c.id not in ids_staff]
+        return evento, clientes, compradores, portero
+
+    def _borrar_datos(self, evento, clientes, portero):
+        MovimientoStock.objects.filter(lote__evento=evento).delete()
+        Orden.objects.filter(evento=evento).delete()
+        evento.delete()
+        Cliente.objects.filter(id__in=[c.id for c in clientes]).delete()
+        portero.delete()
+
+    # ===================================
+    # FASES
+    # ===================================
+
+    async def _login(self, url, concurrencia, emails):
+        async with _cliente_http(url, concurrencia) as http:
+            metricas, respuestas = await _ejecutar([
+                lambda email=email: http.post('/api/auth/login/', json={'email': email, 'password': CLAVE})
+                for email in emails
+            ], concurrencia)
+        tokens = [_json(r).get('token', {}).get('access') for r in respuestas]
+        return metricas, tokens
+
+    async def _reservar(self, url, concurrencia, evento_id, pedidos):
+        async with _cliente_http(url, concurrencia) as http:
+            return await _ejecutar([
+                lambda token=token, cantidad=cantidad: http.post(
+                    '/api/compras/reservar/', json={'evento_id': evento_id, 'cantidad': cantidad},
+                    headers={'Authorization': f'Bearer {token}'}
+                )
+                for token, cantidad in pedidos
+            ], concurrencia)
+
+    def _expirar(self, orden_ids):
+        Orden.objects.filter(id__in=orden_ids).update(fecha_expiracion=timezone.now() - timedelta(minutes=1))
+        inicio = time.perf_counter()
+        try:
+            call_command('limpiar_reservas', stdout=io.StringIO())
+        finally:
+            # Corre en un hilo aparte: su conexión no la cierra nadie más
+            connections.close_all()
+        return {'ordenes': len(orden_ids), 'duracion_s': round(time.perf_counter() - inicio, 3)}
+
+    async def _pagar_y_expirar(self, url, concurrencia, pagos, expirar):
+        async with _cliente_http(url, concurrencia) as http:
+            webhooks = _ejecutar([
+                lambda payment_id=payment_id: http.post(f'/api/pagos/webhook/?topic=payment&id={payment_id}')
+                for payment_id in pagos
+            ], concurrencia)
+            (metricas, _), expiracion = await asyncio.gather(webhooks, asyncio.to_thread(self._expirar, expirar))
+        return metricas, expiracion
+
+    async def _escanear(self, url, concurrencia, token, codigos):
+        async with _cliente_http(url, concurrencia) as http:
+            metricas, respuestas = await _ejecutar([
+                lambda codigo=codigo: http.post(
+                    '/api/staff/validar-qr/', json={'codigo_qr': codigo}, headers={'Authorization': f'Bearer {token}'}
+                )
+                for codigo in codigos
+            ], concurrencia)
+        metricas['validas'] = sum(1 for r in respuestas if _json(r).get('es_valida') is True)
+        metricas['alertas'] = sum(1 for r in respuestas if _json(r).get('es_valida') is False)
+        return metricas
+
+    def _simular(self, url, mp, evento, compradores, portero, options):
+        azar = random.Random(options['semilla'])
+        concurrencia = options['concurrencia']
+        fases = {}
+
+        fases['login'], tokens = asyncio.run(self._login(url, concurrencia, [c.email for c in compradores]))
+        pedidos = [(token, azar.randint(1, options['max_entradas'])) for token in tokens if token]
+        if not pedidos:
+            raise CommandError(f"Ningún login funcionó: {fases['login']['respuestas']}")
+
+        fases['reservas'], respuestas = asyncio.run(self._reservar(url, concurrencia, evento.id, pedidos))
+        reservas = [_json(r).get('id') for r in respuestas if r is not None and r.status_code == 201]
+        sin_stock = [
+            cantidad for (_, cantidad), r in zip(pedidos, respuestas)
+            if r is not None and r.status_code == 400 and 'stock' in str(_json(r).get('error', ''))
+        ]
+        disponible = max(lote.stock_disponible for lote in Lote.objects.filter(evento=evento))
+
+        # Reparto de las reservas: pago aprobado, pago rechazado o expiración
+        azar.shuffle(reservas)
+        aprobadas = int(len(reservas) * options['aprobadas'])
+        rechazadas = min(int(len(reservas) * options['rechazadas']), len(reservas) - aprobadas)
+        pagos = []
+        for i, orden_id in enumerate(reservas[:aprobadas + rechazadas]):
+            estado = 'approved' if i < aprobadas else 'rejected'
+            pagos.append(mp.registrar_pago(f'carga-{orden_id}', orden_id, estado)['id'])
+        fases['pagos'], fases['expiracion'] = asyncio.run(
+            self._pagar_y_expirar(url, concurrencia, pagos, reservas[aprobadas + rechazadas:])
+        )
+
+        login = httpx.post(f'{url}/api/auth/login/', json={'email': portero.username, 'password': CLAVE}, timeout=60)
+        token = _json(login).get('token', {}).get('access')
+        if not token:
+            raise CommandError(f'El login del portero falló: {login.status_code}')
+        codigos = [str(e) for e in Entrada.objects.filter(lote__evento=evento).values_list('id', flat=True)]
+        fases['puerta'] = asyncio.run(self._escanear(url, concurrencia, token, codigos))
+        muestra = azar.sample(codigos, int(len(codigos) * options['reescaneos']))
+        fases['reescaneo'] = asyncio.run(self._escanear(url, concurrencia, token, muestra))
+
+        planeado = {
+            'reservas': len(reservas),
+            'sin_stock': len(sin_stock),
+            'aprobadas': aprobadas,
+            'rechazadas': rechazadas,
+            'expiradas': len(reservas) - aprobadas - rechazadas,
+            'entradas_escaneadas': len(codigos),
+            'reescaneos': len(muestra),
+        }
+        return fases, planeado, {'disponible_tras_reservas': disponible, 'menor_pedido_sin_stock': min(sin_stock, default=None)}
+
+    # ===================================
+    # INVARIANTES
+    # ===================================
+
+    def _verificar(self, evento, fases, planeado, agotamiento):
+        lotes = list(Lote.objects.filter(evento=evento).order_by('orden'))
+        real = stock_real(lotes)
+        libro = dict(
+            MovimientoStock.objects.filter(lote__in=lotes).order_by().values('lote_id')
+            .annotate(total=Sum('cantidad')).values_list('lote_id', 'total')
+        )
+        por_estado = {
+            fila['estado']: fila for fila in
+            Orden.objects.filter(evento=evento).order_by().values('estado').annotate(ordenes=Count('id'), entradas=Sum('cantidad_entradas'))
+        }
+        aprobado = por_estado.get('APROBADO', {'ordenes': 0, 'entradas': 0})
+        entradas = Entrada.objects.filter(lote__evento=evento)
+        emitidas = entradas.count()
+        usadas = entradas.filter(usada=True).count()
+
+        def chequeo(ok, detalle):
+            return {'ok': bool(ok), 'detalle': detalle}
+
+        estados = {estado: fila['ordenes'] for estado, fila in por_estado.items()}
+        menor = agotamiento['menor_pedido_sin_stock']
+        return {
+            'sin_sobreventa': chequeo(
+                all(0 <= l.cantidad_vendida <= l.cantidad_total for l in lotes),
+                {l.nombre: f'{l.cantidad_vendida}/{l.cantidad_total}' for l in lotes}
+            ),
+            'contador_igual_ordenes': chequeo(
+                all(l.cantidad_vendida == real.get(l.id, 0) for l in lotes),
+                {l.nombre: {'contador': l.cantidad_vendida, 'ordenes': real.get(l.id, 0)} for l in lotes}
+            ),
+            'contador_igual_libro': chequeo(
+                all(l.cantidad_vendida == libro.get(l.id, 0) for l in lotes),
+                {l.nombre: {'contador': l.cantidad_vendida, 'libro': libro.get(l.id, 0)} for l in lotes}
+            ),
+            'reservas_registradas': chequeo(
+                sum(estados.values()) == planeado['reservas'],
+                {'respuestas_201': planeado['reservas'], 'ordenes': sum(estados.values())}
+            ),
+            # Si se rechazó un pedido por falta de stock, ningún lote podía cubrirlo después
+            'agotado_sin_huecos': chequeo(
+                menor is None or agotamiento['disponible_tras_reservas'] < menor, agotamiento
+            ),
+            'estados_finales': chequeo(
+                estados.get('APROBADO', 0) == planeado['aprobadas']
+                and estados.get('RECHAZADO', 0) == planeado['rechazadas']
+                and estados.get('EXPIRADO', 0) == planeado['expiradas'],
+                {'esperado': {k: planeado[k] for k in ('aprobadas', 'rechazadas', 'expiradas')}, 'ordenes': estados}
+            ),
+            'entradas_emitidas': chequeo(
+                emitidas == (aprobado['entradas'] or 0),
+                {'entradas': emitidas, 'de_ordenes_aprobadas': aprobado['entradas'] or 0}
+            ),
+            'ingreso_unico': chequeo(
+                fases['puerta']['validas'] == emitidas == usadas
+                and fases['reescaneo']['alertas'] == planeado['reescaneos'],
+                {
+                    'validas': fases['puerta']['validas'], 'usadas': usadas,
+                    'reescaneos': planeado['reescaneos'], 'alertas': fases['reescaneo']['alertas'],
+                }
+            ),
+        }
+
+    # ===================================
+    # COMANDO
+    # ===================================
+
+    def handle(self, *args, **options):
+        if options['aprobadas'] + options['rechazadas'] > 1:
+            raise CommandError('--aprobadas + --rechazadas no puede superar 1.')
+
+        evento, clientes, compradores, portero = self._crear_datos(options)
+        try:
+            with ServidorMPLocal(latencia=options['latencia_mp']) as mp:
+                puerto = _puerto_libre()
+                env = dict(
+                    os.environ,
+                    SERVER_MODE=options['modo'],
+                    MP_API_URL=mp.url,
+                    GUNICORN_BIND=f'127.0.0.1:{puerto}',
+                    WEB_CONCURRENCY=str(options['workers']),
+                )
+                proceso = subprocess.Popen(
+                    [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--log-level', 'warning'],
+                    cwd=settings.BASE_DIR, env=env,
+                )
+                try:
+                    if not _esperar_puerto(puerto):
+                        raise CommandError(f"El servidor {options['modo']} no arrancó.")
+                    fases, planeado, agotamiento = self._simular(
+                        f'http://127.0.0.1:{puerto}', mp, evento, compradores, portero, options
+                    )
+                finally:
+                    proceso.terminate()
+                    proceso.wait(timeout=30)
+
+            invariantes = self._verificar(evento, fases, planeado, agotamiento)
+        finally:
+            if not options['conservar']:
+                self._borrar_datos(evento, clientes, portero)
+
+        resultado = {
+            'configuracion': {
+                clave: options[clave] for clave in (
+                    'clientes', 'stock', 'lotes', 'max_entradas', 'concurrencia', 'aprobadas', 'rechazadas',
+                    'latencia_mp', 'modo', 'workers', 'semilla'
+                )
+            },
+            'ventas': planeado,
+            'fases': fases,
+            'invariantes': invariantes,
+        }
+        if options['salida']:
+            with open(options['salida'], 'w') as archivo:
+                json.dump(resultado, archivo, indent=2)
+
+        fallas = [nombre for nombre, chequeo in invariantes.items() if not chequeo['ok']]
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, indent=2))
+        else:
+            self._imprimir(resultado)
+        if fallas:
+            raise CommandError(f"Invariantes que fallaron: {', '.join(fallas)}")
+
+    def _imprimir(self, resultado):
+        ventas = resultado['ventas']
+        self.stdout.write(
+            f"Reservas {ventas['reservas']} (sin stock {ventas['sin_stock']})   aprobadas {ventas['aprobadas']}   "
+            f"rechazadas {ventas['rechazadas']}   expiradas {ventas['expiradas']}   entradas {ventas['entradas_escaneadas']}"
+        )
+        for fase, r in resultado['fases'].items():
+            if 'requests' not in r:
+                self.stdout.write(f"  {fase:<10} {r['ordenes']} órdenes en {r['duracion_s']} s")
+                continue
+            self.stdout.write(
+                f"  {fase:<10} {r['requests_por_segundo']:>8} req/s   p50 {r['p50_ms']:>8} ms   p90 {r['p90_ms']:>8} ms   "
+                f"p99 {r['p99_ms']:>8} ms   {r['respuestas']}"
+            )
+        for nombre, chequeo in resultado['invariantes'].items():
+            if chequeo['ok']:
+                self.stdout.write(self.style.SUCCESS(f"  ✔ {nombre}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"  ✘ {nombre}: {json.dumps(chequeo['detalle'])}"))
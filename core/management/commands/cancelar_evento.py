@@ -0,0 +1,85 @@
+"""
+Comando de administración para cancelar un evento y reembolsar sus órdenes.
+
+    python manage.py cancelar_evento --evento 12 --motivo "Suspendido por lluvia"
+    python manage.py cancelar_evento --evento 12 --reintentar-errores
+    python manage.py cancelar_evento --reanudar
+
+Procesa en primer plano mostrando el avance. Con REEMBOLSOS_EJECUCION=comando
+(o si un reinicio cortó el hilo del worker) --reanudar retoma todas las
+cancelaciones EN_PROCESO o con reembolsos pendientes (pagos tardíos
+encolados); se puede programar en cron.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from core.models import Evento, CancelacionEvento
+from core.services_reembolsos import cancelar_evento, procesar_cancelacion, reintentar_errores
+
+
+class Command(BaseCommand):
+    help = 'Cancela un evento y reembolsa por Mercado Pago todas sus órdenes aprobadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evento', type=int)
+        parser.add_argument('--motivo', default='', help='Se incluye en el email a los clientes')
+        parser.add_argument('--reanudar', action='store_true', help='Retoma las cancelaciones EN_PROCESO o con reembolsos pendientes')
+        parser.add_argument('--reintentar-errores', action='store_true', help='Vuelve a intentar los reembolsos en ERROR')
+        parser.add_argument('--concurrencia', type=int, help='Pedidos a MP en vuelo (por defecto REEMBOLSOS_CONCURRENCIA)')
+        parser.add_argument('--por-segundo', type=float, help='Tope de pedidos/seg a MP (por defecto REEMBOLSOS_POR_SEGUNDO)')
+
+    def _progreso(self, cancelacion):
+        self.stdout.write(
+            f"  [{cancelacion.progreso:>3}%] {cancelacion.reembolsadas}/{cancelacion.ordenes_totales} reembolsadas, "
+            f"{cancelacion.errores} con error, {cancelacion.emails_enviados} emails"
+        )
+
+    def _procesar(self, cancelacion_id, options):
+        inicio = time.perf_counter()
+        inicial = CancelacionEvento.objects.get(id=cancelacion_id).reembolsadas
+        cancelacion = procesar_cancelacion(
+            cancelacion_id, concurrencia=options['concurrencia'], por_segundo=options['por_segundo'],
+            al_progresar=self._progreso,
+        )
+        duracion = time.perf_counter() - inicio
+        ritmo = (cancelacion.reembolsadas - inicial) / duracion if duracion else 0
+        estilo = self.style.SUCCESS if cancelacion.estado == 'COMPLETADA' else self.style.WARNING
+        self.stdout.write(estilo(
+            f"Evento {cancelacion.evento_id}: {cancelacion.get_estado_display()} - "
+            f"{cancelacion.reembolsadas} reembolsadas (${cancelacion.monto_reembolsado}), "
+            f"{cancelacion.errores} con error, {ritmo:.1f} reembolsos/s"
+        ))
+
+    def handle(self, *args, **options):
+        if options['reanudar']:
+            # También las terminadas con reembolsos nuevos (un pago tardío encolado al cerrar)
+            pendientes = list(
+                CancelacionEvento.objects.filter(Q(estado='EN_PROCESO') | Q(reembolsos__estado='PENDIENTE'))
+                .distinct().values_list('id', flat=True)
+            )
+            for cancelacion_id in pendientes:
+                self._procesar(cancelacion_id, options)
+            if not pendientes:
+                self.stdout.write("No hay cancelaciones en proceso.")
+            return
+
+        if not options['evento']:
+            raise CommandError("Indique --evento (o --reanudar).")
+        if not Evento.objects.filter(id=options['evento']).exists():
+            raise CommandError(f"Evento {options['evento']} no encontrado.")
+
+        if options['reintentar_errores']:
+            cancelacion = CancelacionEvento.objects.filter(evento_id=options['evento']).first()
+            if cancelacion is None:
+                raise CommandError(f"El evento {options['evento']} no está cancelado.")
+            self.stdout.write(f"Reembolsos en error reencolados: {reintentar_errores(cancelacion.id)}")
+        else:
+            cancelacion, creada = cancelar_evento(options['evento'], motivo=options['motivo'], en_segundo_plano=False)
+            self.stdout.write(
+                f"{'Evento cancelado' if creada else 'Cancelación retomada'}: "
+                f"{cancelacion.ordenes_totales} órdenes a reembolsar."
+            )
+
+        self._procesar(cancelacion.id, options)
@@ -0,0 +1,61 @@
+"""
+Comando de administración para conciliar las órdenes con los pagos de Mercado Pago.
+
+    python manage.py conciliar_pagos
+    python manage.py conciliar_pagos --desde 2026-05-01T00:00:00-03:00
+
+Recorre la búsqueda de pagos desde el último cursor guardado, aprueba las
+órdenes con pago aprobado cuyo webhook no llegó y rechaza las que fueron
+rechazadas. Se recomienda como CRON cada 5 minutos.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from core.services_conciliacion import conciliar_pagos, ErrorConciliacion
+
+
+class Command(BaseCommand):
+    help = 'Concilia las órdenes abiertas con la búsqueda de pagos de Mercado Pago (incremental).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha ISO-8601 desde la cual releer (ignora el cursor)')
+        parser.add_argument('--pagina', type=int, help='Pagos por página (por defecto CONCILIACION_PAGINA)')
+
+    def _progreso(self, resultado):
+        self.stdout.write(
+            f"  Página {resultado['paginas']}: {resultado['pagos']} pagos, "
+            f"{resultado['aprobadas']} aprobadas, {resultado['rechazadas']} rechazadas"
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            desde = parse_datetime(options['desde'])
+            if desde is None or desde.tzinfo is None:
+                raise CommandError("--desde debe ser una fecha ISO-8601 con zona horaria.")
+
+        inicio = time.perf_counter()
+        try:
+            resultado = conciliar_pagos(desde=desde, pagina=options['pagina'], al_progresar=self._progreso)
+        except ErrorConciliacion as e:
+            raise CommandError(f"{e} (el cursor conserva lo ya conciliado)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Conciliados {resultado['pagos']} pagos en {time.perf_counter() - inicio:.1f}s: "
+            f"{resultado['aprobadas']} órdenes aprobadas, {resultado['rechazadas']} rechazadas, "
+            f"{resultado['sin_orden']} pagos sin orden."
+        ))
+        if resultado['fuera_de_termino']:
+            self.stdout.write(self.style.WARNING(
+                f"{resultado['fuera_de_termino']} órdenes ya vencidas o rechazadas se aprobaron y retomaron su stock."
+            ))
+        if resultado['a_reembolsar']:
+            self.stdout.write(self.style.WARNING(
+                f"{resultado['a_reembolsar']} órdenes de eventos cancelados se encolaron para reembolso (cancelar_evento --reanudar)."
+            ))
+        if resultado['sin_stock']:
+            self.stdout.write(self.style.ERROR(
+                f"{resultado['sin_stock']} órdenes pagadas tarde no tenían stock: quedaron PAGADA_SIN_STOCK para revisar o reembolsar."
+            ))
@@ -0,0 +1,18 @@
+"""
+Comando de administración para consolidar las métricas por minuto en
+buckets por hora y por día, y purgar los que superan la retención.
+"""
+
+from django.core.management.base import BaseCommand
+from core.services_metricas import consolidar_metricas
+
+
+class Command(BaseCommand):
+    help = 'Consolida MetricaLote (minuto -> hora -> día) y purga según METRICAS_RETENCION_*.'
+
+    def handle(self, *args, **options):
+        resultado = consolidar_metricas()
+        self.stdout.write(self.style.SUCCESS(
+            f"Métricas consolidadas: {resultado['horas']} horas, {resultado['dias']} días. "
+            f"Purgados: {resultado['minutos_purgados']} minutos, {resultado['horas_purgadas']} horas."
+        ))
@@ -0,0 +1,80 @@
+"""
+Comando de administración para emitir cortesías / listas de invitados en masa.
+
+    python manage.py emitir_cortesias invitados.csv --lote 12 --etiqueta "Promotor X"
+    python manage.py emitir_cortesias --lote 12 --qr-pendientes
+    python manage.py emitir_cortesias --qr-pendientes    # todos los eventos próximos (worker)
+
+El archivo es un CSV con encabezado (cedula,nombre,apellido,email[,telefono,
+fecha_nacimiento,cantidad]) o un JSON con la lista de invitados. Las
+cortesías emitidas por la API quedan sin QR hasta que el worker corre
+--qr-pendientes.
+"""
+
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Lote
+from core.services_cortesias import (
+    leer_invitados, normalizar_invitados, emitir_cortesias, renderizar_qrs, entradas_sin_qr
+)
+
+
+class Command(BaseCommand):
+    help = 'Emite entradas de cortesía desde un CSV/JSON de invitados contra un lote.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', nargs='?', help='CSV o JSON de invitados')
+        parser.add_argument('--lote', type=int)
+        parser.add_argument('--etiqueta', default='', help='Lista o promotor (queda en la orden)')
+        parser.add_argument('--formato', choices=['csv', 'json'], help='Por defecto según la extensión')
+        parser.add_argument('--procesos', type=int, help='Procesos para los QR (por defecto CORTESIAS_PROCESOS_QR)')
+        parser.add_argument('--sin-qr', action='store_true', help='No genera los QR (se pueden generar luego)')
+        parser.add_argument('--qr-pendientes', action='store_true', help='Solo genera los QR faltantes del lote (sin --lote, de los eventos próximos)')
+
+    def handle(self, *args, **options):
+        if options['lote'] is None and not options['qr_pendientes']:
+            raise CommandError("Indique --lote.")
+        if options['lote'] is not None and not Lote.objects.filter(id=options['lote']).exists():
+            raise CommandError(f"Lote {options['lote']} no encontrado.")
+
+        if options['qr_pendientes']:
+            inicio = time.perf_counter()
+            generados = renderizar_qrs(entradas_sin_qr(options['lote']), procesos=options['procesos'])
+            self.stdout.write(self.style.SUCCESS(
+                f"QRs generados: {generados} en {time.perf_counter() - inicio:.1f}s"
+            ))
+            return
+
+        if not options['archivo']:
+            raise CommandError("Indique el archivo de invitados (o --qr-pendientes).")
+        formato = options['formato'] or ('json' if options['archivo'].lower().endswith('.json') else 'csv')
+        with open(options['archivo'], 'rb') as archivo:
+            try:
+                filas = leer_invitados(archivo.read(), formato)
+            except (ValueError, ValidationError) as e:
+                raise CommandError(f"No se pudo leer el archivo: {e}")
+
+        invitados, errores = normalizar_invitados(filas)
+        if errores:
+            for error in errores:
+                self.stderr.write(f"  Fila {error['fila']}: {error['error']}")
+            raise CommandError(f"{len(errores)} filas con errores; no se emitió nada.")
+
+        inicio = time.perf_counter()
+        try:
+            resultado = emitir_cortesias(options['lote'], invitados, etiqueta=options['etiqueta'])
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+        emision = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"Emitidas {resultado['entradas']} entradas a {resultado['ordenes']} invitados "
+            f"({resultado['clientes_creados']} clientes nuevos) en {emision:.1f}s"
+        ))
+
+        if options['sin_qr']:
+            return
+        inicio = time.perf_counter()
+        generados = renderizar_qrs(resultado['entrada_ids'], procesos=options['procesos'])
+        self.stdout.write(self.style.SUCCESS(f"QRs generados: {generados} en {time.perf_counter() - inicio:.1f}s"))
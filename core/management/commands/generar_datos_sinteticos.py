@@ -0,0 +1,511 @@
+"""
+Comando de administración que llena la base con un volumen realista de datos
+sintéticos para medir rendimiento (clientes, eventos, lotes, órdenes y
+entradas), reproducible a partir de una semilla.
+
+    python manage.py generar_datos_sinteticos                                # 200k clientes, 500 eventos, 2M órdenes
+    python manage.py generar_datos_sinteticos --clientes 20000 --eventos 50 --ordenes 200000
+    python manage.py generar_datos_sinteticos --borrar                       # reemplaza los sintéticos anteriores
+
+Distribuciones:
+- Eventos entre dos años atrás y cuatro meses adelante, con popularidad
+  log-normal (pocos eventos concentran muchas ventas) y de 1 a 4 lotes
+  escalonados; los clientes compran con frecuencia tipo Zipf.
+- Ventas en la ventana de 45 días previa al evento: pico de apertura, goteo
+  y pico en la última semana. 78% aprobadas, 12% expiradas, 10% rechazadas,
+  3% cortesías; las reservas de los últimos 15 minutos quedan PENDIENTES.
+- Cada orden viva toma el primer lote con stock, como reservar_stock; el
+  cupo de los lotes se calcula para que ~30% de los eventos se agoten.
+- Entradas de eventos pasados usadas en un 88%, en las horas del evento.
+
+Se mantienen los totales derivados: Lote.cantidad_vendida (con su
+movimiento INICIAL en el libro de stock), ResumenVentasLote y MetricaLote
+diarias. Órdenes y entradas se escriben con COPY en PostgreSQL y con un
+INSERT con executemany en el resto, por tandas. Mismos datos con la misma
+--semilla y --fecha-referencia (los ids autoincrementales dependen de la base).
+"""
+
+import io
+import math
+import random
+import time
+import unicodedata
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import DateTimeField, UUIDField
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import (
+    Cliente, Evento, Lote, Orden, Entrada, ResumenVentasLote, MetricaLote, MovimientoStock
+)
+from core.services_metricas import inicio_bucket
+
+DOMINIO = 'sintetico.backyardbar.local'
+PREFIJO_EVENTO = 'Sintético · '
+CLAVE = 'sintetico123'
+
+NOMBRES = [
+    'Juan', 'María', 'Martín', 'Lucía', 'Santiago', 'Sofía', 'Matías', 'Valentina', 'Diego', 'Camila',
+    'Nicolás', 'Florencia', 'Federico', 'Agustina', 'Gonzalo', 'Micaela', 'Joaquín', 'Carolina', 'Facundo',
+    'Natalia', 'Sebastián', 'Paula', 'Rodrigo', 'Victoria', 'Andrés', 'Romina', 'Pablo', 'Jimena', 'Bruno', 'Inés',
+]
+APELLIDOS = [
+    'Rodríguez', 'González', 'Fernández', 'García', 'López', 'Martínez', 'Pérez', 'Sosa', 'Silva', 'Díaz',
+    'Pereira', 'Suárez', 'Álvarez', 'Núñez', 'Cabrera', 'Ramos', 'Méndez', 'Acosta', 'Castro', 'Olivera',
+    'Benítez', 'Techera', 'Ferreira', 'Correa', 'Viera', 'Romero', 'Píriz', 'Morales', 'Cardozo', 'De León',
+]
+GENEROS = ['Fiesta', 'Noche de Jazz', 'Tributo', 'After Office', 'Techno', 'Cumbia', 'Stand Up', 'Rock Nacional']
+LOTES = {
+    1: ['General'],
+    2: ['Preventa', 'General'],
+    3: ['Early Bird', 'Preventa', 'General'],
+    4: ['Early Bird', 'Preventa', 'General', 'VIP'],
+}
+CAMPOS_ORDEN = [
+    'id', 'cliente_id', 'evento_id', 'lote_id', 'cantidad_entradas', 'monto_subtotal', 'monto_comision',
+    'monto_total', 'estado', 'origen', 'etiqueta', 'mp_preference_id', 'mp_payment_id', 'fecha_creacion',
+    'fecha_aprobacion', 'fecha_expiracion',
+]
+CAMPOS_ENTRADA = [
+    'id', 'orden_id', 'cliente_id', 'lote_id', 'codigo_corto', 'usada', 'anulada', 'fecha_uso', 'imagen_qr',
+    'fecha_creacion', 'fecha_modificacion',
+]
+# Estados vivos (toman stock)
+VIVOS = ('APROBADO', 'PENDIENTE')
+
+
+def _ascii(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower().replace(' ', '')
+
+
+@contextmanager
+def _fechas_manuales(*modelos):
+    """Desactiva auto_now/auto_now_add para que bulk_create respete las fechas generadas."""
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for modelo in modelos for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def _valor_copy(valor):
+    """Valor en el formato de texto de COPY."""
+    if valor is None:
+        return '\\N'
+    if valor is True or valor is False:
+        return 't' if valor else 'f'
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _adaptador(campo):
+    """Conversión al valor de la base para `campo` (None si el driver lo acepta tal cual)."""
+    campo = getattr(campo, 'target_field', campo)
+    if isinstance(campo, UUIDField) and not connection.features.has_native_uuid_field:
+        return lambda valor: valor.hex
+    if isinstance(campo, DateTimeField):
+        return connection.ops.adapt_datetimefield_value
+    return None
+
+
+class _Escritor:
+    """
+    Acumula filas (tuplas en el orden de `campos`) y las inserta por tandas:
+    COPY en PostgreSQL y un INSERT con executemany en el resto, sin instanciar
+    modelos (a esta escala el costo está en el ORM, no en la base).
+    `depende_de` se vacía antes (las entradas necesitan sus órdenes insertadas).
+    """
+
+    def __init__(self, modelo, campos, tanda, depende_de=None, antes_de_escribir=None):
+        self.modelo = modelo
+        self.campos = campos
+        self.tanda = tanda
+        self.depende_de = depende_de
+        self.antes_de_escribir = antes_de_escribir
+        self.filas = []
+        self.total = 0
+        self.copy = connection.vendor == 'postgresql'
+        campos_modelo = [modelo._meta.get_field(campo) for campo in campos]
+        self.tabla = connection.ops.quote_name(modelo._meta.db_table)
+        self.columnas = ', '.join(connection.ops.quote_name(campo.column) for campo in campos_modelo)
+        self.adaptadores = [_adaptador(campo) for campo in campos_modelo]
+
+    def agregar(self, fila):
+        self.filas.append(fila)
+        if len(self.filas) >= self.tanda:
+            self.vaciar()
+
+    def vaciar(self):
+        if self.depende_de is not None:
+            self.depende_de.vaciar()
+        if not self.filas:
+            return
+        if self.antes_de_escribir is not None:
+            self.antes_de_escribir(self.filas)
+        if self.copy:
+            self._copiar()
+        else:
+            self._insertar()
+        self.total += len(self.filas)
+        self.filas = []
+
+    def _insertar(self):
+        conversiones = [(i, adaptar) for i, adaptar in enumerate(self.adaptadores) if adaptar is not None]
+        parametros = []
+        for fila in self.filas:
+            fila = list(fila)
+            for i, adaptar in conversiones:
+                if fila[i] is not None:
+                    fila[i] = adaptar(fila[i])
+            parametros.append(fila)
+        marcas = ', '.join(['%s'] * len(self.campos))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {self.tabla} ({self.columnas}) VALUES ({marcas})', parametros)
+
+    def _copiar(self):
+        datos = io.StringIO(''.join('\t'.join(map(_valor_copy, fila)) + '\n' for fila in self.filas))
+        sql = f'COPY {self.tabla} ({self.columnas}) FROM STDIN'
+        with connection.cursor() as cursor:
+            if hasattr(cursor.cursor, 'copy_expert'):
+                cursor.cursor.copy_expert(sql, datos)
+            else:
+                # psycopg 3
+                with cursor.cursor.copy(sql) as copia:
+                    copia.write(datos.getvalue())
+
+
+class Command(BaseCommand):
+    help = 'Genera clientes, eventos, órdenes y entradas sintéticos a escala para benchmarks (reproducible con --semilla).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=200_000)
+        parser.add_argument('--eventos', type=int, default=500)
+        parser.add_argument('--ordenes', type=int, default=2_000_000)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--fecha-referencia', help='"Ahora" de los datos (ISO 8601); fijarla hace la generación reproducible')
+        parser.add_argument('--tanda', type=int, default=10_000, help='Filas por inserción')
+        parser.add_argument('--borrar', action='store_true', help='Borra antes los datos sintéticos de una ejecución anterior')
+
+    # ===================================
+    # BORRADO
+    # ===================================
+
+    def _borrar(self):
+        """
+        Borra los eventos sintéticos (con sus órdenes y entradas) y después los
+        clientes. Órdenes, entradas y movimientos van con DELETE directo: el
+        delete() del ORM carga cada orden para revisar sus relaciones.
+        """
+        tabla = lambda modelo: connection.ops.quote_name(modelo._meta.db_table)
+        lotes_del_evento = f'SELECT id FROM {tabla(Lote)} WHERE evento_id = %s'
+        eventos = list(Evento.objects.filter(titulo__startswith=PREFIJO_EVENTO).values_list('id', flat=True))
+        for evento_id in eventos:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {tabla(Entrada)} WHERE lote_id IN ({lotes_del_evento})', [evento_id])
+                cursor.execute(f'DELETE FROM {tabla(MovimientoStock)} WHERE lote_id IN ({lotes_del_evento})', [evento_id])
+                cursor.execute(f'DELETE FROM {tabla(Orden)} WHERE evento_id = %s', [evento_id])
+                Evento.objects.filter(id=evento_id).delete()
+        clientes = Cliente.objects.filter(email__endswith=f'@{DOMINIO}')
+        borrados = clientes.count()
+        clientes.delete()
+        self.stdout.write(f'Borrados {len(eventos)} eventos y {borrados} clientes sintéticos.')
+
+    # ===================================
+    # CLIENTES Y EVENTOS
+    # ===================================
+
+    def _crear_clientes(self, cantidad):
+        clave = make_password(CLAVE)
+        ids = []
+        for desde in range(0, cantidad, self.tanda):
+            clientes = []
+            for n in range(desde, min(desde + self.tanda, cantidad)):
+                nombre, apellido = self.azar.choice(NOMBRES), self.azar.choice(APELLIDOS)
+                clientes.append(Cliente(
+                    # Rango de cédulas que todavía no se emitió
+                    cedula=str(90_000_000 + n), nombre=nombre, apellido=apellido,
+                    fecha_nacimiento=self.referencia.date() - timedelta(days=self.azar.randint(18 * 365, 60 * 365)),
+                    email=f'{_ascii(nombre)}.{_ascii(apellido)}.{n}@{DOMINIO}',
+                    telefono=f'09{self.azar.randint(0, 9_999_999):07d}', password=clave,
+                    fecha_registro=self.referencia - timedelta(seconds=self.azar.randint(0, 3 * 365 * 86400)),
+                ))
+            ids.extend(c.id for c in Cliente.objects.bulk_create(clientes))
+        # Frecuencia de compra tipo Zipf: pocos clientes compran muchas veces
+        self.azar.shuffle(ids)
+        acumulado, pesos = 0.0, []
+        for rango in range(len(ids)):
+            acumulado += 1 / (rango + 1) ** 0.8
+            pesos.append(acumulado)
+        return ids, pesos
+
+    def _crear_eventos(self, cantidad):
+        eventos = []
+        for n in range(cantidad):
+            dias = self.azar.uniform(-730, 120)
+            inicio = (self.referencia + timedelta(days=dias)).replace(minute=0, second=0, microsecond=0)
+            cobra = self.azar.random() < 0.5
+            # Publicado antes de abrir la venta (y nunca en el futuro)
+            creacion = min(inicio - timedelta(days=60), self.referencia - timedelta(days=11))
+            eventos.append(Evento(
+                titulo=f'{PREFIJO_EVENTO}{self.azar.choice(GENEROS)} #{n + 1}',
+                descripcion='Evento generado para benchmarks.',
+                fecha_inicio=inicio, ubicacion='Backyard Bar - Montevideo',
+                cobra_comision=cobra, valor_comision=Decimal(self.azar.choice([30, 50, 80])) if cobra else Decimal('0'),
+                fecha_creacion=creacion, fecha_modificacion=creacion,
+            ))
+        return Evento.objects.bulk_create(eventos)
+
+    def _reparto(self, eventos, total):
+        """Órdenes por evento con popularidad log-normal; suman exactamente `total`."""
+        pesos = [self.azar.lognormvariate(0, 1) for _ in eventos]
+        suma = sum(pesos)
+        cantidades = [int(total * peso / suma) for peso in pesos]
+        for i in self.azar.sample(range(len(eventos)), total - sum(cantidades)):
+            cantidades[i] += 1
+        return cantidades
+
+    # ===================================
+    # ÓRDENES DE UN EVENTO
+    # ===================================
+
+    def _fecha_venta(self, apertura, cierre):
+        """Pico de apertura (48 h), goteo en la ventana y pico en la última semana."""
+        duracion = (cierre - apertura).total_seconds()
+        r = self.azar.random()
+        if r < 0.25:
+            segundos = self.azar.uniform(0, min(duracion, 48 * 3600))
+        elif r < 0.75:
+            segundos = self.azar.uniform(0, duracion)
+        else:
+            segundos = self.azar.uniform(max(0, duracion - 7 * 86400), duracion)
+        return apertura + timedelta(seconds=segundos)
+
+    def _pedidos(self, evento, cantidad):
+        """[(fecha, cantidad, origen, estado)] del evento, ordenados por fecha."""
+        apertura = evento.fecha_inicio - timedelta(days=45)
+        if apertura > self.referencia - timedelta(days=1):
+            # Evento lejano: la venta abrió hace pocos días
+            apertura = self.referencia - timedelta(days=self.azar.randint(1, 10))
+        cierre = min(evento.fecha_inicio, self.referencia)
+        pendientes_desde = self.referencia - timedelta(minutes=15)
+
+        pedidos = []
+        for _ in range(cantidad):
+            fecha = self._fecha_venta(apertura, cierre)
+            entradas = self.azar.choices((1, 2, 3, 4, 5, 6), weights=(35, 35, 12, 12, 3, 3))[0]
+            if self.azar.random() < 0.03:
+                pedidos.append((fecha, entradas, 'CORTESIA', 'APROBADO'))
+                continue
+            if fecha > pendientes_desde:
+                estado = 'PENDIENTE'
+            else:
+                r = self.azar.random()
+                estado = 'APROBADO' if r < 0.78 else 'EXPIRADO' if r < 0.90 else 'RECHAZADO'
+            pedidos.append((fecha, entradas, 'COMPRA', estado))
+        pedidos.sort(key=lambda pedido: pedido[0])
+        return pedidos
+
+    def _crear_lotes(self, evento, pedidos):
+        """Lotes con cupo según la demanda viva; retorna (lotes, índice de lote por pedido, pedidos)."""
+        cantidad_lotes = self.azar.randint(1, 4)
+        vivas = sum(entradas for _, entradas, _, estado in pedidos if estado in VIVOS)
+        # ~30% de los eventos se agotan; el resto vende entre 50% y 95%
+        venta = 1.0 if self.azar.random() < 0.3 else self.azar.uniform(0.5, 0.95)
+        total = max(math.ceil(vivas / venta), cantidad_lotes * 10)
+        partes = [self.azar.uniform(0.5, 1.5) for _ in range(cantidad_lotes)]
+        cupos = [int(total * parte / sum(partes)) for parte in partes]
+        cupos[-1] += total - sum(cupos)
+
+        # Cada orden viva toma el primer lote con stock para el pedido completo (como reservar_stock)
+        vendidas = [0] * cantidad_lotes
+        asignados = []
+        for i, (fecha, entradas, origen, estado) in enumerate(pedidos):
+            lote = next((n for n in range(cantidad_lotes) if cupos[n] - vendidas[n] >= entradas), None)
+            if lote is None:
+                # Sin stock: la reserva no habría existido como orden viva
+                lote = cantidad_lotes - 1
+                if estado in VIVOS:
+                    pedidos[i] = (fecha, entradas, origen, 'EXPIRADO' if origen == 'COMPRA' else 'RECHAZADO')
+                    estado = pedidos[i][3]
+            if estado in VIVOS:
+                vendidas[lote] += entradas
+            asignados.append(lote)
+
+        precio = Decimal(self.azar.randrange(300, 1500, 50))
+        lotes = Lote.objects.bulk_create([
+            Lote(
+                evento=evento, nombre=nombre, orden=n + 1, cantidad_total=cupos[n], cantidad_vendida=vendidas[n],
+                precio=(precio * Decimal(1 + 0.3 * n)).quantize(Decimal('1')),
+                fecha_creacion=evento.fecha_creacion,
+            )
+            for n, nombre in enumerate(LOTES[cantidad_lotes])
+        ])
+        return lotes, asignados
+
+    def _generar_evento(self, evento, cantidad):
+        pedidos = self._pedidos(evento, cantidad)
+        lotes, asignados = self._crear_lotes(evento, pedidos)
+        pasado = evento.fecha_inicio < self.referencia
+
+        resumen = {lote.id: Counter() for lote in lotes}
+        metricas = defaultdict(Counter)
+        for (fecha, entradas, origen, estado), indice in zip(pedidos, asignados):
+            lote = lotes[indice]
+            cliente_id = self.azar.choices(self.clientes, cum_weights=self.pesos)[0]
+            cortesia = origen == 'CORTESIA'
+            subtotal = Decimal(0) if cortesia else lote.precio * entradas
+            comision = Decimal(0) if cortesia else evento.valor_comision * entradas
+            aprobacion = None
+            if estado == 'APROBADO':
+                aprobacion = fecha if cortesia else fecha + timedelta(seconds=self.azar.randint(10, 600))
+            orden_id = uuid.UUID(int=self.azar.getrandbits(128), version=4)
+            self.ordenes.agregar((
+                orden_id, cliente_id, evento.id, lote.id, entradas, subtotal, comision, subtotal + comision,
+                estado, origen, 'Lista de promotores' if cortesia else '',
+                None if cortesia else f'sint-{orden_id.hex[:12]}',
+                str(self.pagos_generados + 1) if estado in ('APROBADO', 'RECHAZADO') and not cortesia else None,
+                fecha, aprobacion, None if cortesia else fecha + timedelta(minutes=15),
+            ))
+            self.pagos_generados += 1
+            self.estados[estado] += 1
+
+            if estado == 'PENDIENTE':
+                resumen[lote.id]['reservas_pendientes'] += entradas
+            if estado != 'APROBADO':
+                continue
+            resumen[lote.id]['vendidas'] += entradas
+            resumen[lote.id]['recaudado'] += subtotal + comision
+            resumen[lote.id]['comision'] += comision
+            dia = inicio_bucket(aprobacion, 'DIA')
+            metricas[(lote.id, dia)]['vendidas'] += entradas
+            metricas[(lote.id, dia)]['recaudado'] += subtotal + comision
+
+            for _ in range(entradas):
+                usada = pasado and self.azar.random() < 0.88
+                uso = evento.fecha_inicio + timedelta(seconds=self.azar.randint(0, 4 * 3600)) if usada else None
+                self.entradas.agregar((
+                    uuid.UUID(int=self.azar.getrandbits(128), version=4), orden_id, cliente_id, lote.id,
+                    None, usada, False, uso, '', aprobacion, uso or aprobacion,
+                ))
+                if usada:
+                    resumen[lote.id]['ingresadas'] += 1
+                    metricas[(lote.id, inicio_bucket(uso, 'DIA'))]['ingresadas'] += 1
+
+        # Las órdenes se insertan antes que lo que las referencia
+        self.entradas.vaciar()
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(lote=lote, cantidad=lote.cantidad_vendida, motivo='INICIAL', fecha=evento.fecha_creacion)
+            for lote in lotes if lote.cantidad_vendida
+        ])
+        ResumenVentasLote.objects.bulk_create([
+            ResumenVentasLote(
+                lote_id=lote_id, evento=evento, vendidas=totales['vendidas'], ingresadas=totales['ingresadas'],
+                reservas_pendientes=totales['reservas_pendientes'], recaudado=totales['recaudado'] or Decimal(0),
+                comision=totales['comision'] or Decimal(0), fecha_modificacion=self.referencia,
+            )
+            for lote_id, totales in resumen.items()
+        ])
+        MetricaLote.objects.bulk_create([
+            MetricaLote(
+                lote_id=lote_id, evento=evento, granularidad='DIA', inicio=dia, vendidas=valores['vendidas'],
+                recaudado=valores['recaudado'] or Decimal(0), ingresadas=valores['ingresadas'],
+            )
+            for (lote_id, dia), valores in metricas.items()
+        ], batch_size=self.tanda)
+        return len(lotes)
+
+    def _asignar_codigos(self, filas):
+        """
+        codigo_corto (primeros 8 hex del UUID, como asignar_codigos_cortos),
+        único contra la tanda y la base. A las entradas que chocan se les
+        regenera el UUID con un generador aparte, para no desplazar la
+        secuencia principal.
+        """
+        indice = CAMPOS_ENTRADA.index('codigo_corto')
+        asignados = set()
+        pendientes = list(range(len(filas)))
+        while pendientes:
+            codigos = [filas[i][0].hex[:8].upper() for i in pendientes]
+            ocupados = set(Entrada.objects.filter(codigo_corto__in=codigos).values_list('codigo_corto', flat=True))
+            repetidos = []
+            for i, codigo in zip(pendientes, codigos):
+                fila = list(filas[i])
+                if codigo in ocupados or codigo in asignados:
+                    fila[0] = uuid.UUID(int=self.azar_colisiones.getrandbits(128), version=4)
+                    repetidos.append(i)
+                else:
+                    fila[indice] = codigo
+                    asignados.add(codigo)
+                filas[i] = tuple(fila)
+            pendientes = repetidos
+
+    # ===================================
+    # COMANDO
+    # ===================================
+
+    def handle(self, *args, **options):
+        self.tanda = max(options['tanda'], 100)
+        self.azar = random.Random(options['semilla'])
+        self.azar_colisiones = random.Random(options['semilla'] + 1)
+        if options['fecha_referencia']:
+            self.referencia = parse_datetime(options['fecha_referencia'])
+            if self.referencia is None:
+                raise CommandError(f"Fecha inválida: {options['fecha_referencia']}")
+            if timezone.is_naive(self.referencia):
+                self.referencia = timezone.make_aware(self.referencia)
+        else:
+            self.referencia = timezone.now()
+
+        if options['borrar']:
+            self._borrar()
+        elif Cliente.objects.filter(email__endswith=f'@{DOMINIO}').exists():
+            raise CommandError('Ya hay datos sintéticos en la base: use --borrar para reemplazarlos.')
+        if options['clientes'] < 1 or options['eventos'] < 1:
+            raise CommandError('Se necesita al menos un cliente y un evento.')
+
+        inicio = time.perf_counter()
+        self.ordenes = _Escritor(Orden, CAMPOS_ORDEN, self.tanda)
+        self.entradas = _Escritor(
+            Entrada, CAMPOS_ENTRADA, self.tanda, depende_de=self.ordenes, antes_de_escribir=self._asignar_codigos
+        )
+        self.estados = Counter()
+        self.pagos_generados = 0
+        lotes = 0
+
+        with _fechas_manuales(Cliente, Evento, Lote, ResumenVentasLote, MovimientoStock):
+            self.clientes, self.pesos = self._crear_clientes(options['clientes'])
+            self.stdout.write(f"{len(self.clientes)} clientes ({time.perf_counter() - inicio:.0f} s)")
+
+            eventos = self._crear_eventos(options['eventos'])
+            for numero, (evento, cantidad) in enumerate(zip(eventos, self._reparto(eventos, options['ordenes'])), 1):
+                with transaction.atomic():
+                    lotes += self._generar_evento(evento, cantidad)
+                if numero % 50 == 0 or numero == len(eventos):
+                    self.stdout.write(
+                        f"  {numero}/{len(eventos)} eventos, {self.ordenes.total} órdenes, "
+                        f"{self.entradas.total} entradas ({time.perf_counter() - inicio:.0f} s)"
+                    )
+
+        duracion = time.perf_counter() - inicio
+        filas = len(self.clientes) + len(eventos) + lotes + self.ordenes.total + self.entradas.total
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo en {duracion:.0f} s ({filas / duracion:,.0f} filas/s): {len(self.clientes)} clientes, "
+            f"{len(eventos)} eventos, {lotes} lotes, {self.ordenes.total} órdenes {dict(self.estados)}, "
+            f"{self.entradas.total} entradas. Clave de los clientes: {CLAVE}"
+        ))
@@ -7,6 +7,9 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.db import transaction
 from core.models import Orden, Lote
+from core.services_estadisticas import ajustar_resumen_por_orden
+from core.services_stock import registrar_movimiento_stock
+from core.trazas import tramo
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,7 +36,7 @@ class Command(BaseCommand):
         for orden in ordenes_a_vencer:
             try:
                 # Usamos transacción atómica por cada orden para asegurar consistencia
-                with transaction.atomic():
+                with tramo('expiracion', orden_id=orden.id), transaction.atomic():
                     # Bloqueamos la orden y el lote para la actualización
                     orden_bloqueada = Orden.objects.select_for_update().get(id=orden.id)
                     
@@ -41,14 +44,16 @@ class Command(BaseCommand):
                     if orden_bloqueada.estado != 'PENDIENTE':
                         continue
                     
-                    # 1. Marcar como EXPIRADO
-                    orden_bloqueada.estado = 'EXPIRADO'
-                    orden_bloqueada.save()
-
-                    # 2. Devolver Stock al Lote
-                    lote = Lote.objects.select_for_update().get(id=orden_bloqueada.lote.id)
+                    # 1. Devolver Stock al Lote (bloqueado antes que el resumen, como en la reserva)
+                    lote = Lote.objects.select_for_update().get(id=orden_bloqueada.lote_id)
                     lote.cantidad_vendida -= orden_bloqueada.cantidad_entradas
                     lote.save()
+                    registrar_movimiento_stock(lote.id, -orden_bloqueada.cantidad_entradas, 'EXPIRACION', orden_bloqueada.id)
+
+                    # 2. Marcar como EXPIRADO
+                    orden_bloqueada.estado = 'EXPIRADO'
+                    orden_bloqueada.save()
+                    ajustar_resumen_por_orden(orden_bloqueada, 'PENDIENTE')
 
                     proceso_exitoso += 1
                     logger.info(f"Orden {orden.id} expirada y stock liberado (+{orden.cantidad_entradas}).")
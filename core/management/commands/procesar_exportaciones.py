@@ -0,0 +1,28 @@
+"""
+Comando de administración para procesar las exportaciones en segundo plano.
+
+Con EXPORTACION_EJECUCION=hilo los trabajos corren en un hilo del worker que
+los pidió; este comando (cron) retoma los que quedaron colgados por un
+reinicio. Con EXPORTACION_EJECUCION=comando es quien los ejecuta.
+"""
+
+from django.core.management.base import BaseCommand
+from core.models import TrabajoExportacion
+from core.services_exportacion import ejecutar_exportacion, reencolar_trabajos_colgados
+
+
+class Command(BaseCommand):
+    help = 'Reencola las exportaciones colgadas y ejecuta las pendientes.'
+
+    def handle(self, *args, **options):
+        reencolados = reencolar_trabajos_colgados()
+        if reencolados:
+            self.stdout.write(self.style.WARNING(f"Reencoladas {reencolados} exportaciones sin progreso."))
+
+        procesados = 0
+        pendientes = TrabajoExportacion.objects.filter(estado='PENDIENTE').order_by('fecha_creacion')
+        for trabajo_id in pendientes.values_list('id', flat=True):
+            if ejecutar_exportacion(trabajo_id):
+                procesados += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Exportaciones procesadas: {procesados}"))
@@ -0,0 +1,32 @@
+"""
+Comando de administración para reconstruir el resumen de ventas (ResumenVentasLote)
+desde Orden y Entrada. Corrige cualquier desvío de los totales incrementales.
+"""
+
+from django.core.management.base import BaseCommand
+from core.services_estadisticas import reconstruir_resumen_ventas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula ResumenVentasLote desde cero y corrige las diferencias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evento', type=int, help='Reconstruir solo los lotes de este evento')
+        parser.add_argument('--verificar', action='store_true', help='Solo informa las diferencias, sin corregirlas')
+
+    def handle(self, *args, **options):
+        diferencias = reconstruir_resumen_ventas(
+            evento_id=options['evento'], aplicar=not options['verificar']
+        )
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('El resumen de ventas está al día.'))
+            return
+
+        for d in diferencias:
+            self.stdout.write(f"  Lote {d['lote_id']:>6} {d['campo']:<20} resumen={d['resumen']}  real={d['real']}")
+
+        if options['verificar']:
+            self.stdout.write(self.style.WARNING(f'{len(diferencias)} diferencias encontradas (sin corregir).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(diferencias)} diferencias corregidas.'))
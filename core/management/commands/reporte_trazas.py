@@ -0,0 +1,55 @@
+"""
+Comando de administración que resume las trazas por orden: p50/p90/p99 y
+máximo de cada etapa (tramos e hitos derivados) en una ventana de tiempo.
+
+    python manage.py reporte_trazas                      # últimas 24 horas
+    python manage.py reporte_trazas --horas 2
+    python manage.py reporte_trazas --desde 2026-03-01T20:00 --hasta 2026-03-02T04:00 --json
+"""
+
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.trazas import percentiles_por_etapa
+
+
+class Command(BaseCommand):
+    help = 'Percentiles por etapa de las trazas de órdenes (reserva, pago, emisión, email).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=24, help='Ventana hacia atrás desde ahora (si no se pasa --desde)')
+        parser.add_argument('--desde', help='Inicio de la ventana (ISO 8601)')
+        parser.add_argument('--hasta', help='Fin de la ventana (ISO 8601, por defecto ahora)')
+        parser.add_argument('--json', action='store_true', help='Imprime solo el resultado en JSON')
+
+    def _fecha(self, valor):
+        fecha = parse_datetime(valor)
+        if fecha is None:
+            raise CommandError(f"Fecha inválida: {valor}")
+        return fecha if timezone.is_aware(fecha) else timezone.make_aware(fecha)
+
+    def handle(self, *args, **options):
+        hasta = self._fecha(options['hasta']) if options['hasta'] else timezone.now()
+        desde = self._fecha(options['desde']) if options['desde'] else hasta - timedelta(hours=options['horas'])
+        if desde >= hasta:
+            raise CommandError('--desde debe ser anterior a --hasta.')
+
+        reporte = percentiles_por_etapa(desde, hasta)
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, indent=2))
+            return
+
+        if not reporte:
+            self.stdout.write(self.style.WARNING('No hay tramos en la ventana.'))
+            return
+        self.stdout.write(f"Trazas entre {desde:%Y-%m-%d %H:%M} y {hasta:%Y-%m-%d %H:%M} (ms):")
+        self.stdout.write(f"  {'etapa':<28} {'cantidad':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+        for etapa, datos in reporte.items():
+            self.stdout.write(
+                f"  {etapa:<28} {datos['cantidad']:>8} {datos['p50']:>9.1f} {datos['p90']:>9.1f} "
+                f"{datos['p99']:>9.1f} {datos['max']:>9.1f}"
+            )
@@ -0,0 +1,147 @@
+"""
+Comando de administración que verifica con EXPLAIN que las consultas
+frecuentes usen índices y no recorran tablas grandes completas.
+
+Arma las mismas consultas que limpiar_reservas, verificar_stock,
+reconstruir_resumen_ventas, la cancelación, la exportación, el manifiesto de
+portería, Mis Entradas, la validación y los listados por defecto, con
+parámetros tomados de los datos, y falla si el plan de alguna hace un
+recorrido secuencial de sus tablas vigiladas. Con pocas filas el planificador
+prefiere recorrer la tabla, así que se corre sobre el volumen de benchmark:
+
+    python manage.py generar_datos_sinteticos
+    python manage.py verificar_planes_consultas [--json] [--planes]
+
+Soporta PostgreSQL ("Seq Scan on ...") y SQLite ("SCAN tabla" sin índice).
+"""
+
+import json
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from core.models import Lote, Orden, Entrada, MovimientoStock
+
+TABLAS = [Orden, Entrada, MovimientoStock]
+RECORRIDO = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    # "SCAN tabla" recorre la tabla; "SCAN tabla USING INDEX ..." recorre un índice en orden
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)(?:\s|$)'),
+}
+
+
+def _consultas(lote, cliente_id, codigo_corto, ultimo_movimiento):
+    """{nombre: (modelos vigilados, queryset)} con las consultas de cada camino."""
+    ahora = timezone.now()
+    evento_id = lote.evento_id
+    lotes_evento = list(Lote.objects.filter(evento_id=evento_id).values_list('id', flat=True))
+    return {
+        # limpiar_reservas y la métrica backyard_reservas_vencidas
+        'limpiar_reservas': ([Orden], Orden.objects.filter(estado='PENDIENTE', fecha_expiracion__lt=ahora)),
+        # services_stock.stock_real
+        'stock_real': ([Orden], Orden.objects.filter(
+            lote__in=[lote.id], estado__in=['PENDIENTE', 'APROBADO']
+        ).order_by().values('lote_id').annotate(total=Sum('cantidad_entradas'))),
+        # services_estadisticas: totales por lote desde las órdenes y las entradas
+        'resumen_ventas_ordenes': ([Orden], Orden.objects.filter(lote__in=lotes_evento).order_by().values(
+            'lote_id'
+        ).annotate(pendientes=Sum('cantidad_entradas', filter=Q(estado='PENDIENTE')))),
+        'resumen_ventas_entradas': ([Entrada], Entrada.objects.filter(lote__in=lotes_evento).order_by().values(
+            'lote_id'
+        ).annotate(ingresadas=Count('id', filter=Q(usada=True)))),
+        # services_reembolsos: órdenes a reembolsar y reservas a cortar al cancelar
+        'cancelacion_aprobadas': ([Orden], Orden.objects.filter(
+            evento_id=evento_id, estado='APROBADO', reembolso__isnull=True
+        ).order_by().values_list('id', 'monto_total')),
+        'cancelacion_pendientes': ([Orden], Orden.objects.filter(
+            evento_id=evento_id, estado='PENDIENTE'
+        ).values_list('id', flat=True)),
+        # services_exportacion.filas_lista_invitados (misma base que la búsqueda de asistentes)
+        'exportacion_invitados': ([Entrada], Entrada.objects.filter(
+            lote__evento_id__in=[evento_id], anulada=False
+        ).order_by('lote__evento__fecha_inicio', 'lote__evento_id', '-fecha_creacion').values_list(
+            'id', 'codigo_corto', 'cliente__nombre', 'cliente__apellido', 'lote__nombre', 'usada'
+        )),
+        # services_validacion: manifiesto incremental de portería
+        'manifiesto_puerta': ([Entrada], Entrada.objects.filter(
+            lote__evento_id=evento_id, fecha_modificacion__gt=ahora - timedelta(minutes=5)
+        ).values_list('id', 'usada', 'anulada', 'fecha_modificacion')),
+        # services_validacion: validación por código corto
+        'validacion_codigo': ([Entrada], Entrada.objects.filter(
+            codigo_corto=codigo_corto, usada=False, anulada=False
+        ).values_list('id', flat=True)),
+        # MisEntradasView (primera página)
+        'mis_entradas': ([Entrada], Entrada.objects.filter(cliente_id=cliente_id).select_related(
+            'lote__evento'
+        )[:20]),
+        # Orden por defecto del admin y los listados
+        'listado_ordenes': ([Orden], Orden.objects.all()[:50]),
+        'listado_entradas': ([Entrada], Entrada.objects.all()[:50]),
+        # services_stock: libro de un lote y movimientos nuevos de la verificación incremental
+        'libro_stock_lote': ([MovimientoStock], MovimientoStock.objects.filter(lote_id=lote.id)),
+        'verificar_stock': ([MovimientoStock], MovimientoStock.objects.filter(id__gt=ultimo_movimiento - 1000)),
+    }
+
+
+def _parametros():
+    # Un lote de venta mediana: ni el evento más grande ni uno vacío
+    lotes = Lote.objects.filter(cantidad_vendida__gt=0).order_by('cantidad_vendida', 'id')
+    lote = lotes[lotes.count() // 2]
+    cliente_id = Orden.objects.filter(lote=lote).order_by().values_list('cliente_id', flat=True).first()
+    codigo_corto = Entrada.objects.filter(lote=lote).order_by().values_list('codigo_corto', flat=True).first()
+    ultimo_movimiento = MovimientoStock.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    return lote, cliente_id, codigo_corto, ultimo_movimiento
+
+
+class Command(BaseCommand):
+    help = 'Falla si una consulta frecuente recorre completa una tabla grande según EXPLAIN (correr sobre datos de benchmark).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-ordenes', type=int, default=100_000,
+                            help='Órdenes mínimas para que los planes sean representativos')
+        parser.add_argument('--planes', action='store_true', help='Muestra el plan de todas las consultas')
+        parser.add_argument('--json', action='store_true', help='Imprime solo el resultado en JSON')
+
+    def handle(self, *args, **options):
+        patron = RECORRIDO.get(connection.vendor)
+        if patron is None:
+            raise CommandError(f"Base no soportada: {connection.vendor} (solo PostgreSQL y SQLite).")
+        ordenes = Orden.objects.count()
+        if ordenes < options['min_ordenes']:
+            raise CommandError(
+                f"Hay {ordenes} órdenes (mínimo {options['min_ordenes']}): con pocas filas los planes no son "
+                f"representativos. Generar datos con generar_datos_sinteticos."
+            )
+
+        # Estadísticas al día para que el planificador estime con los datos actuales
+        with connection.cursor() as cursor:
+            for modelo in TABLAS:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(modelo._meta.db_table)}')
+
+        resultado = {}
+        fallas = []
+        for nombre, (vigilados, consulta) in _consultas(*_parametros()).items():
+            plan = consulta.explain()
+            tablas = {modelo._meta.db_table for modelo in vigilados}
+            recorridas = sorted({tabla for tabla in patron.findall(plan) if tabla in tablas})
+            resultado[nombre] = {'recorridos': recorridas, 'plan': plan.splitlines()}
+            if recorridas:
+                fallas.append(f"{nombre}: recorrido secuencial de {', '.join(recorridas)}")
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, indent=2))
+        else:
+            for nombre, datos in resultado.items():
+                estado = self.style.ERROR('RECORRE ' + ', '.join(datos['recorridos'])) if datos['recorridos'] else 'ok'
+                self.stdout.write(f"  {nombre:<26} {estado}")
+                if options['planes'] or datos['recorridos']:
+                    for linea in datos['plan']:
+                        self.stdout.write(f"      {linea}")
+        if fallas:
+            raise CommandError('\n'.join(fallas))
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS(f"Ninguna consulta frecuente recorre tablas completas ({ordenes} órdenes)."))
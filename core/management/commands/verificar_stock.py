@@ -0,0 +1,47 @@
+"""
+Comando de administración para verificar Lote.cantidad_vendida contra el libro
+de movimientos de stock.
+
+    python manage.py verificar_stock              # incremental (CRON cada minuto)
+    python manage.py verificar_stock --reparar    # corrige los lotes con diferencias
+    python manage.py verificar_stock --completo   # recalcula todo desde las órdenes
+
+Termina con error si encuentra diferencias sin reparar, para que el CRON avise.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.services_stock import verificar_stock
+
+
+class Command(BaseCommand):
+    help = 'Verifica los contadores de stock de los lotes contra el libro de movimientos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Corrige el contador al stock real (bajo lock del lote)')
+        parser.add_argument('--completo', action='store_true', help='Recalcula desde todas las órdenes y rehace los saldos')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        resultado = verificar_stock(reparar=options['reparar'], completo=options['completo'])
+        duracion = (time.perf_counter() - inicio) * 1000
+
+        self.stdout.write(
+            f"{resultado['lotes']} lotes, {resultado['movimientos']} movimientos nuevos verificados en {duracion:.0f} ms."
+        )
+        for orden in resultado['ordenes_inconsistentes']:
+            self.stdout.write(self.style.WARNING(
+                f"  Orden {orden['orden_id']} ({orden['estado']}): el libro suma {orden['libro']}"
+            ))
+        for diferencia in resultado['diferencias']:
+            estilo = self.style.SUCCESS if diferencia.get('reparado') else self.style.ERROR
+            self.stdout.write(estilo(
+                f"  Lote {diferencia['lote_id']}: contador {diferencia['contador']}, libro {diferencia['libro']}, "
+                f"real {diferencia['real']}{' -> reparado' if diferencia.get('reparado') else ''}"
+            ))
+
+        sin_reparar = [d for d in resultado['diferencias'] if not d.get('reparado')]
+        if sin_reparar:
+            raise CommandError(f"{len(sin_reparar)} lotes con stock inconsistente (use --reparar).")
+        self.stdout.write(self.style.SUCCESS("Stock consistente."))
@@ -0,0 +1,94 @@
+"""
+Middlewares de Backyard Bar.
+"""
+
+import random
+import threading
+
+from django.conf import settings
+
+from .authentication import DualJWTAuthentication
+from .consultas import contar_consultas
+from .instrumentacion import HTTP_CONSULTAS_SQL, HTTP_SQL_SEGUNDOS
+from .perfilado import Muestreador, guardar_perfil
+
+
+class ConsultasSQLMiddleware:
+    """
+    Cuenta las consultas SQL y el tiempo en base de datos de cada request.
+
+    Siempre alimenta las métricas backyard_http_consultas_sql y
+    backyard_http_sql_segundos (por nombre de ruta); con DEBUG además agrega
+    las cabeceras X-Consultas-SQL y X-Tiempo-SQL-ms a la respuesta. Las
+    consultas lentas se registran en el log (ver core.consultas).
+
+    En un stream (SSE, exportaciones) solo se cuenta lo previo a la respuesta.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with contar_consultas(contexto=f"{request.method} {request.path}") as contador:
+            response = self.get_response(request)
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = (coincidencia.view_name if coincidencia else None) or 'sin_ruta'
+        HTTP_CONSULTAS_SQL.labels(vista=vista).observe(contador.cantidad)
+        HTTP_SQL_SEGUNDOS.labels(vista=vista).observe(contador.segundos)
+
+        if settings.DEBUG:
+            response['X-Consultas-SQL'] = str(contador.cantidad)
+            response['X-Tiempo-SQL-ms'] = f"{contador.segundos * 1000:.1f}"
+        return response
+
+
+class PerfiladoMiddleware:
+    """
+    Perfila por muestreo las vistas elegidas (ver core.perfilado) y agrega
+    la cabecera X-Perfil con el nombre de la captura.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            muestreador = getattr(request, '_muestreador', None)
+            if muestreador is not None:
+                muestreador.detener()
+
+        if muestreador is not None:
+            response['X-Perfil'] = guardar_perfil(
+                muestreador, request, response, request.resolver_match.url_name or 'sin_nombre'
+            )
+        return response
+
+    def _es_staff(self, request):
+        # El JWT se valida recién en la vista (DRF): acá solo si se pidió el perfil
+        try:
+            autenticado = DualJWTAuthentication().authenticate(request)
+        except Exception:
+            return False
+        return bool(autenticado) and getattr(autenticado[0], 'is_staff', False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        forzado = 'HTTP_X_PERFILAR' in request.META
+        if not forzado and not settings.PERFILADO_ACTIVO:
+            return None
+
+        if forzado:
+            if not self._es_staff(request):
+                return None
+        elif (
+            request.resolver_match.url_name not in settings.PERFILADO_RUTAS
+            or random.random() >= settings.PERFILADO_FRACCION
+        ):
+            return None
+
+        request._muestreador = Muestreador(
+            threading.get_ident(), settings.PERFILADO_INTERVALO_MS / 1000
+        ).iniciar()
+        return None
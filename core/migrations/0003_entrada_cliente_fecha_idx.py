@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_entrada_imagen_qr'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entrada',
+            index=models.Index(fields=['cliente', '-fecha_creacion'], name='entrada_cliente_fecha_idx'),
+        ),
+    ]
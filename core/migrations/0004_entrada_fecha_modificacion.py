@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_entrada_cliente_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrada',
+            name='fecha_modificacion',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Fecha de Modificación'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:39
+
+from django.db import migrations, models, transaction
+
+LOTE_BACKFILL = 2000
+
+
+def backfill_codigos_cortos(apps, schema_editor):
+    """
+    Asigna a las entradas existentes el mismo código que ya figura en sus emails
+    (primeros 8 hex del UUID). Procesa en lotes para no cargar toda la tabla;
+    ante una colisión alarga el prefijo del UUID. Cada lote es su propia
+    transacción: no se bloquea toda la tabla hasta el final y, si se corta,
+    la migración retoma desde las entradas que siguen sin código.
+    """
+    Entrada = apps.get_model('core', 'Entrada')
+
+    while True:
+        with transaction.atomic():
+            if not _backfill_lote(Entrada):
+                break
+
+
+def _backfill_lote(Entrada):
+    """Asigna códigos a un lote de entradas. Retorna False si no quedaban entradas sin código."""
+    lote = list(Entrada.objects.filter(codigo_corto__isnull=True).order_by('id').only('id')[:LOTE_BACKFILL])
+    if not lote:
+        return False
+
+    pendientes = {e.id: 8 for e in lote}
+    por_id = {e.id: e for e in lote}
+    # Códigos ya tomados en este lote (todavía no están en la base)
+    asignados = set()
+    while pendientes:
+        codigos = {entrada_id: entrada_id.hex[:largo].upper() for entrada_id, largo in pendientes.items()}
+        ocupados = set(
+            Entrada.objects.filter(codigo_corto__in=codigos.values()).values_list('codigo_corto', flat=True)
+        )
+        siguientes = {}
+        for entrada_id, codigo in codigos.items():
+            if codigo in ocupados or codigo in asignados:
+                siguientes[entrada_id] = pendientes[entrada_id] + 2
+            else:
+                asignados.add(codigo)
+                por_id[entrada_id].codigo_corto = codigo
+        pendientes = siguientes
+
+    Entrada.objects.bulk_update(lote, ['codigo_corto'], batch_size=500)
+    return True
+
+
+class Migration(migrations.Migration):
+    # El backfill hace commit por lote (ver backfill_codigos_cortos)
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_entrada_fecha_modificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrada',
+            name='codigo_corto',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True, unique=True, verbose_name='Código Corto'),
+        ),
+        migrations.RunPython(backfill_codigos_cortos, migrations.RunPython.noop),
+    ]
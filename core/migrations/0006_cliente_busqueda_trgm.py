@@ -0,0 +1,41 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Índices GIN trigram para la búsqueda de asistentes. Solo PostgreSQL: resuelven
+# el ILIKE 'x%' de __iprefijo y el operador % de __trigram_similar. La cédula se
+# indexa sin puntos ni guiones, igual que la compara buscar_asistentes.
+INDICES_TRGM = {
+    'cliente_apellido_trgm_idx': 'apellido',
+    'cliente_nombre_trgm_idx': 'nombre',
+    'cliente_email_trgm_idx': 'email',
+    'cliente_cedula_trgm_idx': "(REPLACE(REPLACE(cedula, '.', ''), '-', ''))",
+}
+
+
+def crear_indices_trgm(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, expresion in INDICES_TRGM.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON core_cliente USING gin ({expresion} gin_trgm_ops)'
+        )
+
+
+def borrar_indices_trgm(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre in INDICES_TRGM:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_entrada_codigo_corto'),
+    ]
+
+    operations = [
+        # CREATE EXTENSION pg_trgm (no hace nada fuera de PostgreSQL)
+        TrigramExtension(),
+        migrations.RunPython(crear_indices_trgm, borrar_indices_trgm),
+    ]
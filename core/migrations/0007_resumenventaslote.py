@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:46
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def poblar_resumenes(apps, schema_editor):
+    """Calcula el resumen inicial de cada lote con dos consultas agrupadas."""
+    Lote = apps.get_model('core', 'Lote')
+    Orden = apps.get_model('core', 'Orden')
+    Entrada = apps.get_model('core', 'Entrada')
+    ResumenVentasLote = apps.get_model('core', 'ResumenVentasLote')
+
+    resumenes = {
+        lote_id: ResumenVentasLote(lote_id=lote_id, evento_id=evento_id)
+        for lote_id, evento_id in Lote.objects.values_list('id', 'evento_id')
+    }
+
+    for fila in Entrada.objects.order_by().values('lote_id').annotate(
+        vendidas=Count('id'), ingresadas=Count('id', filter=Q(usada=True))
+    ):
+        resumenes[fila['lote_id']].vendidas = fila['vendidas']
+        resumenes[fila['lote_id']].ingresadas = fila['ingresadas']
+
+    for fila in Orden.objects.order_by().values('lote_id').annotate(
+        reservas_pendientes=Sum('cantidad_entradas', filter=Q(estado='PENDIENTE')),
+        recaudado=Sum('monto_total', filter=Q(estado='APROBADO')),
+        comision=Sum('monto_comision', filter=Q(estado='APROBADO')),
+    ):
+        resumen = resumenes[fila['lote_id']]
+        resumen.reservas_pendientes = fila['reservas_pendientes'] or 0
+        resumen.recaudado = fila['recaudado'] or Decimal('0')
+        resumen.comision = fila['comision'] or Decimal('0')
+
+    ResumenVentasLote.objects.bulk_create(resumenes.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_cliente_busqueda_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentasLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vendidas', models.IntegerField(default=0, verbose_name='Entradas Emitidas')),
+                ('ingresadas', models.IntegerField(default=0, verbose_name='Entradas Usadas')),
+                ('reservas_pendientes', models.IntegerField(default=0, verbose_name='Reservas Pendientes')),
+                ('recaudado', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Recaudado')),
+                ('comision', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Comisión')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Modificación')),
+                ('evento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_ventas', to='core.evento', verbose_name='Evento')),
+                ('lote', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resumen', to='core.lote', verbose_name='Lote')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Ventas',
+                'verbose_name_plural': 'Resúmenes de Ventas',
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:48
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_metricas(apps, schema_editor):
+    """
+    Buckets por minuto de las aprobaciones e ingresos históricos. El comando
+    consolidar_metricas los lleva a horas / días y purga los minutos viejos.
+    """
+    Orden = apps.get_model('core', 'Orden')
+    Entrada = apps.get_model('core', 'Entrada')
+    MetricaLote = apps.get_model('core', 'MetricaLote')
+
+    buckets = defaultdict(lambda: {'vendidas': 0, 'recaudado': Decimal('0'), 'ingresadas': 0})
+
+    def minuto(fecha):
+        return timezone.localtime(fecha).replace(second=0, microsecond=0)
+
+    for lote_id, evento_id, fecha, cantidad, monto in Orden.objects.filter(
+        estado='APROBADO', fecha_aprobacion__isnull=False
+    ).values_list('lote_id', 'evento_id', 'fecha_aprobacion', 'cantidad_entradas', 'monto_total').iterator(chunk_size=5000):
+        bucket = buckets[(lote_id, evento_id, minuto(fecha))]
+        bucket['vendidas'] += cantidad
+        bucket['recaudado'] += monto
+
+    for lote_id, evento_id, fecha in Entrada.objects.filter(
+        usada=True, fecha_uso__isnull=False
+    ).values_list('lote_id', 'lote__evento_id', 'fecha_uso').iterator(chunk_size=5000):
+        buckets[(lote_id, evento_id, minuto(fecha))]['ingresadas'] += 1
+
+    MetricaLote.objects.bulk_create(
+        [
+            MetricaLote(lote_id=lote_id, evento_id=evento_id, granularidad='MINUTO', inicio=inicio, **valores)
+            for (lote_id, evento_id, inicio), valores in buckets.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_resumenventaslote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidad', models.CharField(choices=[('MINUTO', 'Minuto'), ('HORA', 'Hora'), ('DIA', 'Día')], max_length=6, verbose_name='Granularidad')),
+                ('inicio', models.DateTimeField(verbose_name='Inicio del Intervalo')),
+                ('vendidas', models.IntegerField(default=0, verbose_name='Entradas Vendidas')),
+                ('recaudado', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Recaudado')),
+                ('ingresadas', models.IntegerField(default=0, verbose_name='Ingresos')),
+                ('evento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metricas', to='core.evento', verbose_name='Evento')),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metricas', to='core.lote', verbose_name='Lote')),
+            ],
+            options={
+                'verbose_name': 'Métrica de Lote',
+                'verbose_name_plural': 'Métricas de Lotes',
+                'indexes': [models.Index(fields=['evento', 'granularidad', 'inicio'], name='metrica_evento_serie_idx')],
+                'unique_together': {('lote', 'granularidad', 'inicio')},
+            },
+        ),
+        migrations.RunPython(poblar_metricas, migrations.RunPython.noop),
+    ]
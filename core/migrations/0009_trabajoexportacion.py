@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:56
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_metricalote'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoExportacion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('evento_ids', models.JSONField(verbose_name='Eventos')),
+                ('formato', models.CharField(default='csv', max_length=10, verbose_name='Formato')),
+                ('gzip', models.BooleanField(default=False, verbose_name='Comprimido')),
+                ('clave', models.CharField(db_index=True, max_length=64, verbose_name='Clave del Archivo')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En Proceso'), ('LISTO', 'Listo'), ('ERROR', 'Error'), ('VENCIDO', 'Vencido')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('filas_totales', models.PositiveIntegerField(default=0, verbose_name='Filas Totales')),
+                ('filas_procesadas', models.PositiveIntegerField(default=0, verbose_name='Filas Procesadas')),
+                ('archivo', models.CharField(blank=True, max_length=255, verbose_name='Archivo')),
+                ('tamano', models.BigIntegerField(default=0, verbose_name='Tamaño (bytes)')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Modificación')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Finalización')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Exportación',
+                'verbose_name_plural': 'Trabajos de Exportación',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_trabajoexportacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orden',
+            name='etiqueta',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Etiqueta'),
+        ),
+        migrations.AddField(
+            model_name='orden',
+            name='origen',
+            field=models.CharField(choices=[('COMPRA', 'Compra'), ('CORTESIA', 'Cortesía')], default='COMPRA', max_length=20, verbose_name='Origen'),
+        ),
+        migrations.AlterField(
+            model_name='cliente',
+            name='fecha_nacimiento',
+            field=models.DateField(blank=True, null=True, verbose_name='Fecha de Nacimiento'),
+        ),
+    ]
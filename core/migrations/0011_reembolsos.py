@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_orden_origen_cortesias'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrada',
+            name='anulada',
+            field=models.BooleanField(default=False, verbose_name='Anulada'),
+        ),
+        migrations.AlterField(
+            model_name='orden',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('APROBADO', 'Aprobado'), ('RECHAZADO', 'Rechazado'), ('EXPIRADO', 'Expirado'), ('REEMBOLSADO', 'Reembolsado')], default='PENDIENTE', max_length=20, verbose_name='Estado'),
+        ),
+        migrations.CreateModel(
+            name='CancelacionEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('motivo', models.TextField(blank=True, verbose_name='Motivo')),
+                ('estado', models.CharField(choices=[('EN_PROCESO', 'En Proceso'), ('COMPLETADA', 'Completada'), ('CON_ERRORES', 'Con Errores')], default='EN_PROCESO', max_length=20, verbose_name='Estado')),
+                ('ordenes_totales', models.PositiveIntegerField(default=0, verbose_name='Órdenes a Reembolsar')),
+                ('reembolsadas', models.PositiveIntegerField(default=0, verbose_name='Órdenes Reembolsadas')),
+                ('errores', models.PositiveIntegerField(default=0, verbose_name='Órdenes con Error')),
+                ('monto_reembolsado', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Monto Reembolsado')),
+                ('emails_enviados', models.PositiveIntegerField(default=0, verbose_name='Emails Enviados')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Modificación')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Finalización')),
+                ('evento', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='cancelacion', to='core.evento', verbose_name='Evento')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Cancelación de Evento',
+                'verbose_name_plural': 'Cancelaciones de Eventos',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Reembolso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En Proceso'), ('REEMBOLSADO', 'Reembolsado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Monto')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('mp_refund_id', models.CharField(blank=True, max_length=100, verbose_name='Refund ID (MP)')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('email_enviado', models.BooleanField(default=False, verbose_name='Email Enviado')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Modificación')),
+                ('cancelacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reembolsos', to='core.cancelacionevento', verbose_name='Cancelación')),
+                ('orden', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='reembolso', to='core.orden', verbose_name='Orden')),
+            ],
+            options={
+                'verbose_name': 'Reembolso',
+                'verbose_name_plural': 'Reembolsos',
+                'indexes': [models.Index(fields=['cancelacion', 'estado'], name='reembolso_cancelacion_idx')],
+            },
+        ),
+    ]
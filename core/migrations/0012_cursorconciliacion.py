@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_reembolsos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CursorConciliacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True, verbose_name='Nombre')),
+                ('fecha_cursor', models.DateTimeField(blank=True, null=True, verbose_name='Último Pago Procesado')),
+                ('resultado', models.JSONField(blank=True, default=dict, verbose_name='Última Ejecución')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Modificación')),
+            ],
+            options={
+                'verbose_name': 'Cursor de Conciliación',
+                'verbose_name_plural': 'Cursores de Conciliación',
+            },
+        ),
+    ]
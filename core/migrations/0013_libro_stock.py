@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def saldo_inicial(apps, schema_editor):
+    """Un movimiento INICIAL por lote con el contador actual: el libro arranca cerrando."""
+    Lote = apps.get_model('core', 'Lote')
+    MovimientoStock = apps.get_model('core', 'MovimientoStock')
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(lote_id=lote_id, cantidad=vendida, motivo='INICIAL')
+        for lote_id, vendida in Lote.objects.filter(cantidad_vendida__gt=0).values_list('id', 'cantidad_vendida')
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_cursorconciliacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuntoControlStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True, verbose_name='Nombre')),
+                ('movimiento_hasta', models.BigIntegerField(default=0, verbose_name='Último Movimiento Sumado')),
+                ('resultado', models.JSONField(blank=True, default=dict, verbose_name='Última Verificación')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Modificación')),
+            ],
+            options={
+                'verbose_name': 'Punto de Control de Stock',
+                'verbose_name_plural': 'Puntos de Control de Stock',
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoStockLote',
+            fields=[
+                ('lote', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='saldo_stock', serialize=False, to='core.lote', verbose_name='Lote')),
+                ('saldo', models.IntegerField(default=0, verbose_name='Saldo')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Stock',
+                'verbose_name_plural': 'Saldos de Stock',
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField(verbose_name='Cantidad')),
+                ('motivo', models.CharField(choices=[('INICIAL', 'Saldo inicial'), ('RESERVA', 'Reserva'), ('CORTESIA', 'Cortesía'), ('PAGO_TARDIO', 'Pago de orden vencida'), ('RECHAZO', 'Pago rechazado'), ('EXPIRACION', 'Reserva expirada'), ('REEMBOLSO', 'Reembolso'), ('AJUSTE', 'Ajuste por verificación')], max_length=20, verbose_name='Motivo')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_stock', to='core.lote', verbose_name='Lote')),
+                ('orden', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos_stock', to='core.orden', verbose_name='Orden')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Stock',
+                'verbose_name_plural': 'Movimientos de Stock',
+            },
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:14
+
+from django.db import migrations, models
+
+# Índices de las consultas frecuentes (ver verificar_planes_consultas). En
+# PostgreSQL se crean con CREATE INDEX CONCURRENTLY para no bloquear las
+# escrituras de órdenes y entradas mientras se construyen sobre tablas grandes;
+# por eso la migración no es atómica.
+INDICES = [
+    ('entrada', models.Index(
+        condition=models.Q(('anulada', False)), fields=['lote', 'usada'], name='entrada_lote_vigente_idx'
+    )),
+    ('entrada', models.Index(fields=['-fecha_creacion'], name='entrada_fecha_creacion_idx')),
+    ('orden', models.Index(
+        condition=models.Q(('estado', 'PENDIENTE')), fields=['fecha_expiracion'], name='orden_pendiente_vence_idx'
+    )),
+    ('orden', models.Index(fields=['lote', 'estado'], name='orden_lote_estado_idx')),
+    ('orden', models.Index(fields=['evento', 'estado'], name='orden_evento_estado_idx')),
+    ('orden', models.Index(fields=['-fecha_creacion'], name='orden_fecha_creacion_idx')),
+]
+
+
+def _opciones(schema_editor):
+    return {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+
+
+def crear_indices(apps, schema_editor):
+    for modelo, indice in INDICES:
+        schema_editor.add_index(apps.get_model('core', modelo), indice, **_opciones(schema_editor))
+
+
+def borrar_indices(apps, schema_editor):
+    for modelo, indice in INDICES:
+        schema_editor.remove_index(apps.get_model('core', modelo), indice, **_opciones(schema_editor))
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_libro_stock'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name=modelo, index=indice) for modelo, indice in INDICES],
+            database_operations=[migrations.RunPython(crear_indices, borrar_indices)],
+        ),
+    ]
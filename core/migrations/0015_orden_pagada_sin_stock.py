@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orden',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('APROBADO', 'Aprobado'), ('RECHAZADO', 'Rechazado'), ('EXPIRADO', 'Expirado'), ('REEMBOLSADO', 'Reembolsado'), ('PAGADA_SIN_STOCK', 'Pagada sin Stock')], default='PENDIENTE', max_length=20, verbose_name='Estado'),
+        ),
+    ]
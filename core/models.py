@@ -6,9 +6,16 @@ MÓDULOS:
 - Usuarios: Cliente (compradores finales, autenticación independiente)
 - Eventos: Evento, Lote (sistema de precios escalonados)
 - Ventas: Orden (reservas y pagos), Entrada (tickets finales con QR)
+- Estadísticas: ResumenVentasLote (totales por lote para el dashboard),
+  MetricaLote (series temporales por minuto / hora / día)
+- Exportaciones: TrabajoExportacion (listas de invitados generadas en segundo plano)
+- Reembolsos: CancelacionEvento, Reembolso (devolución masiva al cancelar un evento)
+- Conciliación: CursorConciliacion (avance de la conciliación de pagos con Mercado Pago)
+- Stock: MovimientoStock (libro de movimientos de cantidad_vendida), SaldoStockLote y
+  PuntoControlStock (verificación incremental del libro contra los contadores)
 """
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.hashers import make_password, check_password
 import uuid
 from django.utils import timezone
@@ -28,7 +35,8 @@ class Cliente(models.Model):
     cedula = models.CharField(max_length=20, unique=True, db_index=True, verbose_name="Cédula")
     nombre = models.CharField(max_length=100, verbose_name="Nombre")
     apellido = models.CharField(max_length=100, verbose_name="Apellido")
-    fecha_nacimiento = models.DateField(verbose_name="Fecha de Nacimiento")
+    # Opcional solo para invitados cargados por el staff (cortesías); el registro la exige
+    fecha_nacimiento = models.DateField(null=True, blank=True, verbose_name="Fecha de Nacimiento")
     email = models.EmailField(unique=True, db_index=True, verbose_name="Email")
     telefono = models.CharField(max_length=20, verbose_name="Teléfono")
     password = models.CharField(max_length=128, verbose_name="Contraseña")  # Almacena hash
@@ -90,8 +98,11 @@ class Evento(models.Model):
     
     @property
     def stock_total_disponible(self):
-        """Retorna el stock total disponible sumando todos los lotes activos"""
-        return sum(lote.stock_disponible for lote in self.lotes.filter(activo=True))
+        """
+        Retorna el stock total disponible sumando todos los lotes activos.
+        Usa los lotes precargados (prefetch_related('lotes')) si los hay.
+        """
+        return sum(lote.stock_disponible for lote in self.lotes.all() if lote.activo)
 
 
 class Lote(models.Model):
@@ -153,12 +164,24 @@ class Orden(models.Model):
     - APROBADO: Pago confirmado, se generaron las entradas
     - RECHAZADO: Pago fallido, stock liberado
     - EXPIRADO: Tiempo agotado, stock liberado automáticamente
+    - REEMBOLSADO: Pago devuelto (evento cancelado), entradas anuladas y stock liberado
+    - PAGADA_SIN_STOCK: Pagó después de vencer y el stock ya se vendió; sin entradas, a revisar o reembolsar
+    
+    Origen:
+    - COMPRA: compra del sitio pagada con Mercado Pago
+    - CORTESIA: emitida por el staff sin pago (cortesías, listas de promotores)
     """
     ESTADOS = [
         ('PENDIENTE', 'Pendiente'),
         ('APROBADO', 'Aprobado'),
         ('RECHAZADO', 'Rechazado'),
         ('EXPIRADO', 'Expirado'),
+        ('REEMBOLSADO', 'Reembolsado'),
+        ('PAGADA_SIN_STOCK', 'Pagada sin Stock'),
+    ]
+    ORIGENES = [
+        ('COMPRA', 'Compra'),
+        ('CORTESIA', 'Cortesía'),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -191,6 +214,9 @@ class Orden(models.Model):
     monto_total = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Monto Total")
     
     estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE', verbose_name="Estado")
+    origen = models.CharField(max_length=20, choices=ORIGENES, default='COMPRA', verbose_name="Origen")
+    # Lista o promotor de una emisión de cortesías
+    etiqueta = models.CharField(max_length=100, blank=True, verbose_name="Etiqueta")
     
     # Integración con Mercado Pago
     mp_preference_id = models.CharField(max_length=100, blank=True, null=True, verbose_name="Preference ID (MP)")
@@ -205,6 +231,18 @@ class Orden(models.Model):
         verbose_name = "Orden"
         verbose_name_plural = "Órdenes"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # limpiar_reservas y la métrica de reservas vencidas: solo las pendientes, por vencimiento
+            models.Index(
+                fields=['fecha_expiracion'], condition=models.Q(estado='PENDIENTE'), name='orden_pendiente_vence_idx'
+            ),
+            # Stock real y totales por lote (verificar_stock, reconstruir_resumen_ventas)
+            models.Index(fields=['lote', 'estado'], name='orden_lote_estado_idx'),
+            # Órdenes de un evento por estado (cancelación y reembolsos)
+            models.Index(fields=['evento', 'estado'], name='orden_evento_estado_idx'),
+            # Orden por defecto (admin y listados)
+            models.Index(fields=['-fecha_creacion'], name='orden_fecha_creacion_idx'),
+        ]
 
     def __str__(self):
         return f"Orden {self.id} - {self.cliente.nombre} - {self.estado}"
@@ -244,8 +282,15 @@ class Entrada(models.Model):
         verbose_name="Lote"
     )
     
+    # Código impreso en emails y listas (prefijo del UUID) para búsqueda manual en la puerta
+    codigo_corto = models.CharField(
+        max_length=12, unique=True, null=True, blank=True, editable=False, verbose_name="Código Corto"
+    )
+    
     # Control de uso
     usada = models.BooleanField(default=False, verbose_name="Usada")
+    # Anulada por el reembolso de su orden: no permite ingresar
+    anulada = models.BooleanField(default=False, verbose_name="Anulada")
     fecha_uso = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Uso")
     
     # Imagen del QR persistida
@@ -261,11 +306,21 @@ class Entrada(models.Model):
     )
     
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    # Cursor del manifiesto offline de portería: cambia con cada alta o check-in
+    fecha_modificacion = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Fecha de Modificación")
 
     class Meta:
         verbose_name = "Entrada"
         verbose_name_plural = "Entradas"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Mis Entradas: filtro por cliente + paginación keyset por fecha
+            models.Index(fields=['cliente', '-fecha_creacion'], name='entrada_cliente_fecha_idx'),
+            # Entradas vigentes de un evento (exportación, búsqueda de asistentes) y conteo de ingresos por lote
+            models.Index(fields=['lote', 'usada'], condition=models.Q(anulada=False), name='entrada_lote_vigente_idx'),
+            # Orden por defecto (admin y listados)
+            models.Index(fields=['-fecha_creacion'], name='entrada_fecha_creacion_idx'),
+        ]
 
     def __str__(self):
         return f"Entrada {self.id} - {self.cliente.nombre} - {'Usada' if self.usada else 'Disponible'}"
@@ -275,9 +330,458 @@ class Entrada(models.Model):
         """Retorna el código que se debe usar para generar el QR"""
         return str(self.id)
     
+    def save(self, *args, **kwargs):
+        if not self.codigo_corto:
+            asignar_codigos_cortos([self])
+            if 'update_fields' in kwargs and kwargs['update_fields'] is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'codigo_corto'}
+        super().save(*args, **kwargs)
+    
     def marcar_como_usada(self, usuario_validador=None):
         """Marca la entrada como usada"""
         self.usada = True
         self.fecha_uso = timezone.now()
         self.usuario_validador = usuario_validador
-        self.save()
+        self.save(update_fields=['usada', 'fecha_uso', 'usuario_validador', 'fecha_modificacion'])
+
+
+# ===================================
+# MÓDULO DE ESTADÍSTICAS
+# ===================================
+
+class ResumenVentasLote(models.Model):
+    """
+    Totales de ventas de un lote, mantenidos en las mismas transacciones que
+    cambian órdenes y entradas (ver services_estadisticas.ajustar_resumen_ventas).
+    El dashboard lee de acá en lugar de agregar toda la historia de Orden/Entrada.
+    Se reconstruye desde cero con `manage.py reconstruir_resumen_ventas`.
+    """
+    lote = models.OneToOneField(
+        Lote,
+        related_name='resumen',
+        on_delete=models.CASCADE,
+        verbose_name="Lote"
+    )
+    evento = models.ForeignKey(
+        Evento,
+        related_name='resumenes_ventas',
+        on_delete=models.CASCADE,
+        verbose_name="Evento"
+    )
+
+    # IntegerField (sin CHECK >= 0): un desvío no debe hacer fallar una compra o un check-in
+    vendidas = models.IntegerField(default=0, verbose_name="Entradas Emitidas")
+    ingresadas = models.IntegerField(default=0, verbose_name="Entradas Usadas")
+    reservas_pendientes = models.IntegerField(default=0, verbose_name="Reservas Pendientes")
+    recaudado = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Recaudado")
+    comision = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Comisión")
+
+    fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Modificación")
+
+    class Meta:
+        verbose_name = "Resumen de Ventas"
+        verbose_name_plural = "Resúmenes de Ventas"
+
+    def __str__(self):
+        return f"Resumen {self.lote} - {self.vendidas} vendidas"
+
+
+class MetricaLote(models.Model):
+    """
+    Contadores de un lote en un intervalo de tiempo (bucket).
+    Se escriben por MINUTO en cada aprobación y check-in; el comando
+    consolidar_metricas los agrega en HORA y DIA y purga los vencidos
+    (ver services_metricas).
+    """
+    GRANULARIDADES = [
+        ('MINUTO', 'Minuto'),
+        ('HORA', 'Hora'),
+        ('DIA', 'Día'),
+    ]
+
+    lote = models.ForeignKey(
+        Lote,
+        related_name='metricas',
+        on_delete=models.CASCADE,
+        verbose_name="Lote"
+    )
+    evento = models.ForeignKey(
+        Evento,
+        related_name='metricas',
+        on_delete=models.CASCADE,
+        verbose_name="Evento"
+    )
+    granularidad = models.CharField(max_length=6, choices=GRANULARIDADES, verbose_name="Granularidad")
+    inicio = models.DateTimeField(verbose_name="Inicio del Intervalo")
+
+    vendidas = models.IntegerField(default=0, verbose_name="Entradas Vendidas")
+    recaudado = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Recaudado")
+    ingresadas = models.IntegerField(default=0, verbose_name="Ingresos")
+
+    class Meta:
+        verbose_name = "Métrica de Lote"
+        verbose_name_plural = "Métricas de Lotes"
+        unique_together = [['lote', 'granularidad', 'inicio']]
+        indexes = [
+            # Series del endpoint de staff: evento + granularidad + rango de fechas
+            models.Index(fields=['evento', 'granularidad', 'inicio'], name='metrica_evento_serie_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.lote} {self.granularidad} {self.inicio:%Y-%m-%d %H:%M}"
+
+
+# ===================================
+# MÓDULO DE EXPORTACIONES
+# ===================================
+
+class TrabajoExportacion(models.Model):
+    """
+    Exportación de la lista de invitados generada en segundo plano.
+    El archivo queda en settings.EXPORTACIONES_DIR (fuera de MEDIA, tiene datos
+    personales) y se reutiliza mientras `clave` (eventos + formato + versión de
+    los datos) no cambie. Ver services_exportacion.
+    """
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En Proceso'),
+        ('LISTO', 'Listo'),
+        ('ERROR', 'Error'),
+        ('VENCIDO', 'Vencido'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    evento_ids = models.JSONField(verbose_name="Eventos")
+    formato = models.CharField(max_length=10, default='csv', verbose_name="Formato")
+    gzip = models.BooleanField(default=False, verbose_name="Comprimido")
+    # sha256 de eventos + formato + gzip + versión de los datos
+    clave = models.CharField(max_length=64, db_index=True, verbose_name="Clave del Archivo")
+
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE', verbose_name="Estado")
+    filas_totales = models.PositiveIntegerField(default=0, verbose_name="Filas Totales")
+    filas_procesadas = models.PositiveIntegerField(default=0, verbose_name="Filas Procesadas")
+    archivo = models.CharField(max_length=255, blank=True, verbose_name="Archivo")
+    tamano = models.BigIntegerField(default=0, verbose_name="Tamaño (bytes)")
+    error = models.TextField(blank=True, verbose_name="Error")
+
+    solicitado_por = models.ForeignKey(
+        'auth.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Solicitado por"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    # Latido del trabajo: se actualiza con el progreso (detecta trabajos colgados)
+    fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Modificación")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Finalización")
+
+    class Meta:
+        verbose_name = "Trabajo de Exportación"
+        verbose_name_plural = "Trabajos de Exportación"
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Exportación {self.id} - {self.estado}"
+
+    @property
+    def progreso(self):
+        """Porcentaje de filas escritas (0-100)"""
+        if self.estado == 'LISTO':
+            return 100
+        if not self.filas_totales:
+            return 0
+        return min(99, int(self.filas_procesadas * 100 / self.filas_totales))
+
+
+# ===================================
+# MÓDULO DE REEMBOLSOS
+# ===================================
+
+class CancelacionEvento(models.Model):
+    """
+    Cancelación de un evento y progreso del reembolso masivo de sus órdenes
+    APROBADAS (ver services_reembolsos). Los contadores se actualizan en cada
+    tanda; fecha_modificacion sirve de latido para retomar un proceso cortado.
+    """
+    ESTADOS = [
+        ('EN_PROCESO', 'En Proceso'),
+        ('COMPLETADA', 'Completada'),
+        ('CON_ERRORES', 'Con Errores'),
+    ]
+
+    evento = models.OneToOneField(
+        Evento,
+        related_name='cancelacion',
+        on_delete=models.PROTECT,
+        verbose_name="Evento"
+    )
+    motivo = models.TextField(blank=True, verbose_name="Motivo")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='EN_PROCESO', verbose_name="Estado")
+
+    ordenes_totales = models.PositiveIntegerField(default=0, verbose_name="Órdenes a Reembolsar")
+    reembolsadas = models.PositiveIntegerField(default=0, verbose_name="Órdenes Reembolsadas")
+    errores = models.PositiveIntegerField(default=0, verbose_name="Órdenes con Error")
+    monto_reembolsado = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Monto Reembolsado")
+    emails_enviados = models.PositiveIntegerField(default=0, verbose_name="Emails Enviados")
+
+    solicitado_por = models.ForeignKey(
+        'auth.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Solicitado por"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Modificación")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Finalización")
+
+    class Meta:
+        verbose_name = "Cancelación de Evento"
+        verbose_name_plural = "Cancelaciones de Eventos"
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Cancelación {self.evento} - {self.estado}"
+
+    @property
+    def progreso(self):
+        """Porcentaje de órdenes procesadas (reembolsadas o con error definitivo)"""
+        if not self.ordenes_totales:
+            return 100 if self.estado != 'EN_PROCESO' else 0
+        return min(100, int((self.reembolsadas + self.errores) * 100 / self.ordenes_totales))
+
+
+class Reembolso(models.Model):
+    """
+    Estado del reembolso de una orden. La clave de idempotencia enviada a
+    Mercado Pago es el id de la orden: reintentar nunca devuelve dos veces.
+    """
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En Proceso'),
+        ('REEMBOLSADO', 'Reembolsado'),
+        ('ERROR', 'Error'),
+    ]
+
+    cancelacion = models.ForeignKey(
+        CancelacionEvento,
+        related_name='reembolsos',
+        on_delete=models.CASCADE,
+        verbose_name="Cancelación"
+    )
+    orden = models.OneToOneField(
+        Orden,
+        related_name='reembolso',
+        on_delete=models.PROTECT,
+        verbose_name="Orden"
+    )
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE', verbose_name="Estado")
+    monto = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Monto")
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    mp_refund_id = models.CharField(max_length=100, blank=True, verbose_name="Refund ID (MP)")
+    error = models.TextField(blank=True, verbose_name="Error")
+    email_enviado = models.BooleanField(default=False, verbose_name="Email Enviado")
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Modificación")
+
+    class Meta:
+        verbose_name = "Reembolso"
+        verbose_name_plural = "Reembolsos"
+        indexes = [
+            # Próxima tanda a procesar de una cancelación
+            models.Index(fields=['cancelacion', 'estado'], name='reembolso_cancelacion_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reembolso {self.orden_id} - {self.estado}"
+
+
+# ===================================
+# MÓDULO DE CONCILIACIÓN
+# ===================================
+
+class CursorConciliacion(models.Model):
+    """
+    Hasta dónde se recorrió la búsqueda de pagos de Mercado Pago (por
+    date_last_updated). Cada ejecución retoma desde aquí, así que solo lee los
+    pagos que cambiaron desde la anterior.
+    """
+    nombre = models.CharField(max_length=50, unique=True, verbose_name="Nombre")
+    fecha_cursor = models.DateTimeField(null=True, blank=True, verbose_name="Último Pago Procesado")
+    # Contadores de la última ejecución
+    resultado = models.JSONField(default=dict, blank=True, verbose_name="Última Ejecución")
+    fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Modificación")
+
+    class Meta:
+        verbose_name = "Cursor de Conciliación"
+        verbose_name_plural = "Cursores de Conciliación"
+
+    def __str__(self):
+        return f"{self.nombre} - {self.fecha_cursor}"
+
+
+# ===================================
+# MÓDULO DE STOCK
+# ===================================
+
+class MovimientoStock(models.Model):
+    """
+    Cada cambio de Lote.cantidad_vendida, escrito en la misma transacción que
+    el cambio. Solo se agregan filas: la suma de los movimientos de un lote es
+    lo que debería valer su contador.
+    """
+    MOTIVOS = [
+        ('INICIAL', 'Saldo inicial'),
+        ('RESERVA', 'Reserva'),
+        ('CORTESIA', 'Cortesía'),
+        ('PAGO_TARDIO', 'Pago de orden vencida'),
+        ('RECHAZO', 'Pago rechazado'),
+        ('EXPIRACION', 'Reserva expirada'),
+        ('REEMBOLSO', 'Reembolso'),
+        ('AJUSTE', 'Ajuste por verificación'),
+    ]
+    # Motivos que toman stock para una orden (los demás lo liberan o ajustan)
+    ALTAS = ['RESERVA', 'CORTESIA', 'PAGO_TARDIO']
+
+    lote = models.ForeignKey(
+        Lote,
+        related_name='movimientos_stock',
+        on_delete=models.CASCADE,
+        verbose_name="Lote"
+    )
+    orden = models.ForeignKey(
+        Orden,
+        related_name='movimientos_stock',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name="Orden"
+    )
+    # Positivo toma stock, negativo lo libera
+    cantidad = models.IntegerField(verbose_name="Cantidad")
+    motivo = models.CharField(max_length=20, choices=MOTIVOS, verbose_name="Motivo")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Movimiento de Stock"
+        verbose_name_plural = "Movimientos de Stock"
+
+    def __str__(self):
+        return f"{self.lote_id} {self.cantidad:+d} ({self.motivo})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Los movimientos de stock no se modifican: registre un AJUSTE.")
+        super().save(*args, **kwargs)
+
+
+class SaldoStockLote(models.Model):
+    """Suma de los movimientos de un lote hasta el punto de control."""
+    lote = models.OneToOneField(
+        Lote,
+        related_name='saldo_stock',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Lote"
+    )
+    saldo = models.IntegerField(default=0, verbose_name="Saldo")
+
+    class Meta:
+        verbose_name = "Saldo de Stock"
+        verbose_name_plural = "Saldos de Stock"
+
+    def __str__(self):
+        return f"Lote {self.lote_id}: {self.saldo}"
+
+
+class PuntoControlStock(models.Model):
+    """
+    Último movimiento ya sumado a SaldoStockLote. La verificación solo lee los
+    movimientos posteriores, no todas las órdenes.
+    """
+    nombre = models.CharField(max_length=50, unique=True, verbose_name="Nombre")
+    movimiento_hasta = models.BigIntegerField(default=0, verbose_name="Último Movimiento Sumado")
+    # Contadores de la última verificación
+    resultado = models.JSONField(default=dict, blank=True, verbose_name="Última Verificación")
+    fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Modificación")
+
+    class Meta:
+        verbose_name = "Punto de Control de Stock"
+        verbose_name_plural = "Puntos de Control de Stock"
+
+    def __str__(self):
+        return f"{self.nombre} - {self.movimiento_hasta}"
+
+
+def asignar_codigos_cortos(entradas):
+    """
+    Asigna codigo_corto (primeros 8 hex del UUID, en mayúsculas) a una lista de
+    entradas con una consulta por ronda. Si el prefijo ya existe, a una entrada
+    nueva se le regenera el UUID; a una ya guardada se le alarga el prefijo.
+    Para insertar entradas nuevas usar crear_entradas().
+    """
+    pendientes = [e for e in entradas if not e.codigo_corto]
+    largos = {id(e): 8 for e in pendientes}
+
+    while pendientes:
+        for entrada in pendientes:
+            entrada.codigo_corto = entrada.id.hex[:largos[id(entrada)]].upper()
+
+        codigos = [e.codigo_corto for e in pendientes]
+        ocupados = set(
+            Entrada.objects.filter(codigo_corto__in=codigos).exclude(
+                id__in=[e.id for e in pendientes]
+            ).values_list('codigo_corto', flat=True)
+        )
+
+        vistos = set()
+        repetidos = []
+        for entrada in pendientes:
+            if entrada.codigo_corto in ocupados or entrada.codigo_corto in vistos:
+                repetidos.append(entrada)
+            else:
+                vistos.add(entrada.codigo_corto)
+
+        for entrada in repetidos:
+            if entrada._state.adding:
+                entrada.id = uuid.uuid4()
+            else:
+                largos[id(entrada)] += 2
+            entrada.codigo_corto = None
+        pendientes = repetidos
+
+
+# Intentos de crear_entradas ante un código corto tomado por otra transacción
+REINTENTOS_CODIGO_CORTO = 3
+
+
+def crear_entradas(entradas, batch_size=None):
+    """
+    asignar_codigos_cortos() + bulk_create() de entradas nuevas.
+
+    La verificación de códigos ocupados no ve las entradas que otra transacción
+    todavía no confirmó: dos emisiones simultáneas pueden elegir el mismo código
+    y el INSERT de la segunda choca con el índice único. El INSERT
+    va en un savepoint y, ante IntegrityError, se reintenta con UUIDs y códigos
+    nuevos (las entradas todavía no se mostraron a nadie).
+    """
+    for intento in range(1, REINTENTOS_CODIGO_CORTO + 1):
+        asignar_codigos_cortos(entradas)
+        try:
+            with transaction.atomic():
+                return Entrada.objects.bulk_create(entradas, batch_size=batch_size)
+        except IntegrityError:
+            if intento == REINTENTOS_CODIGO_CORTO:
+                raise
+            for entrada in entradas:
+                entrada.id = uuid.uuid4()
+                entrada.codigo_corto = None
+                entrada._state.adding = True
+                entrada._state.db = None
+
+
+def normalizar_codigo_corto(valor):
+    """Normaliza lo que tipea el portero: sin espacios ni guiones y en mayúsculas."""
+    return valor.replace('-', '').replace(' ', '').strip().upper()
@@ -0,0 +1,215 @@
+"""
+Stand-in local de la API de Mercado Pago para benchmarks y pruebas.
+
+Expone el subconjunto de endpoints que usa Backyard Bar y responde con una
+latencia configurable. Se activa apuntando settings.MP_API_URL a este servidor.
+
+Reembolsos (POST /v1/payments/{id}/refunds): respeta X-Idempotency-Key como
+la API real, puede limitar la tasa (429) y rechazar pagos puntuales (400).
+
+Búsqueda (GET /v1/payments/search): filtra por rango de date_created o
+date_last_updated y external_reference, ordena y pagina con limit/offset.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def _fecha_mp(fecha=None):
+    """Fecha con el formato de la API: 2024-05-01T12:00:00.000+00:00."""
+    return (fecha or datetime.now(timezone.utc)).isoformat(timespec='milliseconds')
+
+
+class _ManejadorMP(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _leer_json(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        if not largo:
+            return {}
+        return json.loads(self.rfile.read(largo) or b'{}')
+
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos).encode()
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _buscar(self, query):
+        parametros = {clave: valores[0] for clave, valores in parse_qs(query).items()}
+        pagos = list(self.server.pagos.values())
+
+        if parametros.get('external_reference'):
+            pagos = [p for p in pagos if p.get('external_reference') == parametros['external_reference']]
+        campo = parametros.get('range')
+        if campo:
+            desde = parametros.get('begin_date')
+            hasta = parametros.get('end_date')
+            desde = datetime.fromisoformat(desde) if desde else None
+            hasta = datetime.fromisoformat(hasta) if hasta else None
+            pagos = [
+                p for p in pagos if p.get(campo)
+                and (desde is None or datetime.fromisoformat(p[campo]) >= desde)
+                and (hasta is None or datetime.fromisoformat(p[campo]) <= hasta)
+            ]
+        orden = parametros.get('sort', 'date_created')
+        pagos.sort(
+            key=lambda p: (datetime.fromisoformat(p[orden]) if p.get(orden) else datetime.min.replace(tzinfo=timezone.utc), str(p['id'])),
+            reverse=parametros.get('criteria') == 'desc',
+        )
+
+        limite = min(int(parametros.get('limit', 30)), 1000)
+        desplazamiento = int(parametros.get('offset', 0))
+        return self._responder(200, {
+            'paging': {'total': len(pagos), 'limit': limite, 'offset': desplazamiento},
+            'results': pagos[desplazamiento:desplazamiento + limite],
+        })
+
+    def do_GET(self):
+        time.sleep(self.server.latencia)
+        url = urlsplit(self.path)
+        if url.path == '/v1/payments/search':
+            self.server.busquedas += 1
+            return self._buscar(url.query)
+        match = re.match(r'^/v1/payments/([^/?]+)$', self.path)
+        if match:
+            pago = self.server.pagos.get(match.group(1))
+            if pago is None:
+                pago = {'id': match.group(1), 'status': self.server.estado_por_defecto, 'external_reference': None}
+            return self._responder(200, pago)
+        return self._responder(404, {'message': 'not_found'})
+
+    def _limite_superado(self):
+        """Ventana fija de un segundo, como el rate limit de la API real."""
+        if not self.server.max_por_segundo:
+            return False
+        with self.server.lock:
+            segundo = int(time.monotonic())
+            if self.server.ventana[0] != segundo:
+                self.server.ventana = [segundo, 0]
+            self.server.ventana[1] += 1
+            return self.server.ventana[1] > self.server.max_por_segundo
+
+    def _reembolsar(self, payment_id, datos):
+        if self._limite_superado():
+            return self._responder(429, {'message': 'too_many_requests'})
+        if payment_id in self.server.reembolsos_rechazados:
+            return self._responder(400, {'message': 'refund_not_allowed', 'status': 400})
+
+        clave = self.headers.get('X-Idempotency-Key') or uuid.uuid4().hex
+        with self.server.lock:
+            reembolso = self.server.reembolsos.get(clave)
+            if reembolso is None:
+                pago = self.server.pagos.get(payment_id, {})
+                reembolso = {
+                    'id': len(self.server.reembolsos) + 1,
+                    'payment_id': payment_id,
+                    'amount': datos.get('amount', pago.get('transaction_amount')),
+                    'status': 'approved',
+                }
+                self.server.reembolsos[clave] = reembolso
+                if pago:
+                    pago['status'] = 'refunded'
+                    pago['date_last_updated'] = _fecha_mp()
+        return self._responder(201, reembolso)
+
+    def do_POST(self):
+        time.sleep(self.server.latencia)
+        datos = self._leer_json()
+        match = re.match(r'^/v1/payments/([^/?]+)/refunds$', self.path)
+        if match:
+            return self._reembolsar(match.group(1), datos)
+        if self.path.startswith('/checkout/preferences'):
+            pref_id = f"local-{uuid.uuid4().hex[:12]}"
+            return self._responder(201, {
+                'id': pref_id,
+                'init_point': f"{self.server.url}/checkout?pref_id={pref_id}",
+                'external_reference': datos.get('external_reference'),
+            })
+        return self._responder(404, {'message': 'not_found'})
+
+
+class ServidorMPLocal:
+    """
+    Servidor HTTP en un hilo aparte.
+
+        with ServidorMPLocal(latencia=0.5) as mp:
+            settings.MP_API_URL = mp.url
+    """
+
+    def __init__(self, host='127.0.0.1', puerto=0, latencia=0.0, estado_por_defecto='in_process', max_por_segundo=0):
+        self.httpd = ThreadingHTTPServer((host, puerto), _ManejadorMP)
+        self.httpd.daemon_threads = True
+        self.httpd.latencia = latencia
+        self.httpd.estado_por_defecto = estado_por_defecto
+        # Pagos conocidos: {payment_id: {"id", "status", "external_reference", ...}}
+        self.httpd.pagos = {}
+        # Reembolsos hechos: {clave de idempotencia: {"id", "payment_id", "amount", "status"}}
+        self.httpd.reembolsos = {}
+        # payment_ids cuyo reembolso se rechaza (400)
+        self.httpd.reembolsos_rechazados = set()
+        # Tope de reembolsos por segundo (0 = sin límite); el exceso recibe 429
+        self.httpd.max_por_segundo = max_por_segundo
+        self.httpd.ventana = [0, 0]
+        # Cantidad de GET /v1/payments/search recibidos
+        self.httpd.busquedas = 0
+        self.httpd.lock = threading.Lock()
+        self.httpd.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.hilo = None
+
+    @property
+    def url(self):
+        return self.httpd.url
+
+    @property
+    def pagos(self):
+        return self.httpd.pagos
+
+    @property
+    def reembolsos(self):
+        return self.httpd.reembolsos
+
+    @property
+    def reembolsos_rechazados(self):
+        return self.httpd.reembolsos_rechazados
+
+    @property
+    def busquedas(self):
+        return self.httpd.busquedas
+
+    def registrar_pago(self, payment_id, external_reference, status='approved', monto=None, fecha=None):
+        """Agrega (o actualiza) un pago con las fechas que usa la búsqueda."""
+        ahora = _fecha_mp(fecha)
+        with self.httpd.lock:
+            pago = self.httpd.pagos.setdefault(str(payment_id), {'id': str(payment_id), 'date_created': ahora})
+            pago.update({
+                'status': status, 'external_reference': external_reference,
+                'transaction_amount': monto, 'date_last_updated': ahora,
+            })
+        return pago
+
+    def iniciar(self):
+        self.hilo = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.hilo.start()
+        return self
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
@@ -0,0 +1,16 @@
+"""
+Paginadores de la API de Backyard Bar.
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class MisEntradasPagination(CursorPagination):
+    """
+    Paginación keyset sobre fecha_creacion: cada página es un
+    WHERE fecha_creacion < cursor ... LIMIT n, sin OFFSET ni COUNT(*).
+    """
+    ordering = '-fecha_creacion'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
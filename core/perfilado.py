@@ -0,0 +1,153 @@
+"""
+Perfilado por muestreo de requests (opt-in).
+
+PerfiladoMiddleware (core.middleware) elige qué requests perfilar: una fracción
+(PERFILADO_FRACCION) de las rutas de PERFILADO_RUTAS cuando PERFILADO_ACTIVO
+está prendido, o cualquier request de staff que mande `X-Perfilar: 1`.
+Mientras dura la vista, un hilo aparte toma la pila del hilo del request cada
+PERFILADO_INTERVALO_MS y al final se guarda en PERFILES_DIR en formato
+"collapsed stacks" (una línea `marco;marco;marco cantidad` por pila), que
+leen flamegraph.pl, inferno y speedscope.app.
+
+Apagado cuesta una comparación por request. Con vistas async bajo ASGI se
+muestrea el hilo del request, donde corre el ORM (sync_to_async), no el
+event loop.
+"""
+
+import json
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+
+NOMBRE_VALIDO = re.compile(r'^[\w.-]+$')
+STDLIB = sysconfig.get_paths()['stdlib'] + os.sep
+
+
+@lru_cache(maxsize=4096)
+def _marco(codigo):
+    """'función (archivo)' con la ruta relativa al proyecto, a site-packages o a la stdlib."""
+    archivo = codigo.co_filename
+    if 'site-packages' in archivo:
+        archivo = archivo.split('site-packages' + os.sep, 1)[1]
+    elif archivo.startswith(STDLIB):
+        archivo = archivo[len(STDLIB):]
+    elif archivo.startswith(str(settings.BASE_DIR)):
+        archivo = os.path.relpath(archivo, settings.BASE_DIR)
+    return f"{codigo.co_qualname} ({archivo})"
+
+
+class Muestreador:
+    """Toma la pila de un hilo cada `intervalo` segundos desde un hilo aparte."""
+
+    def __init__(self, hilo_id, intervalo):
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self.muestras = 0
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True, name='perfilado')
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while frame is not None:
+                pila.append(_marco(frame.f_code))
+                frame = frame.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+                self.muestras += 1
+
+    def iniciar(self):
+        self.inicio = time.perf_counter()
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.duracion = time.perf_counter() - self.inicio
+        self._detener.set()
+        self._hilo.join()
+
+
+# ===================================
+# CAPTURAS
+# ===================================
+
+def guardar_perfil(muestreador, request, response, ruta):
+    """Escribe la captura (.folded) y sus datos (.json). Retorna el nombre."""
+    ahora = timezone.now()
+    nombre = f"{ahora:%Y%m%dT%H%M%S}_{ruta}_{uuid.uuid4().hex[:8]}"
+    os.makedirs(settings.PERFILES_DIR, exist_ok=True)
+    base = os.path.join(settings.PERFILES_DIR, nombre)
+
+    with open(f"{base}.folded", 'w') as archivo:
+        for pila, cantidad in muestreador.pilas.most_common():
+            archivo.write(f"{pila} {cantidad}\n")
+    with open(f"{base}.json", 'w') as archivo:
+        json.dump({
+            'nombre': nombre,
+            'ruta': ruta,
+            'metodo': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duracion_ms': round(muestreador.duracion * 1000, 1),
+            'muestras': muestreador.muestras,
+            'intervalo_ms': settings.PERFILADO_INTERVALO_MS,
+            'fecha': ahora.isoformat(),
+        }, archivo)
+
+    _purgar_perfiles()
+    return nombre
+
+
+def _capturas():
+    """Rutas de los .json de las capturas, la más nueva primero."""
+    if not os.path.isdir(settings.PERFILES_DIR):
+        return []
+    # El nombre empieza con la fecha: ordenar por nombre es ordenar por antigüedad
+    return sorted(
+        (os.path.join(settings.PERFILES_DIR, f) for f in os.listdir(settings.PERFILES_DIR) if f.endswith('.json')),
+        reverse=True
+    )
+
+
+def _purgar_perfiles():
+    for viejo in _capturas()[settings.PERFILADO_MAX_CAPTURAS:]:
+        for extension in ('.json', '.folded'):
+            try:
+                os.remove(viejo[:-len('.json')] + extension)
+            except FileNotFoundError:
+                pass
+
+
+def listar_perfiles(ruta=None, limite=50):
+    """Datos de las capturas más recientes (opcionalmente de una ruta)."""
+    perfiles = []
+    for captura in _capturas():
+        try:
+            with open(captura) as archivo:
+                datos = json.load(archivo)
+        except (OSError, ValueError):
+            continue
+        if ruta is None or datos['ruta'] == ruta:
+            perfiles.append(datos)
+            if len(perfiles) >= limite:
+                break
+    return perfiles
+
+
+def ruta_perfil(nombre):
+    """Ruta del .folded de una captura, o None si el nombre no es válido o no existe."""
+    if not NOMBRE_VALIDO.match(nombre):
+        return None
+    ruta = os.path.join(settings.PERFILES_DIR, f"{nombre}.folded")
+    return ruta if os.path.exists(ruta) else None
@@ -0,0 +1,130 @@
+"""
+Difusión en tiempo real del stock de los Lotes (Server-Sent Events).
+
+Cada Evento con suscriptores tiene UN solo lector que consulta sus lotes cada
+STOCK_STREAM_INTERVALO_SEGUNDOS y reparte el snapshot a todas las conexiones
+abiertas. La carga sobre la base de datos depende de la cantidad de eventos
+observados, no de la cantidad de navegadores conectados.
+
+Requiere servir la app por ASGI (uvicorn): bajo WSGI cada conexión ocuparía
+un worker sync durante toda su vida.
+"""
+
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Lote
+
+logger = logging.getLogger(__name__)
+
+
+def _leer_lotes(evento_id):
+    """Snapshot serializable de los lotes de un evento (una sola consulta)."""
+    lotes = list(
+        Lote.objects.filter(evento_id=evento_id).order_by('orden').values(
+            'id', 'nombre', 'precio', 'cantidad_total', 'cantidad_vendida', 'orden', 'activo'
+        )
+    )
+    for lote in lotes:
+        lote['precio'] = str(lote['precio'])
+        lote['stock_disponible'] = lote['cantidad_total'] - lote['cantidad_vendida']
+
+    return {
+        'evento_id': evento_id,
+        'lotes': lotes,
+        'stock_total_disponible': sum(l['stock_disponible'] for l in lotes if l['activo']),
+    }
+
+
+class _CanalEvento:
+    """Lector compartido de un evento y sus colas de suscriptores."""
+
+    def __init__(self, evento_id):
+        self.evento_id = evento_id
+        self.suscriptores = set()
+        self.ultimo = None
+        self.tarea = None
+
+    def publicar(self, snapshot):
+        # Cola de tamaño 1: si el cliente no consumió el anterior, se reemplaza.
+        # Así un suscriptor lento nunca acumula más de un mensaje pendiente.
+        for cola in self.suscriptores:
+            if cola.full():
+                try:
+                    cola.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            cola.put_nowait(snapshot)
+
+    async def correr(self):
+        intervalo = settings.STOCK_STREAM_INTERVALO_SEGUNDOS
+        leer = sync_to_async(_leer_lotes, thread_sensitive=True)
+        while self.suscriptores:
+            try:
+                snapshot = await leer(self.evento_id)
+                if snapshot != self.ultimo:
+                    self.ultimo = snapshot
+                    self.publicar(snapshot)
+            except Exception as e:
+                logger.error(f"Error leyendo stock del evento {self.evento_id}: {str(e)}")
+            await asyncio.sleep(intervalo)
+
+
+class DifusorStock:
+    """Registro de canales por evento dentro del proceso ASGI."""
+
+    def __init__(self):
+        self.canales = {}
+
+    def suscribir(self, evento_id):
+        canal = self.canales.get(evento_id)
+        if canal is None:
+            canal = self.canales[evento_id] = _CanalEvento(evento_id)
+
+        cola = asyncio.Queue(maxsize=1)
+        if canal.ultimo is not None:
+            cola.put_nowait(canal.ultimo)
+        canal.suscriptores.add(cola)
+
+        if canal.tarea is None or canal.tarea.done():
+            canal.tarea = asyncio.get_running_loop().create_task(canal.correr())
+        return cola
+
+    def desuscribir(self, evento_id, cola):
+        canal = self.canales.get(evento_id)
+        if canal is None:
+            return
+        canal.suscriptores.discard(cola)
+        if not canal.suscriptores:
+            # El lector termina solo en su próxima vuelta al no tener suscriptores
+            del self.canales[evento_id]
+
+
+difusor_stock = DifusorStock()
+
+
+def formatear_sse(snapshot, evento='stock'):
+    return f"event: {evento}\ndata: {json.dumps(snapshot, separators=(',', ':'))}\n\n"
+
+
+async def stream_stock_evento(evento_id):
+    """Generador SSE: snapshot inicial, cambios coalescidos y heartbeats."""
+    heartbeat = settings.STOCK_STREAM_HEARTBEAT_SEGUNDOS
+    cola = difusor_stock.suscribir(evento_id)
+    try:
+        # Indicamos al navegador cada cuánto reintentar si se corta la conexión
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                snapshot = await asyncio.wait_for(cola.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": ping\n\n"
+                continue
+            yield formatear_sse(snapshot)
+    finally:
+        difusor_stock.desuscribir(evento_id, cola)
@@ -0,0 +1,117 @@
+"""
+Lecturas en la réplica de la base de datos.
+
+Con DATABASE_REPLICA_URL configurada existe el alias 'replica' y RouterReplica
+manda a ella las lecturas hechas dentro de lecturas_en_replica(): el catálogo
+de eventos, el dashboard, la lista de invitados y Mis Entradas (ver
+LecturaEnReplicaMixin). Todo lo demás sigue en la primaria:
+
+- Las escrituras y los select_for_update (Django los rutea como escritura).
+- Cualquier lectura dentro de una transacción abierta en la primaria: lo
+  leído ahí se usa para escribir.
+- Las lecturas de un cliente con una compra reciente (reserva o pago en los
+  últimos REPLICA_LECTURA_PROPIA_SEGUNDOS): ve sus propias entradas y el stock
+  que tomó aunque la réplica venga atrasada.
+
+Sin réplica configurada no se instala el router y nada cambia.
+"""
+
+import contextvars
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Cliente, Orden
+
+REPLICA = 'replica'
+
+# Las lecturas del contexto actual (request, hilo o tarea async) pueden ir a la réplica
+_lecturas_en_replica = contextvars.ContextVar('lecturas_en_replica', default=False)
+
+
+def replica_configurada():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def lecturas_en_replica(activar=True):
+    """Las lecturas del bloque van a la réplica (si hay). activar=False fuerza la primaria."""
+    anterior = _lecturas_en_replica.get()
+    _lecturas_en_replica.set(activar)
+    try:
+        yield
+    finally:
+        _lecturas_en_replica.set(anterior)
+
+
+def en_replica(iterable):
+    """
+    Itera `iterable` leyendo de la réplica. Para respuestas en streaming: el
+    cuerpo se genera cuando la vista ya retornó (bajo ASGI, en otro hilo),
+    así que el contexto se activa en cada paso y no queda activo entre pasos.
+    """
+    iterador = iter(iterable)
+    while True:
+        with lecturas_en_replica():
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                return
+        yield elemento
+
+
+def compra_reciente(cliente):
+    """True si el cliente reservó o se le aprobó un pago hace menos de REPLICA_LECTURA_PROPIA_SEGUNDOS (leído de la primaria)."""
+    limite = timezone.now() - timedelta(seconds=settings.REPLICA_LECTURA_PROPIA_SEGUNDOS)
+    return Orden.objects.using(DEFAULT_DB_ALIAS).filter(
+        Q(fecha_creacion__gte=limite) | Q(fecha_aprobacion__gte=limite), cliente=cliente
+    ).exists()
+
+
+class RouterReplica:
+    """Router de DATABASE_ROUTERS: lecturas marcadas a la réplica, el resto a la primaria."""
+
+    def db_for_read(self, model, **hints):
+        if _lecturas_en_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mismos datos en los dos alias
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return db == DEFAULT_DB_ALIAS
+
+
+class LecturaEnReplicaMixin:
+    """
+    Para vistas DRF de solo lectura (sync o adrf): después de autenticar
+    (en la primaria), las lecturas de la vista van a la réplica, salvo para
+    un cliente con una compra reciente.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not replica_configurada():
+            return
+
+        usuario = request.user
+        propia = isinstance(usuario, Cliente) and compra_reciente(usuario)
+        # Se restaura en finalize_response (también si la vista lanza una excepción)
+        self._replica_anterior = _lecturas_en_replica.get()
+        _lecturas_en_replica.set(not propia)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if hasattr(self, '_replica_anterior'):
+            _lecturas_en_replica.set(self._replica_anterior)
+            del self._replica_anterior
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -4,9 +4,17 @@ Manejo de serialización/deserialización de datos con validaciones personalizad
 """
 
 from rest_framework import serializers
-from .models import Cliente, Evento, Lote, Orden, Entrada
+from django.conf import settings
+from .models import (
+    Cliente, Evento, Lote, Orden, Entrada, TrabajoExportacion, CancelacionEvento, normalizar_codigo_corto
+)
+from .services_metricas import DURACION_BUCKET, granularidad_para_rango
+from .services_cortesias import leer_invitados, normalizar_invitados
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+import uuid
 
 
 # ===================================
@@ -24,7 +32,8 @@ class ClienteRegistroSerializer(serializers.ModelSerializer):
             'email', 'telefono', 'password', 'password_confirm'
         ]
         extra_kwargs = {
-            'password': {'write_only': True}
+            'password': {'write_only': True},
+            'fecha_nacimiento': {'required': True, 'allow_null': False},
         }
     
     def validate_cedula(self, value):
@@ -157,10 +166,28 @@ class EntradaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Entrada
         fields = [
-            'id', 'evento_titulo', 'lote_nombre', 'usada', 'fecha_uso',
+            'id', 'evento_titulo', 'lote_nombre', 'usada', 'anulada', 'fecha_uso',
             'fecha_creacion', 'codigo_qr', 'imagen_qr'
         ]
-        read_only_fields = ['id', 'usada', 'fecha_uso', 'fecha_creacion']
+        read_only_fields = ['id', 'usada', 'anulada', 'fecha_uso', 'fecha_creacion']
+
+
+class EntradaCompactaSerializer(serializers.ModelSerializer):
+    """
+    Forma compacta para Mis Entradas.
+    Requiere select_related('lote__evento') para no hacer consultas por fila.
+    """
+    evento_titulo = serializers.CharField(source='lote.evento.titulo', read_only=True)
+    evento_fecha = serializers.DateTimeField(source='lote.evento.fecha_inicio', read_only=True)
+    lote_nombre = serializers.CharField(source='lote.nombre', read_only=True)
+    
+    class Meta:
+        model = Entrada
+        fields = [
+            'id', 'evento_titulo', 'evento_fecha', 'lote_nombre',
+            'usada', 'anulada', 'fecha_uso', 'fecha_creacion', 'imagen_qr'
+        ]
+        read_only_fields = fields
 
 
 class OrdenSerializer(serializers.ModelSerializer):
@@ -187,6 +214,22 @@ class OrdenSerializer(serializers.ModelSerializer):
         ]
 
 
+class OrdenCheckoutSerializer(serializers.Serializer):
+    """
+    Respuesta mínima de la reserva: lo necesario para redirigir a Mercado Pago.
+    Solo lee campos ya cargados en la orden recién creada (cero consultas).
+    """
+    id = serializers.UUIDField(read_only=True)
+    estado = serializers.CharField(read_only=True)
+    cantidad_entradas = serializers.IntegerField(read_only=True)
+    monto_subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    monto_comision = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    monto_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    fecha_expiracion = serializers.DateTimeField(read_only=True)
+    mp_preference_id = serializers.CharField(read_only=True)
+    mp_init_point = serializers.CharField(read_only=True, required=False)
+
+
 class OrdenDetalleSerializer(serializers.ModelSerializer):
     """Serializer detallado para una orden específica con toda la información"""
     cliente_nombre = serializers.CharField(source='cliente.nombre', read_only=True)
@@ -217,20 +260,49 @@ class OrdenDetalleSerializer(serializers.ModelSerializer):
 # ===================================
 
 class ValidarEntradaSerializer(serializers.Serializer):
-    """Serializer para validar una entrada con código QR"""
-    codigo_qr = serializers.UUIDField(required=True)
+    """
+    Serializer para validar una entrada con código QR o con su código corto
+    (el que figura en el email, para cuando el QR no escanea).
+    Solo valida el formato: la existencia se resuelve en el mismo check-in.
+    """
+    codigo_qr = serializers.CharField(required=True)
     
     def validate_codigo_qr(self, value):
-        """Valida que el código QR exista"""
+        """Retorna un UUID (QR) o un código corto normalizado"""
         try:
-            entrada = Entrada.objects.get(id=value)
-        except Entrada.DoesNotExist:
-            raise serializers.ValidationError("El código QR no es válido.")
+            return uuid.UUID(value.strip())
+        except ValueError:
+            pass
+        codigo = normalizar_codigo_corto(value)
+        if not 8 <= len(codigo) <= 12 or any(c not in '0123456789ABCDEF' for c in codigo):
+            raise serializers.ValidationError("El código no es un QR ni un código de entrada válido.")
+        return codigo
+    
+
+
+class EscaneoOfflineSerializer(serializers.Serializer):
+    """Un escaneo registrado por una puerta sin conexión"""
+    codigo_qr = serializers.UUIDField(required=True)
+    fecha_uso = serializers.DateTimeField(required=False, allow_null=True)
+
+
+class CheckInLoteSerializer(serializers.Serializer):
+    """Lote de escaneos offline a sincronizar"""
+    escaneos = EscaneoOfflineSerializer(many=True, allow_empty=False)
+    
+    def validate_escaneos(self, value):
+        """Limita el tamaño del lote para acotar la duración de la transacción"""
+        maximo = settings.CHECKIN_LOTE_MAX_ESCANEOS
+        if len(value) > maximo:
+            raise serializers.ValidationError(f"Máximo {maximo} escaneos por lote.")
         return value
 
 
 class EntradaValidacionSerializer(serializers.ModelSerializer):
-    """Serializer completo para la respuesta de validación de entrada"""
+    """
+    Serializer completo para la respuesta de validación de entrada.
+    Requiere select_related('cliente', 'lote__evento', 'usuario_validador').
+    """
     cliente_nombre = serializers.CharField(source='cliente.nombre', read_only=True)
     cliente_apellido = serializers.CharField(source='cliente.apellido', read_only=True)
     evento_titulo = serializers.CharField(source='lote.evento.titulo', read_only=True)
@@ -241,7 +313,149 @@ class EntradaValidacionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Entrada
         fields = [
-            'id', 'cliente_nombre', 'cliente_apellido',
+            'id', 'codigo_corto', 'cliente_nombre', 'cliente_apellido',
             'evento_titulo', 'evento_fecha', 'lote_nombre',
-            'usada', 'fecha_uso', 'validador_username', 'fecha_creacion'
+            'usada', 'anulada', 'fecha_uso', 'validador_username', 'fecha_creacion'
         ]
+
+
+# ===================================
+# SERIALIZERS PARA MÉTRICAS (Staff)
+# ===================================
+
+class SerieTemporalParamsSerializer(serializers.Serializer):
+    """
+    Parámetros de la serie temporal de un evento.
+    Sin granularidad se elige la más fina que entra en METRICAS_MAX_PUNTOS.
+    """
+    granularidad = serializers.ChoiceField(choices=['minuto', 'hora', 'dia'], required=False)
+    desde = serializers.DateTimeField(required=False)
+    hasta = serializers.DateTimeField(required=False)
+    lote = serializers.IntegerField(required=False, min_value=1)
+    
+    def validate(self, data):
+        """Completa el rango (últimas 24 h por defecto) y limita la cantidad de puntos"""
+        data['hasta'] = data.get('hasta') or timezone.now()
+        data['desde'] = data.get('desde') or data['hasta'] - timedelta(hours=24)
+        if data['desde'] >= data['hasta']:
+            raise serializers.ValidationError({"desde": "Debe ser anterior a 'hasta'."})
+
+        if 'granularidad' in data:
+            data['granularidad'] = data['granularidad'].upper()
+        else:
+            data['granularidad'] = granularidad_para_rango(data['desde'], data['hasta'])
+
+        puntos = (data['hasta'] - data['desde']) / DURACION_BUCKET[data['granularidad']]
+        if puntos > settings.METRICAS_MAX_PUNTOS:
+            raise serializers.ValidationError(
+                {"granularidad": f"El rango supera {settings.METRICAS_MAX_PUNTOS} puntos; use una granularidad mayor."}
+            )
+        return data
+
+
+class CrearExportacionSerializer(serializers.Serializer):
+    """Pedido de una exportación en segundo plano de uno o varios eventos"""
+    eventos = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), min_length=1, max_length=50
+    )
+    formato = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    gzip = serializers.BooleanField(default=False)
+    
+    def validate_eventos(self, value):
+        """Verifica que todos los eventos existan"""
+        ids = set(value)
+        existentes = set(Evento.objects.filter(id__in=ids).values_list('id', flat=True))
+        if existentes != ids:
+            faltantes = ', '.join(str(i) for i in sorted(ids - existentes))
+            raise serializers.ValidationError(f"Eventos inexistentes: {faltantes}")
+        return sorted(ids)
+
+
+class TrabajoExportacionSerializer(serializers.ModelSerializer):
+    """Estado de una exportación en segundo plano"""
+    progreso = serializers.IntegerField(read_only=True)
+    url_descarga = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = TrabajoExportacion
+        fields = [
+            'id', 'evento_ids', 'formato', 'gzip', 'estado', 'progreso',
+            'filas_totales', 'filas_procesadas', 'tamano', 'error',
+            'fecha_creacion', 'fecha_fin', 'url_descarga'
+        ]
+    
+    def get_url_descarga(self, obj):
+        if obj.estado != 'LISTO':
+            return None
+        request = self.context.get('request')
+        url = reverse('descargar-exportacion', args=[obj.id])
+        return request.build_absolute_uri(url) if request else url
+
+
+class EmitirCortesiasSerializer(serializers.Serializer):
+    """
+    Invitados a emitir como cortesía: lista JSON en `invitados` o un archivo
+    CSV/JSON en `archivo` (multipart). Campos por invitado: cedula, nombre,
+    apellido, email y opcionales telefono, fecha_nacimiento y cantidad.
+    """
+    invitados = serializers.ListField(child=serializers.DictField(), required=False, allow_empty=False)
+    archivo = serializers.FileField(required=False)
+    etiqueta = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    
+    def validate(self, data):
+        """Lee el archivo si vino uno y valida todas las filas (todo o nada)"""
+        if 'archivo' in data:
+            formato = 'json' if data['archivo'].name.lower().endswith('.json') else 'csv'
+            try:
+                filas = leer_invitados(data['archivo'].read(), formato)
+            except (ValueError, DjangoValidationError):
+                raise serializers.ValidationError({"archivo": "No se pudo leer el archivo (CSV con encabezado o JSON)."})
+        elif 'invitados' in data:
+            filas = data['invitados']
+        else:
+            raise serializers.ValidationError("Envíe 'invitados' o un 'archivo' CSV/JSON.")
+
+        maximo = settings.CORTESIAS_MAX_INVITADOS
+        if len(filas) > maximo:
+            raise serializers.ValidationError(f"Máximo {maximo} invitados por emisión.")
+
+        invitados, errores = normalizar_invitados(filas)
+        if errores:
+            raise serializers.ValidationError({"errores": errores})
+        data['invitados'] = invitados
+        return data
+
+
+class CancelarEventoSerializer(serializers.Serializer):
+    """Motivo de la cancelación (se incluye en el email a los clientes)"""
+    motivo = serializers.CharField(max_length=500, required=False, allow_blank=True, default='')
+
+
+class CancelacionEventoSerializer(serializers.ModelSerializer):
+    """Progreso del reembolso masivo de un evento cancelado"""
+    progreso = serializers.IntegerField(read_only=True)
+    pendientes = serializers.SerializerMethodField()
+    reembolsos_por_segundo = serializers.SerializerMethodField()
+    ultimos_errores = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = CancelacionEvento
+        fields = [
+            'id', 'evento', 'motivo', 'estado', 'progreso', 'ordenes_totales', 'reembolsadas',
+            'errores', 'pendientes', 'monto_reembolsado', 'emails_enviados', 'reembolsos_por_segundo',
+            'ultimos_errores', 'fecha_creacion', 'fecha_modificacion', 'fecha_fin'
+        ]
+    
+    def get_pendientes(self, obj):
+        return obj.ordenes_totales - obj.reembolsadas - obj.errores
+    
+    def get_reembolsos_por_segundo(self, obj):
+        """Ritmo promedio desde la cancelación hasta el fin (o el último avance)"""
+        segundos = ((obj.fecha_fin or obj.fecha_modificacion) - obj.fecha_creacion).total_seconds()
+        return round(obj.reembolsadas / segundos, 1) if segundos > 0 else None
+    
+    def get_ultimos_errores(self, obj):
+        return list(
+            obj.reembolsos.filter(estado='ERROR').order_by('-fecha_modificacion')
+            .values('orden_id', 'intentos', 'error')[:20]
+        )
@@ -0,0 +1,128 @@
+"""
+Versiones async de los servicios que esperan a Mercado Pago.
+
+Las llamadas salientes usan httpx (un cliente con pool por event loop) y todo
+el trabajo con el ORM pasa por sync_to_async(thread_sensitive=True), que bajo
+ASGI corre en el hilo dedicado del request. Así un request esperando a MP no
+ocupa un worker: el event loop sigue atendiendo otros mientras tanto.
+"""
+
+import asyncio
+import logging
+import weakref
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .instrumentacion import medir, resultado_http, RESERVA_SEGUNDOS, MP_SOLICITUD_SEGUNDOS
+from .services_compra import armar_datos_preferencia, reservar_stock, confirmar_pago_orden, fallar_orden
+from .trazas import tramo
+
+logger = logging.getLogger(__name__)
+
+# Un cliente por event loop: httpx.AsyncClient no puede compartirse entre loops
+# (bajo WSGI cada request async corre en un loop propio)
+_clientes_http = weakref.WeakKeyDictionary()
+
+
+def headers_mp():
+    headers = {}
+    if settings.MP_ACCESS_TOKEN:
+        headers["Authorization"] = f"Bearer {settings.MP_ACCESS_TOKEN}"
+    return headers
+
+
+def _cliente_http_mp():
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_http.get(loop)
+    if cliente is None:
+        cliente = httpx.AsyncClient(
+            base_url=settings.MP_API_URL,
+            headers=headers_mp(),
+            timeout=settings.MP_HTTP_TIMEOUT_SEGUNDOS,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        _clientes_http[loop] = cliente
+    return cliente
+
+
+async def crear_preferencia_mercadopago_async(orden):
+    """Equivalente async de crear_preferencia_mercadopago."""
+    try:
+        with medir(MP_SOLICITUD_SEGUNDOS, operacion='preferencia') as medicion, tramo('mp.preferencia') as t:
+            respuesta = await _cliente_http_mp().post(
+                "/checkout/preferences", json=armar_datos_preferencia(orden)
+            )
+            medicion.etiquetas['resultado'] = resultado_http(respuesta.status_code)
+            t.atributos['http'] = respuesta.status_code
+        if respuesta.status_code == 201:
+            datos = respuesta.json()
+            return {"id": datos["id"], "init_point": datos["init_point"]}
+
+        logger.error(f"Error al crear preferencia MP: {respuesta.status_code} {respuesta.text}")
+        return None
+
+    except Exception as e:
+        logger.error(f"Excepción en crear_preferencia_mercadopago_async: {str(e)}")
+        return None
+
+
+async def obtener_pago_mercadopago_async(payment_id):
+    """
+    Consulta un pago en Mercado Pago.
+    Retorna un dict con la misma forma que sdk.payment().get(): {"status", "response"}.
+    """
+    with medir(MP_SOLICITUD_SEGUNDOS, operacion='pago') as medicion, tramo('mp.pago') as t:
+        respuesta = await _cliente_http_mp().get(f"/v1/payments/{payment_id}")
+        medicion.etiquetas['resultado'] = resultado_http(respuesta.status_code)
+        t.atributos['http'] = respuesta.status_code
+    return {"status": respuesta.status_code, "response": respuesta.json()}
+
+
+def _reservar_stock_atomico(cliente_id, evento_id, cantidad):
+    with tramo('reserva.stock'), transaction.atomic():
+        return reservar_stock(cliente_id, evento_id, cantidad)
+
+
+def _guardar_preferencia(orden, mp_pref_data):
+    orden.mp_preference_id = mp_pref_data["id"]
+    orden.save(update_fields=['mp_preference_id'])
+
+
+async def procesar_reserva_entrada_async(cliente_id, evento_id, cantidad):
+    """
+    Reserva en dos fases: el stock se bloquea solo durante la transacción corta
+    de reservar_stock y la preferencia se crea fuera del lock. Si MP falla, la
+    orden se rechaza y el stock se libera con fallar_orden.
+    """
+    with medir(RESERVA_SEGUNDOS) as medicion, tramo('reserva', cantidad=cantidad):
+        try:
+            orden = await sync_to_async(_reservar_stock_atomico, thread_sensitive=True)(
+                cliente_id, evento_id, cantidad
+            )
+        except ValidationError:
+            medicion.etiquetas['resultado'] = 'sin_stock'
+            raise
+
+        mp_pref_data = await crear_preferencia_mercadopago_async(orden)
+
+        if not mp_pref_data:
+            await sync_to_async(fallar_orden, thread_sensitive=True)(orden.id)
+            raise Exception("Error al conectar con la pasarela de pagos. Stock liberado.")
+
+        await sync_to_async(_guardar_preferencia, thread_sensitive=True)(orden, mp_pref_data)
+        orden.mp_init_point = mp_pref_data["init_point"]
+        medicion.etiquetas['resultado'] = 'ok'
+        return orden
+
+
+async def confirmar_pago_orden_async(orden_id, mp_payment_id):
+    # Genera QRs y envía el email (SMTP) en el hilo del request, fuera del event loop
+    return await sync_to_async(confirmar_pago_orden, thread_sensitive=True)(orden_id, mp_payment_id)
+
+
+async def fallar_orden_async(orden_id):
+    return await sync_to_async(fallar_orden, thread_sensitive=True)(orden_id)
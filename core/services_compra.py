@@ -4,68 +4,106 @@ Maneja la lógica transaccional, reserva de stock y comunicación con Mercado Pa
 """
 
 import mercadopago
+from mercadopago.http import HttpClient
 from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from .models import Evento, Lote, Orden, Cliente, Entrada
+from .models import Evento, Lote, Orden, Cliente, Entrada, CancelacionEvento, crear_entradas
 from .utils import generar_qr_entrada, enviar_email_entradas
+from .services_estadisticas import ajustar_resumen_ventas, ajustar_resumen_por_orden
+from .services_metricas import registrar_metrica
+from .services_stock import registrar_movimiento_stock
+from .instrumentacion import medir, resultado_http, RESERVA_SEGUNDOS, RESERVA_ESPERA_LOCK_SEGUNDOS, MP_SOLICITUD_SEGUNDOS
+from .trazas import tramo, asignar_traza
 from datetime import timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+MP_API_URL_OFICIAL = "https://api.mercadopago.com"
+
+
+class _HttpClientMP(HttpClient):
+    """Cliente HTTP del SDK que redirige las llamadas a settings.MP_API_URL."""
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(MP_API_URL_OFICIAL):
+            url = settings.MP_API_URL.rstrip('/') + url[len(MP_API_URL_OFICIAL):]
+        return super().request(method, url, *args, **kwargs)
+
+
+def obtener_sdk_mercadopago():
+    """
+    SDK de Mercado Pago configurado con las credenciales del proyecto.
+    Si MP_API_URL apunta a otro host (stand-in local, benchmarks) se usa ese.
+    """
+    if settings.MP_API_URL.rstrip('/') == MP_API_URL_OFICIAL:
+        return mercadopago.SDK(settings.MP_ACCESS_TOKEN)
+    return mercadopago.SDK(settings.MP_ACCESS_TOKEN, http_client=_HttpClientMP())
+
+
+def armar_datos_preferencia(orden):
+    """
+    Arma el payload de la preferencia de pago de una orden.
+    Solo usa los objetos ya cargados en la orden (sin consultas extra).
+    """
+    # Estructura del item para Mercado Pago
+    # Nos aseguramos de que unit_price sea float y no tenga demasiados decimales
+    unit_price = round(float(orden.monto_total / orden.cantidad_entradas), 2)
+    
+    item_data = {
+        "id": str(orden.lote.id),
+        "title": f"Entrada: {orden.evento.titulo}",
+        "description": f"Acceso a {orden.evento.titulo} - Lote: {orden.lote.nombre}",
+        "category_id": "events",
+        "quantity": orden.cantidad_entradas,
+        "unit_price": unit_price,
+        "currency_id": "UYU"
+    }
+
+    # DETERMINAR URLS DE RETORNO (Usa FRONTEND_URL si existe, sino usa BASE_URL)
+    # En producción esto debería ser la URL del frontend
+    base_url_retorno = getattr(settings, 'FRONTEND_URL', settings.BASE_URL)
+    if base_url_retorno.endswith('/'):
+        base_url_retorno = base_url_retorno[:-1]
+
+    preference_data = {
+        "items": [item_data],
+        "payer": {
+            "name": orden.cliente.nombre,
+            "surname": orden.cliente.apellido,
+            "email": orden.cliente.email,
+        },
+        "back_urls": {
+            "success": f"{base_url_retorno}/compra/exito",
+            "failure": f"{base_url_retorno}/compra/fallo",
+            "pending": f"{base_url_retorno}/compra/pendiente"
+        },
+        # auto_return SOLAMENTE funciona con HTTPS en algunas versiones de la API/Regiones
+        # Lo habilitamos solo si la URL es HTTPS para evitar errores 400 en localhost
+        "auto_return": "approved" if base_url_retorno.startswith('https') else "",
+        "external_reference": str(orden.id),
+        "binary_mode": True, # Para que sea Aprobado o Rechazado, sin estados intermedios raros
+    }
+
+    # Comentamos notification_url si es localhost ya que MP puede dar error 400
+    if not "localhost" in settings.BASE_URL and not "127.0.0.1" in settings.BASE_URL:
+        preference_data["notification_url"] = f"{settings.BASE_URL}/api/pagos/webhook/"
+
+    return preference_data
+
+
 def crear_preferencia_mercadopago(orden):
     """
     Genera una preferencia de pago en Mercado Pago para una orden específica.
     """
     try:
-        sdk = mercadopago.SDK(settings.MP_ACCESS_TOKEN)
-        
-        # Estructura del item para Mercado Pago
-        # Nos aseguramos de que unit_price sea float y no tenga demasiados decimales
-        unit_price = round(float(orden.monto_total / orden.cantidad_entradas), 2)
-        
-        item_data = {
-            "id": str(orden.lote.id),
-            "title": f"Entrada: {orden.evento.titulo}",
-            "description": f"Acceso a {orden.evento.titulo} - Lote: {orden.lote.nombre}",
-            "category_id": "events",
-            "quantity": orden.cantidad_entradas,
-            "unit_price": unit_price,
-            "currency_id": "UYU"
-        }
-
-        # DETERMINAR URLS DE RETORNO (Usa FRONTEND_URL si existe, sino usa BASE_URL)
-        # En producción esto debería ser la URL del frontend
-        base_url_retorno = getattr(settings, 'FRONTEND_URL', settings.BASE_URL)
-        if base_url_retorno.endswith('/'):
-            base_url_retorno = base_url_retorno[:-1]
-
-        preference_data = {
-            "items": [item_data],
-            "payer": {
-                "name": orden.cliente.nombre,
-                "surname": orden.cliente.apellido,
-                "email": orden.cliente.email,
-            },
-            "back_urls": {
-                "success": f"{base_url_retorno}/compra/exito",
-                "failure": f"{base_url_retorno}/compra/fallo",
-                "pending": f"{base_url_retorno}/compra/pendiente"
-            },
-            # auto_return SOLAMENTE funciona con HTTPS en algunas versiones de la API/Regiones
-            # Lo habilitamos solo si la URL es HTTPS para evitar errores 400 en localhost
-            "auto_return": "approved" if base_url_retorno.startswith('https') else "",
-            "external_reference": str(orden.id),
-            "binary_mode": True, # Para que sea Aprobado o Rechazado, sin estados intermedios raros
-        }
-
-        # Comentamos notification_url si es localhost ya que MP puede dar error 400
-        if not "localhost" in settings.BASE_URL and not "127.0.0.1" in settings.BASE_URL:
-            preference_data["notification_url"] = f"{settings.BASE_URL}/api/pagos/webhook/"
-
-        preference_result = sdk.preference().create(preference_data)
+        sdk = obtener_sdk_mercadopago()
+        with medir(MP_SOLICITUD_SEGUNDOS, operacion='preferencia') as medicion, tramo('mp.preferencia') as t:
+            preference_result = sdk.preference().create(armar_datos_preferencia(orden))
+            medicion.etiquetas['resultado'] = resultado_http(preference_result["status"])
+            t.atributos['http'] = preference_result["status"]
         
         if preference_result["status"] == 201:
             return {
@@ -84,11 +122,19 @@ def crear_preferencia_mercadopago(orden):
         return None
 
 
-@transaction.atomic
-def procesar_reserva_entrada(cliente_id, evento_id, cantidad):
+def obtener_pago_mercadopago(payment_id):
+    """Consulta un pago en Mercado Pago. Retorna {"status", "response"} del SDK."""
+    with medir(MP_SOLICITUD_SEGUNDOS, operacion='pago') as medicion, tramo('mp.pago') as t:
+        payment_info = obtener_sdk_mercadopago().payment().get(payment_id)
+        medicion.etiquetas['resultado'] = resultado_http(payment_info["status"])
+        t.atributos['http'] = payment_info["status"]
+    return payment_info
+
+
+def reservar_stock(cliente_id, evento_id, cantidad):
     """
-    Lógica de reserva con bloqueo de base de datos para evitar overselling.
-    Sigue el orden de lotes (escalonado).
+    Reserva el stock y crea la Orden PENDIENTE (pasos 1 a 6 de la reserva).
+    Debe ejecutarse dentro de una transacción: bloquea los lotes del evento.
     """
     # 1. Obtener cliente y evento
     try:
@@ -99,10 +145,11 @@ def procesar_reserva_entrada(cliente_id, evento_id, cantidad):
 
     # 2. Buscar lotes con stock disponible usando SELECT FOR UPDATE
     # Esto bloquea las filas de los lotes para que otros procesos esperen hasta que termine esta transacción
-    lotes_disponibles = Lote.objects.select_for_update().filter(
-        evento=evento, 
-        activo=True
-    ).order_by('orden')
+    with medir(RESERVA_ESPERA_LOCK_SEGUNDOS):
+        lotes_disponibles = list(Lote.objects.select_for_update().filter(
+            evento=evento, 
+            activo=True
+        ).order_by('orden'))
 
     lote_seleccionado = None
     
@@ -129,6 +176,7 @@ def procesar_reserva_entrada(cliente_id, evento_id, cantidad):
 
     # 6. Crear la Orden en estado PENDIENTE
     fecha_expiracion = timezone.now() + timedelta(minutes=settings.TIEMPO_EXPIRACION_RESERVA_MINUTOS)
+    ajustar_resumen_ventas(lote_seleccionado.id, reservas_pendientes=cantidad)
     
     orden = Orden.objects.create(
         cliente=cliente,
@@ -141,85 +189,162 @@ def procesar_reserva_entrada(cliente_id, evento_id, cantidad):
         estado='PENDIENTE',
         fecha_expiracion=fecha_expiracion
     )
+    registrar_movimiento_stock(lote_seleccionado.id, cantidad, 'RESERVA', orden.id)
+    asignar_traza(orden.id)
+    return orden
 
-    # 7. Generar preferencia de Mercado Pago
-    mp_pref_data = crear_preferencia_mercadopago(orden)
-    
-    if mp_pref_data:
-        orden.mp_preference_id = mp_pref_data["id"]
-        # Guardamos el init_point en un atributo volátil para el serializer si queremos, 
-        # o lo manejamos en la vista
-        orden.save()
-        # Agregamos el init_point al objeto para que el serializer lo tome (si lo configuramos)
-        orden.mp_init_point = mp_pref_data["init_point"]
-    else:
-        # Si falla MP, lanzamos error para que el @transaction.atomic haga rollback del stock
-        raise Exception("Error al conectar con la pasarela de pagos. Stock liberado.")
 
-    return orden
+@transaction.atomic
+def procesar_reserva_entrada(cliente_id, evento_id, cantidad):
+    """
+    Lógica de reserva con bloqueo de base de datos para evitar overselling.
+    Sigue el orden de lotes (escalonado).
+    """
+    with medir(RESERVA_SEGUNDOS) as medicion, tramo('reserva', cantidad=cantidad):
+        try:
+            with tramo('reserva.stock'):
+                orden = reservar_stock(cliente_id, evento_id, cantidad)
+        except ValidationError:
+            medicion.etiquetas['resultado'] = 'sin_stock'
+            raise
+
+        # 7. Generar preferencia de Mercado Pago
+        mp_pref_data = crear_preferencia_mercadopago(orden)
+        
+        if mp_pref_data:
+            orden.mp_preference_id = mp_pref_data["id"]
+            # Guardamos el init_point en un atributo volátil para el serializer si queremos, 
+            # o lo manejamos en la vista
+            orden.save()
+            # Agregamos el init_point al objeto para que el serializer lo tome (si lo configuramos)
+            orden.mp_init_point = mp_pref_data["init_point"]
+        else:
+            # Si falla MP, lanzamos error para que el @transaction.atomic haga rollback del stock
+            raise Exception("Error al conectar con la pasarela de pagos. Stock liberado.")
+
+        medicion.etiquetas['resultado'] = 'ok'
+        return orden
 
 
 @transaction.atomic
 def confirmar_pago_orden(orden_id, mp_payment_id):
     """
     Cambia el estado de una orden a APROBADO y genera las entradas con QR.
+    Si el evento ya fue cancelado no emite entradas: la orden se suma al
+    reembolso de la cancelación (el pago llegó tarde). Si el pago llega con
+    la reserva ya liberada y el lote sin stock, la orden queda
+    PAGADA_SIN_STOCK para reembolsarla o resolverla a mano.
     """
-    try:
-        # Bloqueamos la orden para evitar procesamientos duplicados por webhooks simultáneos
-        orden = Orden.objects.select_for_update().get(id=orden_id)
+    with tramo('pago.confirmar', orden_id=orden_id) as t:
+        try:
+            # Bloqueamos la orden para evitar procesamientos duplicados por webhooks simultáneos
+            orden = Orden.objects.select_for_update().get(id=orden_id)
         
-        if orden.estado == 'APROBADO':
-            return orden # Ya procesada anteriormente
-
-        orden.estado = 'APROBADO'
-        orden.mp_payment_id = mp_payment_id
-        orden.fecha_aprobacion = timezone.now()
-        orden.save()
-
-        # Generar las Entradas individuales
-        for _ in range(orden.cantidad_entradas):
-            entrada = Entrada.objects.create(
-                orden=orden,
-                cliente=orden.cliente,
-                lote=orden.lote
+            if orden.estado in ['APROBADO', 'PAGADA_SIN_STOCK']:
+                t.atributos['resultado'] = 'ya_aprobada'
+                return orden # Ya procesada anteriormente
+
+            estado_anterior = orden.estado
+            t.atributos['estado_anterior'] = estado_anterior
+            if estado_anterior in ['RECHAZADO', 'EXPIRADO']:
+                # Pagó después de que se liberó la reserva: vuelve a tomar el stock si sigue libre
+                lote = Lote.objects.select_for_update().get(id=orden.lote_id)
+                if lote.stock_disponible < orden.cantidad_entradas:
+                    orden.estado = 'PAGADA_SIN_STOCK'
+                    orden.mp_payment_id = mp_payment_id
+                    orden.save()
+                    t.atributos['resultado'] = 'sin_stock'
+                    logger.error(
+                        f"Orden {orden.id} pagada tarde ({estado_anterior}) sin stock en el lote {lote.id} "
+                        f"({lote.stock_disponible} libres de {orden.cantidad_entradas}). Queda PAGADA_SIN_STOCK para revisión."
+                    )
+                    return orden
+                lote.cantidad_vendida += orden.cantidad_entradas
+                lote.save(update_fields=['cantidad_vendida'])
+                registrar_movimiento_stock(lote.id, orden.cantidad_entradas, 'PAGO_TARDIO', orden.id)
+
+            orden.estado = 'APROBADO'
+            orden.mp_payment_id = mp_payment_id
+            orden.fecha_aprobacion = timezone.now()
+            orden.save()
+
+            if CancelacionEvento.objects.filter(evento_id=orden.evento_id).exists():
+                # Evento cancelado: sin entradas ni email, solo se encola su reembolso para el
+                # worker (la cancelación se toca después del resumen, como en cada tanda)
+                from .services_reembolsos import encolar_reembolsos
+                ajustar_resumen_por_orden(orden, estado_anterior, emitidas=0)
+                encolar_reembolsos([orden])
+                t.atributos['resultado'] = 'evento_cancelado'
+                logger.warning(f"Orden {orden.id} pagada con el evento {orden.evento_id} cancelado. Se encola su reembolso.")
+                return orden
+
+            ajustar_resumen_por_orden(orden, estado_anterior)
+            registrar_metrica(
+                orden.lote_id, orden.evento_id, orden.fecha_aprobacion,
+                vendidas=orden.cantidad_entradas, recaudado=orden.monto_total
             )
-            # Generar y guardar el QR
-            qr_file = generar_qr_entrada(entrada.id)
-            entrada.imagen_qr.save(f"qr_{entrada.id}.png", qr_file, save=True)
+
+            # Generar las Entradas individuales
+            with tramo('emision', entradas=orden.cantidad_entradas):
+                entradas = crear_entradas([
+                    Entrada(orden=orden, cliente=orden.cliente, lote=orden.lote)
+                    for _ in range(orden.cantidad_entradas)
+                ])
+                for entrada in entradas:
+                    # Generar y guardar el QR
+                    qr_file = generar_qr_entrada(entrada.id)
+                    entrada.imagen_qr.save(f"qr_{entrada.id}.png", qr_file, save=True)
         
-        # Enviar email al cliente con los QRs
-        enviar_email_entradas(orden)
+            # Enviar email al cliente con los QRs, después del commit: la espera al SMTP no alarga
+            # la transacción (locks de orden y lote, deltas del manifiesto de portería)
+            transaction.on_commit(lambda: enviar_email_entradas(orden))
         
-        logger.info(f"Orden {orden.id} aprobada. Entradas y QRs generados y enviados por email.")
-        return orden
+            logger.info(f"Orden {orden.id} aprobada. Entradas y QRs generados; email encolado al commit.")
+            return orden
 
-    except Orden.DoesNotExist:
-        logger.error(f"Intento de confirmar pago para orden inexistente: {orden_id}")
-        return None
+        except Orden.DoesNotExist:
+            logger.error(f"Intento de confirmar pago para orden inexistente: {orden_id}")
+            return None
 
 
 @transaction.atomic
-def fallar_orden(orden_id):
+def fallar_orden(orden_id, solo_pendiente=False):
     """
     Maneja el rechazo de un pago o expiración. Libera el stock.
+    Con solo_pendiente=True no toca una orden que ya se aprobó (cancelación).
     """
-    try:
-        orden = Orden.objects.select_for_update().get(id=orden_id)
+    with tramo('pago.rechazo', orden_id=orden_id) as t:
+        try:
+            orden = Orden.objects.select_for_update().get(id=orden_id)
         
-        if orden.estado in ['RECHAZADO', 'EXPIRADO']:
-            return orden # Ya fallida
+            if orden.estado in ['RECHAZADO', 'EXPIRADO', 'REEMBOLSADO']:
+                t.atributos['resultado'] = 'sin_cambios'
+                return orden # Ya fallida (o reembolsada: MP avisa el reembolso como un pago 'refunded')
+            if solo_pendiente and orden.estado != 'PENDIENTE':
+                t.atributos['resultado'] = 'sin_cambios'
+                return orden
+            if orden.estado == 'PAGADA_SIN_STOCK':
+                # No tomó stock: el reembolso hecho en MP solo cierra la orden
+                orden.estado = 'REEMBOLSADO'
+                orden.save()
+                t.atributos['resultado'] = 'reembolsada'
+                return orden
 
-        # Cambiamos el estado (por defecto RECHAZADO, el comando de limpieza usará EXPIRADO)
-        orden.estado = 'RECHAZADO'
-        orden.save()
+            # LIBERAR STOCK: Restamos de cantidad_vendida del lote. El lote se
+            # bloquea antes de tocar el resumen, en el mismo orden que la reserva
+            lote = Lote.objects.select_for_update().get(id=orden.lote_id)
+            lote.cantidad_vendida -= orden.cantidad_entradas
+            lote.save()
+            registrar_movimiento_stock(lote.id, -orden.cantidad_entradas, 'RECHAZO', orden.id)
 
-        # LIBERAR STOCK: Restamos de cantidad_vendida del lote
-        lote = Lote.objects.select_for_update().get(id=orden.lote.id)
-        lote.cantidad_vendida -= orden.cantidad_entradas
-        lote.save()
+            # Cambiamos el estado (por defecto RECHAZADO, el comando de limpieza usará EXPIRADO)
+            estado_anterior = orden.estado
+            orden.estado = 'RECHAZADO'
+            orden.save()
+            ajustar_resumen_por_orden(orden, estado_anterior)
 
-        logger.info(f"Orden {orden.id} rechazada. Stock {orden.cantidad_entradas} liberado para lote {lote.id}.")
-        return orden
+            logger.info(f"Orden {orden.id} rechazada. Stock {orden.cantidad_entradas} liberado para lote {lote.id}.")
+            return orden
 
-    except Orden.DoesNotExist:
-        return None
+        except Orden.DoesNotExist:
+            return None
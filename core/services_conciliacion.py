@@ -0,0 +1,318 @@
+"""
+Conciliación de órdenes contra la búsqueda de pagos de Mercado Pago.
+
+Si un webhook se pierde, la orden queda PENDIENTE aunque el pago exista y
+termina expirando. conciliar_pagos() recorre GET /v1/payments/search por
+date_last_updated (ascendente) desde el cursor guardado y, por cada página:
+
+  1. Cruza los pagos con las órdenes por external_reference (una consulta).
+  2. Aprueba en una transacción las órdenes con pago aprobado: estado,
+     entradas con bulk_create, resumen de ventas y métricas por lote. Si el
+     evento ya fue cancelado no emite entradas: encola su reembolso.
+  3. Rechaza en otra las PENDIENTES cuyo pago fue rechazado o cancelado y
+     libera su stock.
+  4. Avanza el cursor. Después genera los QR y envía los emails de la página.
+
+Aplicar una página dos veces no cambia nada (solo se tocan órdenes que
+siguen abiertas), por eso cada ejecución relee unos minutos antes del cursor.
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .instrumentacion import medir, resultado_http, EMAIL_SEGUNDOS, MP_SOLICITUD_SEGUNDOS
+from .models import Lote, Orden, Entrada, CancelacionEvento, CursorConciliacion, crear_entradas
+from .services_compra import obtener_sdk_mercadopago
+from .services_cortesias import renderizar_qrs
+from .services_estadisticas import ajustar_resumen_ventas
+from .services_metricas import registrar_metrica
+from .services_reembolsos import encolar_reembolsos
+from .services_stock import registrar_movimientos_stock
+from .trazas import tramo_tanda
+from .utils import armar_email_entradas
+
+logger = logging.getLogger(__name__)
+
+CURSOR_PAGOS = 'pagos_mp'
+# Estados de pago que cierran una orden abierta (mismos que el webhook)
+ESTADOS_RECHAZO = ['rejected', 'cancelled', 'refunded', 'charged_back']
+
+
+class ErrorConciliacion(Exception):
+    """La búsqueda de Mercado Pago no respondió; el cursor conserva lo avanzado."""
+
+
+# ===================================
+# APLICACIÓN POR TANDAS
+# ===================================
+
+@transaction.atomic
+def aprobar_ordenes(pagos_por_orden):
+    """
+    Aprueba las órdenes {orden_id: payment_id} que todavía no lo están.
+    Una orden RECHAZADA o EXPIRADA con pago aprobado (pagó tarde) vuelve a
+    tomar su stock, como si el webhook hubiera llegado a tiempo; si el stock
+    ya se vendió queda PAGADA_SIN_STOCK (como en confirmar_pago_orden).
+    Con el evento cancelado se aprueba sin entradas y se encola su reembolso.
+    Retorna (orden_ids con entradas, entrada_ids creadas, fuera_de_termino,
+    sin_stock, orden_ids a reembolsar).
+    """
+    ahora = timezone.now()
+    candidatas = list(
+        Orden.objects.select_for_update()
+        .filter(id__in=list(pagos_por_orden), estado__in=['PENDIENTE', 'RECHAZADO', 'EXPIRADO'])
+        .order_by('id')
+    )
+    # Stock libre de los lotes de las órdenes vencidas, bajo lock (antes que el resumen)
+    libres = {
+        lote.id: lote.stock_disponible
+        for lote in Lote.objects.select_for_update().filter(
+            id__in={orden.lote_id for orden in candidatas if orden.estado != 'PENDIENTE'}
+        ).order_by('id')
+    }
+
+    cancelados = set(
+        CancelacionEvento.objects.filter(evento_id__in={orden.evento_id for orden in candidatas})
+        .values_list('evento_id', flat=True)
+    )
+
+    # [vendidas, reservas liberadas, stock a retomar, recaudado, comisión, recaudado a reembolsar]
+    por_lote = defaultdict(lambda: [0, 0, 0, Decimal('0'), Decimal('0'), Decimal('0')])
+    ordenes = []
+    sin_stock = []
+    entradas = []
+    movimientos = []
+    for orden in candidatas:
+        if orden.estado != 'PENDIENTE':
+            if libres[orden.lote_id] < orden.cantidad_entradas:
+                orden.estado = 'PAGADA_SIN_STOCK'
+                orden.mp_payment_id = pagos_por_orden[str(orden.id)]
+                sin_stock.append(orden)
+                continue
+            libres[orden.lote_id] -= orden.cantidad_entradas
+
+        ordenes.append(orden)
+        totales = por_lote[orden.lote_id]
+        if orden.evento_id not in cancelados:
+            totales[0] += orden.cantidad_entradas
+        else:
+            totales[5] += orden.monto_total
+        if orden.estado == 'PENDIENTE':
+            totales[1] += orden.cantidad_entradas
+        else:
+            totales[2] += orden.cantidad_entradas
+            movimientos.append((orden.lote_id, orden.id, orden.cantidad_entradas, 'PAGO_TARDIO'))
+        totales[3] += orden.monto_total
+        totales[4] += orden.monto_comision
+
+        orden.estado = 'APROBADO'
+        orden.mp_payment_id = pagos_por_orden[str(orden.id)]
+        orden.fecha_aprobacion = ahora
+        if orden.evento_id in cancelados:
+            continue
+        entradas.extend(
+            Entrada(orden=orden, cliente_id=orden.cliente_id, lote_id=orden.lote_id)
+            for _ in range(orden.cantidad_entradas)
+        )
+
+    Orden.objects.bulk_update(ordenes, ['estado', 'mp_payment_id', 'fecha_aprobacion'], batch_size=500)
+    Orden.objects.bulk_update(sin_stock, ['estado', 'mp_payment_id'], batch_size=500)
+    for orden in sin_stock:
+        logger.error(
+            f"Orden {orden.id} pagada tarde sin stock en el lote {orden.lote_id}. Queda PAGADA_SIN_STOCK para revisión."
+        )
+    crear_entradas(entradas, batch_size=2000)
+    registrar_movimientos_stock(movimientos)
+
+    evento_por_lote = {orden.lote_id: orden.evento_id for orden in ordenes}
+    for lote_id, (vendidas, reservas, retomar, recaudado, comision, a_devolver) in sorted(por_lote.items()):
+        if retomar:
+            Lote.objects.filter(id=lote_id).update(cantidad_vendida=F('cantidad_vendida') + retomar)
+        ajustar_resumen_ventas(
+            lote_id, vendidas=vendidas, reservas_pendientes=-reservas, recaudado=recaudado, comision=comision
+        )
+        registrar_metrica(lote_id, evento_por_lote[lote_id], ahora, vendidas=vendidas, recaudado=recaudado - a_devolver)
+    # La cancelación después del resumen, en el mismo orden de locks que cada tanda de reembolsos
+    a_reembolsar = encolar_reembolsos([orden for orden in ordenes if orden.evento_id in cancelados])
+
+    con_entradas = [orden.id for orden in ordenes if orden.evento_id not in cancelados]
+    return con_entradas, [entrada.id for entrada in entradas], len(movimientos), len(sin_stock), a_reembolsar
+
+
+@transaction.atomic
+def rechazar_ordenes(orden_ids):
+    """Rechaza las órdenes PENDIENTES de `orden_ids` y libera su stock. Retorna cuántas."""
+    ordenes = list(
+        Orden.objects.select_for_update().filter(id__in=orden_ids, estado='PENDIENTE')
+        .order_by('id').values_list('id', 'lote_id', 'cantidad_entradas')
+    )
+    Orden.objects.filter(id__in=[orden[0] for orden in ordenes]).update(estado='RECHAZADO')
+    registrar_movimientos_stock((lote_id, orden_id, -cantidad, 'RECHAZO') for orden_id, lote_id, cantidad in ordenes)
+
+    por_lote = defaultdict(int)
+    for _, lote_id, cantidad in ordenes:
+        por_lote[lote_id] += cantidad
+    for lote_id, cantidad in sorted(por_lote.items()):
+        Lote.objects.filter(id=lote_id).update(cantidad_vendida=F('cantidad_vendida') - cantidad)
+        ajustar_resumen_ventas(lote_id, reservas_pendientes=-cantidad)
+
+    return len(ordenes)
+
+
+def _enviar_entradas(orden_ids):
+    """QRs y emails de las órdenes aprobadas, por una sola conexión SMTP."""
+    ordenes = list(
+        Orden.objects.filter(id__in=orden_ids).select_related('cliente', 'evento')
+        .prefetch_related(Prefetch('entradas', queryset=Entrada.objects.order_by('fecha_creacion')))
+    )
+    mensajes = [armar_email_entradas(orden) for orden in ordenes]
+    with medir(EMAIL_SEGUNDOS, tipo='entradas') as medicion, tramo_tanda('email') as tanda:
+        tanda.ordenes.extend(orden.id for orden in ordenes)
+        try:
+            with get_connection() as conexion:
+                enviados = conexion.send_messages(mensajes) or 0
+            medicion.etiquetas['resultado'] = 'ok'
+            return enviados
+        except Exception as e:
+            logger.error(f"Error enviando las entradas conciliadas: {str(e)}")
+            tanda.estado = 'error'
+            return 0
+
+
+def aplicar_pagos(pagos):
+    """
+    Aplica una página de pagos de la búsqueda. Un pago aprobado gana sobre
+    los rechazados de la misma orden (reintentos del comprador).
+    Retorna los contadores de la página.
+    """
+    resultado = {
+        'pagos': len(pagos), 'aprobadas': 0, 'rechazadas': 0, 'fuera_de_termino': 0, 'sin_stock': 0,
+        'a_reembolsar': 0, 'sin_orden': 0,
+    }
+
+    aprobados = {}
+    rechazados = set()
+    for pago in pagos:
+        referencia = pago.get('external_reference')
+        try:
+            referencia = str(uuid.UUID(str(referencia)))
+        except ValueError:
+            # Pagos que no son de una orden del sitio (p. ej. cobros en el local)
+            resultado['sin_orden'] += 1
+            continue
+        if pago.get('status') == 'approved':
+            aprobados[referencia] = str(pago['id'])
+        elif pago.get('status') in ESTADOS_RECHAZO:
+            rechazados.add(referencia)
+    rechazados -= aprobados.keys()
+
+    entrada_ids = []
+    orden_ids = []
+    if aprobados:
+        with tramo_tanda('conciliacion.aprobacion') as tanda:
+            orden_ids, entrada_ids, resultado['fuera_de_termino'], resultado['sin_stock'], a_reembolsar = (
+                aprobar_ordenes(aprobados)
+            )
+            tanda.ordenes.extend(orden_ids + a_reembolsar)
+        resultado['aprobadas'] = len(orden_ids) + len(a_reembolsar)
+        resultado['a_reembolsar'] = len(a_reembolsar)
+    if rechazados:
+        resultado['rechazadas'] = rechazar_ordenes(list(rechazados))
+
+    if orden_ids:
+        with tramo_tanda('emision', entradas=len(entrada_ids)) as tanda:
+            tanda.ordenes.extend(orden_ids)
+            renderizar_qrs(entrada_ids)
+        resultado['emails'] = _enviar_entradas(orden_ids)
+    return resultado
+
+
+# ===================================
+# RECORRIDO DE LA BÚSQUEDA
+# ===================================
+
+def _fecha_mp(fecha):
+    return fecha.isoformat(timespec='milliseconds')
+
+
+def _buscar_pagos(sdk, desde, hasta, limite, desplazamiento):
+    with medir(MP_SOLICITUD_SEGUNDOS, operacion='busqueda') as medicion:
+        respuesta = sdk.payment().search({
+            'sort': 'date_last_updated',
+            'criteria': 'asc',
+            'range': 'date_last_updated',
+            'begin_date': _fecha_mp(desde),
+            'end_date': _fecha_mp(hasta),
+            'limit': limite,
+            'offset': desplazamiento,
+        })
+        medicion.etiquetas['resultado'] = resultado_http(respuesta['status'])
+    if respuesta['status'] != 200:
+        raise ErrorConciliacion(f"Búsqueda de pagos MP {respuesta['status']}: {str(respuesta['response'])[:200]}")
+    return respuesta['response'].get('results', [])
+
+
+def conciliar_pagos(desde=None, pagina=None, al_progresar=None):
+    """
+    Recorre los pagos modificados desde el cursor (o desde `desde`) hasta
+    ahora y concilia las órdenes. Pagina por fecha (keyset): el desplazamiento
+    solo se usa entre pagos con la misma date_last_updated, así un pago que
+    cambia durante el recorrido no corre a los demás de página.
+    `al_progresar(resultado)` se llama después de cada página.
+    Retorna los contadores de la ejecución.
+    """
+    pagina = pagina or settings.CONCILIACION_PAGINA
+    cursor, _ = CursorConciliacion.objects.get_or_create(nombre=CURSOR_PAGOS)
+    hasta = timezone.now()
+    if desde is None:
+        if cursor.fecha_cursor:
+            desde = cursor.fecha_cursor - timedelta(minutes=settings.CONCILIACION_SOLAPAMIENTO_MINUTOS)
+        else:
+            desde = hasta - timedelta(hours=settings.CONCILIACION_VENTANA_INICIAL_HORAS)
+
+    sdk = obtener_sdk_mercadopago()
+    resultado = defaultdict(int, {'desde': _fecha_mp(desde), 'paginas': 0})
+    desplazamiento = 0
+    while True:
+        pagos = _buscar_pagos(sdk, desde, hasta, pagina, desplazamiento)
+        if not pagos:
+            break
+
+        for clave, valor in aplicar_pagos(pagos).items():
+            resultado[clave] += valor
+        resultado['paginas'] += 1
+
+        fechas = [parse_datetime(p['date_last_updated']) for p in pagos if p.get('date_last_updated')]
+        ultima = max(fechas, default=desde)
+        if ultima > desde:
+            desde, desplazamiento = ultima, 0
+        else:
+            desplazamiento += len(pagos)
+        if cursor.fecha_cursor is None or ultima > cursor.fecha_cursor:
+            cursor.fecha_cursor = ultima
+            cursor.save(update_fields=['fecha_cursor', 'fecha_modificacion'])
+
+        if al_progresar:
+            al_progresar(dict(resultado))
+        if len(pagos) < pagina:
+            break
+
+    resultado = dict(resultado, hasta=_fecha_mp(hasta))
+    cursor.resultado = resultado
+    cursor.save(update_fields=['resultado', 'fecha_modificacion'])
+    logger.info(
+        f"Conciliación MP: {resultado['pagos']} pagos en {resultado['paginas']} páginas, "
+        f"{resultado['aprobadas']} órdenes aprobadas ({resultado['fuera_de_termino']} fuera de término), "
+        f"{resultado['rechazadas']} rechazadas, {resultado['sin_stock']} pagadas sin stock, "
+        f"{resultado['a_reembolsar']} de eventos cancelados encoladas para reembolso."
+    )
+    return resultado
@@ -0,0 +1,306 @@
+"""
+Emisión masiva de cortesías y listas de invitados (Staff).
+
+emitir_cortesias() recibe la lista ya normalizada y en una sola transacción:
+  1. Crea los Cliente que no existen (bulk_create por tandas); los existentes
+     se reconocen por cédula sin puntos ni guiones y no se modifican.
+  2. Bloquea el lote, descuenta el stock y crea una Orden APROBADA sin monto
+     (origen CORTESIA) por invitado y sus Entradas con bulk_create.
+  3. Ajusta ResumenVentasLote y MetricaLote como una venta más.
+
+Los QR se dibujan después del commit en un pool de procesos
+(renderizar_qrs): la puerta valida por UUID, así que una entrada sin imagen
+ya es válida y el lote no queda bloqueado mientras se generan. Dibujar un QR
+cuesta ~6 ms de CPU, por eso la API no los genera: responde `qr_pendientes`
+y los dibuja el worker (`emitir_cortesias --qr-pendientes`), nunca un
+proceso del servidor web.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Cliente, Evento, Lote, Orden, Entrada, CancelacionEvento, crear_entradas
+from .services_estadisticas import ajustar_resumen_ventas
+from .services_metricas import registrar_metrica
+from .services_stock import registrar_movimientos_stock
+from .services_validacion import cedula_sin_formato
+from .utils import qr_png
+
+logger = logging.getLogger(__name__)
+
+TANDA_INSERCION = 2000
+CAMPOS_INVITADO = ['cedula', 'nombre', 'apellido', 'email', 'telefono', 'fecha_nacimiento', 'cantidad']
+
+
+# ===================================
+# LECTURA Y VALIDACIÓN
+# ===================================
+
+def leer_invitados(contenido, formato):
+    """
+    Lista de dicts desde un CSV (con encabezado) o un JSON (lista de objetos
+    o {"invitados": [...]}). `contenido` puede ser str o bytes.
+    """
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode('utf-8-sig')
+    if formato == 'json':
+        datos = json.loads(contenido)
+        if isinstance(datos, dict):
+            datos = datos.get('invitados', [])
+        if not isinstance(datos, list):
+            raise ValidationError("El JSON debe ser una lista de invitados.")
+        return datos
+
+    lector = csv.DictReader(io.StringIO(contenido))
+    if lector.fieldnames:
+        lector.fieldnames = [_nombre_columna(campo) for campo in lector.fieldnames]
+    return list(lector)
+
+
+def _nombre_columna(campo):
+    """'Cédula ' -> 'cedula', 'Fecha Nacimiento' -> 'fecha_nacimiento'."""
+    sin_tildes = unicodedata.normalize('NFKD', campo).encode('ascii', 'ignore').decode()
+    return sin_tildes.strip().lower().replace(' ', '_')
+
+
+def normalizar_invitados(filas):
+    """
+    Valida y normaliza las filas. Retorna (invitados, errores) con errores
+    [{fila, error}] numerados desde 1; las cédulas repetidas suman cantidad.
+    """
+    invitados = OrderedDict()
+    emails = {}
+    errores = []
+
+    for numero, fila in enumerate(filas, start=1):
+        if not isinstance(fila, dict):
+            errores.append({'fila': numero, 'error': "Formato de fila inválido"})
+            continue
+        datos = {campo: str(fila.get(campo) or '').strip() for campo in CAMPOS_INVITADO}
+
+        cedula = datos['cedula'].replace('.', '').replace('-', '')
+        if not cedula.isdigit() or not 6 <= len(cedula) <= 8:
+            errores.append({'fila': numero, 'error': "Cédula inválida"})
+            continue
+        if not datos['nombre'] or not datos['apellido']:
+            errores.append({'fila': numero, 'error': "Nombre y apellido son obligatorios"})
+            continue
+        email = datos['email'].lower()
+        try:
+            validate_email(email)
+        except ValidationError:
+            errores.append({'fila': numero, 'error': "Email inválido"})
+            continue
+        try:
+            cantidad = int(datos['cantidad'] or 1)
+            if cantidad < 1:
+                raise ValueError
+        except ValueError:
+            errores.append({'fila': numero, 'error': "Cantidad inválida"})
+            continue
+        fecha_nacimiento = None
+        if datos['fecha_nacimiento']:
+            try:
+                fecha_nacimiento = date.fromisoformat(datos['fecha_nacimiento'])
+            except ValueError:
+                errores.append({'fila': numero, 'error': "Fecha de nacimiento inválida (AAAA-MM-DD)"})
+                continue
+
+        if emails.setdefault(email, cedula) != cedula:
+            errores.append({'fila': numero, 'error': "Email repetido con otra cédula"})
+            continue
+
+        if cedula in invitados:
+            invitados[cedula]['cantidad'] += cantidad
+            continue
+        invitados[cedula] = {
+            'cedula': cedula,
+            'nombre': datos['nombre'][:100],
+            'apellido': datos['apellido'][:100],
+            'email': email,
+            'telefono': datos['telefono'][:20],
+            'fecha_nacimiento': fecha_nacimiento,
+            'cantidad': cantidad,
+        }
+
+    return list(invitados.values()), errores
+
+
+# ===================================
+# EMISIÓN
+# ===================================
+
+def _clientes_por_cedula(invitados):
+    """
+    {cedula: cliente_id} creando los que faltan. Un email ya usado por otra
+    cédula no se puede crear: se informa como error.
+    """
+    cedulas = [i['cedula'] for i in invitados]
+    ids = {}
+    for inicio in range(0, len(cedulas), TANDA_INSERCION):
+        tanda = cedulas[inicio:inicio + TANDA_INSERCION]
+        ids.update(
+            Cliente.objects.annotate(cedula_limpia=cedula_sin_formato('cedula'))
+            .filter(cedula_limpia__in=tanda).values_list('cedula_limpia', 'id')
+        )
+
+    nuevos = [i for i in invitados if i['cedula'] not in ids]
+    emails = [i['email'] for i in nuevos]
+    ocupados = set()
+    for inicio in range(0, len(emails), TANDA_INSERCION):
+        ocupados.update(
+            Cliente.objects.filter(email__in=emails[inicio:inicio + TANDA_INSERCION]).values_list('email', flat=True)
+        )
+    errores = [
+        f"Cédula {i['cedula']}: el email {i['email']} ya está registrado con otra cédula."
+        for i in nuevos if i['email'] in ocupados
+    ]
+    if errores:
+        return ids, 0, errores
+
+    # Sin contraseña utilizable: si el invitado se registra después, la define
+    password = make_password(None)
+    creados = Cliente.objects.bulk_create([
+        Cliente(
+            cedula=i['cedula'], nombre=i['nombre'], apellido=i['apellido'], email=i['email'],
+            telefono=i['telefono'], fecha_nacimiento=i['fecha_nacimiento'], password=password,
+        )
+        for i in nuevos
+    ], batch_size=TANDA_INSERCION)
+    # PostgreSQL y SQLite devuelven los ids del INSERT
+    ids.update((cliente.cedula, cliente.id) for cliente in creados)
+    return ids, len(nuevos), []
+
+
+@transaction.atomic
+def emitir_cortesias(lote_id, invitados, etiqueta=''):
+    """
+    Emite las entradas de cortesía de `invitados` (ver normalizar_invitados)
+    contra el lote. Todo o nada: lanza ValidationError si falta stock, si el
+    evento está inactivo o cancelado o hay invitados que no se pueden crear.
+    Retorna {lote_id, clientes_creados, ordenes, entradas, entrada_ids}.
+    """
+    if not invitados:
+        raise ValidationError("La lista de invitados está vacía.")
+
+    clientes, creados, errores = _clientes_por_cedula(invitados)
+    if errores:
+        raise ValidationError(errores)
+
+    # El evento se bloquea antes que el lote, en el mismo orden que cancelar_evento:
+    # una cancelación en curso espera a la emisión o la emisión ve el evento desactivado
+    evento_id = Lote.objects.filter(id=lote_id).values_list('evento_id', flat=True).first()
+    if evento_id is None:
+        raise ValidationError("Lote no encontrado.")
+    activo = Evento.objects.select_for_update().filter(id=evento_id).values_list('activo', flat=True).get()
+    if not activo or CancelacionEvento.objects.filter(evento_id=evento_id).exists():
+        raise ValidationError("El evento no está activo o fue cancelado: no se pueden emitir cortesías.")
+
+    # El lote se bloquea recién ahora: las compras esperan solo lo que dura la emisión
+    lote = Lote.objects.select_for_update().get(id=lote_id)
+
+    total = sum(i['cantidad'] for i in invitados)
+    if lote.stock_disponible < total:
+        raise ValidationError(f"Stock insuficiente en el lote: quedan {lote.stock_disponible} y se piden {total}.")
+
+    ahora = timezone.now()
+    ordenes = []
+    entradas = []
+    for invitado in invitados:
+        orden = Orden(
+            cliente_id=clientes[invitado['cedula']], evento_id=lote.evento_id, lote=lote,
+            cantidad_entradas=invitado['cantidad'], monto_subtotal=0, monto_comision=0, monto_total=0,
+            estado='APROBADO', origen='CORTESIA', etiqueta=etiqueta[:100], fecha_aprobacion=ahora,
+        )
+        ordenes.append(orden)
+        entradas.extend(
+            Entrada(orden=orden, cliente_id=orden.cliente_id, lote=lote) for _ in range(invitado['cantidad'])
+        )
+
+    Orden.objects.bulk_create(ordenes, batch_size=TANDA_INSERCION)
+    crear_entradas(entradas, batch_size=TANDA_INSERCION)
+
+    lote.cantidad_vendida += total
+    lote.save(update_fields=['cantidad_vendida'])
+    registrar_movimientos_stock((lote.id, o.id, o.cantidad_entradas, 'CORTESIA') for o in ordenes)
+    ajustar_resumen_ventas(lote.id, vendidas=total)
+    registrar_metrica(lote.id, lote.evento_id, ahora, vendidas=total)
+
+    logger.info(f"Cortesías emitidas en lote {lote.id}: {len(ordenes)} invitados, {total} entradas ({etiqueta or 'sin etiqueta'}).")
+    return {
+        'lote_id': lote.id,
+        'clientes_creados': creados,
+        'ordenes': len(ordenes),
+        'entradas': total,
+        'entrada_ids': [e.id for e in entradas],
+    }
+
+
+# ===================================
+# QRs EN UN POOL DE PROCESOS
+# ===================================
+
+def _guardar_qrs(entrada_ids, pool):
+    campo = Entrada._meta.get_field('imagen_qr')
+    generados = 0
+
+    for inicio in range(0, len(entrada_ids), TANDA_INSERCION):
+        pendientes = list(
+            Entrada.objects.filter(id__in=entrada_ids[inicio:inicio + TANDA_INSERCION])
+            .filter(Q(imagen_qr='') | Q(imagen_qr__isnull=True)).only('id', 'imagen_qr')
+        )
+        contenidos = [str(e.id) for e in pendientes]
+        imagenes = pool.map(qr_png, contenidos, chunksize=64) if pool else map(qr_png, contenidos)
+
+        for entrada, png in zip(pendientes, imagenes):
+            nombre = campo.generate_filename(entrada, f"qr_{entrada.id}.png")
+            entrada.imagen_qr.name = campo.storage.save(nombre, ContentFile(png))
+
+        Entrada.objects.bulk_update(pendientes, ['imagen_qr'], batch_size=TANDA_INSERCION)
+        generados += len(pendientes)
+
+    return generados
+
+
+def renderizar_qrs(entrada_ids, procesos=None):
+    """
+    Dibuja y guarda el QR de las entradas que todavía no lo tienen.
+    El dibujo (CPU) corre en un pool de CORTESIAS_PROCESOS_QR procesos; el
+    guardado en el storage y el UPDATE, en este proceso.
+    Retorna la cantidad de QRs generados.
+    """
+    procesos = procesos or settings.CORTESIAS_PROCESOS_QR or os.cpu_count() or 1
+    if procesos == 1 or len(entrada_ids) < 100:
+        return _guardar_qrs(entrada_ids, None)
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return _guardar_qrs(entrada_ids, pool)
+
+
+def entradas_sin_qr(lote_id=None):
+    """
+    Ids de las entradas sin imagen QR del lote o, sin lote, de los eventos
+    activos que no terminaron (lo que recorre el worker en cada vuelta).
+    """
+    entradas = Entrada.objects.filter(Q(imagen_qr='') | Q(imagen_qr__isnull=True))
+    if lote_id is not None:
+        entradas = entradas.filter(lote_id=lote_id)
+    else:
+        entradas = entradas.filter(
+            lote__evento__activo=True, lote__evento__fecha_inicio__gte=timezone.now() - timedelta(days=1)
+        )
+    return list(entradas.values_list('id', flat=True))
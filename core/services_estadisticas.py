@@ -0,0 +1,183 @@
+"""
+Servicios de estadísticas para el panel de administración (Staff).
+
+Los totales de ventas viven en ResumenVentasLote y se ajustan con deltas en
+las mismas transacciones que cambian órdenes y entradas:
+
+    reservar_stock          reservas_pendientes += n
+    confirmar_pago_orden    reservas_pendientes -= n (si estaba PENDIENTE),
+                            vendidas += n, recaudado/comision += montos
+    fallar_orden / expirar  reservas_pendientes -= n (si estaba PENDIENTE),
+                            recaudado/comision -= montos (si estaba APROBADO)
+    check-in                ingresadas += 1 por entrada
+    reembolso (cancelación) vendidas -= n (entradas anuladas), recaudado/comision -= montos
+    pago con evento cancelado  como confirmar_pago_orden pero sin vendidas (no emite entradas)
+
+reconstruir_resumen_ventas recalcula todo desde Orden/Entrada.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Evento, Lote, Orden, Entrada, ResumenVentasLote
+
+CAMPOS_RESUMEN = ['vendidas', 'ingresadas', 'reservas_pendientes', 'recaudado', 'comision']
+
+
+def ajustar_resumen_ventas(lote_id, **deltas):
+    """
+    Suma `deltas` (p. ej. vendidas=2, recaudado=Decimal('300')) al resumen del
+    lote con un UPDATE ... SET campo = campo + delta. Debe llamarse dentro de la
+    transacción que cambia el estado, así el resumen nunca ve un cambio a medias.
+    """
+    cambios = {campo: F(campo) + valor for campo, valor in deltas.items() if valor}
+    if not cambios:
+        return
+    cambios['fecha_modificacion'] = timezone.now()
+
+    if ResumenVentasLote.objects.filter(lote_id=lote_id).update(**cambios):
+        return
+
+    # Primer movimiento del lote: se crea la fila y se aplica el delta
+    evento_id = Lote.objects.filter(id=lote_id).values_list('evento_id', flat=True).get()
+    ResumenVentasLote.objects.get_or_create(lote_id=lote_id, defaults={'evento_id': evento_id})
+    ResumenVentasLote.objects.filter(lote_id=lote_id).update(**cambios)
+
+
+def ajustar_resumen_por_orden(orden, estado_anterior, emitidas=None):
+    """
+    Deltas del resumen cuando `orden` pasa de `estado_anterior` a `orden.estado`.
+    `emitidas`: entradas que genera la aprobación (por defecto todas las de la orden).
+    """
+    deltas = {}
+    if estado_anterior == 'PENDIENTE':
+        deltas['reservas_pendientes'] = -orden.cantidad_entradas
+    if estado_anterior == 'APROBADO':
+        deltas['recaudado'] = -orden.monto_total
+        deltas['comision'] = -orden.monto_comision
+    if orden.estado == 'APROBADO':
+        deltas['vendidas'] = orden.cantidad_entradas if emitidas is None else emitidas
+        deltas['recaudado'] = deltas.get('recaudado', 0) + orden.monto_total
+        deltas['comision'] = deltas.get('comision', 0) + orden.monto_comision
+    ajustar_resumen_ventas(orden.lote_id, **deltas)
+
+
+def _calcular_resumenes(lotes):
+    """Totales reales por lote calculados desde Orden y Entrada (dos consultas agrupadas)."""
+    totales = {
+        lote_id: {'evento_id': evento_id, 'vendidas': 0, 'ingresadas': 0, 'reservas_pendientes': 0,
+                  'recaudado': Decimal('0'), 'comision': Decimal('0')}
+        for lote_id, evento_id in lotes.values_list('id', 'evento_id')
+    }
+
+    for fila in Entrada.objects.filter(lote__in=lotes).order_by().values('lote_id').annotate(
+        vendidas=Count('id', filter=Q(anulada=False)),
+        ingresadas=Count('id', filter=Q(usada=True)),
+    ):
+        totales[fila['lote_id']].update(vendidas=fila['vendidas'], ingresadas=fila['ingresadas'])
+
+    for fila in Orden.objects.filter(lote__in=lotes).order_by().values('lote_id').annotate(
+        reservas_pendientes=Coalesce(Sum('cantidad_entradas', filter=Q(estado='PENDIENTE')), 0),
+        recaudado=Coalesce(Sum('monto_total', filter=Q(estado='APROBADO')), Decimal('0')),
+        comision=Coalesce(Sum('monto_comision', filter=Q(estado='APROBADO')), Decimal('0')),
+    ):
+        totales[fila['lote_id']].update(
+            reservas_pendientes=fila['reservas_pendientes'],
+            recaudado=fila['recaudado'],
+            comision=fila['comision'],
+        )
+
+    return totales
+
+
+@transaction.atomic
+def reconstruir_resumen_ventas(evento_id=None, aplicar=True):
+    """
+    Recalcula los resúmenes desde cero y corrige los que difieran.
+
+    Bloquea las filas del resumen antes de leer Orden/Entrada: una transacción
+    de compra o check-in en curso termina primero (y su cambio entra en el
+    cálculo) o espera a que la reconstrucción termine y aplica su delta encima.
+    Retorna la lista de diferencias encontradas [{lote_id, campo, resumen, real}].
+    """
+    lotes = Lote.objects.all()
+    if evento_id is not None:
+        lotes = lotes.filter(evento_id=evento_id)
+
+    # Filas faltantes (lotes sin movimientos) para poder bloquearlas también
+    ResumenVentasLote.objects.bulk_create(
+        [ResumenVentasLote(lote_id=lote_id, evento_id=ev_id)
+         for lote_id, ev_id in lotes.filter(resumen__isnull=True).values_list('id', 'evento_id')],
+        ignore_conflicts=True,
+    )
+    resumenes = {r.lote_id: r for r in ResumenVentasLote.objects.select_for_update().filter(lote__in=lotes)}
+    reales = _calcular_resumenes(lotes)
+
+    diferencias = []
+    a_corregir = []
+    for lote_id, real in reales.items():
+        resumen = resumenes[lote_id]
+        distinto = False
+        for campo in CAMPOS_RESUMEN:
+            if getattr(resumen, campo) != real[campo]:
+                diferencias.append({
+                    'lote_id': lote_id, 'campo': campo,
+                    'resumen': getattr(resumen, campo), 'real': real[campo],
+                })
+                setattr(resumen, campo, real[campo])
+                distinto = True
+        if distinto:
+            a_corregir.append(resumen)
+
+    if aplicar and a_corregir:
+        for resumen in a_corregir:
+            resumen.fecha_modificacion = timezone.now()
+        ResumenVentasLote.objects.bulk_update(a_corregir, CAMPOS_RESUMEN + ['fecha_modificacion'], batch_size=500)
+    elif not aplicar:
+        transaction.set_rollback(True)
+
+    return diferencias
+
+
+def estadisticas_dashboard():
+    """
+    Métricas de los eventos activos leídas de ResumenVentasLote: una sola
+    consulta (evento -> lotes -> resumen, 1 a 1) cuyo costo depende de la
+    cantidad de lotes activos y no del historial de órdenes o entradas.
+    """
+    eventos = list(
+        Evento.objects.filter(activo=True).annotate(
+            stock_total=Coalesce(Sum('lotes__cantidad_total'), 0),
+            vendidas=Coalesce(Sum('lotes__resumen__vendidas'), 0),
+            usadas=Coalesce(Sum('lotes__resumen__ingresadas'), 0),
+            reservas_pendientes=Coalesce(Sum('lotes__resumen__reservas_pendientes'), 0),
+            recaudado=Coalesce(Sum('lotes__resumen__recaudado'), Decimal('0')),
+            comision=Coalesce(Sum('lotes__resumen__comision'), Decimal('0')),
+        ).order_by('fecha_inicio').values(
+            'id', 'titulo', 'stock_total', 'vendidas', 'usadas', 'reservas_pendientes', 'recaudado', 'comision'
+        )
+    )
+
+    stats_eventos = []
+    total_recaudado_global = Decimal('0')
+    for evento in eventos:
+        total_recaudado_global += evento['recaudado']
+        stats_eventos.append({
+            "id": evento['id'],
+            "titulo": evento['titulo'],
+            "vendidas": evento['vendidas'],
+            "usadas": evento['usadas'],
+            "recaudado": float(evento['recaudado']),
+            "comision": float(evento['comision']),
+            "reservas_pendientes": evento['reservas_pendientes'],
+            "stock_total": evento['stock_total'],
+        })
+
+    return {
+        "total_eventos_activos": len(eventos),
+        "total_recaudado_global": float(total_recaudado_global),
+        "eventos": stats_eventos,
+    }
@@ -0,0 +1,369 @@
+"""
+Exportación de la lista de invitados de uno o varios eventos en streaming.
+
+Las filas se leen con values_list(...).iterator(chunk_size): cursor del lado
+del servidor en PostgreSQL, sin instanciar modelos ni cachear el queryset.
+Se agrupan en bloques de ~64 KB que se envían a medida que se generan, así la
+memoria del worker no depende de la cantidad de entradas.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import Entrada, TrabajoExportacion
+
+logger = logging.getLogger(__name__)
+
+ENCABEZADO_CSV = ['Ticket ID', 'Nombre', 'Apellido', 'Cédula', 'Email', 'Lote', 'Costo', 'Estado', 'Fecha Uso']
+TAMANO_BLOQUE = 64 * 1024
+
+FORMATOS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+# Cada cuántas filas un trabajo en segundo plano guarda su progreso
+PROGRESO_CADA_FILAS = 5000
+
+
+def filas_lista_invitados(evento_ids, chunk_size=None):
+    """
+    Tuplas (ticket, nombre, apellido, cedula, email, lote, costo, usada, fecha_uso, evento)
+    de las entradas de uno o varios eventos, leídas del cursor de a `chunk_size` filas.
+    """
+    if isinstance(evento_ids, int):
+        evento_ids = [evento_ids]
+    filas = Entrada.objects.filter(lote__evento_id__in=evento_ids, anulada=False).order_by(
+        'lote__evento__fecha_inicio', 'lote__evento_id', '-fecha_creacion'
+    ).values_list(
+        'id', 'codigo_corto', 'cliente__nombre', 'cliente__apellido', 'cliente__cedula',
+        'cliente__email', 'lote__nombre', 'lote__precio', 'usada', 'fecha_uso', 'lote__evento__titulo',
+    )
+    for entrada_id, codigo_corto, *resto in filas.iterator(chunk_size=chunk_size or settings.EXPORTACION_CHUNK_FILAS):
+        yield (codigo_corto or entrada_id.hex[:8].upper(), *resto)
+
+
+def _en_bloques(lineas):
+    """Concatena líneas (str) y emite bytes UTF-8 de ~TAMANO_BLOQUE."""
+    bloque = []
+    tamano = 0
+    for linea in lineas:
+        bloque.append(linea)
+        tamano += len(linea)
+        if tamano >= TAMANO_BLOQUE:
+            yield ''.join(bloque).encode('utf-8')
+            bloque = []
+            tamano = 0
+    if bloque:
+        yield ''.join(bloque).encode('utf-8')
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: writerow() devuelve la línea en vez de escribirla."""
+
+    def write(self, valor):
+        return valor
+
+
+def generar_csv(filas, con_evento=False):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(ENCABEZADO_CSV + (['Evento'] if con_evento else []))
+    for ticket, nombre, apellido, cedula, email, lote, costo, usada, fecha_uso, evento in filas:
+        fila = [
+            ticket, nombre, apellido, cedula, email, lote, costo,
+            'Ingresó' if usada else 'Pendiente',
+            fecha_uso.strftime('%Y-%m-%d %H:%M') if fecha_uso else '-',
+        ]
+        if con_evento:
+            fila.append(evento)
+        yield escritor.writerow(fila)
+
+
+def generar_ndjson(filas, con_evento=False):
+    for ticket, nombre, apellido, cedula, email, lote, costo, usada, fecha_uso, evento in filas:
+        datos = {
+            'ticket': ticket,
+            'nombre': nombre,
+            'apellido': apellido,
+            'cedula': cedula,
+            'email': email,
+            'lote': lote,
+            'costo': str(costo),
+            'usada': usada,
+            'fecha_uso': fecha_uso.isoformat() if fecha_uso else None,
+        }
+        if con_evento:
+            datos['evento'] = evento
+        yield json.dumps(datos, ensure_ascii=False) + '\n'
+
+
+def comprimir_gzip(bloques):
+    """Comprime un flujo de bytes en formato gzip sin acumularlo."""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for bloque in bloques:
+        comprimido = compresor.compress(bloque)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def exportar_lista_invitados(evento_ids, formato='csv', gzip=False, filas=None):
+    """
+    Generador de bytes de la lista de invitados en el formato pedido.
+    Con más de un evento se agrega la columna del evento. `filas` permite
+    envolver el generador de filas (p. ej. para contar el progreso).
+    """
+    con_evento = not isinstance(evento_ids, int) and len(evento_ids) > 1
+    generador = generar_ndjson if formato == 'ndjson' else generar_csv
+    bloques = _en_bloques(generador(filas or filas_lista_invitados(evento_ids), con_evento=con_evento))
+    return comprimir_gzip(bloques) if gzip else bloques
+
+
+async def _iterar_async(bloques):
+    # Bajo ASGI, Django convierte un iterador sync en lista antes de enviarlo;
+    # pidiendo bloque por bloque en el hilo del request la memoria sigue acotada
+    siguiente = sync_to_async(lambda: next(bloques, None), thread_sensitive=True)
+    while (bloque := await siguiente()) is not None:
+        yield bloque
+
+
+def respuesta_streaming(bloques, content_type, nombre_archivo, status=200):
+    """StreamingHttpResponse con el tipo de iterador que el servidor consume sin acumular."""
+    if settings.SERVER_MODE == 'asgi':
+        bloques = _iterar_async(bloques)
+    respuesta = StreamingHttpResponse(bloques, content_type=content_type, status=status)
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return respuesta
+
+
+# ===================================
+# EXPORTACIONES EN SEGUNDO PLANO
+# ===================================
+
+def version_datos(evento_ids):
+    """
+    Versión de las entradas de los eventos (una consulta agregada): cambia
+    con cada entrada emitida, anulada o usada, pero no con las reservas, que
+    no aparecen en la lista de invitados.
+    """
+    datos = Entrada.objects.filter(lote__evento_id__in=evento_ids).aggregate(
+        emitidas=Count('id', filter=Q(anulada=False)),
+        anuladas=Count('id', filter=Q(anulada=True)),
+        ultima=Max('fecha_modificacion'),
+    )
+    ultima = datos['ultima'].timestamp() if datos['ultima'] else 0
+    return f"{datos['emitidas']}-{datos['anuladas']}-{ultima:.6f}"
+
+
+def clave_exportacion(evento_ids, formato, gzip, version):
+    return hashlib.sha256(
+        json.dumps([sorted(evento_ids), formato, gzip, version]).encode()
+    ).hexdigest()
+
+
+def nombre_archivo_trabajo(trabajo):
+    extension = FORMATOS[trabajo.formato][1]
+    return f"{trabajo.clave}.{extension}{'.gz' if trabajo.gzip else ''}"
+
+
+def ruta_archivo(trabajo):
+    return os.path.join(settings.EXPORTACIONES_DIR, trabajo.archivo or nombre_archivo_trabajo(trabajo))
+
+
+def solicitar_exportacion(evento_ids, formato='csv', gzip=False, usuario=None):
+    """
+    Retorna (trabajo, creado). Si ya hay un archivo (o un trabajo en curso)
+    para los mismos eventos, formato y versión de datos, se reutiliza.
+    """
+    evento_ids = sorted(set(evento_ids))
+    clave = clave_exportacion(evento_ids, formato, gzip, version_datos(evento_ids))
+
+    existente = TrabajoExportacion.objects.filter(
+        clave=clave, estado__in=['PENDIENTE', 'EN_PROCESO', 'LISTO']
+    ).first()
+    if existente and (existente.estado != 'LISTO' or os.path.exists(ruta_archivo(existente))):
+        return existente, False
+
+    trabajo = TrabajoExportacion.objects.create(
+        evento_ids=evento_ids, formato=formato, gzip=gzip, clave=clave, solicitado_por=usuario
+    )
+    if settings.EXPORTACION_EJECUCION == 'hilo':
+        transaction.on_commit(lambda: threading.Thread(
+            target=_ejecutar_en_hilo, args=(trabajo.id,), daemon=True
+        ).start())
+    return trabajo, True
+
+
+def _ejecutar_en_hilo(trabajo_id):
+    try:
+        ejecutar_exportacion(trabajo_id)
+    finally:
+        # La conexión del hilo no la cierra el ciclo de request de Django
+        connection.close()
+
+
+def ejecutar_exportacion(trabajo_id):
+    """
+    Genera el archivo de un trabajo PENDIENTE. El archivo se escribe en un
+    temporal y se renombra al terminar: una descarga nunca ve un archivo a medias.
+    Retorna False si otro proceso ya tomó el trabajo.
+    """
+    tomado = TrabajoExportacion.objects.filter(id=trabajo_id, estado='PENDIENTE').update(
+        estado='EN_PROCESO', fecha_modificacion=timezone.now()
+    )
+    if not tomado:
+        return False
+
+    trabajo = TrabajoExportacion.objects.get(id=trabajo_id)
+    temporal = None
+    try:
+        total = Entrada.objects.filter(lote__evento_id__in=trabajo.evento_ids, anulada=False).count()
+        TrabajoExportacion.objects.filter(id=trabajo.id).update(filas_totales=total)
+
+        procesadas = 0
+
+        def contar(filas):
+            nonlocal procesadas
+            for fila in filas:
+                yield fila
+                procesadas += 1
+                if procesadas % PROGRESO_CADA_FILAS == 0:
+                    TrabajoExportacion.objects.filter(id=trabajo.id).update(
+                        filas_procesadas=procesadas, fecha_modificacion=timezone.now()
+                    )
+
+        os.makedirs(settings.EXPORTACIONES_DIR, exist_ok=True)
+        nombre = nombre_archivo_trabajo(trabajo)
+        final = os.path.join(settings.EXPORTACIONES_DIR, nombre)
+        temporal = f"{final}.{trabajo.id.hex}.tmp"
+
+        evento_ids = trabajo.evento_ids
+        with open(temporal, 'wb') as archivo:
+            for bloque in exportar_lista_invitados(
+                evento_ids, formato=trabajo.formato, gzip=trabajo.gzip, filas=contar(filas_lista_invitados(evento_ids))
+            ):
+                archivo.write(bloque)
+        os.replace(temporal, final)
+
+        TrabajoExportacion.objects.filter(id=trabajo.id).update(
+            estado='LISTO', archivo=nombre, tamano=os.path.getsize(final), filas_procesadas=procesadas,
+            fecha_fin=timezone.now(), fecha_modificacion=timezone.now()
+        )
+        _vencer_anteriores(trabajo)
+        logger.info(f"Exportación {trabajo.id} lista: {procesadas} filas.")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error en la exportación {trabajo.id}: {str(e)}")
+        if temporal and os.path.exists(temporal):
+            os.remove(temporal)
+        TrabajoExportacion.objects.filter(id=trabajo.id).update(
+            estado='ERROR', error=str(e), fecha_fin=timezone.now()
+        )
+        return True
+
+
+def _vencer_anteriores(trabajo):
+    """Borra los archivos de versiones anteriores de la misma exportación."""
+    anteriores = TrabajoExportacion.objects.filter(
+        evento_ids=trabajo.evento_ids, formato=trabajo.formato, gzip=trabajo.gzip, estado='LISTO'
+    ).exclude(clave=trabajo.clave)
+    for anterior in anteriores:
+        try:
+            os.remove(ruta_archivo(anterior))
+        except FileNotFoundError:
+            pass
+    anteriores.update(estado='VENCIDO')
+
+
+def reencolar_trabajos_colgados():
+    """Vuelve a PENDIENTE los trabajos EN_PROCESO sin progreso (p. ej. worker reiniciado)."""
+    limite = timezone.now() - timedelta(minutes=settings.EXPORTACION_TIMEOUT_MINUTOS)
+    return TrabajoExportacion.objects.filter(estado='EN_PROCESO', fecha_modificacion__lt=limite).update(
+        estado='PENDIENTE', filas_procesadas=0
+    )
+
+
+# ===================================
+# DESCARGA CON RANGOS (reanudable)
+# ===================================
+
+def _leer_archivo(ruta, inicio, largo):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+
+
+def _parsear_rango(encabezado, tamano):
+    """
+    (inicio, fin) inclusivos de un encabezado `Range: bytes=a-b`, None si no
+    aplica (ausente o múltiples rangos: se sirve el archivo completo) o
+    'invalido' si el rango no es satisfacible.
+    """
+    if not encabezado:
+        return None
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', encabezado.strip())
+    if not match:
+        return None
+    desde, hasta = match.groups()
+    if not desde and not hasta:
+        return 'invalido'
+    if not desde:
+        # Sufijo: los últimos N bytes
+        inicio, fin = max(0, tamano - int(hasta)), tamano - 1
+    else:
+        inicio = int(desde)
+        fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return 'invalido'
+    return inicio, fin
+
+
+def respuesta_descarga(trabajo, nombre_descarga, rango=None, if_range=None):
+    """
+    Descarga del archivo de un trabajo LISTO con soporte de Range (206) e
+    If-Range. El ETag es la clave del archivo, que nunca cambia de contenido.
+    """
+    ruta = ruta_archivo(trabajo)
+    tamano = os.path.getsize(ruta)
+    etag = f'"{trabajo.clave}"'
+    content_type = 'application/gzip' if trabajo.gzip else FORMATOS[trabajo.formato][0]
+
+    intervalo = _parsear_rango(rango, tamano)
+    if if_range and if_range != etag:
+        intervalo = None
+
+    if intervalo == 'invalido':
+        respuesta = StreamingHttpResponse(iter(()), status=416, content_type=content_type)
+        respuesta['Content-Range'] = f'bytes */{tamano}'
+    elif intervalo is None:
+        respuesta = respuesta_streaming(_leer_archivo(ruta, 0, tamano), content_type, nombre_descarga)
+        respuesta['Content-Length'] = str(tamano)
+    else:
+        inicio, fin = intervalo
+        respuesta = respuesta_streaming(
+            _leer_archivo(ruta, inicio, fin - inicio + 1), content_type, nombre_descarga, status=206
+        )
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        respuesta['Content-Length'] = str(fin - inicio + 1)
+
+    respuesta['Accept-Ranges'] = 'bytes'
+    respuesta['ETag'] = etag
+    return respuesta
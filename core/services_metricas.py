@@ -0,0 +1,211 @@
+"""
+Series temporales de ventas e ingresos por lote (MetricaLote).
+
+- Escritura: registrar_metrica() suma al bucket de MINUTO con un upsert, dentro
+  de la misma transacción de la aprobación o del check-in.
+- Consolidación: consolidar_metricas() (cron) recalcula los buckets de HORA
+  desde los de MINUTO y los de DIA desde los de HORA, y purga los vencidos.
+  Recalcular (en lugar de sumar) hace que correrlo dos veces sea inofensivo.
+- Lectura: serie_temporal() lee los buckets ya consolidados del nivel pedido y
+  completa el tramo posterior a la última consolidación desde el nivel
+  inferior. El costo depende de los puntos pedidos, no del historial.
+
+Los contadores solo registran eventos (aprobaciones, ingresos): un reembolso
+no resta de la serie, los totales netos están en ResumenVentasLote.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import Lote, MetricaLote
+
+NIVELES = ['MINUTO', 'HORA', 'DIA']
+CAMPOS_METRICA = ['vendidas', 'recaudado', 'ingresadas']
+DURACION_BUCKET = {
+    'MINUTO': timedelta(minutes=1),
+    'HORA': timedelta(hours=1),
+    'DIA': timedelta(days=1),
+}
+
+
+def inicio_bucket(fecha, granularidad):
+    """Inicio del bucket que contiene `fecha`, en la zona horaria del sitio."""
+    local = timezone.localtime(fecha)
+    if granularidad == 'MINUTO':
+        return local.replace(second=0, microsecond=0)
+    if granularidad == 'HORA':
+        return local.replace(minute=0, second=0, microsecond=0)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def registrar_metrica(lote_id, evento_id, fecha, **deltas):
+    """
+    Suma `deltas` (vendidas, recaudado, ingresadas) al bucket de MINUTO de
+    `fecha` con una sola consulta: INSERT ... ON CONFLICT DO UPDATE SET
+    campo = campo + delta. El primer movimiento del minuto crea la fila y los
+    siguientes (o uno concurrente) suman sobre ella, sin lecturas previas.
+    """
+    deltas = {campo: valor for campo, valor in deltas.items() if valor}
+    if not deltas:
+        return
+
+    campos = [MetricaLote._meta.get_field(nombre) for nombre in ['lote', 'evento', 'granularidad', 'inicio', *CAMPOS_METRICA]]
+    valores = [lote_id, evento_id, 'MINUTO', inicio_bucket(fecha, 'MINUTO')] + [
+        deltas.get(campo, 0) for campo in CAMPOS_METRICA
+    ]
+
+    q = connection.ops.quote_name
+    tabla = q(MetricaLote._meta.db_table)
+    columnas = ', '.join(q(campo.column) for campo in campos)
+    unicos = ', '.join(q(MetricaLote._meta.get_field(nombre).column) for nombre in ['lote', 'granularidad', 'inicio'])
+    sumas = ', '.join(f"{q(campo)} = {tabla}.{q(campo)} + EXCLUDED.{q(campo)}" for campo in deltas)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {tabla} ({columnas}) VALUES ({', '.join(['%s'] * len(campos))}) "
+            f"ON CONFLICT ({unicos}) DO UPDATE SET {sumas}",
+            [campo.get_db_prep_value(valor, connection) for campo, valor in zip(campos, valores)],
+        )
+
+
+def _reagrupar(origen, destino):
+    """Recalcula los buckets `destino` desde todas las filas retenidas de `origen`."""
+    buckets = {}
+    filas = MetricaLote.objects.filter(granularidad=origen).values_list(
+        'lote_id', 'evento_id', 'inicio', *CAMPOS_METRICA
+    ).iterator(chunk_size=5000)
+
+    for lote_id, evento_id, inicio, vendidas, recaudado, ingresadas in filas:
+        clave = (lote_id, inicio_bucket(inicio, destino))
+        bucket = buckets.get(clave)
+        if bucket is None:
+            bucket = buckets[clave] = MetricaLote(
+                lote_id=lote_id, evento_id=evento_id, granularidad=destino, inicio=clave[1],
+                vendidas=0, recaudado=Decimal('0'), ingresadas=0,
+            )
+        bucket.vendidas += vendidas
+        bucket.recaudado += recaudado
+        bucket.ingresadas += ingresadas
+
+    MetricaLote.objects.bulk_create(
+        buckets.values(),
+        update_conflicts=True,
+        unique_fields=['lote', 'granularidad', 'inicio'],
+        update_fields=CAMPOS_METRICA,
+        batch_size=500,
+    )
+    return len(buckets)
+
+
+@transaction.atomic
+def consolidar_metricas(ahora=None):
+    """
+    MINUTO -> HORA -> DIA y purga según METRICAS_RETENCION_*.
+
+    La purga corta en el inicio de un bucket del nivel superior: un bucket
+    consolidado nunca se recalcula con la mitad de sus filas de origen.
+    Retorna un dict con lo procesado.
+    """
+    ahora = ahora or timezone.now()
+    limite_minutos = inicio_bucket(ahora - timedelta(hours=settings.METRICAS_RETENCION_MINUTOS_HORAS), 'HORA')
+    limite_horas = inicio_bucket(ahora - timedelta(days=settings.METRICAS_RETENCION_HORAS_DIAS), 'DIA')
+
+    horas = _reagrupar('MINUTO', 'HORA')
+    minutos_purgados, _ = MetricaLote.objects.filter(granularidad='MINUTO', inicio__lt=limite_minutos).delete()
+    dias = _reagrupar('HORA', 'DIA')
+    horas_purgadas, _ = MetricaLote.objects.filter(granularidad='HORA', inicio__lt=limite_horas).delete()
+
+    return {
+        'horas': horas,
+        'dias': dias,
+        'minutos_purgados': minutos_purgados,
+        'horas_purgadas': horas_purgadas,
+    }
+
+
+def _buckets(evento_id, nivel, desde, hasta, lote_id):
+    """{(lote_id, inicio): {campo: valor}} del nivel pedido en [desde, hasta)."""
+    filas = MetricaLote.objects.filter(evento_id=evento_id, granularidad=nivel, inicio__lt=hasta)
+    if lote_id is not None:
+        filas = filas.filter(lote_id=lote_id)
+
+    # Hasta la frontera (último bucket consolidado) se lee este nivel; desde ahí,
+    # el nivel inferior, que tiene los movimientos posteriores a la consolidación
+    frontera = None
+    if nivel != 'MINUTO':
+        frontera = filas.aggregate(ultimo=Max('inicio'))['ultimo']
+
+    buckets = {}
+    for lote_id_fila, inicio, *valores in filas.filter(inicio__gte=desde).values_list(
+        'lote_id', 'inicio', *CAMPOS_METRICA
+    ):
+        buckets[(lote_id_fila, inicio)] = dict(zip(CAMPOS_METRICA, valores))
+
+    if nivel == 'MINUTO':
+        return buckets
+
+    inferior = NIVELES[NIVELES.index(nivel) - 1]
+    tramo_desde = max(desde, frontera) if frontera else desde
+    recientes = defaultdict(lambda: dict.fromkeys(CAMPOS_METRICA, 0))
+    for (lote_id_fila, inicio), valores in _buckets(evento_id, inferior, tramo_desde, hasta, lote_id).items():
+        bucket = recientes[(lote_id_fila, inicio_bucket(inicio, nivel))]
+        for campo in CAMPOS_METRICA:
+            bucket[campo] += valores[campo]
+
+    # El nivel inferior está completo para lo posterior a la frontera (o fue purgado
+    # y entonces el bucket consolidado es el definitivo)
+    buckets.update(recientes)
+    return buckets
+
+
+def granularidad_para_rango(desde, hasta):
+    """La granularidad más fina que entra en METRICAS_MAX_PUNTOS buckets."""
+    for nivel in NIVELES:
+        if (hasta - desde) / DURACION_BUCKET[nivel] <= settings.METRICAS_MAX_PUNTOS:
+            return nivel
+    return 'DIA'
+
+
+def _punto(inicio, valores):
+    return {
+        'inicio': timezone.localtime(inicio),
+        'vendidas': valores['vendidas'],
+        'recaudado': float(valores['recaudado']),
+        'ingresadas': valores['ingresadas'],
+    }
+
+
+def serie_temporal(evento_id, granularidad, desde, hasta, lote_id=None):
+    """
+    Series por lote y total del evento entre `desde` y `hasta`. Solo incluye
+    buckets con movimientos (la serie es dispersa).
+    """
+    desde = inicio_bucket(desde, granularidad)
+    buckets = _buckets(evento_id, granularidad, desde, hasta, lote_id)
+
+    lotes = Lote.objects.filter(evento_id=evento_id)
+    if lote_id is not None:
+        lotes = lotes.filter(id=lote_id)
+
+    por_lote = defaultdict(list)
+    totales = defaultdict(lambda: dict.fromkeys(CAMPOS_METRICA, 0))
+    for (lote_id_fila, inicio), valores in sorted(buckets.items(), key=lambda item: item[0][1]):
+        por_lote[lote_id_fila].append(_punto(inicio, valores))
+        for campo in CAMPOS_METRICA:
+            totales[inicio][campo] += valores[campo]
+
+    return {
+        'evento_id': evento_id,
+        'granularidad': granularidad.lower(),
+        'desde': desde,
+        'hasta': timezone.localtime(hasta),
+        'lotes': [
+            {'lote_id': lote['id'], 'nombre': lote['nombre'], 'puntos': por_lote.get(lote['id'], [])}
+            for lote in lotes.order_by('orden').values('id', 'nombre')
+        ],
+        'total': [_punto(inicio, valores) for inicio, valores in sorted(totales.items())],
+    }
@@ -0,0 +1,460 @@
+"""
+Reembolso masivo al cancelar un evento.
+
+cancelar_evento() desactiva el evento, crea la CancelacionEvento y un
+Reembolso PENDIENTE por cada orden APROBADA (leídas de un cursor e insertadas
+por tandas). procesar_cancelacion() los procesa por tandas hasta terminar:
+
+  1. Toma la tanda (PENDIENTE -> EN_PROCESO, SKIP LOCKED en PostgreSQL).
+  2. Pide los reembolsos a Mercado Pago en paralelo (httpx async) con a lo
+     sumo REEMBOLSOS_CONCURRENCIA pedidos en vuelo y REEMBOLSOS_POR_SEGUNDO
+     por segundo. Los 429/5xx/errores de red se reintentan con espera.
+  3. En una transacción: órdenes REEMBOLSADO, entradas anuladas, stock
+     liberado, resumen de ventas ajustado por lote y contadores de progreso.
+  4. Avisa a los clientes por email reutilizando conexiones SMTP.
+
+Es reanudable: un corte deja reembolsos EN_PROCESO que se retoman después de
+REEMBOLSOS_TIMEOUT_MINUTOS (la clave de idempotencia por orden evita que MP
+devuelva dos veces) y volver a procesar agrega las órdenes aprobadas después
+de la cancelación. Un pago que llega tarde con el evento ya cancelado solo
+encola su Reembolso (encolar_reembolsos) para el próximo procesamiento.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import httpx
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from .instrumentacion import medir, resultado_http, EMAIL_SEGUNDOS, MP_SOLICITUD_SEGUNDOS
+from .models import Evento, Lote, Orden, Entrada, CancelacionEvento, Reembolso
+from .services_async import headers_mp
+from .services_compra import fallar_orden
+from .services_estadisticas import ajustar_resumen_ventas
+from .services_stock import registrar_movimientos_stock
+from .trazas import tramo
+
+logger = logging.getLogger(__name__)
+
+# Reintentos de un mismo pedido dentro de la tanda (429, 5xx, red)
+REINTENTOS_PEDIDO = 3
+
+
+# ===================================
+# CANCELACIÓN
+# ===================================
+
+def _agregar_reembolsos(cancelacion):
+    """Crea los Reembolso de las órdenes APROBADAS que todavía no tienen uno."""
+    ordenes = Orden.objects.filter(
+        evento_id=cancelacion.evento_id, estado='APROBADO', reembolso__isnull=True
+    ).order_by().values_list('id', 'monto_total')
+
+    tanda = []
+    agregados = 0
+    for orden_id, monto in ordenes.iterator(chunk_size=settings.REEMBOLSOS_TANDA):
+        tanda.append(Reembolso(cancelacion=cancelacion, orden_id=orden_id, monto=monto))
+        if len(tanda) >= settings.REEMBOLSOS_TANDA:
+            agregados += len(Reembolso.objects.bulk_create(tanda, ignore_conflicts=True))
+            tanda = []
+    if tanda:
+        agregados += len(Reembolso.objects.bulk_create(tanda, ignore_conflicts=True))
+
+    cambios = {'ordenes_totales': Reembolso.objects.filter(cancelacion=cancelacion).count()}
+    if agregados:
+        # Una cancelación ya terminada se reabre por las órdenes nuevas
+        cambios.update(estado='EN_PROCESO', fecha_fin=None)
+    CancelacionEvento.objects.filter(id=cancelacion.id).update(**cambios)
+    return agregados
+
+
+def encolar_reembolsos(ordenes):
+    """
+    Suma al reembolso de su cancelación las `ordenes` APROBADAS cuyo evento ya
+    fue cancelado (pagos tardíos). Va dentro de la transacción que las aprueba
+    y no pide nada a Mercado Pago: el Reembolso queda PENDIENTE para el worker
+    (el hilo de la cancelación en curso o `cancelar_evento --reanudar`).
+    Retorna los ids de las órdenes encoladas.
+    """
+    cancelaciones = dict(
+        CancelacionEvento.objects.filter(evento_id__in={orden.evento_id for orden in ordenes})
+        .values_list('evento_id', 'id')
+    )
+    nuevos = [
+        Reembolso(cancelacion_id=cancelaciones[orden.evento_id], orden_id=orden.id, monto=orden.monto_total)
+        for orden in ordenes if orden.evento_id in cancelaciones
+    ]
+    if not nuevos:
+        return []
+
+    Reembolso.objects.bulk_create(nuevos, ignore_conflicts=True)
+    for cancelacion_id in sorted({reembolso.cancelacion_id for reembolso in nuevos}):
+        # Una cancelación ya terminada se reabre por las órdenes nuevas
+        CancelacionEvento.objects.filter(id=cancelacion_id).update(
+            ordenes_totales=Reembolso.objects.filter(cancelacion_id=cancelacion_id).count(),
+            estado='EN_PROCESO', fecha_fin=None, fecha_modificacion=timezone.now(),
+        )
+    return [reembolso.orden_id for reembolso in nuevos]
+
+
+def cancelar_evento(evento_id, motivo='', usuario=None, en_segundo_plano=True):
+    """
+    Cancela el evento (deja de venderse), rechaza las reservas PENDIENTES y
+    encola el reembolso de las órdenes APROBADAS. Retorna (cancelacion, creada).
+    Llamarlo de nuevo no crea otra cancelación: agrega las órdenes aprobadas
+    desde entonces y vuelve a procesar. Con en_segundo_plano=False no lanza
+    el hilo (quien llama ejecuta procesar_cancelacion).
+    """
+    with transaction.atomic():
+        evento = Evento.objects.select_for_update().get(id=evento_id)
+        if evento.activo:
+            evento.activo = False
+            evento.save(update_fields=['activo', 'fecha_modificacion'])
+
+        # Reservas en curso: se libera el stock como si hubieran expirado
+        # (una que se aprobó mientras tanto entra en los reembolsos de abajo)
+        for orden_id in Orden.objects.filter(evento=evento, estado='PENDIENTE').values_list('id', flat=True):
+            fallar_orden(orden_id, solo_pendiente=True)
+
+        cancelacion, creada = CancelacionEvento.objects.get_or_create(
+            evento=evento, defaults={'motivo': motivo, 'solicitado_por': usuario}
+        )
+        _agregar_reembolsos(cancelacion)
+
+        if en_segundo_plano and settings.REEMBOLSOS_EJECUCION == 'hilo':
+            transaction.on_commit(lambda: threading.Thread(
+                target=_procesar_en_hilo, args=(cancelacion.id,), daemon=True
+            ).start())
+
+    logger.info(f"Evento {evento_id} cancelado. Reembolsos encolados para la cancelación {cancelacion.id}.")
+    cancelacion.refresh_from_db()
+    return cancelacion, creada
+
+
+def _procesar_en_hilo(cancelacion_id):
+    try:
+        procesar_cancelacion(cancelacion_id)
+    except Exception as e:
+        logger.error(f"Error procesando la cancelación {cancelacion_id}: {str(e)}")
+    finally:
+        # La conexión del hilo no la cierra el ciclo de request de Django
+        connection.close()
+
+
+def reintentar_errores(cancelacion_id):
+    """Vuelve a PENDIENTE los reembolsos en ERROR (p. ej. después de corregirlos en MP)."""
+    with transaction.atomic():
+        cantidad = Reembolso.objects.filter(cancelacion_id=cancelacion_id, estado='ERROR').update(
+            estado='PENDIENTE', intentos=0, error='', fecha_modificacion=timezone.now()
+        )
+        CancelacionEvento.objects.filter(id=cancelacion_id).update(
+            errores=F('errores') - cantidad, estado='EN_PROCESO', fecha_fin=None
+        )
+    return cantidad
+
+
+# ===================================
+# PEDIDOS A MERCADO PAGO
+# ===================================
+
+class _LimitadorTasa:
+    """Espacia los pedidos para no superar `por_segundo` (0 = sin tope)."""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self.proximo = 0.0
+
+    async def esperar(self):
+        if not self.intervalo:
+            return
+        ahora = time.monotonic()
+        turno = max(self.proximo, ahora)
+        self.proximo = turno + self.intervalo
+        if turno > ahora:
+            await asyncio.sleep(turno - ahora)
+
+
+async def _pedir_reembolso(cliente, limitador, semaforo, orden_id, payment_id):
+    """
+    POST /v1/payments/{id}/refunds (devolución total). Retorna
+    ('ok', refund_id), ('reintentar', detalle) o ('error', detalle).
+    """
+    async with semaforo:
+        for intento in range(REINTENTOS_PEDIDO):
+            await limitador.esperar()
+            try:
+                with (
+                    medir(MP_SOLICITUD_SEGUNDOS, operacion='reembolso') as medicion,
+                    tramo('mp.reembolso', orden_id=orden_id, intento=intento + 1) as t,
+                ):
+                    respuesta = await cliente.post(
+                        f"/v1/payments/{payment_id}/refunds", json={},
+                        headers={"X-Idempotency-Key": f"reembolso-{orden_id}"},
+                    )
+                    medicion.etiquetas['resultado'] = resultado_http(respuesta.status_code)
+                    t.atributos['http'] = respuesta.status_code
+            except httpx.HTTPError as e:
+                detalle = f"Error de red: {e.__class__.__name__}"
+            else:
+                if respuesta.status_code in (200, 201):
+                    return 'ok', str(respuesta.json().get('id', ''))
+                detalle = f"MP {respuesta.status_code}: {respuesta.text[:200]}"
+                if respuesta.status_code != 429 and respuesta.status_code < 500:
+                    return 'error', detalle
+            await asyncio.sleep(0.5 * 2 ** intento)
+        return 'reintentar', detalle
+
+
+async def _reembolsar_tanda(pedidos, limitador, concurrencia):
+    """{orden_id: resultado} de los pedidos [(orden_id, payment_id)]."""
+    semaforo = asyncio.Semaphore(concurrencia)
+    async with httpx.AsyncClient(
+        base_url=settings.MP_API_URL,
+        headers=headers_mp(),
+        timeout=settings.MP_HTTP_TIMEOUT_SEGUNDOS,
+        limits=httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia),
+    ) as cliente:
+        resultados = await asyncio.gather(*(
+            _pedir_reembolso(cliente, limitador, semaforo, orden_id, payment_id)
+            for orden_id, payment_id in pedidos
+        ))
+    return dict(zip((orden_id for orden_id, _ in pedidos), resultados))
+
+
+# ===================================
+# EMAILS (conexiones SMTP reutilizadas)
+# ===================================
+
+class _PoolCorreo:
+    """
+    `conexiones` conexiones SMTP abiertas durante todo el proceso; cada envío
+    toma una libre y manda varios mensajes por la misma sesión.
+    """
+
+    def __init__(self, conexiones):
+        self.libres = queue.Queue()
+        self.conexiones = [get_connection() for _ in range(conexiones)]
+        for conexion in self.conexiones:
+            self.libres.put(conexion)
+        self.ejecutor = ThreadPoolExecutor(max_workers=conexiones)
+
+    def _enviar(self, mensajes):
+        conexion = self.libres.get()
+        with medir(EMAIL_SEGUNDOS, tipo='reembolso') as medicion:
+            try:
+                conexion.open()
+                ok = conexion.send_messages([mensaje for _, mensaje in mensajes]) == len(mensajes)
+                medicion.etiquetas['resultado'] = 'ok' if ok else 'incompleto'
+                return ok
+            except Exception as e:
+                logger.error(f"Error enviando emails de reembolso: {str(e)}")
+                conexion.close()
+                return False
+            finally:
+                self.libres.put(conexion)
+
+    def enviar(self, mensajes, por_sesion=20):
+        """`mensajes` = [(clave, EmailMessage)]. Retorna las claves enviadas."""
+        partes = [mensajes[i:i + por_sesion] for i in range(0, len(mensajes), por_sesion)]
+        enviados = []
+        for parte, ok in zip(partes, self.ejecutor.map(self._enviar, partes)):
+            if ok:
+                enviados.extend(clave for clave, _ in parte)
+        return enviados
+
+    def cerrar(self):
+        self.ejecutor.shutdown()
+        for conexion in self.conexiones:
+            conexion.close()
+
+
+def _mensaje_reembolso(orden, motivo):
+    context = {
+        'cliente': orden.cliente,
+        'evento': orden.evento,
+        'orden': orden,
+        'motivo': motivo,
+        'frontend_url': settings.FRONTEND_URL,
+    }
+    html_content = render_to_string('emails/reembolso_evento.html', context)
+    email = EmailMultiAlternatives(
+        f"Reembolso: {orden.evento.titulo} fue cancelado - Backyard Bar",
+        strip_tags(html_content),
+        settings.DEFAULT_FROM_EMAIL,
+        [orden.cliente.email],
+    )
+    email.attach_alternative(html_content, "text/html")
+    return email
+
+
+def _avisar_clientes(cancelacion, reembolso_ids, correo):
+    reembolsos = Reembolso.objects.filter(id__in=reembolso_ids, email_enviado=False).select_related(
+        'orden__cliente', 'orden__evento'
+    )
+    mensajes = [(r.id, _mensaje_reembolso(r.orden, cancelacion.motivo)) for r in reembolsos]
+    enviados = correo.enviar(mensajes)
+    if enviados:
+        Reembolso.objects.filter(id__in=enviados).update(email_enviado=True)
+        CancelacionEvento.objects.filter(id=cancelacion.id).update(emails_enviados=F('emails_enviados') + len(enviados))
+    return len(enviados)
+
+
+# ===================================
+# PROCESAMIENTO POR TANDAS
+# ===================================
+
+def _tomar_tanda(cancelacion_id, tamano):
+    """Marca EN_PROCESO la próxima tanda de reembolsos PENDIENTES y la retorna."""
+    with transaction.atomic():
+        ids = list(
+            Reembolso.objects.select_for_update(skip_locked=True)
+            .filter(cancelacion_id=cancelacion_id, estado='PENDIENTE')
+            .order_by('id').values_list('id', flat=True)[:tamano]
+        )
+        Reembolso.objects.filter(id__in=ids).update(estado='EN_PROCESO', fecha_modificacion=timezone.now())
+    return list(Reembolso.objects.filter(id__in=ids).select_related('orden'))
+
+
+@transaction.atomic
+def _aplicar_tanda(cancelacion_id, reembolsos, resultados):
+    """
+    Guarda el resultado de la tanda. Las órdenes reembolsadas que siguen
+    APROBADAS pasan a REEMBOLSADO con sus entradas anuladas, liberan stock y
+    descuentan del resumen de ventas, todo agrupado por lote.
+    """
+    ahora = timezone.now()
+    hechos = []
+    errores = 0
+    for reembolso in reembolsos:
+        estado, detalle = resultados[reembolso.orden_id]
+        reembolso.fecha_modificacion = ahora
+        if estado == 'ok':
+            reembolso.estado, reembolso.mp_refund_id, reembolso.error = 'REEMBOLSADO', detalle, ''
+            hechos.append(reembolso)
+            continue
+        reembolso.intentos += 1
+        reembolso.error = detalle
+        if estado == 'error' or reembolso.intentos >= settings.REEMBOLSOS_MAX_INTENTOS:
+            reembolso.estado = 'ERROR'
+            errores += 1
+        else:
+            reembolso.estado = 'PENDIENTE'
+    Reembolso.objects.bulk_update(
+        reembolsos, ['estado', 'mp_refund_id', 'error', 'intentos', 'fecha_modificacion'], batch_size=500
+    )
+
+    ordenes = list(
+        Orden.objects.select_for_update().filter(
+            id__in=[r.orden_id for r in hechos], estado='APROBADO'
+        ).values_list('id', 'lote_id', 'cantidad_entradas', 'monto_total', 'monto_comision')
+    )
+    orden_ids = [orden[0] for orden in ordenes]
+    # Entradas que se anulan por lote (un pago tardío con el evento ya cancelado no emitió ninguna)
+    anuladas = dict(
+        Entrada.objects.filter(orden_id__in=orden_ids, anulada=False).order_by().values('lote_id')
+        .annotate(cantidad=Count('id')).values_list('lote_id', 'cantidad')
+    )
+    Orden.objects.filter(id__in=orden_ids).update(estado='REEMBOLSADO')
+    Entrada.objects.filter(orden_id__in=orden_ids).update(anulada=True, fecha_modificacion=ahora)
+    registrar_movimientos_stock(
+        (lote_id, orden_id, -cantidad, 'REEMBOLSO') for orden_id, lote_id, cantidad, _, _ in ordenes
+    )
+
+    por_lote = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for _, lote_id, cantidad, monto_total, monto_comision in ordenes:
+        por_lote[lote_id][0] += cantidad
+        por_lote[lote_id][1] += monto_total
+        por_lote[lote_id][2] += monto_comision
+    for lote_id, (cantidad, recaudado, comision) in sorted(por_lote.items()):
+        Lote.objects.filter(id=lote_id).update(cantidad_vendida=F('cantidad_vendida') - cantidad)
+        ajustar_resumen_ventas(
+            lote_id, vendidas=-anuladas.get(lote_id, 0), recaudado=-recaudado, comision=-comision
+        )
+
+    CancelacionEvento.objects.filter(id=cancelacion_id).update(
+        reembolsadas=F('reembolsadas') + len(hechos),
+        errores=F('errores') + errores,
+        monto_reembolsado=F('monto_reembolsado') + sum((r.monto for r in hechos), Decimal('0')),
+        fecha_modificacion=ahora,
+    )
+    return [r.id for r in hechos]
+
+
+def reencolar_reembolsos_colgados(cancelacion_id):
+    """Vuelve a PENDIENTE los reembolsos EN_PROCESO sin progreso (proceso cortado)."""
+    limite = timezone.now() - timedelta(minutes=settings.REEMBOLSOS_TIMEOUT_MINUTOS)
+    return Reembolso.objects.filter(
+        cancelacion_id=cancelacion_id, estado='EN_PROCESO', fecha_modificacion__lt=limite
+    ).update(estado='PENDIENTE')
+
+
+def procesar_cancelacion(cancelacion_id, concurrencia=None, por_segundo=None, tamano_tanda=None, al_progresar=None):
+    """
+    Procesa los reembolsos pendientes de una cancelación hasta terminar.
+    `al_progresar(cancelacion)` se llama después de cada tanda.
+    Retorna la CancelacionEvento actualizada.
+    """
+    concurrencia = concurrencia or settings.REEMBOLSOS_CONCURRENCIA
+    por_segundo = settings.REEMBOLSOS_POR_SEGUNDO if por_segundo is None else por_segundo
+    tamano_tanda = tamano_tanda or settings.REEMBOLSOS_TANDA
+
+    cancelacion = CancelacionEvento.objects.get(id=cancelacion_id)
+    _agregar_reembolsos(cancelacion)
+    reencolar_reembolsos_colgados(cancelacion_id)
+
+    limitador = _LimitadorTasa(por_segundo)
+    correo = _PoolCorreo(settings.REEMBOLSOS_CONEXIONES_SMTP)
+    try:
+        while reembolsos := _tomar_tanda(cancelacion_id, tamano_tanda):
+            resultados = {}
+            pedidos = []
+            for reembolso in reembolsos:
+                orden = reembolso.orden
+                if not orden.monto_total:
+                    # Cortesías: no hay pago que devolver
+                    resultados[orden.id] = ('ok', '')
+                elif not orden.mp_payment_id:
+                    resultados[orden.id] = ('error', "La orden no tiene pago de Mercado Pago")
+                else:
+                    pedidos.append((orden.id, orden.mp_payment_id))
+            if pedidos:
+                resultados.update(asyncio.run(_reembolsar_tanda(pedidos, limitador, concurrencia)))
+
+            hechos = _aplicar_tanda(cancelacion_id, reembolsos, resultados)
+            _avisar_clientes(cancelacion, hechos, correo)
+
+            if al_progresar:
+                al_progresar(CancelacionEvento.objects.get(id=cancelacion_id))
+
+        # Emails que no salieron en su tanda (SMTP caído) o en un proceso anterior
+        pendientes_email = list(
+            Reembolso.objects.filter(cancelacion_id=cancelacion_id, estado='REEMBOLSADO', email_enviado=False)
+            .values_list('id', flat=True)
+        )
+        if pendientes_email:
+            _avisar_clientes(cancelacion, pendientes_email, correo)
+    finally:
+        correo.cerrar()
+
+    cancelacion.refresh_from_db()
+    if not Reembolso.objects.filter(cancelacion_id=cancelacion_id, estado__in=['PENDIENTE', 'EN_PROCESO']).exists():
+        cancelacion.estado = 'CON_ERRORES' if cancelacion.errores else 'COMPLETADA'
+        cancelacion.fecha_fin = timezone.now()
+        cancelacion.save(update_fields=['estado', 'fecha_fin', 'fecha_modificacion'])
+    logger.info(
+        f"Cancelación {cancelacion.id}: {cancelacion.reembolsadas}/{cancelacion.ordenes_totales} reembolsadas, "
+        f"{cancelacion.errores} con error."
+    )
+    return cancelacion
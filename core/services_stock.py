@@ -0,0 +1,188 @@
+"""
+Libro de movimientos de stock y verificación de Lote.cantidad_vendida.
+
+Todo cambio del contador registra un MovimientoStock en la misma transacción
+(registrar_movimiento_stock / registrar_movimientos_stock), así que para cada
+lote: cantidad_vendida == suma de sus movimientos.
+
+verificar_stock() es incremental: SaldoStockLote guarda la suma de cada lote
+hasta el punto de control y solo se leen los movimientos posteriores, más los
+contadores de los lotes. Los lotes que no cierran se vuelven a calcular bajo
+lock del lote (descarta carreras con compras en curso) y, con reparar=True,
+el contador se corrige al stock real de las órdenes (PENDIENTES + APROBADAS)
+registrando un AJUSTE. completo=True recalcula todo desde las órdenes.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+from .models import Lote, Orden, MovimientoStock, SaldoStockLote, PuntoControlStock
+
+logger = logging.getLogger(__name__)
+
+PUNTO_CONTROL = 'lotes'
+TANDA_ORDENES = 1000
+
+
+# ===================================
+# REGISTRO
+# ===================================
+
+def registrar_movimiento_stock(lote_id, cantidad, motivo, orden_id=None):
+    """Registra un cambio de cantidad_vendida. Llamar en la transacción que lo aplica."""
+    if cantidad:
+        MovimientoStock.objects.create(lote_id=lote_id, orden_id=orden_id, cantidad=cantidad, motivo=motivo)
+
+
+def registrar_movimientos_stock(movimientos):
+    """Versión en bloque: `movimientos` = [(lote_id, orden_id, cantidad, motivo)]."""
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(lote_id=lote_id, orden_id=orden_id, cantidad=cantidad, motivo=motivo)
+        for lote_id, orden_id, cantidad, motivo in movimientos if cantidad
+    ], batch_size=2000)
+
+
+# ===================================
+# VERIFICACIÓN
+# ===================================
+
+def stock_real(lotes):
+    """{lote_id: entradas de órdenes PENDIENTES o APROBADAS} (lo que debería valer el contador)."""
+    return dict(
+        Orden.objects.filter(lote__in=lotes, estado__in=['PENDIENTE', 'APROBADO']).order_by()
+        .values('lote_id').annotate(total=Sum('cantidad_entradas')).values_list('lote_id', 'total')
+    )
+
+
+def _sumas_por_lote(movimientos):
+    return dict(
+        movimientos.order_by().values('lote_id').annotate(total=Sum('cantidad')).values_list('lote_id', 'total')
+    )
+
+
+def _ordenes_inconsistentes(desde, hasta):
+    """
+    Órdenes con movimientos en (desde, hasta] cuya suma no corresponde a su
+    estado. Las órdenes anteriores al libro (sin movimiento de alta) se omiten.
+    """
+    orden_ids = list(
+        MovimientoStock.objects.filter(id__gt=desde, id__lte=hasta, orden__isnull=False)
+        .order_by().values_list('orden_id', flat=True).distinct()
+    )
+    inconsistentes = []
+    for inicio in range(0, len(orden_ids), TANDA_ORDENES):
+        ordenes = Orden.objects.filter(id__in=orden_ids[inicio:inicio + TANDA_ORDENES]).annotate(
+            libro=Sum('movimientos_stock__cantidad'),
+            altas=Count('movimientos_stock', filter=Q(movimientos_stock__motivo__in=MovimientoStock.ALTAS)),
+        ).values_list('id', 'lote_id', 'estado', 'cantidad_entradas', 'libro', 'altas')
+        for orden_id, lote_id, estado, cantidad, libro, altas in ordenes:
+            esperado = cantidad if estado in ('PENDIENTE', 'APROBADO') else 0
+            if altas and libro != esperado:
+                inconsistentes.append({'orden_id': str(orden_id), 'lote_id': lote_id, 'estado': estado, 'libro': libro})
+    return inconsistentes
+
+
+def _confirmar_y_reparar(lote_id, reparar):
+    """
+    Recalcula el lote bajo lock: el contador no cambia mientras tanto, así que
+    una diferencia acá no es una compra en curso. Retorna la diferencia o None.
+    """
+    with transaction.atomic():
+        lote = Lote.objects.select_for_update().get(id=lote_id)
+        libro = MovimientoStock.objects.filter(lote_id=lote_id).aggregate(total=Sum('cantidad'))['total'] or 0
+        real = stock_real([lote_id]).get(lote_id, 0)
+        if lote.cantidad_vendida == libro == real:
+            return None
+
+        diferencia = {'lote_id': lote_id, 'contador': lote.cantidad_vendida, 'libro': libro, 'real': real}
+        if reparar:
+            registrar_movimiento_stock(lote_id, real - libro, 'AJUSTE')
+            if lote.cantidad_vendida != real:
+                Lote.objects.filter(id=lote_id).update(cantidad_vendida=real)
+            diferencia['reparado'] = True
+            logger.warning(f"Stock del lote {lote_id} reparado: contador {lote.cantidad_vendida}, libro {libro} -> {real}.")
+        else:
+            logger.error(f"Stock del lote {lote_id} inconsistente: contador {lote.cantidad_vendida}, libro {libro}, real {real}.")
+        return diferencia
+
+
+def verificar_stock(reparar=False, completo=False):
+    """
+    Verifica los contadores contra el libro desde el último punto de control.
+    Los movimientos de los últimos STOCK_MARGEN_SEGUNDOS se cuentan pero no
+    se suman al saldo: una transacción más vieja que siga abierta todavía
+    puede confirmar un movimiento con un id menor.
+    Retorna {'lotes', 'movimientos', 'ordenes_inconsistentes', 'diferencias', ...}.
+    """
+    punto, _ = PuntoControlStock.objects.get_or_create(nombre=PUNTO_CONTROL)
+    desde = 0 if completo else punto.movimiento_hasta
+    limite = timezone.now() - timedelta(seconds=settings.STOCK_MARGEN_SEGUNDOS)
+    nuevos = MovimientoStock.objects.filter(id__gt=desde, fecha__lt=limite).aggregate(tope=Max('id'), cantidad=Count('id'))
+    hasta = nuevos['tope'] or desde
+
+    estables = _sumas_por_lote(MovimientoStock.objects.filter(id__gt=desde, id__lte=hasta))
+    recientes = _sumas_por_lote(MovimientoStock.objects.filter(id__gt=hasta))
+    saldos = {} if completo else dict(SaldoStockLote.objects.values_list('lote_id', 'saldo'))
+    contadores = dict(Lote.objects.values_list('id', 'cantidad_vendida'))
+
+    sospechosos = {
+        lote_id for lote_id, vendida in contadores.items()
+        if saldos.get(lote_id, 0) + estables.get(lote_id, 0) + recientes.get(lote_id, 0) != vendida
+    }
+    if completo:
+        # El libro puede cerrar con el contador y aun así no con las órdenes
+        reales = stock_real(list(contadores))
+        sospechosos.update(lote_id for lote_id, vendida in contadores.items() if reales.get(lote_id, 0) != vendida)
+        ordenes = []
+    else:
+        ordenes = _ordenes_inconsistentes(desde, hasta)
+        sospechosos.update(orden['lote_id'] for orden in ordenes)
+
+    diferencias = [d for d in (_confirmar_y_reparar(lote_id, reparar) for lote_id in sorted(sospechosos)) if d]
+
+    resultado = {
+        'lotes': len(contadores),
+        'movimientos': nuevos['cantidad'],
+        'movimiento_hasta': hasta,
+        'ordenes_inconsistentes': ordenes[:50],
+        'diferencias': diferencias,
+        'completo': completo,
+    }
+
+    with transaction.atomic():
+        punto = PuntoControlStock.objects.select_for_update().get(id=punto.id)
+        # Otra verificación pudo avanzar el punto mientras tanto: no sumar dos veces
+        if completo or punto.movimiento_hasta == desde:
+            if completo:
+                SaldoStockLote.objects.all().delete()
+                SaldoStockLote.objects.bulk_create(
+                    [SaldoStockLote(lote_id=lote_id, saldo=saldo) for lote_id, saldo in estables.items()],
+                    batch_size=2000
+                )
+            else:
+                existentes = set(
+                    SaldoStockLote.objects.filter(lote_id__in=list(estables)).values_list('lote_id', flat=True)
+                )
+                for lote_id, suma in estables.items():
+                    if lote_id in existentes:
+                        SaldoStockLote.objects.filter(lote_id=lote_id).update(saldo=F('saldo') + suma)
+                SaldoStockLote.objects.bulk_create([
+                    SaldoStockLote(lote_id=lote_id, saldo=suma)
+                    for lote_id, suma in estables.items() if lote_id not in existentes
+                ])
+            punto.movimiento_hasta = hasta
+        punto.resultado = {
+            'lotes': resultado['lotes'],
+            'movimientos': resultado['movimientos'],
+            'ordenes_inconsistentes': len(ordenes),
+            'diferencias': len(diferencias),
+            'reparadas': sum(1 for d in diferencias if d.get('reparado')),
+            'completo': completo,
+        }
+        punto.save(update_fields=['movimiento_hasta', 'resultado', 'fecha_modificacion'])
+
+    return resultado
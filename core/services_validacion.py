@@ -0,0 +1,278 @@
+"""
+Servicios de validación de entradas en la puerta (Portería).
+"""
+
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core import signing
+from django.db import connection, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Greatest, Replace
+from django.utils import timezone
+from .instrumentacion import ESCANEOS_TOTAL
+from .lookups import PrefijoSinMayusculas
+from .models import Entrada
+from .services_estadisticas import ajustar_resumen_ventas
+from .services_metricas import registrar_metrica, inicio_bucket
+
+
+def registrar_ingreso(codigo_qr, usuario_validador):
+    """
+    Check-in atómico de una entrada. Retorna (entrada, es_valida) o (None, False)
+    si el código no existe. `codigo_qr` es el UUID del QR o el código corto
+    (ambos resuelven con un lookup por índice único).
+
+    El UPDATE condicional (WHERE usada = false) es la única fuente de verdad:
+    si dos porteros escanean la misma entrada a la vez, solo uno afecta la fila
+    y el otro recibe la alerta de entrada ya utilizada. Una entrada anulada
+    (orden reembolsada) nunca es válida.
+
+    El check-in son 2 consultas: el UPDATE y un SELECT con JOIN de los datos a
+    mostrar (un escaneo rechazado no hace más). Un escaneo válido suma en la
+    misma transacción una escritura al resumen de ventas y un upsert a las
+    métricas por minuto: 4 en total, porque el resumen y las series se
+    actualizan en la transición de estado y no al leerlos.
+    """
+    filtro = {'id': codigo_qr} if isinstance(codigo_qr, uuid.UUID) else {'codigo_corto': codigo_qr}
+
+    with transaction.atomic():
+        ahora = timezone.now()
+        es_valida = Entrada.objects.filter(**filtro, usada=False, anulada=False).update(
+            usada=True,
+            fecha_uso=ahora,
+            usuario_validador=usuario_validador,
+            fecha_modificacion=ahora,
+        ) == 1
+
+        entrada = Entrada.objects.select_related(
+            'cliente', 'lote__evento', 'usuario_validador'
+        ).filter(**filtro).first()
+
+        if entrada is None:
+            ESCANEOS_TOTAL.labels(origen='online', resultado='no_existe').inc()
+            return None, False
+        if es_valida:
+            ajustar_resumen_ventas(entrada.lote_id, ingresadas=1)
+            registrar_metrica(entrada.lote_id, entrada.lote.evento_id, ahora, ingresadas=1)
+
+    resultado = 'valida' if es_valida else 'anulada' if entrada.anulada else 'ya_utilizada'
+    ESCANEOS_TOTAL.labels(origen='online', resultado=resultado).inc()
+    return entrada, es_valida
+
+
+# ===================================
+# PORTERÍA OFFLINE (Manifiesto + check-in por lotes)
+# ===================================
+
+def _firmador_version(evento_id):
+    return signing.Signer(salt=f'core.manifiesto.{evento_id}')
+
+
+def _a_microsegundos(fecha):
+    return int(fecha.timestamp() * 1_000_000)
+
+
+def generar_manifiesto(evento_id, desde=None):
+    """
+    Manifiesto compacto de las entradas de un evento para validar offline.
+
+    Sin `desde` devuelve todas las entradas; con `desde` (la versión firmada de
+    una descarga anterior) solo las modificadas después. La versión es la
+    fecha_modificacion más nueva, pero una transacción la fija al escribir y
+    se ve recién al hacer commit: las deltas se solapan
+    MANIFIESTO_MARGEN_SEGUNDOS, que tiene que superar a la transacción más
+    larga que escribe entradas (la emisión de cortesías; los emails se envían
+    después del commit). Aplicarlas es idempotente.
+
+    Cada fila es [uuid_hex, estado] con estado 0 = válida, 1 = usada y
+    2 = anulada (reembolso): cualquier valor distinto de 0 no permite ingresar.
+    `cantidad` permite a la puerta detectar una descarga truncada.
+
+    Lanza signing.BadSignature si `desde` no es una versión emitida para este evento.
+    """
+    entradas = Entrada.objects.filter(lote__evento_id=evento_id)
+
+    version = 0
+    if desde:
+        version = int(_firmador_version(evento_id).unsign(desde))
+        margen = settings.MANIFIESTO_MARGEN_SEGUNDOS * 1_000_000
+        corte = datetime.fromtimestamp((version - margen) / 1_000_000, tz=dt_timezone.utc)
+        entradas = entradas.filter(fecha_modificacion__gt=corte)
+
+    filas = []
+    for entrada_id, usada, anulada, fecha_modificacion in entradas.values_list(
+        'id', 'usada', 'anulada', 'fecha_modificacion'
+    ).iterator(chunk_size=5000):
+        filas.append([entrada_id.hex, 2 if anulada else 1 if usada else 0])
+        version = max(version, _a_microsegundos(fecha_modificacion))
+
+    datos = {
+        'evento_id': evento_id,
+        'completo': not desde,
+        'version': _firmador_version(evento_id).sign(str(version)),
+        'cantidad': len(filas),
+        'entradas': filas,
+    }
+    return datos
+
+
+@transaction.atomic
+def registrar_ingresos_lote(evento_id, escaneos, usuario_validador):
+    """
+    Aplica en una sola transacción los escaneos hechos offline por una puerta.
+
+    `escaneos` es una lista de dicts {"codigo_qr": UUID, "fecha_uso": datetime|None}.
+    Las entradas involucradas se bloquean (SELECT ... FOR UPDATE) y se marcan
+    con un único bulk_update. Retorna (aplicados, conflictos): un conflicto es
+    una entrada inexistente, anulada, ya usada (p. ej. ingresó por otra
+    puerta) o escaneada dos veces en el mismo lote.
+    """
+    ahora = timezone.now()
+    codigos = {e['codigo_qr'] for e in escaneos}
+
+    existentes = {
+        e.id: e for e in Entrada.objects.select_for_update(of=('self',)).select_related('usuario_validador').filter(
+            id__in=codigos, lote__evento_id=evento_id
+        ).only('id', 'lote', 'usada', 'anulada', 'fecha_uso', 'usuario_validador__username')
+    }
+
+    conflictos = []
+    a_marcar = {}
+    # El escaneo más antiguo de cada código es el que cuenta
+    for escaneo in sorted(escaneos, key=lambda e: e.get('fecha_uso') or ahora):
+        codigo = escaneo['codigo_qr']
+        entrada = existentes.get(codigo)
+
+        if entrada is None:
+            conflictos.append({'codigo_qr': str(codigo), 'motivo': 'no_existe'})
+        elif codigo in a_marcar:
+            conflictos.append({'codigo_qr': str(codigo), 'motivo': 'duplicado_en_lote'})
+        elif entrada.anulada:
+            conflictos.append({'codigo_qr': str(codigo), 'motivo': 'anulada'})
+        elif entrada.usada:
+            conflictos.append({
+                'codigo_qr': str(codigo),
+                'motivo': 'ya_utilizada',
+                'fecha_uso': entrada.fecha_uso,
+                'validador': entrada.usuario_validador.username if entrada.usuario_validador else None,
+            })
+        else:
+            # Una puerta con el reloj adelantado no puede registrar ingresos en el futuro
+            entrada.usada = True
+            entrada.fecha_uso = min(escaneo.get('fecha_uso') or ahora, ahora)
+            entrada.usuario_validador = usuario_validador
+            entrada.fecha_modificacion = ahora
+            a_marcar[codigo] = entrada
+
+    if a_marcar:
+        Entrada.objects.bulk_update(
+            a_marcar.values(), ['usada', 'fecha_uso', 'usuario_validador', 'fecha_modificacion'], batch_size=500
+        )
+        for lote_id, cantidad in Counter(e.lote_id for e in a_marcar.values()).items():
+            ajustar_resumen_ventas(lote_id, ingresadas=cantidad)
+        # Los ingresos offline cuentan en el minuto en que ocurrieron
+        por_minuto = Counter((e.lote_id, inicio_bucket(e.fecha_uso, 'MINUTO')) for e in a_marcar.values())
+        for (lote_id, minuto), cantidad in por_minuto.items():
+            registrar_metrica(lote_id, evento_id, minuto, ingresadas=cantidad)
+
+    ESCANEOS_TOTAL.labels(origen='offline', resultado='valida').inc(len(a_marcar))
+    for motivo, cantidad in Counter(c['motivo'] for c in conflictos).items():
+        ESCANEOS_TOTAL.labels(origen='offline', resultado=motivo).inc(cantidad)
+    return len(a_marcar), conflictos
+
+
+# ===================================
+# BÚSQUEDA DE ASISTENTES
+# ===================================
+
+def cedula_sin_formato(campo):
+    """Expresión de la cédula sin puntos ni guiones (se guardan tal como se tipearon)."""
+    return Replace(Replace(campo, Value('.'), Value('')), Value('-'), Value(''))
+
+
+def _tipo_termino(termino):
+    if termino.replace('.', '').replace('-', '').isdigit():
+        return 'cedula'
+    return 'email' if '@' in termino else 'nombre'
+
+
+def _filtro_termino(termino, trigram):
+    """Condición de un término: cédula, email o nombre/apellido."""
+    tipo = _tipo_termino(termino)
+    if tipo == 'cedula':
+        digitos = termino.replace('.', '').replace('-', '')
+        return Q(PrefijoSinMayusculas(cedula_sin_formato('cliente__cedula'), digitos))
+    if tipo == 'email':
+        return Q(cliente__email__iprefijo=termino)
+
+    filtro = (
+        Q(cliente__apellido__iprefijo=termino)
+        | Q(cliente__nombre__iprefijo=termino)
+        | Q(cliente__email__iprefijo=termino)
+    )
+    # Tolerancia a errores de tipeo y tildes ("perez" encuentra "Pérez")
+    if trigram and len(termino) >= 3:
+        filtro |= Q(cliente__apellido__trigram_similar=termino) | Q(cliente__nombre__trigram_similar=termino)
+    return filtro
+
+
+def buscar_asistentes(evento_id, texto, limite=None):
+    """
+    Busca clientes con entradas para el evento por prefijo de cédula, nombre,
+    apellido o email. Cada palabra de `texto` debe coincidir con algún campo.
+
+    En PostgreSQL suma coincidencias aproximadas (pg_trgm) y ordena por
+    similitud; los índices GIN trigram de la migración 0006 resuelven tanto el
+    ILIKE de prefijo como el operador %. En SQLite solo hay prefijo.
+
+    Una sola consulta (entradas + cliente + lote). Retorna una lista de
+    {"cliente": {...}, "entradas": [...]} agrupada por cliente.
+    """
+    limite = limite or settings.BUSQUEDA_ASISTENTES_LIMITE
+    trigram = connection.vendor == 'postgresql'
+
+    entradas = Entrada.objects.filter(lote__evento_id=evento_id, anulada=False)
+    for termino in texto.split():
+        entradas = entradas.filter(_filtro_termino(termino, trigram))
+
+    nombres = ' '.join(t for t in texto.split() if _tipo_termino(t) == 'nombre')
+    if trigram and nombres:
+        entradas = entradas.annotate(
+            similitud=Greatest(
+                TrigramSimilarity('cliente__apellido', nombres),
+                TrigramSimilarity('cliente__nombre', nombres),
+            )
+        ).order_by('-similitud', 'cliente__apellido', 'cliente__nombre', 'cliente_id')
+    else:
+        entradas = entradas.order_by('cliente__apellido', 'cliente__nombre', 'cliente_id')
+
+    filas = entradas.values_list(
+        'cliente_id', 'cliente__cedula', 'cliente__nombre', 'cliente__apellido', 'cliente__email',
+        'id', 'codigo_corto', 'lote__nombre', 'usada', 'fecha_uso',
+    )[:limite]
+
+    asistentes = {}
+    for (cliente_id, cedula, nombre, apellido, email,
+         entrada_id, codigo_corto, lote_nombre, usada, fecha_uso) in filas:
+        asistente = asistentes.get(cliente_id)
+        if asistente is None:
+            asistente = asistentes[cliente_id] = {
+                'cliente': {
+                    'id': cliente_id, 'cedula': cedula, 'nombre': nombre,
+                    'apellido': apellido, 'email': email,
+                },
+                'entradas': [],
+            }
+        asistente['entradas'].append({
+            'id': entrada_id,
+            'codigo_corto': codigo_corto,
+            'lote_nombre': lote_nombre,
+            'usada': usada,
+            'fecha_uso': fecha_uso,
+        })
+
+    return list(asistentes.values())
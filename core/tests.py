@@ -1,3 +1,871 @@
-from django.test import TestCase
+import re
+import shutil
+import tempfile
+import uuid
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail, signing
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .management.commands.verificar_planes_consultas import RECORRIDO, _consultas, _parametros
+from . import models, services_reembolsos
+from .consultas import PRESUPUESTOS, PresupuestoConsultasExcedido, presupuesto_consultas, presupuesto_endpoint
+from .models import (
+    Cliente, Evento, Lote, Orden, Entrada, MetricaLote, MovimientoStock, ResumenVentasLote, CancelacionEvento,
+    Reembolso, crear_entradas
+)
+from .mp_local import ServidorMPLocal, _ManejadorMP
+from .replicas import (
+    RouterReplica, _lecturas_en_replica, compra_reciente, en_replica, lecturas_en_replica, replica_configurada
+)
+from .serializers import ValidarEntradaSerializer
+from .services_compra import confirmar_pago_orden, fallar_orden, reservar_stock
+from .services_cortesias import entradas_sin_qr
+from .services_estadisticas import ajustar_resumen_ventas, reconstruir_resumen_ventas
+from .services_reembolsos import cancelar_evento, procesar_cancelacion, reintentar_errores
+from .services_stock import verificar_stock
+from .services_validacion import (
+    buscar_asistentes, generar_manifiesto, registrar_ingreso, registrar_ingresos_lote
+)
+
+
+def crear_cliente(numero=1):
+    return Cliente.objects.create(
+        cedula=f"prueba-{numero}", nombre='Prue', apellido='Ba',
+        email=f"prueba-{numero}@backyardbar.local", telefono='-'
+    )
+
+
+def crear_evento_con_entradas(cliente, entradas, lotes=1, dias=7):
+    """Evento con `lotes` lotes y una orden APROBADA de `entradas` entradas en cada uno."""
+    evento = Evento.objects.create(titulo='Prueba', fecha_inicio=timezone.now() + timedelta(days=dias), ubicacion='-')
+    for numero in range(lotes):
+        lote = Lote.objects.create(
+            evento=evento, nombre=f"Lote {numero + 1}", precio=Decimal('500'), orden=numero + 1,
+            cantidad_total=entradas * 2
+        )
+        crear_orden_aprobada(cliente, lote, entradas)
+    return evento
+
+
+def crear_orden_aprobada(cliente, lote, entradas):
+    """Orden APROBADA con sus entradas, descontando el stock del lote y sumándola al resumen."""
+    orden = Orden.objects.create(
+        cliente=cliente, evento=lote.evento, lote=lote, cantidad_entradas=entradas,
+        monto_subtotal=lote.precio * entradas, monto_total=lote.precio * entradas,
+        estado='APROBADO', fecha_aprobacion=timezone.now()
+    )
+    nuevas = [Entrada(orden=orden, cliente=cliente, lote=lote) for _ in range(entradas)]
+    crear_entradas(nuevas)
+    Lote.objects.filter(id=lote.id).update(cantidad_vendida=F('cantidad_vendida') + entradas)
+    ajustar_resumen_ventas(lote.id, vendidas=entradas, recaudado=orden.monto_total)
+    return orden
+
+
+def crear_staff(cliente, dueno=False):
+    # El token solo lleva user_id: el staff no puede compartir id con un cliente
+    return User.objects.create(
+        id=cliente.id + (2000 if dueno else 1000), username=f"{'dueno' if dueno else 'staff'}-{cliente.id}",
+        is_staff=True, is_superuser=dueno
+    )
+
+
+def token(usuario):
+    return f"Bearer {RefreshToken.for_user(usuario).access_token}"
+
+
+def usar_mp_local(test):
+    """Levanta el stand-in de Mercado Pago durante `test` y apunta MP_API_URL a él."""
+    mp = ServidorMPLocal().iniciar()
+    test.addCleanup(mp.detener)
+    configuracion = override_settings(MP_API_URL=mp.url)
+    configuracion.enable()
+    test.addCleanup(configuracion.disable)
+    return mp
+
+
+def usar_media_temporal(test):
+    """Los QR que genere `test` se guardan en un directorio temporal."""
+    directorio = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+    configuracion = override_settings(MEDIA_ROOT=directorio)
+    configuracion.enable()
+    test.addCleanup(configuracion.disable)
+
+
+class MisEntradasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        crear_evento_con_entradas(cls.cliente, entradas=15, lotes=2)
+
+    def test_consultas_por_pagina_no_dependen_de_las_entradas(self):
+        # Autenticación (staff + cliente) y una consulta con JOIN a lote y evento
+        with presupuesto_endpoint('GET /api/mis-entradas/'):
+            primera = self.client.get('/api/mis-entradas/', HTTP_AUTHORIZATION=token(self.cliente))
+        self.assertEqual(len(primera.data['results']), 20)
+
+        with presupuesto_endpoint('GET /api/mis-entradas/'):
+            segunda = self.client.get(primera.data['next'], HTTP_AUTHORIZATION=token(self.cliente))
+        self.assertEqual(len(segunda.data['results']), 10)
+        self.assertIsNone(segunda.data['next'])
+
+    @override_settings(SECURE_PROXY_SSL_HEADER=('HTTP_X_FORWARDED_PROTO', 'https'))
+    def test_siguiente_pagina_con_https_detras_del_proxy(self):
+        respuesta = self.client.get(
+            '/api/mis-entradas/', HTTP_AUTHORIZATION=token(self.cliente), HTTP_X_FORWARDED_PROTO='https'
+        )
+        self.assertTrue(respuesta.data['next'].startswith('https://'))
+
+    @override_settings(SECURE_PROXY_SSL_HEADER=None)
+    def test_sin_proxy_ignora_x_forwarded_proto(self):
+        respuesta = self.client.get(
+            '/api/mis-entradas/', HTTP_AUTHORIZATION=token(self.cliente), HTTP_X_FORWARDED_PROTO='https'
+        )
+        self.assertTrue(respuesta.data['next'].startswith('http://'))
+
+
+class DashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.staff = crear_staff(cls.cliente)
+        crear_evento_con_entradas(cls.cliente, entradas=3, lotes=2)
+
+    def _dashboard(self):
+        # Autenticación del staff y una consulta agregada sobre evento -> lotes -> resumen
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/staff/stats/', HTTP_AUTHORIZATION=token(self.staff))
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_consultas_constantes_con_mas_eventos_y_entradas(self):
+        self.assertEqual(self._dashboard()['eventos'][0]['vendidas'], 6)
+
+        for _ in range(5):
+            crear_evento_con_entradas(self.cliente, entradas=10, lotes=3)
+        datos = self._dashboard()
+        self.assertEqual(datos['total_eventos_activos'], 6)
+        self.assertEqual(datos['total_recaudado_global'], 500 * (6 + 5 * 30))
+
+
+class PresupuestoConsultasTests(TestCase):
+    """Los endpoints principales respetan PRESUPUESTOS y no suman consultas con más datos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.staff = crear_staff(cls.cliente)
+        cls.evento = crear_evento_con_entradas(cls.cliente, entradas=2, lotes=2)
+
+    def _medir(self):
+        entrada = Entrada.objects.filter(lote__evento=self.evento, usada=False).first()
+        pedidos = {
+            'GET /api/eventos/': lambda: self.client.get('/api/eventos/'),
+            'GET /api/eventos/<id>/': lambda: self.client.get(f'/api/eventos/{self.evento.id}/'),
+            'GET /api/mis-entradas/': lambda: self.client.get(
+                '/api/mis-entradas/', HTTP_AUTHORIZATION=token(self.cliente)
+            ),
+            'GET /api/staff/stats/': lambda: self.client.get(
+                '/api/staff/stats/', HTTP_AUTHORIZATION=token(self.staff)
+            ),
+            'POST /api/staff/validar-qr/': lambda: self.client.post(
+                '/api/staff/validar-qr/', {'codigo_qr': str(entrada.id)},
+                content_type='application/json', HTTP_AUTHORIZATION=token(self.staff)
+            ),
+        }
+        self.assertEqual(set(pedidos), set(PRESUPUESTOS))
+        consultas = {}
+        for endpoint, pedido in pedidos.items():
+            with presupuesto_endpoint(endpoint) as contador:
+                respuesta = pedido()
+            self.assertEqual(respuesta.status_code, 200, endpoint)
+            consultas[endpoint] = contador.cantidad
+        return consultas
+
+    def test_consultas_no_crecen_con_los_datos(self):
+        chico = self._medir()
+        for _ in range(5):
+            crear_evento_con_entradas(self.cliente, entradas=4, lotes=3)
+        grande = self._medir()
+        for endpoint in PRESUPUESTOS:
+            self.assertLessEqual(grande[endpoint], chico[endpoint], endpoint)
+
+    def test_presupuesto_excedido_lista_el_sql(self):
+        with self.assertRaisesMessage(PresupuestoConsultasExcedido, 'presupuesto: 0'):
+            with presupuesto_consultas(0, 'El conteo'):
+                Evento.objects.count()
+
+
+class ValidarQRTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.staff = crear_staff(cls.cliente)
+        cls.evento = crear_evento_con_entradas(cls.cliente, entradas=3)
+
+    def _validar(self, entrada):
+        return self.client.post(
+            '/api/staff/validar-qr/', {'codigo_qr': str(entrada.id)},
+            content_type='application/json', HTTP_AUTHORIZATION=token(self.staff)
+        )
+
+    def _consultas(self, entrada):
+        """Consultas del escaneo por tabla, sin la autenticación ni el SAVEPOINT del test."""
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self._validar(entrada)
+        self.assertEqual(respuesta.status_code, 200)
+        tablas = [
+            re.search(r'(?:FROM|UPDATE|INTO) "(\w+)"', consulta['sql']).group(1)
+            for consulta in capturadas.captured_queries if 'SAVEPOINT' not in consulta['sql']
+        ]
+        return [tabla for tabla in tablas if tabla != 'auth_user']
+
+    def test_check_in_en_dos_consultas(self):
+        primera, segunda = Entrada.objects.filter(lote__evento=self.evento)[:2]
+        for entrada in (primera, segunda):
+            # UPDATE condicional + SELECT de los datos; resumen y métrica en la misma transacción
+            self.assertEqual(
+                self._consultas(entrada), ['core_entrada', 'core_entrada', 'core_resumenventaslote', 'core_metricalote']
+            )
+        # Un segundo escaneo de la misma entrada no escribe nada más
+        self.assertEqual(self._consultas(primera), ['core_entrada', 'core_entrada'])
+
+        metricas = MetricaLote.objects.filter(evento=self.evento, granularidad='MINUTO')
+        self.assertEqual(sum(metricas.values_list('ingresadas', flat=True)), 2)
+
+    def test_consultas_totales_dentro_del_presupuesto(self):
+        # Autenticación + 4 del escaneo válido + SAVEPOINT y RELEASE dentro de la transacción del test
+        entrada = Entrada.objects.filter(lote__evento=self.evento).first()
+        with presupuesto_endpoint('POST /api/staff/validar-qr/') as contador:
+            self._validar(entrada)
+        self.assertEqual(contador.cantidad, PRESUPUESTOS['POST /api/staff/validar-qr/'])
+
+
+class CodigosCortosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.staff = crear_staff(cls.cliente)
+        cls.evento = crear_evento_con_entradas(cls.cliente, entradas=1)
+        cls.existente = Entrada.objects.get(lote__evento=cls.evento)
+        cls.orden = cls.existente.orden
+
+    def _nuevas(self, cantidad=3):
+        return [Entrada(orden=self.orden, cliente=self.cliente, lote=self.orden.lote) for _ in range(cantidad)]
+
+    def _asignar_con_colision(self, colisiones):
+        """asignar_codigos_cortos que, `colisiones` veces, no ve el código que otra transacción acaba de insertar."""
+        asignar = models.asignar_codigos_cortos
+        pendientes = [colisiones]
+
+        def asignar_sin_ver(entradas):
+            asignar(entradas)
+            if pendientes[0]:
+                pendientes[0] -= 1
+                entradas[-1].codigo_corto = self.existente.codigo_corto
+        return mock.patch.object(models, 'asignar_codigos_cortos', asignar_sin_ver)
+
+    def test_reintenta_si_otra_transaccion_tomo_el_codigo(self):
+        nuevas = self._nuevas()
+        ids_originales = {entrada.id for entrada in nuevas}
+        with self._asignar_con_colision(1):
+            creadas = crear_entradas(nuevas)
+
+        self.assertEqual(Entrada.objects.filter(orden=self.orden).count(), 4)
+        self.assertTrue(ids_originales.isdisjoint(entrada.id for entrada in creadas))
+        codigos = [entrada.codigo_corto for entrada in creadas]
+        self.assertEqual(len(set(codigos)), 3)
+        self.assertNotIn(self.existente.codigo_corto, codigos)
+
+    def test_sin_reintentos_propaga_el_error(self):
+        with self._asignar_con_colision(models.REINTENTOS_CODIGO_CORTO), self.assertRaises(IntegrityError):
+            crear_entradas(self._nuevas())
+        self.assertEqual(Entrada.objects.filter(orden=self.orden).count(), 1)
+
+    def test_codigo_corto_sin_importar_mayusculas_ni_guiones(self):
+        codigo = self.existente.codigo_corto
+        tipeado = f"{codigo[:4]}-{codigo[4:]}".lower()
+        serializer = ValidarEntradaSerializer(data={'codigo_qr': f" {tipeado} "})
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data['codigo_qr'], codigo)
+
+        respuesta = self.client.post(
+            '/api/staff/validar-qr/', {'codigo_qr': tipeado},
+            content_type='application/json', HTTP_AUTHORIZATION=token(self.staff)
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(Entrada.objects.get(id=self.existente.id).usada)
+
+        self.assertFalse(ValidarEntradaSerializer(data={'codigo_qr': 'ZZZZ-ZZZZ'}).is_valid())
+
+
+class PorteriaOfflineTests(TestCase):
+    """Manifiesto para validar sin conexión y sincronización de los escaneos offline."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.staff = crear_staff(cls.cliente)
+        cls.evento = crear_evento_con_entradas(cls.cliente, entradas=6)
+        cls.otro_evento = crear_evento_con_entradas(cls.cliente, entradas=1)
+
+    def setUp(self):
+        self.entradas = list(Entrada.objects.filter(lote__evento=self.evento).order_by('id'))
+
+    def _manifiesto(self, desde):
+        return self.client.get(
+            f'/api/staff/eventos/{self.evento.id}/manifiesto/', {'desde': desde},
+            HTTP_AUTHORIZATION=token(self.staff)
+        )
+
+    def test_version_adulterada_o_de_otro_evento(self):
+        version = generar_manifiesto(self.evento.id)['version']
+        valor, firma = version.split(':')
+        adulteradas = [
+            f"{int(valor) + 1}:{firma}",
+            f"{valor}:{firma[:-1]}x",
+            generar_manifiesto(self.otro_evento.id)['version'],
+        ]
+        for desde in adulteradas:
+            with self.assertRaises(signing.BadSignature):
+                generar_manifiesto(self.evento.id, desde=desde)
+            self.assertEqual(self._manifiesto(desde).status_code, 400)
+        self.assertEqual(self._manifiesto(version).status_code, 200)
+
+    def test_delta_incluye_las_filas_dentro_del_margen(self):
+        ahora = timezone.now()
+        Entrada.objects.filter(lote__evento=self.evento).update(fecha_modificacion=ahora)
+        completo = generar_manifiesto(self.evento.id)
+        self.assertTrue(completo['completo'])
+        self.assertEqual(completo['cantidad'], 6)
+
+        # Transacciones que escribieron antes de la versión pero hicieron commit después de la descarga
+        dentro, fuera = self.entradas[:2]
+        margen = settings.MANIFIESTO_MARGEN_SEGUNDOS
+        Entrada.objects.filter(id=dentro.id).update(
+            usada=True, fecha_modificacion=ahora - timedelta(seconds=margen - 10)
+        )
+        Entrada.objects.filter(id=fuera.id).update(
+            anulada=True, fecha_modificacion=ahora - timedelta(seconds=margen + 10)
+        )
+
+        delta = generar_manifiesto(self.evento.id, desde=completo['version'])
+        self.assertFalse(delta['completo'])
+        filas = dict(delta['entradas'])
+        self.assertEqual(filas[dentro.id.hex], 1)
+        self.assertNotIn(fuera.id.hex, filas)
+        # Las filas de la versión se repiten: aplicar la delta es idempotente
+        self.assertEqual(delta['cantidad'], 5)
+
+    def test_conflictos_del_lote(self):
+        usada, anulada, repetida, valida = self.entradas[:4]
+        registrar_ingreso(usada.id, self.staff)
+        Entrada.objects.filter(id=anulada.id).update(anulada=True)
+        ajena = Entrada.objects.get(lote__evento=self.otro_evento)
+        desconocida = uuid.uuid4()
+
+        aplicados, conflictos = registrar_ingresos_lote(self.evento.id, [
+            {'codigo_qr': desconocida},
+            {'codigo_qr': ajena.id},
+            {'codigo_qr': repetida.id, 'fecha_uso': timezone.now() - timedelta(minutes=5)},
+            {'codigo_qr': repetida.id, 'fecha_uso': timezone.now() - timedelta(minutes=1)},
+            {'codigo_qr': anulada.id},
+            {'codigo_qr': usada.id},
+            {'codigo_qr': valida.id},
+        ], self.staff)
+
+        self.assertEqual(aplicados, 2)
+        motivos = {}
+        for conflicto in conflictos:
+            motivos.setdefault(conflicto['motivo'], set()).add(conflicto['codigo_qr'])
+        self.assertEqual(motivos, {
+            'no_existe': {str(desconocida), str(ajena.id)},
+            'duplicado_en_lote': {str(repetida.id)},
+            'anulada': {str(anulada.id)},
+            'ya_utilizada': {str(usada.id)},
+        })
+        ya_utilizada = next(c for c in conflictos if c['motivo'] == 'ya_utilizada')
+        self.assertEqual(ya_utilizada['validador'], self.staff.username)
+        self.assertFalse(Entrada.objects.get(id=ajena.id).usada)
+        self.assertFalse(Entrada.objects.get(id=anulada.id).usada)
+
+    def test_fecha_uso_futura_se_limita_al_presente(self):
+        entrada = self.entradas[0]
+        antes = timezone.now()
+        aplicados, conflictos = registrar_ingresos_lote(
+            self.evento.id, [{'codigo_qr': entrada.id, 'fecha_uso': antes + timedelta(hours=2)}], self.staff
+        )
+        self.assertEqual((aplicados, conflictos), (1, []))
+        entrada.refresh_from_db()
+        self.assertTrue(entrada.usada)
+        self.assertLessEqual(entrada.fecha_uso, timezone.now())
+        self.assertGreaterEqual(entrada.fecha_uso, antes)
+
+
+class BuscarAsistentesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = crear_staff(crear_cliente())
+        cls.evento = Evento.objects.create(
+            titulo='Prueba', fecha_inicio=timezone.now() + timedelta(days=7), ubicacion='-'
+        )
+        lote = Lote.objects.create(evento=cls.evento, nombre='General', precio=Decimal('500'), cantidad_total=50)
+        # Las cédulas se guardan tal como se tipearon
+        cls.ana_perez = cls._asistente(lote, '1.234.567-8', 'Ana', 'Pérez', entradas=3)
+        cls.ana_gomez = cls._asistente(lote, '12345999', 'Ana', 'Gómez', entradas=1)
+        cls.bruno = cls._asistente(lote, '4.444.444-4', 'Bruno', 'Pérez', entradas=2)
+        Entrada.objects.filter(cliente=cls.bruno).update(anulada=True)
+
+    @classmethod
+    def _asistente(cls, lote, cedula, nombre, apellido, entradas):
+        cliente = Cliente.objects.create(
+            cedula=cedula, nombre=nombre, apellido=apellido,
+            email=f"{nombre}.{apellido}@backyardbar.local".lower(), telefono='-'
+        )
+        crear_orden_aprobada(cliente, lote, entradas)
+        return cliente
+
+    def _clientes(self, texto, **kwargs):
+        return [r['cliente']['id'] for r in buscar_asistentes(self.evento.id, texto, **kwargs)]
+
+    def test_cedula_con_o_sin_puntos(self):
+        for texto in ('12345678', '1.234.567-8', '1234567', '1.234.56'):
+            self.assertEqual(self._clientes(texto), [self.ana_perez.id], texto)
+        self.assertEqual(self._clientes('1.234'), [self.ana_gomez.id, self.ana_perez.id])
+
+    def test_cada_termino_debe_coincidir(self):
+        self.assertEqual(self._clientes('ana'), [self.ana_gomez.id, self.ana_perez.id])
+        self.assertEqual(self._clientes('ana pérez'), [self.ana_perez.id])
+        self.assertEqual(self._clientes('pérez ana'), [self.ana_perez.id])
+        self.assertEqual(self._clientes('ana 1234567'), [self.ana_perez.id])
+        self.assertEqual(self._clientes('ana 4444'), [])
+
+    def test_excluye_entradas_anuladas(self):
+        self.assertEqual(self._clientes('bruno'), [])
+        self.assertEqual(self._clientes('pérez'), [self.ana_perez.id])
+
+    def test_limite_de_entradas(self):
+        resultados = buscar_asistentes(self.evento.id, 'ana', limite=2)
+        self.assertEqual([len(r['entradas']) for r in resultados], [1, 1])
+
+        with override_settings(BUSQUEDA_ASISTENTES_LIMITE=3):
+            respuesta = self.client.get(
+                f'/api/staff/eventos/{self.evento.id}/asistentes/', {'q': 'ana'},
+                HTTP_AUTHORIZATION=token(self.staff)
+            )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(sum(len(r['entradas']) for r in respuesta.data['resultados']), 3)
+
+
+class CancelacionEventoTests(TestCase):
+    """Cancelación y reembolsos contra el stand-in local de Mercado Pago."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.portero = crear_staff(cls.cliente)
+        cls.dueno = crear_staff(cls.cliente, dueno=True)
+        cls.evento = crear_evento_con_entradas(cls.cliente, entradas=2, lotes=3)
+        for orden in Orden.objects.filter(evento=cls.evento):
+            orden.mp_payment_id = f"pago-{orden.id}"
+            orden.save(update_fields=['mp_payment_id'])
+
+    def setUp(self):
+        self.mp = usar_mp_local(self)
+        self.ordenes = list(Orden.objects.filter(evento=self.evento).order_by('id'))
+
+    def _cancelar(self):
+        cancelacion, _ = cancelar_evento(self.evento.id, motivo='Lluvia', en_segundo_plano=False)
+        return cancelacion
+
+    def _assert_reembolsadas(self, ordenes):
+        ids = [orden.id for orden in ordenes]
+        self.assertFalse(Orden.objects.filter(id__in=ids).exclude(estado='REEMBOLSADO').exists())
+        self.assertFalse(Entrada.objects.filter(orden_id__in=ids, anulada=False).exists())
+        self.assertEqual(reconstruir_resumen_ventas(self.evento.id, aplicar=False), [])
+
+    def test_solo_el_dueno_cancela(self):
+        url = f'/api/staff/eventos/{self.evento.id}/cancelacion/'
+        respuesta = self.client.post(url, {'motivo': 'x'}, HTTP_AUTHORIZATION=token(self.portero))
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertFalse(CancelacionEvento.objects.exists())
+
+        respuesta = self.client.post(url, {'motivo': 'x'}, HTTP_AUTHORIZATION=token(self.dueno))
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.data['ordenes_totales'], 3)
+
+    def test_reembolsa_anula_y_libera_stock(self):
+        cancelacion = procesar_cancelacion(self._cancelar().id)
+
+        self.assertEqual((cancelacion.estado, cancelacion.reembolsadas, cancelacion.errores), ('COMPLETADA', 3, 0))
+        self._assert_reembolsadas(self.ordenes)
+        self.assertFalse(Lote.objects.filter(evento=self.evento, cantidad_vendida__gt=0).exists())
+        self.assertEqual(
+            sorted(self.mp.reembolsos), sorted(f"reembolso-{orden.id}" for orden in self.ordenes)
+        )
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_reanudar_repite_la_clave_de_idempotencia(self):
+        # El proceso se corta después de que MP reembolsó y antes de guardar el resultado
+        cancelacion = self._cancelar()
+        with mock.patch.object(services_reembolsos, '_aplicar_tanda', side_effect=RuntimeError('corte')):
+            with self.assertRaises(RuntimeError):
+                procesar_cancelacion(cancelacion.id)
+        self.assertEqual(Reembolso.objects.filter(estado='EN_PROCESO').count(), 3)
+        self.assertEqual(len(self.mp.reembolsos), 3)
+
+        Reembolso.objects.update(fecha_modificacion=timezone.now() - timedelta(hours=1))
+        cancelacion = procesar_cancelacion(cancelacion.id)
+
+        self.assertEqual((cancelacion.estado, cancelacion.reembolsadas), ('COMPLETADA', 3))
+        self.assertEqual(len(self.mp.reembolsos), 3)
+        self._assert_reembolsadas(self.ordenes)
+
+    @override_settings(REEMBOLSOS_MAX_INTENTOS=1)
+    def test_429_y_400_quedan_como_error(self):
+        rechazada, limitada, reembolsada = self.ordenes
+        self.mp.reembolsos_rechazados.add(rechazada.mp_payment_id)
+        limite = _ManejadorMP._limite_superado
+
+        def limitar(manejador):
+            return limitada.mp_payment_id in manejador.path or limite(manejador)
+
+        with (
+            mock.patch.object(_ManejadorMP, '_limite_superado', limitar),
+            mock.patch.object(services_reembolsos, 'REINTENTOS_PEDIDO', 1),
+        ):
+            cancelacion = procesar_cancelacion(self._cancelar().id)
+
+        self.assertEqual((cancelacion.estado, cancelacion.reembolsadas, cancelacion.errores), ('CON_ERRORES', 1, 2))
+        errores = dict(Reembolso.objects.filter(estado='ERROR').values_list('orden_id', 'error'))
+        self.assertIn('MP 400', errores[rechazada.id])
+        self.assertIn('MP 429', errores[limitada.id])
+        self._assert_reembolsadas([reembolsada])
+        self.assertEqual(Orden.objects.get(id=rechazada.id).estado, 'APROBADO')
+
+        # Corregido en MP, se reintentan y la cancelación termina
+        self.mp.reembolsos_rechazados.clear()
+        self.assertEqual(reintentar_errores(cancelacion.id), 2)
+        cancelacion = procesar_cancelacion(cancelacion.id)
+        self.assertEqual((cancelacion.estado, cancelacion.reembolsadas, cancelacion.errores), ('COMPLETADA', 3, 0))
+        self._assert_reembolsadas(self.ordenes)
+
+    def test_pago_tardio_solo_encola_su_reembolso(self):
+        cancelacion = procesar_cancelacion(self._cancelar().id)
+        lote = self.ordenes[0].lote
+        tardia = Orden.objects.create(
+            cliente=self.cliente, evento=self.evento, lote=lote, cantidad_entradas=1,
+            monto_subtotal=Decimal('500'), monto_total=Decimal('500'), estado='EXPIRADO'
+        )
+
+        with mock.patch.object(services_reembolsos, 'cancelar_evento') as cancelar:
+            confirmar_pago_orden(tardia.id, 'pago-tardio')
+        cancelar.assert_not_called()
+        tardia.refresh_from_db()
+        self.assertEqual((tardia.estado, tardia.entradas.count()), ('APROBADO', 0))
+        self.assertEqual(Reembolso.objects.get(orden=tardia).estado, 'PENDIENTE')
+        cancelacion.refresh_from_db()
+        self.assertEqual((cancelacion.estado, cancelacion.ordenes_totales), ('EN_PROCESO', 4))
+
+        cancelacion = procesar_cancelacion(cancelacion.id)
+        self.assertEqual((cancelacion.estado, cancelacion.reembolsadas), ('COMPLETADA', 4))
+        self._assert_reembolsadas([tardia])
+        lote.refresh_from_db()
+        self.assertEqual(lote.cantidad_vendida, 0)
+
+
+@override_settings(REEMBOLSOS_EJECUCION='comando', REEMBOLSOS_POR_SEGUNDO=0)
+class LibroStockTests(TestCase):
+    """Cada cambio de Lote.cantidad_vendida deja su MovimientoStock."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.evento = Evento.objects.create(
+            titulo='Prueba', fecha_inicio=timezone.now() + timedelta(days=7), ubicacion='-'
+        )
+        cls.lote = Lote.objects.create(evento=cls.evento, nombre='General', precio=Decimal('500'), cantidad_total=10)
+
+    def setUp(self):
+        usar_media_temporal(self)
+
+    def _movimientos(self):
+        movimientos = MovimientoStock.objects.filter(lote=self.lote).order_by('id')
+        return list(movimientos.values_list('orden_id', 'cantidad', 'motivo'))
+
+    def _cantidad_vendida(self):
+        return Lote.objects.get(id=self.lote.id).cantidad_vendida
+
+    def test_cada_cambio_registra_su_movimiento(self):
+        pagada = reservar_stock(self.cliente.id, self.evento.id, 2)
+        rechazada = reservar_stock(self.cliente.id, self.evento.id, 3)
+        tardia = reservar_stock(self.cliente.id, self.evento.id, 1)
+        self.assertEqual(self._cantidad_vendida(), 6)
+
+        fallar_orden(rechazada.id)
+        Orden.objects.filter(id=tardia.id).update(fecha_expiracion=timezone.now() - timedelta(minutes=1))
+        call_command('limpiar_reservas', stdout=StringIO())
+        self.assertEqual(self._cantidad_vendida(), 2)
+
+        confirmar_pago_orden(pagada.id, f"pago-{pagada.id}")
+        confirmar_pago_orden(tardia.id, f"pago-{tardia.id}")
+        self.assertEqual(self._cantidad_vendida(), 3)
+
+        usar_mp_local(self)
+        cancelacion, _ = cancelar_evento(self.evento.id, motivo='Lluvia', en_segundo_plano=False)
+        self.assertEqual(procesar_cancelacion(cancelacion.id).estado, 'COMPLETADA')
+        self.assertEqual(self._cantidad_vendida(), 0)
+
+        movimientos = self._movimientos()
+        self.assertEqual(movimientos[:6], [
+            (pagada.id, 2, 'RESERVA'),
+            (rechazada.id, 3, 'RESERVA'),
+            (tardia.id, 1, 'RESERVA'),
+            (rechazada.id, -3, 'RECHAZO'),
+            (tardia.id, -1, 'EXPIRACION'),
+            (tardia.id, 1, 'PAGO_TARDIO'),
+        ])
+        self.assertCountEqual(movimientos[6:], [(pagada.id, -2, 'REEMBOLSO'), (tardia.id, -1, 'REEMBOLSO')])
+        self.assertEqual(verificar_stock(completo=True)['diferencias'], [])
+
+    def test_verificar_stock_repara_un_contador_corrupto(self):
+        reservar_stock(self.cliente.id, self.evento.id, 2)
+        # Una orden cargada por fuera del libro y un contador que se desvió
+        crear_orden_aprobada(self.cliente, self.lote, 3)
+        Lote.objects.filter(id=self.lote.id).update(cantidad_vendida=F('cantidad_vendida') + 4)
+
+        diferencias = verificar_stock()['diferencias']
+        self.assertEqual(diferencias, [{'lote_id': self.lote.id, 'contador': 9, 'libro': 2, 'real': 5}])
+        self.assertEqual(self._cantidad_vendida(), 9)
+
+        diferencias = verificar_stock(reparar=True)['diferencias']
+        self.assertTrue(diferencias[0]['reparado'])
+        self.assertEqual(self._cantidad_vendida(), 5)
+        self.assertEqual(self._movimientos()[-1], (None, 3, 'AJUSTE'))
+        self.assertEqual(verificar_stock()['diferencias'], [])
+        self.assertEqual(verificar_stock(completo=True)['diferencias'], [])
+
+
+@override_settings(REEMBOLSOS_EJECUCION='comando', REEMBOLSOS_POR_SEGUNDO=0)
+class ResumenVentasTests(TestCase):
+    """ResumenVentasLote se mantiene en cada transición y cuadra con un recuento completo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.staff = crear_staff(cls.cliente)
+        cls.evento = Evento.objects.create(
+            titulo='Prueba', fecha_inicio=timezone.now() + timedelta(days=7), ubicacion='-'
+        )
+        cls.lote = Lote.objects.create(evento=cls.evento, nombre='General', precio=Decimal('500'), cantidad_total=10)
+
+    def setUp(self):
+        usar_media_temporal(self)
+
+    def _resumen(self):
+        """El resumen del lote, después de comprobar que coincide con el recuento."""
+        self.assertEqual(reconstruir_resumen_ventas(self.evento.id, aplicar=False), [])
+        resumen = ResumenVentasLote.objects.get(lote=self.lote)
+        return resumen.vendidas, resumen.ingresadas, resumen.reservas_pendientes, resumen.recaudado
+
+    def test_cuadra_con_el_recuento_en_cada_transicion(self):
+        pagada = reservar_stock(self.cliente.id, self.evento.id, 2)
+        rechazada = reservar_stock(self.cliente.id, self.evento.id, 3)
+        vencida = reservar_stock(self.cliente.id, self.evento.id, 1)
+        self.assertEqual(self._resumen(), (0, 0, 6, 0))
+
+        confirmar_pago_orden(pagada.id, f"pago-{pagada.id}")
+        self.assertEqual(self._resumen(), (2, 0, 4, 1000))
+
+        fallar_orden(rechazada.id)
+        self.assertEqual(self._resumen(), (2, 0, 1, 1000))
+
+        Orden.objects.filter(id=vencida.id).update(fecha_expiracion=timezone.now() - timedelta(minutes=1))
+        call_command('limpiar_reservas', stdout=StringIO())
+        self.assertEqual(self._resumen(), (2, 0, 0, 1000))
+
+        registrar_ingreso(pagada.entradas.first().id, self.staff)
+        self.assertEqual(self._resumen(), (2, 1, 0, 1000))
+
+        usar_mp_local(self)
+        cancelacion, _ = cancelar_evento(self.evento.id, motivo='Lluvia', en_segundo_plano=False)
+        procesar_cancelacion(cancelacion.id)
+        self.assertEqual(Orden.objects.get(id=pagada.id).estado, 'REEMBOLSADO')
+        self.assertEqual(self._resumen(), (0, 1, 0, 0))
+
+    def test_reconstruir_corrige_una_fila_desviada(self):
+        crear_orden_aprobada(self.cliente, self.lote, 3)
+        ResumenVentasLote.objects.filter(lote=self.lote).update(vendidas=99, recaudado=0)
+
+        diferencias = reconstruir_resumen_ventas(self.evento.id, aplicar=False)
+        self.assertCountEqual(diferencias, [
+            {'lote_id': self.lote.id, 'campo': 'vendidas', 'resumen': 99, 'real': 3},
+            {'lote_id': self.lote.id, 'campo': 'recaudado', 'resumen': 0, 'real': 1500},
+        ])
+        self.assertEqual(ResumenVentasLote.objects.get(lote=self.lote).vendidas, 99)
+
+        self.assertEqual(len(reconstruir_resumen_ventas(self.evento.id)), 2)
+        self.assertEqual(self._resumen(), (3, 0, 0, 1500))
+
+        # Un lote sin fila de resumen también se reconstruye
+        ResumenVentasLote.objects.filter(lote=self.lote).delete()
+        reconstruir_resumen_ventas(self.evento.id)
+        self.assertEqual(self._resumen(), (3, 0, 0, 1500))
+
+
+class EnReplicaTests(SimpleTestCase):
+
+    def test_el_contexto_solo_vale_durante_cada_paso(self):
+        vistos, entre_pasos = [], []
+
+        def generar():
+            for numero in range(3):
+                vistos.append(_lecturas_en_replica.get())
+                yield numero
+
+        for _ in en_replica(generar()):
+            entre_pasos.append(_lecturas_en_replica.get())
+        self.assertEqual(vistos, [True] * 3)
+        self.assertEqual(entre_pasos, [False] * 3)
+
+    def test_restaura_el_contexto_si_el_paso_falla(self):
+        def generar():
+            yield 1
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            list(en_replica(generar()))
+        self.assertFalse(_lecturas_en_replica.get())
+
+
+@skipUnless(replica_configurada(), 'Requiere DATABASE_REPLICA_URL (en los tests la réplica espeja a la primaria)')
+class RouterReplicaTests(TransactionTestCase):
+    """Lecturas en la réplica: TransactionTestCase porque dentro de una transacción todo va a la primaria."""
+    # Sin réplica la clase se saltea, pero Django valida los alias al preparar las bases
+    databases = {'default', 'replica'} if replica_configurada() else {'default'}
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+        self.evento = crear_evento_con_entradas(self.cliente, entradas=2)
+        # Compras viejas: el cliente ya puede leer de la réplica
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        Orden.objects.filter(cliente=self.cliente).update(fecha_creacion=hace_una_hora, fecha_aprobacion=hace_una_hora)
+
+    def _consultas_por_base(self, pedido):
+        with CaptureQueriesContext(connections['default']) as primaria, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            respuesta = pedido()
+        self.assertEqual(respuesta.status_code, 200)
+        return len(primaria), len(replica)
+
+    def _mis_entradas(self):
+        return self.client.get('/api/mis-entradas/', HTTP_AUTHORIZATION=token(self.cliente))
+
+    def test_lecturas_marcadas_van_a_la_replica(self):
+        router = RouterReplica()
+        self.assertEqual(router.db_for_read(Entrada), 'default')
+        with lecturas_en_replica():
+            self.assertEqual(router.db_for_read(Entrada), 'replica')
+            self.assertEqual(router.db_for_write(Entrada), 'default')
+            with transaction.atomic():
+                # Lo leído dentro de una transacción se usa para escribir
+                self.assertEqual(router.db_for_read(Entrada), 'default')
+            with lecturas_en_replica(activar=False):
+                self.assertEqual(router.db_for_read(Entrada), 'default')
+        self.assertEqual(router.db_for_read(Entrada), 'default')
+
+    def test_mis_entradas_lee_de_la_replica(self):
+        # Autenticación y compra_reciente en la primaria, el listado en la réplica
+        self.assertEqual(self._consultas_por_base(self._mis_entradas), (3, 1))
+        self.assertFalse(_lecturas_en_replica.get())
+
+    def test_compra_reciente_lee_sus_propias_escrituras(self):
+        reservar_stock(self.cliente.id, self.evento.id, 1)
+        self.assertTrue(compra_reciente(self.cliente))
+        primaria, replica = self._consultas_por_base(self._mis_entradas)
+        self.assertEqual(replica, 0)
+        self.assertEqual(len(self._mis_entradas().data['results']), 2)
+
+    def test_staff_lee_el_dashboard_de_la_replica(self):
+        staff = crear_staff(self.cliente)
+        primaria, replica = self._consultas_por_base(
+            lambda: self.client.get('/api/staff/stats/', HTTP_AUTHORIZATION=token(staff))
+        )
+        self.assertEqual((primaria, replica), (1, 1))
+
+
+class CortesiasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = crear_cliente()
+        cls.staff = crear_staff(cls.cliente)
+        cls.lote = crear_evento_con_entradas(cls.cliente, entradas=5).lotes.get()
+
+    def _emitir(self):
+        return self.client.post(
+            f'/api/staff/lotes/{self.lote.id}/cortesias/',
+            {'invitados': [
+                {'cedula': '1.234.567-8', 'nombre': 'Ana', 'apellido': 'Gómez', 'email': 'ana@backyardbar.local', 'cantidad': 2},
+            ]},
+            content_type='application/json', HTTP_AUTHORIZATION=token(self.staff)
+        )
+
+    def test_la_api_deja_los_qr_al_worker(self):
+        with mock.patch('core.services_cortesias.ProcessPoolExecutor') as pool:
+            respuesta = self._emitir()
+        pool.assert_not_called()
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data['qr_pendientes'], 2)
+        cortesias = set(Entrada.objects.filter(orden__origen='CORTESIA').values_list('id', flat=True))
+        self.assertEqual(len(cortesias), 2)
+        self.assertLessEqual(cortesias, set(entradas_sin_qr()))
+
+    def test_rechaza_evento_cancelado_o_inactivo(self):
+        cancelar_evento(self.lote.evento_id, en_segundo_plano=False)
+        respuesta = self._emitir()
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Orden.objects.filter(origen='CORTESIA').exists())
+
+        # Reactivado a mano sigue cancelado
+        Evento.objects.filter(id=self.lote.evento_id).update(activo=True)
+        self.assertEqual(self._emitir().status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Los planes vigilados se verifican sobre PostgreSQL')
+class PlanesConsultasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = crear_cliente()
+        for _ in range(3):
+            crear_evento_con_entradas(cliente, entradas=5, lotes=2)
+
+    def test_consultas_frecuentes_usan_indices(self):
+        # Con pocas filas el planificador prefiere recorrer la tabla: sin recorridos
+        # secuenciales solo queda el recorrido completo si falta el índice
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        patron = RECORRIDO['postgresql']
+        for nombre, (vigilados, consulta) in _consultas(*_parametros()).items():
+            plan = consulta.explain()
+            tablas = {modelo._meta.db_table for modelo in vigilados}
+            with self.subTest(consulta=nombre):
+                self.assertFalse({tabla for tabla in patron.findall(plan) if tabla in tablas}, plan)
@@ -0,0 +1,308 @@
+"""
+Trazas de la vida de una orden: reserva → pago → emisión → email.
+
+La traza de una orden es su Orden.id, así que cada proceso (request, webhook,
+worker, hilos de fondo) puede agregar tramos sin propagar nada: basta con
+conocer la orden. Dentro de un proceso los tramos se anidan por contextvars
+(también a través de sync_to_async y tareas async):
+
+    with tramo('reserva'):
+        with tramo('reserva.stock'):
+            orden = reservar_stock(...)
+            asignar_traza(orden.id)   # la orden se conoce recién acá
+        with tramo('mp.preferencia'):
+            ...
+
+Los tramos que terminan antes de conocer la orden esperan a asignar_traza();
+si la orden nunca se asigna (p. ej. sin stock) se descartan.
+
+Exportador local: una línea JSON por tramo en
+TRAZAS_DIR/AAAAMMDD/<2 primeros hex de la orden>.jsonl (append, seguro entre
+procesos). Leer una orden solo abre su fragmento de cada día.
+"""
+
+import json
+import logging
+import math
+import os
+import shutil
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_tramo_actual = ContextVar('tramo_actual', default=None)
+_ultimo_dia = [None]
+
+
+class Tramo:
+    """Un tramo en curso. `atributos` se puede completar hasta que termina."""
+
+    def __init__(self, nombre, traza, padre, atributos):
+        self.nombre = nombre
+        self.id = uuid.uuid4().hex[:16]
+        self.padre = padre.id if padre else None
+        # Compartido por todo el árbol del proceso: {"orden": id | None, "pendientes": [...]}
+        self.traza = traza
+        self.atributos = atributos
+        self.estado = 'ok'
+
+
+@contextmanager
+def tramo(nombre, orden_id=None, **atributos):
+    """Mide el bloque como un tramo de la traza de `orden_id` (o de la del tramo actual)."""
+    if not settings.TRAZAS_ACTIVAS:
+        # Mismo objeto para quien completa atributos, pero no se exporta
+        yield Tramo(nombre, {'orden': None, 'pendientes': []}, None, atributos)
+        return
+
+    padre = _tramo_actual.get()
+    orden_id = _id_traza(orden_id)
+    if padre is None or (orden_id and padre.traza['orden'] not in (None, orden_id)):
+        # Raíz, o una orden distinta dentro de un proceso por tandas: empieza otro árbol
+        padre, traza = None, {'orden': orden_id, 'pendientes': []}
+    else:
+        traza = padre.traza
+        if orden_id and traza['orden'] is None:
+            _asignar(traza, orden_id)
+
+    actual = Tramo(nombre, traza, padre, atributos)
+    token = _tramo_actual.set(actual)
+    inicio = time.time()
+    reloj = time.perf_counter()
+    try:
+        yield actual
+    except BaseException:
+        actual.estado = 'error'
+        raise
+    finally:
+        _tramo_actual.reset(token)
+        registro = {
+            'tramo': actual.id,
+            'padre': actual.padre,
+            'nombre': nombre,
+            'inicio': round(inicio, 6),
+            'duracion_ms': round((time.perf_counter() - reloj) * 1000, 3),
+            'estado': actual.estado,
+            'proceso': os.getpid(),
+            'atributos': actual.atributos,
+        }
+        if traza['orden']:
+            _exportar([dict(registro, traza=traza['orden'])])
+        elif padre is not None:
+            traza['pendientes'].append(registro)
+
+
+def _id_traza(orden_id):
+    """UUID normalizado, o None: external_reference llega de afuera y termina en una ruta."""
+    try:
+        return str(uuid.UUID(str(orden_id))) if orden_id else None
+    except ValueError:
+        return None
+
+
+def _asignar(traza, orden_id):
+    traza['orden'] = orden_id
+    pendientes, traza['pendientes'] = traza['pendientes'], []
+    if pendientes:
+        _exportar([dict(registro, traza=traza['orden']) for registro in pendientes])
+
+
+def asignar_traza(orden_id):
+    """Asocia el árbol de tramos en curso a la orden y exporta los que ya terminaron."""
+    actual = _tramo_actual.get()
+    orden_id = _id_traza(orden_id)
+    if actual is not None and orden_id and actual.traza['orden'] is None:
+        _asignar(actual.traza, orden_id)
+
+
+class Tanda:
+    """Un tramo compartido por varias órdenes: `ordenes` se completa durante el bloque."""
+
+    def __init__(self, atributos):
+        self.ordenes = []
+        self.atributos = atributos
+        self.estado = 'ok'
+
+
+@contextmanager
+def tramo_tanda(nombre, **atributos):
+    """
+    Un tramo con la misma medición para cada orden de una tanda (conciliación,
+    QRs, emails) que se procesa sin un tramo por orden:
+
+        with tramo_tanda('email') as tanda:
+            tanda.ordenes.extend(orden_ids)
+            enviar(...)
+    """
+    actual = Tanda(atributos)
+    inicio = time.time()
+    reloj = time.perf_counter()
+    try:
+        yield actual
+    except BaseException:
+        actual.estado = 'error'
+        raise
+    finally:
+        duracion_ms = round((time.perf_counter() - reloj) * 1000, 3)
+        if settings.TRAZAS_ACTIVAS and actual.ordenes:
+            atributos = dict(actual.atributos, tanda=len(actual.ordenes))
+            _exportar([
+                {
+                    'traza': str(orden_id), 'tramo': uuid.uuid4().hex[:16], 'padre': None, 'nombre': nombre,
+                    'inicio': round(inicio, 6), 'duracion_ms': duracion_ms, 'estado': actual.estado,
+                    'proceso': os.getpid(), 'atributos': atributos,
+                }
+                for orden_id in actual.ordenes
+            ])
+
+
+# ===================================
+# EXPORTADOR (archivos JSON por día)
+# ===================================
+
+def _dia(marca):
+    return datetime.fromtimestamp(marca, tz=dt_timezone.utc).strftime('%Y%m%d')
+
+
+def _purgar(dia):
+    """Borra los días fuera de TRAZAS_RETENCION_DIAS (una vez por día y proceso)."""
+    if _ultimo_dia[0] == dia:
+        return
+    _ultimo_dia[0] = dia
+    limite = (datetime.now(dt_timezone.utc) - timedelta(days=settings.TRAZAS_RETENCION_DIAS)).strftime('%Y%m%d')
+    for carpeta in os.listdir(settings.TRAZAS_DIR):
+        if carpeta.isdigit() and carpeta < limite:
+            shutil.rmtree(os.path.join(settings.TRAZAS_DIR, carpeta), ignore_errors=True)
+
+
+def _exportar(registros):
+    por_archivo = defaultdict(list)
+    for registro in registros:
+        por_archivo[(_dia(registro['inicio']), registro['traza'][:2])].append(
+            json.dumps(registro, separators=(',', ':')) + '\n'
+        )
+    try:
+        for (dia, fragmento), lineas in por_archivo.items():
+            carpeta = os.path.join(settings.TRAZAS_DIR, dia)
+            os.makedirs(carpeta, exist_ok=True)
+            _purgar(dia)
+            # O_APPEND: cada write de una línea queda entera aunque escriban varios procesos
+            with open(os.path.join(carpeta, f"{fragmento}.jsonl"), 'a') as archivo:
+                for linea in lineas:
+                    archivo.write(linea)
+                    archivo.flush()
+    except OSError as e:
+        # Una traza perdida no puede romper una compra
+        logger.warning(f"No se pudieron exportar {len(registros)} tramos: {str(e)}")
+
+
+# ===================================
+# LECTURA Y REPORTES
+# ===================================
+
+def _dias(desde, hasta):
+    dia = desde.astimezone(dt_timezone.utc).date()
+    while dia <= hasta.astimezone(dt_timezone.utc).date():
+        yield dia.strftime('%Y%m%d')
+        dia += timedelta(days=1)
+
+
+def _leer(archivo, orden_id=None):
+    try:
+        with open(archivo) as lineas:
+            for linea in lineas:
+                if orden_id is None or orden_id in linea:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        continue
+                    if orden_id is None or registro['traza'] == orden_id:
+                        yield registro
+    except FileNotFoundError:
+        return
+
+
+def tramos_orden(orden_id, desde, hasta=None):
+    """Tramos de una orden (ordenados por inicio), buscando desde la fecha `desde`."""
+    orden_id = _id_traza(orden_id)
+    tramos = []
+    for dia in _dias(desde, hasta or timezone.now()):
+        tramos.extend(_leer(os.path.join(settings.TRAZAS_DIR, dia, f"{orden_id[:2]}.jsonl"), orden_id))
+    return sorted(tramos, key=lambda t: t['inicio'])
+
+
+def _hitos(tramos):
+    """
+    Etapas derivadas de una orden, en ms: la espera del pago (fin de la
+    reserva → inicio de la confirmación) y el total hasta el email.
+    """
+    primero = {}
+    for t in tramos:
+        primero.setdefault(t['nombre'], t)
+    hitos = {}
+    reserva = primero.get('reserva')
+    confirmacion = primero.get('pago.confirmar') or primero.get('conciliacion.aprobacion')
+    email = next((t for t in tramos if t['nombre'] == 'email' and t['estado'] == 'ok'), None)
+    if reserva and confirmacion:
+        hitos['espera_pago'] = (confirmacion['inicio'] - reserva['inicio']) * 1000 - reserva['duracion_ms']
+    if reserva and email:
+        hitos['reserva_a_email'] = (email['inicio'] - reserva['inicio']) * 1000 + email['duracion_ms']
+    return {nombre: round(valor, 1) for nombre, valor in hitos.items()}
+
+
+def resumen_orden(orden_id, desde):
+    """Tramos de la orden con su desfase desde el primero, más los hitos derivados."""
+    tramos = tramos_orden(orden_id, desde)
+    origen = tramos[0]['inicio'] if tramos else 0
+    for t in tramos:
+        t['desde_inicio_ms'] = round((t['inicio'] - origen) * 1000, 1)
+    return {'tramos': tramos, 'hitos': _hitos(tramos)}
+
+
+def _percentil(valores, p):
+    # Rango más cercano sobre la lista ordenada
+    return valores[max(math.ceil(p / 100 * len(valores)), 1) - 1]
+
+
+def percentiles_por_etapa(desde, hasta):
+    """
+    {etapa: {"cantidad", "p50", "p90", "p99", "max"}} en ms de los tramos
+    entre `desde` y `hasta`, más los hitos derivados por orden.
+    """
+    inicio, fin = desde.timestamp(), hasta.timestamp()
+    duraciones = defaultdict(list)
+    por_orden = defaultdict(list)
+    for dia in _dias(desde, hasta):
+        carpeta = os.path.join(settings.TRAZAS_DIR, dia)
+        if not os.path.isdir(carpeta):
+            continue
+        for archivo in sorted(os.listdir(carpeta)):
+            for registro in _leer(os.path.join(carpeta, archivo)):
+                if inicio <= registro['inicio'] <= fin:
+                    duraciones[registro['nombre']].append(registro['duracion_ms'])
+                    por_orden[registro['traza']].append(registro)
+
+    for tramos in por_orden.values():
+        tramos.sort(key=lambda t: t['inicio'])
+        for nombre, valor in _hitos(tramos).items():
+            duraciones[f"hito.{nombre}"].append(valor)
+
+    reporte = {}
+    for nombre, valores in sorted(duraciones.items()):
+        valores.sort()
+        reporte[nombre] = {
+            'cantidad': len(valores),
+            'p50': _percentil(valores, 50),
+            'p90': _percentil(valores, 90),
+            'p99': _percentil(valores, 99),
+            'max': valores[-1],
+        }
+    return reporte
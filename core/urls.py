@@ -2,21 +2,35 @@
 Rutas de la API para Backyard Bar.
 """
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     RegistroClienteView, LoginClienteView, EventoViewSet,
     CompraEntradaView, MisEntradasView, MercadoPagoWebhookView,
     ValidarEntradaView, ConfirmarPagoManualView, DashboardStatsView,
-    ExportGuestListView
+    ExportGuestListView, stock_evento_stream, ManifiestoEventoView, CheckInLoteView,
+    BuscarAsistentesView, SerieTemporalEventoView, ExportacionesView, EstadoExportacionView,
+    DescargarExportacionView, EmitirCortesiasView, CancelacionEventoView, metricas_prometheus,
+    PerfilesView, DescargarPerfilView, TrazaOrdenView, PercentilesTrazasView
 )
 
+# En modo ASGI los endpoints que esperan a Mercado Pago (y el catálogo) son async
+if settings.SERVER_MODE == 'asgi':
+    from .views_async import (
+        EventoViewSetAsync as EventoViewSet,
+        CompraEntradaViewAsync as CompraEntradaView,
+        MercadoPagoWebhookViewAsync as MercadoPagoWebhookView,
+        ConfirmarPagoManualViewAsync as ConfirmarPagoManualView,
+    )
+
 router = DefaultRouter()
 router.register(r'eventos', EventoViewSet, basename='evento')
 
 urlpatterns = [
     # Router (Eventos)
     path('', include(router.urls)),
+    path('eventos/<int:evento_id>/stream/', stock_evento_stream, name='evento-stock-stream'),
     
     # Autenticación Clientes
     path('auth/registro/', RegistroClienteView.as_view(), name='cliente-registro'),
@@ -32,7 +46,23 @@ urlpatterns = [
     
     # Validación (Portería)
     path('staff/validar-qr/', ValidarEntradaView.as_view(), name='validar-qr'),
+    path('staff/eventos/<int:evento_id>/manifiesto/', ManifiestoEventoView.as_view(), name='manifiesto-evento'),
+    path('staff/eventos/<int:evento_id>/check-in-lote/', CheckInLoteView.as_view(), name='check-in-lote'),
+    path('staff/eventos/<int:evento_id>/asistentes/', BuscarAsistentesView.as_view(), name='buscar-asistentes'),
+    path('staff/lotes/<int:lote_id>/cortesias/', EmitirCortesiasView.as_view(), name='emitir-cortesias'),
+    path('staff/eventos/<int:evento_id>/cancelacion/', CancelacionEventoView.as_view(), name='cancelacion-evento'),
     # Dashboard y Exportación
     path('staff/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('staff/eventos/<int:evento_id>/series/', SerieTemporalEventoView.as_view(), name='serie-temporal-evento'),
     path('staff/export-csv/<int:evento_id>/', ExportGuestListView.as_view(), name='export-guest-list'),
+    path('staff/exportaciones/', ExportacionesView.as_view(), name='exportaciones'),
+    path('staff/exportaciones/<uuid:trabajo_id>/', EstadoExportacionView.as_view(), name='estado-exportacion'),
+    path('staff/exportaciones/<uuid:trabajo_id>/descarga/', DescargarExportacionView.as_view(), name='descargar-exportacion'),
+
+    # Monitoreo (Prometheus, perfilado y trazas)
+    path('metrics/', metricas_prometheus, name='metricas-prometheus'),
+    path('staff/perfiles/', PerfilesView.as_view(), name='perfiles'),
+    path('staff/perfiles/<str:nombre>/', DescargarPerfilView.as_view(), name='descargar-perfil'),
+    path('staff/ordenes/<uuid:orden_id>/traza/', TrazaOrdenView.as_view(), name='traza-orden'),
+    path('staff/trazas/percentiles/', PercentilesTrazasView.as_view(), name='percentiles-trazas'),
 ]
@@ -7,11 +7,14 @@ from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from email.mime.image import MIMEImage
+from .instrumentacion import medir, QR_SEGUNDOS, EMAIL_SEGUNDOS
+from .trazas import tramo
 
-def generar_qr_entrada(entrada_id):
+def qr_png(contenido):
     """
-    Genera una imagen QR para una entrada específica y devuelve un ContentFile.
-    El QR contiene el UUID de la entrada.
+    Bytes PNG del QR con `contenido`. Sin dependencias de Django ni métricas:
+    se puede ejecutar en un pool de procesos (lo que mida un proceso hijo no
+    llega al /metrics del padre).
     """
     # Creamos el objeto QR
     qr = qrcode.QRCode(
@@ -20,24 +23,29 @@ def generar_qr_entrada(entrada_id):
         box_size=10,
         border=4,
     )
-    
-    # El contenido del QR es el ID único de la entrada
-    qr.add_data(str(entrada_id))
+    qr.add_data(contenido)
     qr.make(fit=True)
 
     # Creamos la imagen (usando Pillow)
     img = qr.make_image(fill_color="black", back_color="white")
-    
+
     # Guardamos en un buffer de memoria
     buffer = BytesIO()
     img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def generar_qr_entrada(entrada_id):
+    """
+    Genera una imagen QR para una entrada específica y devuelve un ContentFile.
+    El QR contiene el UUID de la entrada.
+    """
     filename = f"qr_{entrada_id}.png"
-    
-    return ContentFile(buffer.getvalue(), name=filename)
+    with medir(QR_SEGUNDOS):
+        return ContentFile(qr_png(str(entrada_id)), name=filename)
 
-def enviar_email_entradas(orden):
+def armar_email_entradas(orden):
     """
-    Envía un correo electrónico HTML al cliente con sus entradas embebidas como CID.
+    Arma el correo HTML al cliente con sus entradas embebidas como CID (sin enviarlo).
     """
     cliente = orden.cliente
     evento = orden.evento
@@ -51,7 +59,7 @@ def enviar_email_entradas(orden):
         cid = f"qr_entrada_{entrada.id}_{i}"
         entradas_con_cid.append({
             'cid': cid,
-            'id_resumido': str(entrada.id)[:8].upper(),
+            'id_resumido': entrada.codigo_corto or str(entrada.id)[:8].upper(),
             'entrada_obj': entrada
         })
     
@@ -73,6 +81,8 @@ def enviar_email_entradas(orden):
         text_content,
         settings.DEFAULT_FROM_EMAIL,
         [cliente.email],
+        # Para cruzar los logs del servidor SMTP con la traza de la orden
+        headers={'X-Backyard-Orden': str(orden.id)},
     )
     email.attach_alternative(html_content, "text/html")
     
@@ -96,10 +106,20 @@ def enviar_email_entradas(orden):
                 
             except Exception as e:
                 print(f"No se pudo embeber el QR {entrada.id}: {e}")
-            
-    try:
-        email.send(fail_silently=False)
-        return True
-    except Exception as e:
-        print(f"Error enviando email: {str(e)}")
-        return False
+
+    return email
+
+def enviar_email_entradas(orden):
+    """
+    Envía un correo electrónico HTML al cliente con sus entradas embebidas como CID.
+    """
+    email = armar_email_entradas(orden)
+    with medir(EMAIL_SEGUNDOS, tipo='entradas') as medicion, tramo('email', orden_id=orden.id) as t:
+        try:
+            email.send(fail_silently=False)
+            medicion.etiquetas['resultado'] = 'ok'
+            return True
+        except Exception as e:
+            print(f"Error enviando email: {str(e)}")
+            t.estado = 'error'
+            return False
@@ -10,17 +10,45 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from .models import Cliente, Evento, Lote, Orden, Entrada
+from datetime import timedelta
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse, JsonResponse
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST
+from .models import Cliente, Evento, Lote, Orden, Entrada, TrabajoExportacion, CancelacionEvento
 from .serializers import (
     ClienteRegistroSerializer, ClienteSerializer, ClienteLoginSerializer,
     EventoListSerializer, EventoDetalleSerializer, CrearOrdenSerializer,
     OrdenSerializer, EntradaSerializer, ValidarEntradaSerializer, 
-    EntradaValidacionSerializer
+    EntradaValidacionSerializer, EntradaCompactaSerializer, OrdenCheckoutSerializer,
+    CheckInLoteSerializer, SerieTemporalParamsSerializer,
+    CrearExportacionSerializer, TrabajoExportacionSerializer, EmitirCortesiasSerializer,
+    CancelarEventoSerializer, CancelacionEventoSerializer
 )
-from .services_compra import procesar_reserva_entrada, confirmar_pago_orden, fallar_orden
-import mercadopago
-from django.conf import settings
+from .pagination import MisEntradasPagination
+from .services_compra import (
+    procesar_reserva_entrada, confirmar_pago_orden, fallar_orden, obtener_pago_mercadopago
+)
+from .services_validacion import (
+    registrar_ingreso, generar_manifiesto, registrar_ingresos_lote, buscar_asistentes
+)
+from django.core import signing
+from django.core.exceptions import ValidationError
+from .services_estadisticas import estadisticas_dashboard
+from .services_metricas import serie_temporal
+from .services_exportacion import (
+    exportar_lista_invitados, respuesta_streaming, FORMATOS as FORMATOS_EXPORTACION,
+    solicitar_exportacion, respuesta_descarga, ruta_archivo
+)
+from .services_cortesias import emitir_cortesias
+from .services_reembolsos import cancelar_evento
+from .perfilado import listar_perfiles, ruta_perfil
+from .trazas import tramo, asignar_traza, resumen_orden, percentiles_por_etapa
+from .realtime import stream_stock_evento
+from .replicas import LecturaEnReplicaMixin, en_replica
+from .instrumentacion import medir, exportar_metricas, WEBHOOK_SEGUNDOS
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -119,9 +147,10 @@ class LoginClienteView(views.APIView):
 # EVENTOS
 # ===================================
 
-class EventoViewSet(viewsets.ReadOnlyModelViewSet):
+class EventoViewSet(LecturaEnReplicaMixin, viewsets.ReadOnlyModelViewSet):
     """Listado y detalle de eventos (Público)"""
-    queryset = Evento.objects.filter(activo=True)
+    # Los lotes en una consulta aparte: el stock de cada evento no consulta por fila
+    queryset = Evento.objects.filter(activo=True).prefetch_related('lotes')
     permission_classes = [AllowAny]
 
     def get_serializer_class(self):
@@ -130,6 +159,44 @@ class EventoViewSet(viewsets.ReadOnlyModelViewSet):
         return EventoListSerializer
 
 
+async def stock_evento_stream(request, evento_id):
+    """
+    Stream SSE (Público) con el stock de los lotes de un evento.
+    Reemplaza el polling a /api/eventos/<id>/ durante las preventas.
+    Solo lo sirve el proceso ASGI (servicio realtime): bajo WSGI la conexión
+    ocuparía un worker sync mientras el navegador tenga la página abierta.
+    """
+    if settings.SERVER_MODE != 'asgi':
+        return JsonResponse(
+            {"error": "El stream de stock se sirve desde el servicio realtime (ASGI)"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if not await Evento.objects.filter(id=evento_id, activo=True).aexists():
+        return JsonResponse({"error": "Evento no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+
+    response = StreamingHttpResponse(stream_stock_evento(evento_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evita que nginx acumule el stream en su buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def metricas_prometheus(request):
+    """
+    Métricas en formato Prometheus (todos los workers de gunicorn).
+    Requiere `Authorization: Bearer <METRICAS_TOKEN>`; sin token configurado
+    solo responde con DEBUG.
+    """
+    token = settings.METRICAS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return JsonResponse({"error": "No encontrado"}, status=status.HTTP_404_NOT_FOUND)
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return JsonResponse({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+    return HttpResponse(exportar_metricas(), content_type=CONTENT_TYPE_LATEST)
+
+
 # ===================================
 # COMPRA Y ÓRDENES (Requiere Autenticación)
 # ===================================
@@ -154,7 +221,10 @@ class CompraEntradaView(views.APIView):
                     cantidad=serializer.validated_data['cantidad']
                 )
                 
-                return Response(OrdenSerializer(orden).data, status=status.HTTP_201_CREATED)
+                # Respuesta mínima por defecto; ?respuesta=completa devuelve la orden anidada
+                if request.query_params.get('respuesta') == 'completa':
+                    return Response(OrdenSerializer(orden).data, status=status.HTTP_201_CREATED)
+                return Response(OrdenCheckoutSerializer(orden).data, status=status.HTTP_201_CREATED)
             
             except Cliente.DoesNotExist:
                 return Response({"error": "Cliente no identificado"}, status=status.HTTP_401_UNAUTHORIZED)
@@ -164,8 +234,11 @@ class CompraEntradaView(views.APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class MisEntradasView(views.APIView):
-    """Lista las entradas del cliente autenticado"""
+class MisEntradasView(LecturaEnReplicaMixin, views.APIView):
+    """
+    Lista las entradas del cliente autenticado (paginación por cursor).
+    Filtro opcional: ?cuando=proximos | pasados (según la fecha del evento).
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -173,9 +246,22 @@ class MisEntradasView(views.APIView):
             cliente = request.user
             if not isinstance(cliente, Cliente):
                 return Response({"error": "No eres un cliente válido"}, status=status.HTTP_403_FORBIDDEN)
-                
-            entradas = Entrada.objects.filter(cliente=cliente)
-            return Response(EntradaSerializer(entradas, many=True).data)
+            
+            # Una sola consulta con JOIN a lote y evento, trayendo solo las columnas que se muestran
+            entradas = Entrada.objects.filter(cliente=cliente).select_related('lote__evento').only(
+                'id', 'usada', 'anulada', 'fecha_uso', 'fecha_creacion', 'imagen_qr',
+                'lote__nombre', 'lote__evento__titulo', 'lote__evento__fecha_inicio'
+            )
+
+            cuando = request.query_params.get('cuando')
+            if cuando == 'proximos':
+                entradas = entradas.filter(lote__evento__fecha_inicio__gte=timezone.now())
+            elif cuando == 'pasados':
+                entradas = entradas.filter(lote__evento__fecha_inicio__lt=timezone.now())
+
+            paginator = MisEntradasPagination()
+            pagina = paginator.paginate_queryset(entradas, request, view=self)
+            return paginator.get_paginated_response(EntradaCompactaSerializer(pagina, many=True).data)
         except Exception:
             return Response({"error": "No autorizado"}, status=status.HTTP_401_UNAUTHORIZED)
 
@@ -194,21 +280,26 @@ class MercadoPagoWebhookView(views.APIView):
         topic = request.query_params.get('topic') or request.data.get('type')
         resource_id = request.query_params.get('id') or (request.data.get('data', {}).get('id'))
 
-        if topic == 'payment':
-            sdk = mercadopago.SDK(settings.MP_ACCESS_TOKEN)
-            payment_info = sdk.payment().get(resource_id)
+        # Otros topics (merchant_order, etc.) no se procesan
+        with medir(WEBHOOK_SEGUNDOS, estado_pago='ignorado') as medicion, tramo('webhook', topic=topic) as t:
+            if topic == 'payment':
+                medicion.etiquetas['estado_pago'] = 'error'
+                payment_info = obtener_pago_mercadopago(resource_id)
             
-            if payment_info["status"] == 200:
-                payment_data = payment_info["response"]
-                orden_id = payment_data.get('external_reference')
-                status_pagos = payment_data.get('status')
+                if payment_info["status"] == 200:
+                    payment_data = payment_info["response"]
+                    orden_id = payment_data.get('external_reference')
+                    status_pagos = payment_data.get('status')
+                    medicion.etiquetas['estado_pago'] = status_pagos or 'desconocido'
+                    t.atributos['estado_pago'] = status_pagos
+                    asignar_traza(orden_id)
                 
-                if status_pagos == 'approved':
-                    confirmar_pago_orden(orden_id, resource_id)
-                elif status_pagos in ['rejected', 'cancelled', 'refunded']:
-                    fallar_orden(orden_id)
+                    if status_pagos == 'approved':
+                        confirmar_pago_orden(orden_id, resource_id)
+                    elif status_pagos in ['rejected', 'cancelled', 'refunded']:
+                        fallar_orden(orden_id)
                 
-                return Response(status=status.HTTP_200_OK)
+                    return Response(status=status.HTTP_200_OK)
         
         return Response(status=status.HTTP_200_OK)
 
@@ -228,8 +319,7 @@ class ConfirmarPagoManualView(views.APIView):
         
         # Consultar estado en Mercado Pago
         try:
-            sdk = mercadopago.SDK(settings.MP_ACCESS_TOKEN)
-            payment_info = sdk.payment().get(payment_id)
+            payment_info = obtener_pago_mercadopago(payment_id)
             
             if payment_info["status"] == 200:
                 payment_data = payment_info["response"]
@@ -265,32 +355,105 @@ class ValidarEntradaView(views.APIView):
             
         serializer = ValidarEntradaSerializer(data=request.data)
         if serializer.is_valid():
-            try:
-                entrada = Entrada.objects.get(id=serializer.validated_data['codigo_qr'])
-                
-                if entrada.usada:
-                    return Response({
-                        "mensaje": "¡ALERTA! Esta entrada ya fue utilizada",
-                        "es_valida": False,
-                        "detalle": EntradaValidacionSerializer(entrada).data
-                    }, status=status.HTTP_200_OK)
-                
-                entrada.marcar_como_usada(usuario_validador=request.user)
-                
+            entrada, es_valida = registrar_ingreso(serializer.validated_data['codigo_qr'], request.user)
+
+            if entrada is None:
+                return Response({"error": "QR no válido"}, status=status.HTTP_404_NOT_FOUND)
+
+            if entrada.anulada:
                 return Response({
-                    "mensaje": "Entrada validada correctamente",
-                    "es_valida": True,
+                    "mensaje": "¡ALERTA! Esta entrada fue anulada (orden reembolsada)",
+                    "es_valida": False,
                     "detalle": EntradaValidacionSerializer(entrada).data
                 }, status=status.HTTP_200_OK)
-            except Entrada.DoesNotExist:
-                return Response({"error": "QR no válido"}, status=status.HTTP_404_NOT_FOUND)
+
+            if not es_valida:
+                return Response({
+                    "mensaje": "¡ALERTA! Esta entrada ya fue utilizada",
+                    "es_valida": False,
+                    "detalle": EntradaValidacionSerializer(entrada).data
+                }, status=status.HTTP_200_OK)
+
+            return Response({
+                "mensaje": "Entrada validada correctamente",
+                "es_valida": True,
+                "detalle": EntradaValidacionSerializer(entrada).data
+            }, status=status.HTTP_200_OK)
             
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class DashboardStatsView(views.APIView):
+class ManifiestoEventoView(views.APIView):
+    """
+    Manifiesto de entradas de un evento para validar sin conexión.
+    ?desde=<version> devuelve solo los cambios posteriores a esa descarga.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, evento_id):
+        if not request.user.is_staff:
+            return Response({"error": "Solo el staff puede descargar el manifiesto"}, status=status.HTTP_403_FORBIDDEN)
+
+        get_object_or_404(Evento, id=evento_id)
+        try:
+            manifiesto = generar_manifiesto(evento_id, desde=request.query_params.get('desde'))
+        except signing.BadSignature:
+            return Response({"error": "Versión de manifiesto inválida"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(manifiesto, status=status.HTTP_200_OK)
+
+
+class CheckInLoteView(views.APIView):
+    """
+    Sincroniza los escaneos hechos offline por una puerta.
+    Aplica todo en una transacción y devuelve los conflictos (dobles ingresos).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, evento_id):
+        if not request.user.is_staff:
+            return Response({"error": "Solo el staff puede validar entradas"}, status=status.HTTP_403_FORBIDDEN)
+
+        get_object_or_404(Evento, id=evento_id)
+        serializer = CheckInLoteSerializer(data=request.data)
+        if serializer.is_valid():
+            aplicados, conflictos = registrar_ingresos_lote(
+                evento_id, serializer.validated_data['escaneos'], request.user
+            )
+            return Response({
+                "aplicados": aplicados,
+                "conflictos": conflictos,
+            }, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BuscarAsistentesView(views.APIView):
+    """
+    Búsqueda de asistentes de un evento por cédula, nombre, apellido o email
+    (?q=). Devuelve sus entradas y si ya ingresaron, para atenderlos sin QR.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, evento_id):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        texto = request.query_params.get('q', '').strip()
+        if len(texto) < 2:
+            return Response({"error": "La búsqueda debe tener al menos 2 caracteres"}, status=status.HTTP_400_BAD_REQUEST)
+
+        get_object_or_404(Evento, id=evento_id)
+        return Response({
+            "evento_id": evento_id,
+            "resultados": buscar_asistentes(evento_id, texto),
+        }, status=status.HTTP_200_OK)
+
+
+class DashboardStatsView(LecturaEnReplicaMixin, views.APIView):
     """
     Proporciona métricas generales para el panel de administración.
+    Cantidad de consultas constante (ver estadisticas_dashboard).
     Solo accesible para Staff.
     """
     permission_classes = [IsAuthenticated]
@@ -299,69 +462,259 @@ class DashboardStatsView(views.APIView):
         if not request.user.is_staff:
             return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
 
-        eventos = Evento.objects.filter(activo=True)
-        stats_eventos = []
+        return Response(estadisticas_dashboard(), status=status.HTTP_200_OK)
 
-        total_recaudado_global = 0
 
-        for evento in eventos:
-            ordenes_aprobadas = Orden.objects.filter(evento=evento, estado='APROBADO')
-            entradas_vendidas = Entrada.objects.filter(lote__evento=evento)
-            entradas_usadas = entradas_vendidas.filter(usada=True).count()
-            
-            recaudado_evento = sum(o.monto_total for o in ordenes_aprobadas)
-            total_recaudado_global += recaudado_evento
-
-            stats_eventos.append({
-                "id": evento.id,
-                "titulo": evento.titulo,
-                "vendidas": entradas_vendidas.count(),
-                "usadas": entradas_usadas,
-                "recaudado": float(recaudado_evento),
-                "stock_total": sum(l.cantidad_total for l in evento.lotes.all())
-            })
+class SerieTemporalEventoView(views.APIView):
+    """
+    Ventas (por lote) e ingresos de un evento en el tiempo.
+    ?granularidad=minuto|hora|dia&desde=ISO&hasta=ISO&lote=ID (todo opcional).
+    Solo accesible para Staff.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, evento_id):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = SerieTemporalParamsSerializer(data=request.query_params)
+        if serializer.is_valid():
+            get_object_or_404(Evento, id=evento_id)
+            datos = serializer.validated_data
+            return Response(serie_temporal(
+                evento_id, datos['granularidad'], datos['desde'], datos['hasta'], lote_id=datos.get('lote')
+            ), status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ExportGuestListView(LecturaEnReplicaMixin, views.APIView):
+    """
+    Lista de asistentes de un evento en streaming (memoria acotada).
+    ?formato=csv|ndjson (por defecto csv) y ?gzip=1 para descargarla comprimida.
+    Solo accesible para Staff.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, evento_id):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS_EXPORTACION:
+            return Response({"error": "Formato no soportado (csv, ndjson)"}, status=status.HTTP_400_BAD_REQUEST)
+        gzip = request.query_params.get('gzip') in ('1', 'true')
+
+        evento = get_object_or_404(Evento, id=evento_id)
+        content_type, extension = FORMATOS_EXPORTACION[formato]
+        nombre_archivo = f"lista_{evento.titulo}_{timezone.now().date()}.{extension}"
+        if gzip:
+            content_type, nombre_archivo = 'application/gzip', f"{nombre_archivo}.gz"
+
+        # El cuerpo se genera después de que la vista retorna: el streaming lee de la réplica por su cuenta
+        return respuesta_streaming(
+            en_replica(exportar_lista_invitados(evento.id, formato=formato, gzip=gzip)), content_type, nombre_archivo
+        )
+
+
+class ExportacionesView(views.APIView):
+    """
+    Pide una exportación en segundo plano de uno o varios eventos.
+    POST {"eventos": [1, 2], "formato": "csv", "gzip": false}
+    - 202: trabajo nuevo, consultar su estado
+    - 200: ya existe un archivo (o un trabajo en curso) para la misma versión de los datos
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = CrearExportacionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        trabajo, creado = solicitar_exportacion(
+            serializer.validated_data['eventos'],
+            formato=serializer.validated_data['formato'],
+            gzip=serializer.validated_data['gzip'],
+            usuario=request.user,
+        )
+        return Response(
+            TrabajoExportacionSerializer(trabajo, context={'request': request}).data,
+            status=status.HTTP_202_ACCEPTED if creado else status.HTTP_200_OK
+        )
+
+
+class EstadoExportacionView(views.APIView):
+    """Estado y progreso de una exportación en segundo plano."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, trabajo_id):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        trabajo = get_object_or_404(TrabajoExportacion, id=trabajo_id)
+        return Response(TrabajoExportacionSerializer(trabajo, context={'request': request}).data)
+
+
+class DescargarExportacionView(views.APIView):
+    """
+    Descarga del archivo de una exportación terminada.
+    Soporta Range/If-Range para reanudar descargas cortadas (206).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, trabajo_id):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        trabajo = get_object_or_404(TrabajoExportacion, id=trabajo_id)
+        if trabajo.estado in ('PENDIENTE', 'EN_PROCESO', 'ERROR'):
+            return Response(
+                {"error": "La exportación no está lista", "estado": trabajo.estado},
+                status=status.HTTP_409_CONFLICT
+            )
+        # VENCIDO: reemplazada por una versión más nueva de los datos
+        if trabajo.estado == 'VENCIDO' or not os.path.exists(ruta_archivo(trabajo)):
+            return Response({"error": "El archivo ya no está disponible"}, status=status.HTTP_410_GONE)
+
+        extension = FORMATOS_EXPORTACION[trabajo.formato][1]
+        nombre_archivo = f"lista_invitados_{trabajo.fecha_creacion.date()}.{extension}{'.gz' if trabajo.gzip else ''}"
+        return respuesta_descarga(
+            trabajo, nombre_archivo,
+            rango=request.headers.get('Range'), if_range=request.headers.get('If-Range')
+        )
+
+
+class PerfilesView(views.APIView):
+    """
+    Capturas recientes del perfilador por muestreo (más nuevas primero).
+    ?ruta=<nombre de URL> filtra por endpoint. Solo accesible para Staff.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        perfiles = listar_perfiles(ruta=request.query_params.get('ruta'))
+        return Response({"perfiles": perfiles}, status=status.HTTP_200_OK)
+
 
+class DescargarPerfilView(views.APIView):
+    """
+    Descarga de una captura en formato collapsed stacks (flamegraph.pl,
+    inferno, speedscope.app). Solo accesible para Staff.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, nombre):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        ruta = ruta_perfil(nombre)
+        if ruta is None:
+            return Response({"error": "Captura no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=f"{nombre}.folded", content_type='text/plain')
+
+
+class TrazaOrdenView(views.APIView):
+    """
+    Tramos de una orden (reserva, MP, confirmación, emisión, email...) con su
+    desfase desde el primero y los hitos derivados. Solo accesible para Staff.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, orden_id):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        orden = get_object_or_404(Orden.objects.only('id', 'estado', 'fecha_creacion'), id=orden_id)
         return Response({
-            "total_eventos_activos": eventos.count(),
-            "total_recaudado_global": float(total_recaudado_global),
-            "eventos": stats_eventos
+            "orden_id": str(orden.id),
+            "estado": orden.estado,
+            **resumen_orden(orden.id, desde=orden.fecha_creacion),
         }, status=status.HTTP_200_OK)
 
 
-class ExportGuestListView(views.APIView):
+class PercentilesTrazasView(views.APIView):
     """
-    Genera un archivo CSV con la lista de asistentes para un evento.
+    p50/p90/p99 por etapa de las últimas ?horas=24 (máximo una semana).
     Solo accesible para Staff.
     """
     permission_classes = [IsAuthenticated]
 
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            horas = min(max(int(request.query_params.get('horas', 24)), 1), 168)
+        except ValueError:
+            return Response({"error": "horas debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        hasta = timezone.now()
+        return Response({
+            "horas": horas,
+            "etapas": percentiles_por_etapa(hasta - timedelta(hours=horas), hasta),
+        }, status=status.HTTP_200_OK)
+
+
+class EmitirCortesiasView(views.APIView):
+    """
+    Emisión masiva de cortesías / listas de invitados contra un lote.
+    Crea los clientes que falten, descuenta stock y emite las entradas en una
+    transacción; los QR se generan después en segundo plano (pool de procesos).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, lote_id):
+        if not request.user.is_staff:
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        get_object_or_404(Lote, id=lote_id)
+        serializer = EmitirCortesiasSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            resultado = emitir_cortesias(
+                lote_id, serializer.validated_data['invitados'], etiqueta=serializer.validated_data['etiqueta']
+            )
+        except ValidationError as e:
+            return Response({"error": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Los QR los dibuja el worker (emitir_cortesias --qr-pendientes): las entradas ya valen en la puerta
+        resultado['qr_pendientes'] = len(resultado.pop('entrada_ids'))
+        return Response(resultado, status=status.HTTP_201_CREATED)
+
+
+class CancelacionEventoView(views.APIView):
+    """
+    POST (solo dueño): cancela el evento y reembolsa todas sus órdenes
+    aprobadas en segundo plano (202). Repetirlo retoma la misma cancelación (200).
+    GET: progreso y ritmo de los reembolsos.
+    """
+    permission_classes = [IsAuthenticated]
+
     def get(self, request, evento_id):
         if not request.user.is_staff:
             return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
 
-        import csv
-        from django.http import HttpResponse
-        
-        evento = get_object_or_404(Evento, id=evento_id)
-        entradas = Entrada.objects.filter(lote__evento=evento).select_related('cliente', 'lote')
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="lista_{evento.titulo}_{timezone.now().date()}.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(['Ticket ID', 'Nombre', 'Apellido', 'Cédula', 'Email', 'Lote', 'Costo', 'Estado', 'Fecha Uso'])
-
-        for e in entradas:
-            writer.writerow([
-                str(e.id)[:8].upper(),
-                e.cliente.nombre,
-                e.cliente.apellido,
-                e.cliente.cedula,
-                e.cliente.email,
-                e.lote.nombre,
-                e.lote.precio,
-                'Ingresó' if e.usada else 'Pendiente',
-                e.fecha_uso.strftime('%Y-%m-%d %H:%M') if e.fecha_uso else '-'
-            ])
-
-        return response
+        cancelacion = get_object_or_404(CancelacionEvento, evento_id=evento_id)
+        return Response(CancelacionEventoSerializer(cancelacion).data)
+
+    def post(self, request, evento_id):
+        # Reembolsos irreversibles: solo el dueño, no los porteros
+        if not request.user.is_superuser:
+            return Response({"error": "Solo el dueño puede cancelar un evento"}, status=status.HTTP_403_FORBIDDEN)
+
+        get_object_or_404(Evento, id=evento_id)
+        serializer = CancelarEventoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        cancelacion, creada = cancelar_evento(
+            evento_id, motivo=serializer.validated_data['motivo'], usuario=request.user
+        )
+        return Response(
+            CancelacionEventoSerializer(cancelacion).data,
+            status=status.HTTP_202_ACCEPTED if creada else status.HTTP_200_OK
+        )
@@ -0,0 +1,162 @@
+"""
+Vistas async (modo ASGI) para los endpoints que esperan I/O externo.
+
+Misma API y mismas respuestas que sus equivalentes de views.py; urls.py las
+usa cuando SERVER_MODE='asgi'. La espera a Mercado Pago no bloquea un worker.
+"""
+
+from adrf.views import APIView as AsyncAPIView
+from adrf.viewsets import ReadOnlyModelViewSet as AsyncReadOnlyModelViewSet
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from .models import Cliente, Evento
+from .serializers import (
+    EventoListSerializer, EventoDetalleSerializer, CrearOrdenSerializer, OrdenSerializer,
+    OrdenCheckoutSerializer
+)
+from .instrumentacion import medir, WEBHOOK_SEGUNDOS
+from .trazas import tramo, asignar_traza
+from .replicas import LecturaEnReplicaMixin
+from .services_async import (
+    procesar_reserva_entrada_async, obtener_pago_mercadopago_async,
+    confirmar_pago_orden_async, fallar_orden_async
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _serializar(serializer_class, instancia, **kwargs):
+    return sync_to_async(lambda: serializer_class(instancia, **kwargs).data, thread_sensitive=True)()
+
+
+# ===================================
+# EVENTOS
+# ===================================
+
+class EventoViewSetAsync(LecturaEnReplicaMixin, AsyncReadOnlyModelViewSet):
+    """Listado y detalle de eventos (Público)"""
+    # Los lotes en una consulta aparte: el stock de cada evento no consulta por fila
+    queryset = Evento.objects.filter(activo=True).prefetch_related('lotes')
+    permission_classes = [AllowAny]
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return EventoDetalleSerializer
+        return EventoListSerializer
+
+    async def list(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    async def retrieve(self, request, *args, **kwargs):
+        return await self.aretrieve(request, *args, **kwargs)
+
+
+# ===================================
+# COMPRA Y ÓRDENES (Requiere Autenticación)
+# ===================================
+
+class CompraEntradaViewAsync(AsyncAPIView):
+    """Endpoint para iniciar la reserva y compra"""
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        serializer = CrearOrdenSerializer(data=request.data)
+        if await sync_to_async(serializer.is_valid, thread_sensitive=True)():
+            try:
+                cliente = request.user
+
+                if not isinstance(cliente, Cliente):
+                    return Response({"error": "Solo los clientes pueden comprar entradas"}, status=status.HTTP_403_FORBIDDEN)
+
+                orden = await procesar_reserva_entrada_async(
+                    cliente_id=cliente.id,
+                    evento_id=serializer.validated_data['evento_id'],
+                    cantidad=serializer.validated_data['cantidad']
+                )
+
+                if request.query_params.get('respuesta') == 'completa':
+                    return Response(await _serializar(OrdenSerializer, orden), status=status.HTTP_201_CREATED)
+                return Response(OrdenCheckoutSerializer(orden).data, status=status.HTTP_201_CREATED)
+
+            except Cliente.DoesNotExist:
+                return Response({"error": "Cliente no identificado"}, status=status.HTTP_401_UNAUTHORIZED)
+            except Exception as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# ===================================
+# WEBHOOK MERCADO PAGO
+# ===================================
+
+class MercadoPagoWebhookViewAsync(AsyncAPIView):
+    """
+    Recibe notificaciones de Mercado Pago sobre cambios en el estado de los pagos.
+    """
+    permission_classes = [AllowAny]
+
+    async def post(self, request):
+        topic = request.query_params.get('topic') or request.data.get('type')
+        resource_id = request.query_params.get('id') or (request.data.get('data', {}).get('id'))
+
+        # Otros topics (merchant_order, etc.) no se procesan
+        with medir(WEBHOOK_SEGUNDOS, estado_pago='ignorado') as medicion, tramo('webhook', topic=topic) as t:
+            if topic == 'payment':
+                medicion.etiquetas['estado_pago'] = 'error'
+                payment_info = await obtener_pago_mercadopago_async(resource_id)
+
+                if payment_info["status"] == 200:
+                    payment_data = payment_info["response"]
+                    orden_id = payment_data.get('external_reference')
+                    status_pagos = payment_data.get('status')
+                    medicion.etiquetas['estado_pago'] = status_pagos or 'desconocido'
+                    t.atributos['estado_pago'] = status_pagos
+                    asignar_traza(orden_id)
+
+                    if status_pagos == 'approved':
+                        await confirmar_pago_orden_async(orden_id, resource_id)
+                    elif status_pagos in ['rejected', 'cancelled', 'refunded']:
+                        await fallar_orden_async(orden_id)
+
+                    return Response(status=status.HTTP_200_OK)
+
+        return Response(status=status.HTTP_200_OK)
+
+
+class ConfirmarPagoManualViewAsync(AsyncAPIView):
+    """
+    Endpoint para que el frontend confirme el pago tras ser redirigido.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        payment_id = request.data.get('payment_id')
+
+        if not payment_id:
+            return Response({"error": "Falta payment_id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            payment_info = await obtener_pago_mercadopago_async(payment_id)
+
+            if payment_info["status"] == 200:
+                payment_data = payment_info["response"]
+                orden_id = payment_data.get('external_reference')
+                status_pago = payment_data.get('status')
+
+                if status_pago == 'approved':
+                    orden = await confirmar_pago_orden_async(orden_id, payment_id)
+                    if orden:
+                        return Response(await _serializar(OrdenSerializer, orden), status=status.HTTP_200_OK)
+                    else:
+                        return Response({"error": "No se pudo procesar la orden"}, status=status.HTTP_404_NOT_FOUND)
+                else:
+                    return Response({"error": f"El pago no está aprobado (Estado: {status_pago})"}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                return Response({"error": "No se pudo obtener información del pago"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error en ConfirmarPagoManualViewAsync: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -15,6 +15,12 @@ api.interceptors.request.use((config) => {
     return config;
 });
 
+// Stream SSE de stock (servido por el proceso ASGI; puede vivir en otro origen que la API).
+// Sin VITE_STREAM_URL no se abre: el backend WSGI no lo sirve.
+const STREAM_URL = import.meta.env.VITE_STREAM_URL;
+
+export const getStockStreamUrl = (eventoId) => STREAM_URL ? `${STREAM_URL}/api/eventos/${eventoId}/stream/` : null;
+
 export const getMediaUrl = (path) => {
     if (!path) return null;
     if (path.startsWith('http')) return path;
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import api, { getMediaUrl } from '../api';
+import api, { getMediaUrl, getStockStreamUrl } from '../api';
 import { motion } from 'framer-motion';
 import { Calendar, MapPin, ShieldCheck, ChevronRight } from 'lucide-react';
 
@@ -24,6 +24,22 @@ const EventDetail = () => {
             });
     }, [id, navigate]);
 
+    // Stock en tiempo real: el servidor empuja los cambios de los lotes (SSE)
+    useEffect(() => {
+        const streamUrl = getStockStreamUrl(id);
+        if (!streamUrl) return;
+        const source = new EventSource(streamUrl);
+        source.addEventListener('stock', (e) => {
+            const data = JSON.parse(e.data);
+            setEvento(prev => prev && ({
+                ...prev,
+                lotes: data.lotes,
+                stock_total_disponible: data.stock_total_disponible
+            }));
+        });
+        return () => source.close();
+    }, [id]);
+
     const handleComprar = async () => {
         const token = localStorage.getItem('token');
         if (!token) {
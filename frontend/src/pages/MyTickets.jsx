@@ -4,8 +4,12 @@ import api, { getMediaUrl } from '../api';
 import { motion } from 'framer-motion';
 import { Download, Calendar, MapPin, ScanLine, CheckCircle2 } from 'lucide-react';
 
+// Cursor de la URL `next` de la paginación (null en la última página)
+const cursorDe = (next) => next ? new URL(next).searchParams.get('cursor') : null;
+
 const MyTickets = () => {
     const [entradas, setEntradas] = useState([]);
+    const [siguiente, setSiguiente] = useState(null);
     const [loading, setLoading] = useState(true);
     const [confirming, setConfirming] = useState(false);
     const location = useLocation();
@@ -26,7 +30,8 @@ const MyTickets = () => {
         const fetchTickets = () => {
             api.get('/mis-entradas/')
                 .then(res => {
-                    setEntradas(res.data);
+                    setEntradas(res.data.results);
+                    setSiguiente(cursorDe(res.data.next));
                     setLoading(false);
                 })
                 .catch(err => {
@@ -54,6 +59,16 @@ const MyTickets = () => {
         }
     }, [location, navigate]);
 
+    // Paginación por cursor: se pide la página siguiente a la API con solo el cursor (no la URL absoluta del `next`)
+    const cargarMas = () => {
+        api.get('/mis-entradas/', { params: { cursor: siguiente } })
+            .then(res => {
+                setEntradas(prev => [...prev, ...res.data.results]);
+                setSiguiente(cursorDe(res.data.next));
+            })
+            .catch(err => console.error(err));
+    };
+
     if (confirming) return (
         <div style={{ height: '100vh', display: 'flex', flexDirection: 'column', justifyContent: 'center', alignItems: 'center', gap: '20px' }}>
             <motion.div animate={{ scale: [1, 1.2, 1] }} transition={{ repeat: Infinity, duration: 2 }}>
@@ -84,7 +99,7 @@ const MyTickets = () => {
                             key={entrada.id}
                             initial={{ opacity: 0, scale: 0.9 }}
                             animate={{ opacity: 1, scale: 1 }}
-                            transition={{ delay: index * 0.1 }}
+                            transition={{ delay: (index % 20) * 0.1 }}
                             className="glass"
                             style={{ position: 'relative', overflow: 'hidden' }}
                         >
@@ -158,6 +173,14 @@ const MyTickets = () => {
                     ))}
                 </div>
             )}
+
+            {siguiente && (
+                <div style={{ textAlign: 'center', marginTop: '40px' }}>
+                    <button onClick={cargarMas} className="download-btn" style={{ background: 'rgba(255,255,255,0.05)', border: '1px solid rgba(255,255,255,0.1)', color: 'white', padding: '12px 30px', borderRadius: '12px', cursor: 'pointer' }}>
+                        Cargar más entradas
+                    </button>
+                </div>
+            )}
         </div>
     );
 };
@@ -7,6 +7,7 @@ const Scanner = () => {
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState(null);
     const [isScanning, setIsScanning] = useState(true);
+    const [codigoManual, setCodigoManual] = useState('');
     const scannerRef = useRef(null);
 
     useEffect(() => {
@@ -28,6 +29,7 @@ const Scanner = () => {
         };
     }, []);
 
+    // Acepta el UUID del QR o el código corto impreso en el email (ej. "3F2A9C1B")
     const onScanSuccess = async (decodedText) => {
         if (loading) return;
 
@@ -37,7 +39,7 @@ const Scanner = () => {
 
         try {
             setLoading(true);
-            const response = await api.post('/validar-entrada/', {
+            const response = await api.post('/staff/validar-qr/', {
                 codigo_qr: decodedText
             });
 
@@ -79,6 +81,13 @@ const Scanner = () => {
         oscillator.stop(audioCtx.currentTime + 0.2);
     };
 
+    const onSubmitManual = (e) => {
+        e.preventDefault();
+        if (!codigoManual.trim()) return;
+        onScanSuccess(codigoManual.trim());
+        setCodigoManual('');
+    };
+
     const resetScanner = () => {
         setScanResult(null);
         setError(null);
@@ -94,6 +103,17 @@ const Scanner = () => {
             <div className="scanner-body">
                 <div id="reader" style={{ width: '100%', maxWidth: '500px', margin: '0 auto' }}></div>
 
+                <form className="manual-form" onSubmit={onSubmitManual}>
+                    <input
+                        type="text"
+                        value={codigoManual}
+                        onChange={(e) => setCodigoManual(e.target.value)}
+                        placeholder="Código de la entrada (ej. 3F2A9C1B)"
+                        autoCapitalize="characters"
+                    />
+                    <button type="submit">Validar</button>
+                </form>
+
                 {loading && (
                     <div className="scan-overlay">
                         <div className="loader"></div>
@@ -190,6 +210,34 @@ const Scanner = () => {
                     cursor: pointer;
                 }
 
+                .manual-form {
+                    display: flex;
+                    gap: 10px;
+                    margin-top: 15px;
+                }
+
+                .manual-form input {
+                    flex: 1;
+                    background: #0f172a;
+                    border: 1px solid #334155;
+                    color: white;
+                    padding: 12px;
+                    border-radius: 10px;
+                    font-family: monospace;
+                    font-size: 1rem;
+                    text-transform: uppercase;
+                }
+
+                .manual-form button {
+                    background: #3b82f6;
+                    color: white;
+                    border: none;
+                    padding: 12px 20px;
+                    border-radius: 10px;
+                    font-weight: 600;
+                    cursor: pointer;
+                }
+
                 .scan-overlay {
                     position: absolute;
                     top: 0;
@@ -0,0 +1,36 @@
+"""
+Configuración de Gunicorn para Backyard Bar.
+
+SERVER_MODE=wsgi (por defecto): workers sync clásicos.
+SERVER_MODE=asgi: workers uvicorn sobre backyard_bar.asgi; las vistas que
+esperan a Mercado Pago/SMTP pasan a ser async y no bloquean el worker.
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 3))
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'backyard_bar.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'backyard_bar.wsgi:application'
+    worker_class = 'sync'
+
+# Métricas Prometheus compartidas entre workers: cada proceso escribe sus
+# valores en este directorio y /api/metrics/ los suma. Tiene que definirse
+# antes de cargar la app (prometheus_client lo lee al importarse).
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/backyard_metricas')
+
+
+def on_starting(server):
+    # Los archivos de una ejecución anterior sumarían valores viejos
+    import shutil
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)